@@ -0,0 +1,182 @@
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+##                                                                                   ##
+##  This file forms part of the BayesLands surface processes modelling companion.    ##
+##                                                                                   ##
+##  For full license and copyright information, please refer to the LICENSE.md file  ##
+##  located at the project root, or contact the authors.                             ##
+##                                                                                   ##
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+
+"""
+Batch runner for BayesLands experiments.
+
+Jobs are read from a text file with one job per line:
+
+	problem  sampler  seed  samples
+
+where problem is an id or name from the registry (problems.xml) and sampler is either
+mcmc (bl_mcmc.py) or surflikl (bl_surflikl.py). Lines starting with # are ignored.
+
+Jobs are scheduled on the available cores with a concurrency limit. Each job is pinned
+to its own block of CPUs (using taskset when available) and its output is written to a
+log file. Result directories are created atomically by the scripts (see bl_problems), so
+concurrent jobs on the same problem do not collide.
+"""
+import os
+import sys
+import time
+import argparse
+import subprocess
+import multiprocessing
+
+SAMPLERS = {'mcmc': 'bl_mcmc.py', 'surflikl': 'bl_surflikl.py'}
+
+def read_jobs(filename):
+	"""
+	Read the batch file.
+
+	Parameters
+	----------
+	variable: filename
+		Batch file with one (problem, sampler, seed, samples) job per line.
+
+	Return
+	------
+	variable: jobs
+		List of (problem, sampler, seed, samples) tuples.
+	"""
+	jobs = []
+	with open(filename) as f:
+		for count, line in enumerate(f):
+			term = line.split('#')[0].split()
+			if len(term) == 0:
+				continue
+			if len(term) != 4:
+				raise ValueError('Error in the batch file line %d: expected problem sampler seed samples.' % (count+1))
+			if term[1] not in SAMPLERS:
+				raise ValueError('Error in the batch file line %d: sampler is either %s.' % (count+1, ', '.join(sorted(SAMPLERS))))
+			jobs.append((term[0], term[1], int(term[2]), int(term[3])))
+
+	return jobs
+
+def _command(job, registry, cpus, pin, meshcache=None):
+	"""
+	Build the command line of a job, pinned to the given CPUs.
+	"""
+	problem, sampler, seed, samples = job
+	script = os.path.join(os.path.dirname(os.path.abspath(__file__)), SAMPLERS[sampler])
+	cmd = [sys.executable, script, '-p', str(problem), '-s', str(samples), '--seed', str(seed)]
+	if registry is not None:
+		cmd += ['--registry', registry]
+	if meshcache is not None:
+		cmd += ['--meshcache', meshcache]
+	if pin:
+		cmd = ['taskset', '-c', ','.join([str(c) for c in cpus])] + cmd
+
+	return cmd
+
+def run_batch(jobs, nprocs=None, cpus_per_job=1, cpus=None, pin=True, logdir='batch_logs', registry=None, poll=1., meshcache=None):
+	"""
+	Run the jobs with at most nprocs jobs at the same time.
+
+	Parameters
+	----------
+	variable: jobs
+		List of (problem, sampler, seed, samples) tuples.
+	variable: nprocs
+		Maximum number of concurrent jobs (defaults to the number of CPU blocks available).
+	variable: cpus_per_job
+		Number of CPUs given to each job.
+	variable: cpus
+		List of CPU ids available to the batch (defaults to all CPUs).
+	variable: pin
+		Pin each job to its CPUs with taskset.
+	variable: logdir
+		Directory where the output of each job is written.
+	variable: registry
+		Optional problem registry passed to the scripts.
+	variable: poll
+		Polling interval (s) of the running jobs.
+	variable: meshcache
+		Optional mesh cache directory. Jobs on the same problem then memory map a single
+		copy of the mesh.
+
+	Return
+	------
+	variable: results
+		List of (job, return code, wall time) in job order.
+	"""
+	if cpus is None:
+		cpus = range(multiprocessing.cpu_count())
+	nslots = max(1, len(cpus)//cpus_per_job)
+	if nprocs is None or nprocs > nslots:
+		nprocs = nslots
+	if pin and not any(os.access(os.path.join(path, 'taskset'), os.X_OK) for path in os.environ.get('PATH', '').split(os.pathsep)):
+		print 'taskset is not available, jobs will not be pinned'
+		pin = False
+	if not os.path.exists(logdir):
+		os.makedirs(logdir)
+
+	env = dict(os.environ)
+	env['OMP_NUM_THREADS'] = str(cpus_per_job)
+
+	free = range(nprocs)
+	running = {}
+	results = [None]*len(jobs)
+	pending = range(len(jobs))
+
+	while len(pending) > 0 or len(running) > 0:
+		# Launch jobs on the free CPU blocks
+		while len(pending) > 0 and len(free) > 0:
+			k = pending.pop(0)
+			slot = free.pop(0)
+			block = cpus[slot*cpus_per_job:(slot+1)*cpus_per_job]
+			cmd = _command(jobs[k], registry, block, pin, meshcache)
+			log = open('%s/job_%s_%s_%s_%s.log' % ((logdir,k)+jobs[k][:3]), 'w')
+			print 'Starting job', k, jobs[k], 'on cpus', block
+			proc = subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT, env=env)
+			running[k] = (proc, slot, log, time.time())
+
+		time.sleep(poll)
+
+		# Collect finished jobs
+		for k in running.keys():
+			proc, slot, log, tstart = running[k]
+			code = proc.poll()
+			if code is not None:
+				log.close()
+				results[k] = (jobs[k], code, time.time()-tstart)
+				free.append(slot)
+				del running[k]
+				print 'Job', k, jobs[k], 'finished with code', code, 'in (s):', results[k][2]
+
+	return results
+
+def main():
+
+	parser = argparse.ArgumentParser(description='BayesLands batch runner')
+	parser.add_argument('jobs', help='Batch file with one "problem sampler seed samples" job per line')
+	parser.add_argument('-j','--concurrency', help='Maximum number of concurrent jobs', default=None, dest="nprocs", type=int)
+	parser.add_argument('-c','--cpus-per-job', help='Number of CPUs pinned to each job', default=1, dest="cpus_per_job", type=int)
+	parser.add_argument('--cpus', help='CPU ids available to the batch (e.g. 0 1 2 3)', nargs='+', default=None, dest="cpus", type=int)
+	parser.add_argument('--nopin', help='Do not pin jobs to CPUs', action='store_false', dest="pin")
+	parser.add_argument('--logdir', help='Directory of the job logs', default='batch_logs', dest="logdir")
+	parser.add_argument('--registry', help='Problem registry file', default=None, dest="registry")
+	parser.add_argument('--meshcache', help='Mesh cache directory shared by the jobs', default=None, dest="meshcache")
+	args = parser.parse_args()
+
+	jobs = read_jobs(args.jobs)
+	results = run_batch(jobs, args.nprocs, args.cpus_per_job, args.cpus, args.pin, args.logdir, args.registry, meshcache=args.meshcache)
+
+	print '\n%-5s %-15s %-10s %8s %10s %6s %12s' % ('job', 'problem', 'sampler', 'seed', 'samples', 'code', 'time (s)')
+	failed = 0
+	for k, (job, code, walltime) in enumerate(results):
+		print '%-5d %-15s %-10s %8d %10d %6d %12.2f' % ((k,)+job+(code, walltime))
+		if code != 0:
+			failed += 1
+
+	if failed > 0:
+		print failed, 'job(s) failed, see the logs in', args.logdir
+		sys.exit(1)
+
+if __name__ == "__main__": main()
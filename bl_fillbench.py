@@ -0,0 +1,95 @@
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+##                                                                                   ##
+##  This file forms part of the BayesLands surface processes modelling companion.    ##
+##                                                                                   ##
+##  For full license and copyright information, please refer to the LICENSE.md file  ##
+##  located at the project root, or contact the authors.                             ##
+##                                                                                   ##
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+
+"""
+This script compares the depression filling algorithms of Badlands on the TIN of the
+registered problems: Planchon & Darboux (pit_stack_PD) and priority-flood (pit_stack_PF).
+For each problem, the initial elevation is filled with both algorithms, with and without
+the maximum filling thickness, and the timings and the largest difference between the
+filled surfaces are reported. It exits with a non-zero status when the filled surfaces
+differ by more than the given tolerance.
+"""
+import sys
+import time
+import argparse
+import numpy as np
+
+import bl_problems
+from pyBadlands.model import Model as badlandsModel
+from pyBadlands.surface import elevationTIN
+
+def time_filling(fill, elev, allfill, sealevel, repeat):
+	"""
+	Time a depression filling function.
+
+	Parameters
+	----------
+	variable: fill
+		Depression filling function (pit_stack_PD or pit_stack_PF).
+	variable: elev
+		Numpy array containing the nodes elevation.
+	variable: allfill
+		Produce depression-less surface (1) or limit the filling thickness (0).
+	variable: sealevel
+		Current elevation of sea level.
+	variable: repeat
+		Number of repetitions.
+
+	Return
+	------
+	variable: times
+		Numpy array of the wall times (s) of each repetition.
+	variable: fillH
+		Numpy array containing the filled elevations.
+	"""
+	times = np.zeros(repeat)
+	for r in range(repeat):
+		tstart = time.time()
+		fillH = fill(elev, allfill, sealevel)
+		times[r] = time.time() - tstart
+
+	return times, fillH
+
+def main():
+
+	parser = argparse.ArgumentParser(description='BayesLands depression filling benchmark')
+	parser.add_argument('-p','--problems', help='Problem ids or names (defaults to all the registered problems)', nargs='+', default=None, dest="problems")
+	parser.add_argument('-r','--repeat', help='Number of repetitions of each filling', default=5, dest="repeat", type=int)
+	parser.add_argument('-t','--tolerance', help='Maximum difference between the filled surfaces (m)', default=1.e-6, dest="tolerance", type=float)
+	parser.add_argument('--registry', help='Problem registry file', default=bl_problems.REGISTRY, dest="registry")
+	args = parser.parse_args()
+
+	if args.problems is None:
+		problems = bl_problems.load_problems(args.registry)
+	else:
+		problems = [bl_problems.get_problem(key, args.registry) for key in args.problems]
+
+	failed = False
+	print '%-15s %8s %7s %12s %12s %12s %12s %8s %12s' % ('problem', 'nodes', 'allfill', 'PD min (s)', 'PD med (s)', 'PF min (s)', 'PF med (s)', 'speedup', 'max diff (m)')
+	for prob in problems:
+		model = badlandsModel()
+		model.load_xml('0', prob.xmlinput, muted = True)
+		model.force.getSea(model.tNow)
+		elev = model.elevation
+		sealevel = model.force.sealevel
+
+		for allfill in [0, 1]:
+			tPD, fillPD = time_filling(elevationTIN.pit_stack_PD, elev, allfill, sealevel, args.repeat)
+			tPF, fillPF = time_filling(elevationTIN.pit_stack_PF, elev, allfill, sealevel, args.repeat)
+			diff = np.abs(fillPD - fillPF).max()
+			print '%-15s %8d %7d %12.5f %12.5f %12.5f %12.5f %8.2f %12.3e' % (prob.name, len(elev), allfill, tPD.min(), np.median(tPD),
+				tPF.min(), np.median(tPF), np.median(tPD)/max(np.median(tPF), 1.e-12), diff)
+			if diff > args.tolerance:
+				print '   - %s filled surfaces differ by more than %.3e m' % (prob.name, args.tolerance)
+				failed = True
+
+	if failed:
+		sys.exit(1)
+
+if __name__ == "__main__": main()
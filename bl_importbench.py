@@ -0,0 +1,88 @@
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+##                                                                                   ##
+##  This file forms part of the BayesLands surface processes modelling companion.    ##
+##                                                                                   ##
+##  For full license and copyright information, please refer to the LICENSE.md file  ##
+##  located at the project root, or contact the authors.                             ##
+##                                                                                   ##
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+
+"""
+This script measures the import time of the BayesLands entry points in fresh interpreters
+and checks that none of the plotting libraries are loaded at import. It exits with a non-zero
+status when a module is slower than the given threshold or imports a plotting library, so it
+can be used to guard worker startup against regressions.
+"""
+import sys
+import json
+import argparse
+import subprocess
+import numpy as np
+
+# Modules which should never be loaded when importing the worker entry points
+PLOTTING_MODULES = ['plotly', 'matplotlib', 'pylab', 'cmocean', 'PIL', 'sklearn', 'mpl_toolkits', 'cycler']
+
+_PROBE = """
+import sys, time, json
+tstart = time.time()
+import %s
+tend = time.time() - tstart
+loaded = sorted(set(name.split('.')[0] for name in sys.modules.keys()))
+print json.dumps({'time': tend, 'loaded': loaded})
+"""
+
+def probe(module):
+	"""
+	Import a module in a fresh interpreter.
+
+	Parameters
+	----------
+	variable: module
+		Name of the module to import.
+
+	Return
+	------
+	variable: tend
+		Import time in seconds.
+	variable: loaded
+		List of top-level packages loaded by the import.
+	"""
+	out = subprocess.check_output([sys.executable, '-c', _PROBE % module])
+	result = json.loads(out.strip().splitlines()[-1])
+
+	return result['time'], result['loaded']
+
+def main():
+
+	parser = argparse.ArgumentParser(description='BayesLands import time benchmark')
+	parser.add_argument('-m','--modules', help='Modules to benchmark', nargs='+', default=['bl_worker','bl_mcmc','bl_surflikl'], dest="modules")
+	parser.add_argument('-r','--repeat', help='Number of fresh interpreters per module', default=5, dest="repeat", type=int)
+	parser.add_argument('-t','--threshold', help='Maximum median import time (s)', default=None, dest="threshold", type=float)
+	args = parser.parse_args()
+
+	failed = False
+	print '%-15s %10s %10s %10s' % ('module', 'min (s)', 'median (s)', 'max (s)')
+	for module in args.modules:
+		times = np.zeros(args.repeat)
+		try:
+			for r in range(args.repeat):
+				times[r], loaded = probe(module)
+		except subprocess.CalledProcessError:
+			print '   - %s cannot be imported' % module
+			failed = True
+			continue
+		med = np.median(times)
+		print '%-15s %10.4f %10.4f %10.4f' % (module, times.min(), med, times.max())
+
+		heavy = [name for name in PLOTTING_MODULES if name in loaded]
+		if len(heavy) > 0:
+			print '   - %s imports plotting libraries: %s' % (module, ', '.join(heavy))
+			failed = True
+		if args.threshold is not None and med > args.threshold:
+			print '   - %s import time above threshold (%.4f s)' % (module, args.threshold)
+			failed = True
+
+	if failed:
+		sys.exit(1)
+
+if __name__ == "__main__": main()
@@ -0,0 +1,220 @@
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+##                                                                                   ##
+##  This file forms part of the BayesLands surface processes modelling companion.    ##
+##                                                                                   ##
+##  For full license and copyright information, please refer to the LICENSE.md file  ##
+##  located at the project root, or contact the authors.                             ##
+##                                                                                   ##
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+
+"""
+This script compares the compiled libUtils (Fortran/C) and their Python implementation
+(libUtils/kernels, compiled with Numba when installed) on the TIN of the registered problems.
+For each problem, the flow directions, hillslope diffusion, depression filling, stack
+ordering and discharge kernels are run with both backends on the initial surface, and the
+timings and the largest difference between the outputs are reported. The first call of
+each Python kernel includes the Numba compilation and is not timed. Only the Python kernels
+are timed when a compiled library is missing. It exits with a non-zero status when the
+outputs differ by more than the given tolerance.
+"""
+import sys
+import time
+import argparse
+import importlib
+import numpy as np
+
+import bl_problems
+from pyBadlands import libUtils
+from pyBadlands.model import Model as badlandsModel
+
+def get_kernel(library, fmodule, kernel, name):
+	"""
+	Get a function of a compiled library and of its Python implementation.
+
+	Parameters
+	----------
+	variable: library
+		Name of the compiled library.
+	variable: fmodule
+		Name of the Fortran module wrapped in the library (None for C libraries).
+	variable: kernel
+		Name of the Python kernels module.
+	variable: name
+		Name of the function.
+
+	Return
+	------
+	variable: ffunc
+		Compiled function (None when the library is not available).
+	variable: kfunc
+		Python function.
+	"""
+	kfunc = getattr(importlib.import_module('pyBadlands.libUtils.kernels.'+kernel), name)
+	if libUtils.backends[library] != 'fortran':
+		return None, kfunc
+
+	module = getattr(libUtils, library)
+	if fmodule is not None:
+		module = getattr(module, fmodule)
+
+	return getattr(module, name), kfunc
+
+def time_kernel(func, args, repeat):
+	"""
+	Time a kernel function.
+
+	Parameters
+	----------
+	variable: func
+		Kernel function.
+	variable: args
+		Arguments of the function.
+	variable: repeat
+		Number of repetitions.
+
+	Return
+	------
+	variable: times
+		Numpy array of the wall times (s) of each repetition.
+	variable: out
+		Outputs of the function.
+	"""
+	times = np.zeros(repeat)
+	for r in range(repeat):
+		tstart = time.time()
+		out = func(*args)
+		times[r] = time.time() - tstart
+
+	return times, out
+
+def max_diff(out1, out2, tolerance):
+	"""
+	Largest absolute difference between the outputs of two kernel functions.
+
+	Parameters
+	----------
+	variable: out1, out2
+		Outputs of the two functions.
+	variable: tolerance
+		Maximum accepted difference.
+
+	Return
+	------
+	variable: diff
+		Largest absolute difference, infinite when the outputs have different shapes or
+		NaN values at different places.
+	variable: passed
+		False when the difference exceeds the tolerance.
+	"""
+	if not isinstance(out1, tuple):
+		out1 = (out1,)
+		out2 = (out2,)
+	if len(out1) != len(out2):
+		return np.inf, False
+	diff = 0.
+	for a, b in zip(out1, out2):
+		a = np.asarray(a, dtype=float)
+		b = np.asarray(b, dtype=float)
+		if a.shape != b.shape:
+			return np.inf, False
+		nan = np.isnan(a)
+		if not np.array_equal(nan, np.isnan(b)):
+			return np.inf, False
+		if a.size > nan.sum():
+			diff = max(diff, np.abs(a[~nan]-b[~nan]).max())
+
+	return diff, diff <= tolerance
+
+def kernel_cases(model):
+	"""
+	Build the kernel calls of the initial time step of a Badlands model.
+
+	Parameters
+	----------
+	variable: model
+		Badlands model loaded from its XML input file.
+
+	Return
+	------
+	variable: cases
+		List of kernel calls (label, library, Fortran module, kernels module, function, arguments).
+	"""
+	mesh = model.FVmesh
+	elev = model.elevation
+	nodes = len(elev)
+	gids = np.arange(nodes, dtype=np.int32)
+	borders = np.ones(nodes, dtype=np.int32)
+	borders[:model.recGrid.boundsPt] = 0
+	area = mesh.control_volumes
+
+	# Reference outputs used to chain the kernels
+	fillH = libUtils.PDalgo.pdstack.pitfilling(elev, 1, model.force.sealevel)
+	base, receivers = libUtils.sfd.directions_csr(fillH, elev, mesh.ngbOffsets, mesh.ngbIDs, gids)[:2]
+	localbase = np.where(base >= 0)[0].astype(np.int32)
+	delta = np.zeros(nodes+1, dtype=np.int32)
+	delta[1:] = np.cumsum(np.bincount(receivers, minlength=nodes))
+	stack = libUtils.FLWnetwork.fstack.build(localbase, receivers, delta)[1]
+	stack = stack[stack >= 0].astype(np.int32)
+	discharge = area*model.rain
+
+	cases = []
+	cases.append(('directions', 'sfd', None, 'sfd', 'directions_csr',
+		(fillH, elev, mesh.ngbOffsets, mesh.ngbIDs, gids)))
+	cases.append(('diffusion', 'sfd', None, 'sfd', 'diffusion_csr',
+		(elev, borders, mesh.ngbOffsets, mesh.ngbIDs, mesh.ngbEdges, mesh.ngbDist, gids)))
+	cases.append(('pitfilling', 'PDalgo', 'pdstack', 'pdstack', 'pitfilling',
+		(elev, 0, model.force.sealevel)))
+	cases.append(('fstack', 'FLWnetwork', 'fstack', 'fstack', 'build',
+		(localbase, receivers, delta)))
+	cases.append(('discharge', 'FLOWalgo', 'flowcompute', 'flowcompute', 'discharge',
+		(stack, receivers, elev, discharge)))
+
+	return cases
+
+def main():
+
+	parser = argparse.ArgumentParser(description='BayesLands libUtils kernels benchmark')
+	parser.add_argument('-p','--problems', help='Problem ids or names (defaults to all the registered problems)', nargs='+', default=None, dest="problems")
+	parser.add_argument('-r','--repeat', help='Number of repetitions of each kernel', default=5, dest="repeat", type=int)
+	parser.add_argument('-t','--tolerance', help='Maximum difference between the backends outputs', default=1.e-6, dest="tolerance", type=float)
+	parser.add_argument('--registry', help='Problem registry file', default=bl_problems.REGISTRY, dest="registry")
+	args = parser.parse_args()
+
+	if args.problems is None:
+		problems = bl_problems.load_problems(args.registry)
+	else:
+		problems = [bl_problems.get_problem(key, args.registry) for key in args.problems]
+
+	failed = False
+	print '%-15s %8s %-11s %12s %12s %12s %12s %8s %12s' % ('problem', 'nodes', 'kernel', 'F med (s)', 'J first (s)', 'J min (s)', 'J med (s)', 'speedup', 'max diff')
+	for prob in problems:
+		model = badlandsModel()
+		model.load_xml('0', prob.xmlinput, muted = True)
+		model.force.getSea(model.tNow)
+		mesh = model.FVmesh
+
+		# The Python depression filling keeps its own copy of the TIN parameters
+		kpd = importlib.import_module('pyBadlands.libUtils.kernels.pdstack')
+		kpd.pitparamscsr(mesh.ngbOffsets, mesh.ngbIDs, mesh.control_volumes, model.input.diffnb,
+			model.input.diffprop, model.input.fillmax, 1.e-2, model.recGrid.boundsPt)
+
+		for label, library, fmodule, kernel, name, kargs in kernel_cases(model):
+			ffunc, kfunc = get_kernel(library, fmodule, kernel, name)
+			tfirst, kout = time_kernel(kfunc, kargs, 1)
+			tJ, kout = time_kernel(kfunc, kargs, args.repeat)
+			if ffunc is None:
+				print '%-15s %8d %-11s %12s %12.5f %12.5f %12.5f %8s %12s' % (prob.name, len(model.elevation), label, 'n/a',
+					tfirst[0], tJ.min(), np.median(tJ), 'n/a', 'n/a')
+				continue
+			tF, fout = time_kernel(ffunc, kargs, args.repeat)
+			diff, passed = max_diff(fout, kout, args.tolerance)
+			print '%-15s %8d %-11s %12.5f %12.5f %12.5f %12.5f %8.2f %12.3e' % (prob.name, len(model.elevation), label, np.median(tF),
+				tfirst[0], tJ.min(), np.median(tJ), np.median(tF)/max(np.median(tJ), 1.e-12), diff)
+			if not passed:
+				print '   - %s %s outputs differ by more than %.3e' % (prob.name, label, args.tolerance)
+				failed = True
+
+	if failed:
+		sys.exit(1)
+
+if __name__ == "__main__": main()
@@ -22,47 +22,19 @@ import math
 import copy
 import fnmatch
 import shutil
-import plotly
 import argparse
-import collections
-import plotly.plotly as py
-import matplotlib as mpl
-import matplotlib.mlab as mlab
-import matplotlib.pyplot as plt
-import cmocean as cmo
-import plotly.graph_objs as go
+import bl_worker
+import bl_problems
 from copy import deepcopy
-from pylab import rcParams
-from PIL import Image
-from io import StringIO
-from cycler import cycler
-from matplotlib.patches import Polygon
-from matplotlib.collections import PatchCollection
-from scipy.spatial import cKDTree
-from scipy import stats 
-from pyBadlands.model import Model as badlandsModel
-from mpl_toolkits.axes_grid1 import make_axes_locatable
-from mpl_toolkits.mplot3d import Axes3D
-from scipy.stats import multivariate_normal
-from plotly.graph_objs import *
-from plotly.offline.offline import _plot_html
-plotly.offline.init_notebook_mode()
-
-
-parser=argparse.ArgumentParser(description='PTBayeslands modelling')
-
-parser.add_argument('-p','--problem', help='Problem Number 1-crater-fast,2-crater,3-etopo-fast,4-etopo,5-null,6-mountain', required=True, dest="problem",type=int)
-parser.add_argument('-s','--samples', help='Number of samples', default=10000, dest="samples",type=int)
-
-args = parser.parse_args()
-problem = args.problem
-samples = args.samples
+
+# Plotting libraries (plotly, matplotlib...) are imported lazily inside the plotting
+# methods so that sampling workers do not pay their import cost.
 
 class bayeslands_mcmc():
 	"""
 		
 	"""
-	def __init__(self, muted, simtime, samples, real_elev , real_erdp, real_erdp_pts, erdp_coords, filename, xmlinput, erodlimits, rainlimits, mlimit, nlimit, run_nb, likl_sed):
+	def __init__(self, muted, simtime, samples, real_elev , real_erdp, real_erdp_pts, erdp_coords, filename, xmlinput, erodlimits, rainlimits, mlimit, nlimit, run_nb, likl_sed, problem=None, meshcache=None):
 		self.filename = filename
 		self.input = xmlinput
 		self.real_elev = real_elev
@@ -71,6 +43,8 @@ class bayeslands_mcmc():
 		self.real_erdp_pts = real_erdp_pts
 		self.erdp_coords = erdp_coords
 		self.likl_sed = likl_sed
+		self.problem = problem
+		self.meshcache = meshcache
 
 		self.simtime = simtime
 		self.samples = samples
@@ -94,6 +68,9 @@ class bayeslands_mcmc():
 		self.sim_interval = np.arange(0, self.simtime+1, self.simtime/4)
 		self.burn_in = 0.05
 
+		# Per-sample timing and memory instrumentation
+		self.timer = bl_worker.SampleTimer('%s/timing.csv' % (self.filename))
+
 	def blackBox(self, rain, erodibility, m , n):
 		"""
 		Main entry point for running badlands model with different forcing conditions.
@@ -121,46 +98,9 @@ class bayeslands_mcmc():
 		variable: erdp_pts_vec
 			Cumulative erosion/deposition at particular co-ordinates on the grid stored in erdp_coords
 		"""
-		tstart = time.clock()
-		# Re-initialise badlands model
-		model = badlandsModel()
-
-		# Load the XmL input file
-		model.load_xml(str(self.run_nb), self.input, muted = self.muted)
-
-		# Adjust erodibility based on given parameter
-		model.input.SPLero = erodibility
-		model.flow.erodibility.fill(erodibility)
-
-		# Adjust precipitation values based on given parameter
-		model.force.rainVal[:] = rain
-
-		#Adjust m and n values
-		model.input.SPLm = m
-		model.input.SPLn = n
-
-		elev_vec = collections.OrderedDict()
-		erdp_vec = collections.OrderedDict()
-		erdp_pts_vec = collections.OrderedDict()
-		
-		for x in range(len(self.sim_interval)):
-			
-			self.simtime = self.sim_interval[x]
-
-			model.run_to_time(self.simtime, muted = self.muted)
-			
-			elev, erdp = self.interpolateArray(model.FVmesh.node_coords[:, :2], model.elevation, model.cumdiff)
-			
-			erdp_pts = np.zeros((self.erdp_coords.shape[0]))
-
-			for count, val in enumerate(self.erdp_coords):
-				erdp_pts[count] = erdp[val[0], val[1]]
-
-			elev_vec[self.simtime] = elev
-			erdp_vec[self.simtime] = erdp
-			erdp_pts_vec[self.simtime] = erdp_pts
-			
-			# print 'Badlands black box model took (s):',time.clock()-tstart
+		elev_vec, erdp_vec, erdp_pts_vec = bl_worker.blackBox(self.input, self.run_nb, self.sim_interval, self.erdp_coords,
+			rain, erodibility, m, n, muted = self.muted, timer = self.timer, meshcache = self.meshcache)
+		self.simtime = self.sim_interval[-1]
 
 		return elev_vec, erdp_vec, erdp_pts_vec
 
@@ -183,36 +123,7 @@ class bayeslands_mcmc():
 		variable: dzreg
 			erodep on a regular grid
 		"""
-		x, y = np.hsplit(coords, 2)
-		dx = (x[1]-x[0])[0]
-
-		nx = int((x.max() - x.min())/dx+1)
-		ny = int((y.max() - y.min())/dx+1)
-		xi = np.linspace(x.min(), x.max(), nx)
-		yi = np.linspace(y.min(), y.max(), ny)
-
-		xi, yi = np.meshgrid(xi, yi)
-		xyi = np.dstack([xi.flatten(), yi.flatten()])[0]
-		XY = np.column_stack((x,y))
-
-		tree = cKDTree(XY)
-		distances, indices = tree.query(xyi, k=3)
-		if len(z[indices].shape) == 3:
-			z_vals = z[indices][:,:,0]
-			dz_vals = dz[indices][:,:,0]
-		else:
-			z_vals = z[indices]
-			dz_vals = dz[indices]
-
-		zi = np.average(z_vals,weights=(1./distances), axis=1)
-		dzi = np.average(dz_vals,weights=(1./distances), axis=1)
-		onIDs = np.where(distances[:,0] == 0)[0]
-		if len(onIDs) > 0:
-			zi[onIDs] = z[indices[onIDs,0]]
-			dzi[onIDs] = dz[indices[onIDs,0]]
-		zreg = np.reshape(zi,(ny,nx))
-		dzreg = np.reshape(dzi,(ny,nx))
-		return zreg,dzreg
+		return bl_worker.interpolateArray(coords, z, dz)
 
 	def viewMap(self, sample_num, likl, rain, erod, width = 600, height = 600, zmin = None, zmax = None, zData = None, title='Export Grid'):
 		"""
@@ -235,12 +146,15 @@ class bayeslands_mcmc():
 		variable: title
 			Title of the graph.
 		"""
+		import plotly
+		from plotly.graph_objs import Figure, Heatmap, Layout, Scene, XAxis, YAxis, ZAxis
+
 		if zmin == None:
 			zmin = zData.min()
 		if zmax == None:
 			zmax = zData.max()
 		
-		trace = go.Heatmap(z=zData)
+		trace = Heatmap(z=zData)
 		data=[trace]
 		layout = Layout(
 			title='Crater Erosiondeposition     rain = %s, erod = %s, likl = %s ' %( rain, erod, likl),
@@ -276,8 +190,11 @@ class bayeslands_mcmc():
 		variable: title
 			Title of the graph.
 		"""
+		import plotly
+		from plotly.graph_objs import Bar, Figure, Layout, Scene, XAxis, YAxis
+
 		xData = np.array_str(xData)
-		trace = go.Bar(x=xData, y = yData)
+		trace = Bar(x=xData, y = yData)
 		data=[trace]
 		layout = Layout(
 			title='Crater Erosion deposition pts    rain = %s, erod = %s, likl = %s ' %( rain, erod, likl),
@@ -316,6 +233,8 @@ class bayeslands_mcmc():
 		variable: title
 			Title of the graph.
 		"""
+		import plotly
+		from plotly.graph_objs import Data, Figure, Layout, Scene, Surface, XAxis, YAxis, ZAxis
 
 		if zmin == None:
 			zmin = zData.min()
@@ -344,13 +263,13 @@ class bayeslands_mcmc():
 
 		fig = Figure(data=data, layout=layout)
 		
-		if args.problem == 2:
+		if self.problem == 2:
 			camera = dict(
 			up=dict(x=0, y=0, z=1),
 			center=dict(x=0.1, y=0.0, z=-0.15),
 			eye=dict(x=0.85, y=1.1, z=1.4)
 			)
-		elif args.problem == 4:
+		elif self.problem == 4:
 			camera = dict(
 			up=dict(x=0, y=0, z=1),
 			center=dict(x=-0.075, y=-0.075, z=-0.1),
@@ -369,6 +288,7 @@ class bayeslands_mcmc():
 		return
 
 	def plot_erodeposition(self, erodep_mean, erodep_std, groundtruth_erodep_pts, sim_interval, fname):
+		import matplotlib.pyplot as plt
 
 		ticksize = 15
 
@@ -402,6 +322,7 @@ class bayeslands_mcmc():
 		variable : list_xslice, list_yslice
 			cross section of elevation grid at x,y co-ordinate of the grid
 		"""
+		import matplotlib.pyplot as plt
 
 		ymid = int(self.real_elev.shape[1]/2 ) #   cut the slice in the middle 
 		xmid = int(self.real_elev.shape[0]/2)
@@ -466,18 +387,19 @@ class bayeslands_mcmc():
 		pos_tau_erdp = str(pos_tau_erdp)
 		pos_tau_erdp_pts = str(pos_tau_erdp_pts)
 		pos_likl = str(pos_likl)
-		if not os.path.isfile(('%s/exp_data.txt' % (self.filename))):
-			with file(('%s/exp_data.txt' % (self.filename)),'w') as outfile:
-				outfile.write('{0} '.format(pos_rain))
-				outfile.write('{0} '.format(pos_erod))
-				outfile.write('{0} \n'.format(pos_likl))
-				outfile.write('')
-
-		else:
-			with file(('%s/exp_data.txt' % (self.filename)),'a') as outfile:
-				outfile.write('{0} '.format(pos_rain))
-				outfile.write('{0} '.format(pos_erod))
-				outfile.write('{0} \n'.format(pos_likl))
+		with self.timer.phase('io'):
+			if not os.path.isfile(('%s/exp_data.txt' % (self.filename))):
+				with file(('%s/exp_data.txt' % (self.filename)),'w') as outfile:
+					outfile.write('{0} '.format(pos_rain))
+					outfile.write('{0} '.format(pos_erod))
+					outfile.write('{0} \n'.format(pos_likl))
+					outfile.write('')
+
+			else:
+				with file(('%s/exp_data.txt' % (self.filename)),'a') as outfile:
+					outfile.write('{0} '.format(pos_rain))
+					outfile.write('{0} '.format(pos_erod))
+					outfile.write('{0} \n'.format(pos_likl))
 
 	def likelihoodFunc(self,input_vector, real_elev, real_erdp, real_erdp_pts, tausq_elev, tausq_erdp, tausq_erdp_pts):
 		"""
@@ -485,30 +407,12 @@ class bayeslands_mcmc():
 		"""
 		pred_elev_vec, pred_erdp_vec, pred_erdp_pts_vec = self.blackBox(input_vector[0], input_vector[1], input_vector[2], input_vector[3])
 
-		tausq_elev = (np.sum(np.square(pred_elev_vec[self.simtime] - real_elev)))/real_elev.size
-		sq_error_elev = (np.sum(np.square(pred_elev_vec[self.simtime] - real_elev)))/real_elev.size
-
-		tausq_erdp_pts = np.zeros(self.sim_interval.size)
-		for i in range(self.sim_interval.size):
-			tausq_erdp_pts[i] = np.sum(np.square(pred_erdp_pts_vec[self.sim_interval[i]] - self.real_erdp_pts[i]))/real_erdp_pts.shape[1]
-		
-		likelihood_elev = -0.5 * np.log(2* math.pi * tausq_elev) - 0.5 * np.square(pred_elev_vec[self.simtime] - real_elev) / tausq_elev
-		likelihood_erdp_pts = 0
+		with self.timer.phase('likelihood'):
+			likelihood, sq_error, sq_error_elev, sq_error_erdp_pts = bl_worker.likelihood(pred_elev_vec, pred_erdp_pts_vec, real_elev,
+				real_erdp_pts, self.sim_interval, self.likl_sed, sed_weight = 50)
 
 		if self.likl_sed:
-			#likelihood_erdp  = -0.5 * np.log(2* math.pi * tausq_erdp) - 0.5 * np.square(pred_erdp_vec[self.simtime] - real_erdp) / tausq_erdp		
-			for i in range(1,self.sim_interval.size):
-				likelihood_erdp_pts += np.sum(-0.5 * np.log(2* math.pi * tausq_erdp_pts[i]) - 0.5 * np.square(pred_erdp_pts_vec[self.sim_interval[i]] - self.real_erdp_pts[i]) / tausq_erdp_pts[i])
-			
-			likelihood = np.sum(likelihood_elev) + (likelihood_erdp_pts*50)
-
-			sq_error_erdp_pts = np.sum(np.square(pred_erdp_pts_vec[self.sim_interval[i]] - self.real_erdp_pts[i]))/real_erdp_pts.shape[1]
-			sq_error = sq_error_elev+ sq_error_erdp_pts
 			print 'Using sediment pts in the likelihood'
-		
-		else:
-			likelihood = np.sum(likelihood_elev)
-			sq_error = sq_error_elev
 
 		return [likelihood, pred_elev_vec, pred_erdp_vec, pred_erdp_pts_vec]
 
@@ -632,6 +536,7 @@ class bayeslands_mcmc():
 
 		for i in range(samples-1):
 			print '\nSample : ', i
+			self.timer.start(i+1)
 
 			# Updating rain parameter and checking limits
 			p_rain = rain + np.random.normal(0,self.step_rain)
@@ -802,6 +707,7 @@ class bayeslands_mcmc():
 
 		self.viewCrossSection(list_xslicepred.T, list_yslicepred.T)
 
+		import matplotlib.pyplot as plt
 		size = 15 
 		plt.tick_params(labelsize=size)
 		params = {'legend.fontsize': size, 'legend.handlelength': 2}
@@ -832,105 +738,48 @@ class bayeslands_mcmc():
 		np.savetxt('%s/prediction_data/pred_xslc.txt' % (self.filename), list_xslicepred )
 		np.savetxt('%s/prediction_data/pred_yslc.txt' % (self.filename), list_yslicepred )
 
+		print '\nTime spent per phase:\n', self.timer.summary('%s/timing_summary.txt' % (self.filename))
+		self.timer.close()
+
 		return
 
 def main():
 	"""
 		
 	"""
-	random.seed(time.time())
-	muted = True
-	run_nb = 0
-	directory = ""
-	likl_sed = False
-	erdp_coords_crater = np.array([[60,60],[52,67],[74,76],[62,45],[72,66],[85,73],[90,75],[44,86],[100,80],[88,69]])
-	erdp_coords_crater_fast = np.array([[60,60],[72,66],[85,73],[90,75],[44,86],[100,80],[88,69],[79,91],[96,77],[42,49]])
-	erdp_coords_etopo = np.array([[42,10],[39,8],[75,51],[59,13],[40,5],[6,20],[14,66],[4,40],[72,73],[46,64]])
-	erdp_coords_etopo_fast = np.array([[42,10],[39,8],[75,51],[59,13],[40,5],[6,20],[14,66],[4,40],[68,40],[72,44]])
-
-	if problem == 1:
-		directory = 'Examples/crater_fast'
-		xmlinput = '%s/crater.xml' %(directory)
-		simtime = 15000
-		rainlimits = [0.0, 3.0]
-		erodlimits = [3.e-5, 7.e-5]
-		mlimit = [0.4, 0.6]
-		nlimit = [0.9, 1.1]
-		true_rain = 1.5
-		true_erod = 5.e-5
-		likl_sed = True
-		erdp_coords = erdp_coords_crater_fast
-
-	elif problem == 2:
-		directory = 'Examples/crater'
-		xmlinput = '%s/crater.xml' %(directory)
-		simtime = 50000
-		rainlimits = [0.0, 3.0]
-		erodlimits = [3.e-5, 7.e-5]
-		mlimit = [0.4, 0.6]
-		nlimit = [0.9, 1.1]
-		true_rain = 1.5
-		true_erod = 5.e-5
-		likl_sed = True
-		erdp_coords = erdp_coords_crater
-
-	elif problem == 3:
-		directory = 'Examples/etopo_fast'
-		xmlinput = '%s/etopo.xml' %(directory)
-		simtime = 500000
-		rainlimits = [0.0, 3.0]
-		erodlimits = [3.e-6, 7.e-6]
-		mlimit = [0.4, 0.6]
-		nlimit = [0.9, 1.1]
-		true_rain = 1.5
-		true_erod = 5.e-6
-		likl_sed = True
-		erdp_coords = erdp_coords_etopo_fast
-
-	elif problem == 4:
-		directory = 'Examples/etopo'
-		xmlinput = '%s/etopo.xml' %(directory)
-		simtime = 1000000
-		rainlimits = [0.0, 3.0]
-		erodlimits = [3.e-6, 7.e-6]
-		mlimit = [0.4, 0.6]
-		nlimit = [0.9, 1.1]
-		true_rain = 1.5
-		true_erod = 5.e-6
-		likl_sed = True
-		erdp_coords = erdp_coords_etopo
-
-	elif problem == 5:
-		directory = 'Examples/tasmania'
-		xmlinput = '%s/tasmania.xml' %(directory)
-		simtime = 1000000
-		rainlimits = [0.0, 3.0]
-		erodlimits = [3.e-6, 7.e-6]
-		mlimit = [0.4, 0.6]
-		nlimit = [0.9, 1.1]
-		true_rain = 1.5
-		true_erod = 5.e-6
-		likl_sed = False
-		erdp_coords = erdp_coords_etopo
+	parser=argparse.ArgumentParser(description='PTBayeslands modelling')
+
+	parser.add_argument('-p','--problem', help='Problem id or name from the registry (problems.xml): 1-crater-fast,2-crater,3-etopo-fast,4-etopo,5-tasmania,6-mountain', required=True, dest="problem")
+	parser.add_argument('-s','--samples', help='Number of samples', default=10000, dest="samples",type=int)
+	parser.add_argument('--seed', help='Random seed (defaults to the current time)', default=None, dest="seed",type=int)
+	parser.add_argument('--registry', help='Problem registry file', default=bl_problems.REGISTRY, dest="registry")
+	parser.add_argument('--meshcache', help='Mesh cache directory (shared by concurrent runs)', default=None, dest="meshcache")
+
+	args = parser.parse_args()
+	samples = args.samples
+
+	if args.seed is not None:
+		random.seed(args.seed)
+		np.random.seed(args.seed)
 	else:
-		print('Invalid selection, please choose a problem from the list ')
+		random.seed(time.time())
+	muted = True
+
+	prob = bl_problems.get_problem(args.problem, args.registry)
+	prob.require('erodlimits')
+	directory = prob.directory
 
 	final_elev = np.loadtxt('%s/data/final_elev.txt' %(directory))
 	final_erdp = np.loadtxt('%s/data/final_erdp.txt' %(directory))
 	final_erdp_pts = np.loadtxt('%s/data/final_erdp_pts.txt' %(directory))	
 
-	while os.path.exists('%s/mcmcresults_%s' % (directory,run_nb)):
-		run_nb+=1
-	if not os.path.exists('%s/mcmcresults_%s' % (directory,run_nb)):
-		os.makedirs('%s/mcmcresults_%s' % (directory,run_nb))
-		os.makedirs('%s/mcmcresults_%s/plots' % (directory,run_nb))
-		os.makedirs('%s/mcmcresults_%s/prediction_data' % (directory,run_nb))
-		filename = ('%s/mcmcresults_%s' % (directory,run_nb))
+	run_nb, filename = bl_problems.make_run_dir(directory, 'mcmcresults')
 
 	print '\nInput file shape', final_elev.shape, '\n'
 	run_nb_str = 'mcmcresults_' + str(run_nb)
 
-	bl_mcmc = bayeslands_mcmc(muted, simtime, samples, final_elev, final_erdp, final_erdp_pts, erdp_coords, filename, xmlinput, erodlimits, rainlimits, mlimit, nlimit, run_nb_str, likl_sed)
+	bl_mcmc = bayeslands_mcmc(muted, prob.simtime, samples, final_elev, final_erdp, final_erdp_pts, prob.erdp_coords, filename, prob.xmlinput,
+		prob.erodlimits, prob.rainlimits, prob.mlimit, prob.nlimit, run_nb_str, prob.likl_sed, prob.id, args.meshcache)
 	bl_mcmc.sampler()
 
 	np.savetxt('%s/latest_run.txt' %(directory), np.array([str(run_nb)]), fmt="%s")
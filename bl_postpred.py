@@ -0,0 +1,262 @@
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+##                                                                                   ##
+##  This file forms part of the BayesLands surface processes modelling companion.    ##
+##                                                                                   ##
+##  For full license and copyright information, please refer to the LICENSE.md file  ##
+##  located at the project root, or contact the authors.                             ##
+##                                                                                   ##
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+
+"""
+This script implements the posterior-predictive engine of BayesLands.
+
+The chain stored by bl_mcmc.py (exp_data.txt) is thinned according to its effective sample
+size, Badlands is re-run for the selected parameter vectors on a pool of processes and the
+predictions are streamed to disk. Per-pixel mean, standard deviation, quantiles and
+exceedance probabilities are then computed from the on-disk predictions chunk by chunk, so
+the memory used does not depend on the number of posterior samples.
+"""
+import os
+import math
+import argparse
+import multiprocessing
+import numpy as np
+
+def autocorr_time(chain):
+	"""
+	Estimate the integrated autocorrelation time of a 1D chain. The autocorrelation
+	function is summed until the first negative value (initial positive sequence).
+
+	Parameters
+	----------
+	variable: chain
+		Samples of one parameter.
+
+	Return
+	------
+	variable: tau
+		Integrated autocorrelation time (>= 1).
+	"""
+	x = np.asarray(chain, dtype=float)
+	x = x - x.mean()
+	nb = len(x)
+	if nb < 2 or not np.any(x):
+		return 1.
+
+	# Autocorrelation computed with FFT (zero padded to avoid circular correlation)
+	size = 2**int(math.ceil(math.log(2*nb, 2)))
+	fx = np.fft.rfft(x, n=size)
+	acf = np.fft.irfft(fx*np.conjugate(fx), n=size)[:nb]
+	acf /= acf[0]
+
+	tau = 1.
+	for k in range(1, nb):
+		if acf[k] < 0.:
+			break
+		tau += 2.*acf[k]
+
+	return tau
+
+def thin_chain(params, burn_in=0.05, max_samples=None):
+	"""
+	Select posterior samples from the chain after burn-in using a thinning interval
+	equal to the largest integrated autocorrelation time of the parameters.
+
+	Parameters
+	----------
+	variable: params
+		Numpy array (samples x parameters) of the chain.
+	variable: burn_in
+		Fraction of the chain discarded as burn-in.
+	variable: max_samples
+		Optional maximum number of selected samples.
+
+	Return
+	------
+	variable: ids
+		Indices of the selected samples in the chain.
+	variable: ess
+		Effective sample size of the chain after burn-in.
+	"""
+	start = int(params.shape[0]*burn_in)
+	post = params[start:,:]
+
+	tau = max([autocorr_time(post[:,p]) for p in range(post.shape[1])])
+	ess = post.shape[0]/tau
+	step = max(1, int(math.ceil(tau)))
+
+	ids = np.arange(start, params.shape[0], step)
+	if max_samples is not None and len(ids) > max_samples:
+		ids = ids[np.linspace(0, len(ids)-1, max_samples).astype(int)]
+
+	return ids, ess
+
+def _simulate(args):
+	"""
+	Pool task running the black box model for one posterior sample.
+	"""
+	# The model (and MPI) is only imported in the worker processes
+	import bl_worker
+
+	k, xmlinput, run_nb, sim_interval, rain, erod, m, n, meshcache = args
+	elev_vec, erdp_vec, erdp_pts_vec = bl_worker.blackBox(xmlinput, run_nb, sim_interval,
+		np.zeros((0,2), dtype=int), rain, erod, m, n, meshcache = meshcache)
+
+	return k, elev_vec, erdp_vec
+
+def _prepare_mesh(args):
+	"""
+	Pool task building the mesh cache shared by the workers.
+	"""
+	import bl_worker
+
+	xmlinput, meshcache = args
+	bl_worker.prepare_mesh(xmlinput, meshcache)
+
+	return
+
+def _summarise(store, fname, quantiles, thresholds, chunk):
+	"""
+	Compute per-pixel statistics from an on-disk prediction store, a block of rows at a time.
+
+	Parameters
+	----------
+	variable: store
+		Memory-mapped array (samples x ny x nx) of predictions.
+	variable: fname
+		Prefix of the output files.
+	variable: quantiles
+		Quantiles (in percent) to compute.
+	variable: thresholds
+		Values for which the exceedance probability is computed.
+	variable: chunk
+		Number of grid rows loaded at once.
+	"""
+	nsamples, ny, nx = store.shape
+	mean = np.zeros((ny,nx))
+	std = np.zeros((ny,nx))
+	quant = np.zeros((len(quantiles),ny,nx))
+	exceed = np.zeros((len(thresholds),ny,nx))
+
+	for r in range(0, ny, chunk):
+		block = np.asarray(store[:, r:r+chunk, :])
+		mean[r:r+chunk,:] = block.mean(axis=0)
+		std[r:r+chunk,:] = block.std(axis=0)
+		if len(quantiles) > 0:
+			quant[:, r:r+chunk, :] = np.percentile(block, quantiles, axis=0)
+		for t in range(len(thresholds)):
+			exceed[t, r:r+chunk, :] = np.mean(block > thresholds[t], axis=0)
+
+	np.savetxt('%s_mean.txt' % fname, mean, fmt='%.5f')
+	np.savetxt('%s_std.txt' % fname, std, fmt='%.5f')
+	for q in range(len(quantiles)):
+		np.savetxt('%s_q%s.txt' % (fname, quantiles[q]), quant[q], fmt='%.5f')
+	for t in range(len(thresholds)):
+		np.savetxt('%s_exceed_%s.txt' % (fname, thresholds[t]), exceed[t], fmt='%.5f')
+
+	return
+
+def posterior_predictive(xmlinput, chain, simtime, outdir, processes=None, burn_in=0.05, max_samples=None,
+			m=0.5, n=1.0, quantiles=[5,50,95], thresholds=[0.], chunk=64, meshcache=None):
+	"""
+	Re-simulate the thinned posterior samples of a chain and write per-pixel statistics.
+
+	Parameters
+	----------
+	variable: xmlinput
+		XML file defining the parameters used to run Badlands simulation.
+	variable: chain
+		Chain file written by the sampler (rain, erodibility and likelihood columns).
+	variable: simtime
+		Simulation time used by the sampler.
+	variable: outdir
+		Output directory.
+	variable: processes
+		Number of worker processes (defaults to the number of cores).
+	variable: burn_in
+		Fraction of the chain discarded as burn-in.
+	variable: max_samples
+		Optional maximum number of re-simulated samples.
+	variable: m, n
+		Stream power law exponents used by the sampler.
+	variable: quantiles
+		Per-pixel quantiles (in percent) to compute.
+	variable: thresholds
+		Erosion/deposition values for which exceedance probability maps are computed.
+	variable: chunk
+		Number of grid rows loaded at once when computing the statistics.
+	variable: meshcache
+		Mesh cache directory (defaults to outdir/meshcache). The mesh is built once and
+		memory mapped by every worker, so the workers share a single copy of the mesh arrays.
+	"""
+	data = np.loadtxt(chain, ndmin=2)
+	params = data[:,:2]
+	ids, ess = thin_chain(params, burn_in, max_samples)
+	nsel = len(ids)
+	print 'Chain length', params.shape[0], ' ESS', ess, ' re-simulated samples', nsel
+
+	if not os.path.exists(outdir):
+		os.makedirs(outdir)
+	if meshcache is None:
+		meshcache = '%s/meshcache' % outdir
+	np.savetxt('%s/selected_samples.txt' % outdir, np.column_stack((ids, params[ids,:])), fmt='%d %.8e %.8e')
+
+	sim_interval = np.arange(0, simtime+1, simtime/4)
+	tasks = [(k, xmlinput, 'postpred_%s' % ids[k], sim_interval, params[ids[k],0], params[ids[k],1], m, n, meshcache) for k in range(nsel)]
+
+	# Predictions are streamed to memory-mapped files as workers complete
+	stores = {}
+	pool = multiprocessing.Pool(processes)
+	try:
+		# Build the shared mesh once before starting the simulations
+		pool.apply(_prepare_mesh, ((xmlinput, meshcache),))
+		for k, elev_vec, erdp_vec in pool.imap_unordered(_simulate, tasks):
+			for name, vec in (('elev', elev_vec), ('erdp', erdp_vec)):
+				for t, grid in vec.items():
+					key = (name, t)
+					if key not in stores:
+						stores[key] = np.memmap('%s/pred_%s_%s.dat' % (outdir, name, t), dtype=np.float32,
+							mode='w+', shape=(nsel,)+grid.shape)
+					stores[key][k] = grid
+			print 'Sample', k+1, 'of', nsel, 'done'
+		pool.close()
+	except:
+		pool.terminate()
+		raise
+	finally:
+		pool.join()
+
+	for (name, t), store in sorted(stores.items()):
+		store.flush()
+		if name == 'elev':
+			_summarise(store, '%s/postpred_%s_%s' % (outdir, name, t), quantiles, [], chunk)
+		else:
+			_summarise(store, '%s/postpred_%s_%s' % (outdir, name, t), quantiles, thresholds, chunk)
+
+	return
+
+def main():
+
+	parser = argparse.ArgumentParser(description='BayesLands posterior-predictive engine')
+	parser.add_argument('-x','--xml', help='Badlands XmL input file', required=True, dest="xmlinput")
+	parser.add_argument('-c','--chain', help='Chain file (exp_data.txt) written by bl_mcmc', required=True, dest="chain")
+	parser.add_argument('-t','--simtime', help='Simulation time used by the sampler', required=True, dest="simtime", type=float)
+	parser.add_argument('-o','--output', help='Output directory', default=None, dest="output")
+	parser.add_argument('-j','--processes', help='Number of worker processes', default=None, dest="processes", type=int)
+	parser.add_argument('-b','--burnin', help='Burn-in fraction of the chain', default=0.05, dest="burnin", type=float)
+	parser.add_argument('-s','--samples', help='Maximum number of re-simulated samples', default=None, dest="samples", type=int)
+	parser.add_argument('-q','--quantiles', help='Per-pixel quantiles (percent)', nargs='+', default=[5,50,95], dest="quantiles", type=float)
+	parser.add_argument('-e','--exceed', help='Erosion/deposition exceedance thresholds', nargs='+', default=[0.], dest="thresholds", type=float)
+	parser.add_argument('-m','--meshcache', help='Mesh cache directory shared by the workers', default=None, dest="meshcache")
+	args = parser.parse_args()
+
+	outdir = args.output
+	if outdir is None:
+		outdir = '%s/posterior_predictive' % os.path.dirname(os.path.abspath(args.chain))
+
+	posterior_predictive(args.xmlinput, args.chain, args.simtime, outdir, args.processes, args.burnin,
+		args.samples, quantiles=args.quantiles, thresholds=args.thresholds, meshcache=args.meshcache)
+
+	print 'Results are stored in ', outdir
+
+if __name__ == "__main__": main()
@@ -39,6 +39,7 @@ from matplotlib.patches import Polygon
 from matplotlib.collections import PatchCollection
 from scipy.spatial import cKDTree
 from scipy import stats 
+import bl_problems
 from pyBadlands.model import Model as badlandsModel
 from mpl_toolkits.axes_grid1 import make_axes_locatable
 from mpl_toolkits.mplot3d import Axes3D
@@ -48,10 +49,11 @@ plotly.offline.init_notebook_mode()
 
 parser=argparse.ArgumentParser(description='PTBayeslands modelling')
 
-parser.add_argument('-p','--problem', help='Problem Number 1-crater-fast,2-crater,3-etopo-fast,4-etopo,5-null,6-mountain', required=True, dest="problem",type=int)
+parser.add_argument('-p','--problem', help='Problem id or name from the registry (problems.xml): 1-crater-fast,2-crater,3-etopo-fast,4-etopo,5-tasmania,6-mountain', required=True, dest="problem")
 parser.add_argument('-f','--functionality', help="Would you like to: \n 1) Plot Posterior Histogram for Params\n 2) Calculate Covariance mat for Params\n 3) Sediment variation with time\n", required=True, dest="functionality",type=int)
 parser.add_argument('-b','--bins', help="number of bins in Histogram", required=True, dest="bins",type=int)
 parser.add_argument('-r','--run_nb', help="Folder number", default = 0, dest="run_nb",type=int)
+parser.add_argument('--registry', help='Problem registry file', default=bl_problems.REGISTRY, dest="registry")
 
 args = parser.parse_args()
 problem = args.problem
@@ -314,24 +316,13 @@ def natural_keys(text):
 	'''
 	return [ atoi(c) for c in re.split('(\d+)', text) ]
 
-def timevariantErodep(directory, fname, real_erdp_pts, filenames, run_nb):
+def timevariantErodep(erdp_coords, fname, real_erdp_pts, filenames, run_nb):
 	
 	fig, ax = plt.subplots()
 	index = np.arange(real_erdp_pts.shape[1])
 	width = 0.30
 	opacity = 0.8 
 
-	if directory == "Examples/crater_fast/":
-		erdp_coords = np.array([[60,60],[72,66],[85,73],[90,75],[44,86],[100,80],[88,69],[79,91],[96,77],[42,49]])
-	elif directory == "Examples/crater/":
-		erdp_coords = np.array([[60,60],[52,67],[74,76],[62,45],[72,66],[85,73],[90,75],[44,86],[100,80],[88,69]])
-	elif directory == "Examples/etopo_fast/":
-		erdp_coords = np.array([[42,10],[39,8],[75,51],[59,13],[40,5],[6,20],[14,66],[4,40],[68,40],[72,44]])
-	elif directory == "Examples/etopo/":
-		erdp_coords = np.array([[42,10],[39,8],[75,51],[59,13],[40,5],[6,20],[14,66],[4,40],[72,73],[46,64]])
-	else:
-		erdp_coords = np.array([[60,60],[72,66],[85,73],[90,75],[44,86],[100,80],[88,69],[79,91],[96,77],[42,49]])
-
 	filenames.sort(key = natural_keys)
 
 	for count, list_name in enumerate(filenames):
@@ -355,28 +346,8 @@ def timevariantErodep(directory, fname, real_erdp_pts, filenames, run_nb):
 	return
 
 def main():
-	directory = ""
-
-	if problem == 1:
-		directory = 'Examples/crater_fast'
-		rain_true_val = 1.5
-		erod_true_val = 5.e-5
-	elif problem == 2:
-		directory = 'Examples/crater'
-		rain_true_val = 1.5
-		erod_true_val = 5.e-5
-	elif problem == 3:
-		directory = 'Examples/etopo_fast'
-		rain_true_val = 1.5
-		erod_true_val = 5.e-6
-	elif problem == 4:
-		directory = 'Examples/etopo'
-		rain_true_val = 1.5
-		erod_true_val = 5.e-6
-	elif problem ==5:
-		directory = 'Examples/tasmania'
-		rain_true_val = 1.5
-		erod_true_val = 5.e-6
+	prob = bl_problems.get_problem(problem, args.registry)
+	directory = prob.directory
 
 	if args.run_nb == 0:
 		run_nb = np.loadtxt('%s/latest_run.txt' %(directory))
@@ -426,7 +397,7 @@ def main():
 		print '\n Covariance Matrix has been created'
 
 	elif functionality ==3:
-		timevariantErodep(directory, prediction_data, erdp_pts_data, prefixed, run_nb)
+		timevariantErodep(prob.erdp_coords, prediction_data, erdp_pts_data, prefixed, run_nb)
 		print 'Finished plotting time variant erodep'
 
 	
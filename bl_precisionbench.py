@@ -0,0 +1,125 @@
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+##                                                                                   ##
+##  This file forms part of the BayesLands surface processes modelling companion.    ##
+##                                                                                   ##
+##  For full license and copyright information, please refer to the LICENSE.md file  ##
+##  located at the project root, or contact the authors.                             ##
+##                                                                                   ##
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+
+"""
+This script validates the single precision storage mode of Badlands against the double
+precision one on the registered problems. For each problem, the model is run in both
+precisions up to the problem simulation time and the elevation differences (relative to the
+elevation range), the difference of the eroded/deposited volume (mass balance) and the memory
+used by the mesh, stratigraphic and work arrays are reported. It exits with a non-zero status
+when the relative differences exceed the given tolerance.
+"""
+import sys
+import time
+import argparse
+import numpy as np
+
+import bl_problems
+from pyBadlands.model import Model as badlandsModel
+
+def state_nbytes(model):
+	"""
+	Memory used by the Finite Volume geometry, the arrays stored with the model precision and
+	the work buffers.
+
+	Parameters
+	----------
+	variable: model
+		Badlands model.
+
+	Return
+	------
+	variable: nbytes
+		Memory (bytes) of the Finite Volume geometry (with the double precision kernel copies), rain,
+		stratigraphic layers and work buffers.
+	"""
+	mesh = model.FVmesh
+	arrays = [mesh.edge_length, mesh.vor_edges, mesh.control_volumes, mesh.ngbEdges, mesh.ngbDist, model.rain]
+	arrays += mesh.kernelArrays.values()
+	if model.straTIN is not None:
+		arrays += [model.straTIN.paleoDepth, model.straTIN.layerThick, model.straTIN.depoThick]
+	if model.carbTIN is not None:
+		arrays += [model.carbTIN.paleoDepth, model.carbTIN.layerThick, model.carbTIN.depoThick]
+	if model.strata is not None:
+		arrays += [model.strata.stratElev, model.strata.stratThick, model.strata.stratDepth]
+
+	return sum(np.asarray(a).nbytes for a in arrays) + model.buffers.nbytes()
+
+def run_model(prob, precision, simtime):
+	"""
+	Run a problem with the given storage precision.
+
+	Parameters
+	----------
+	variable: prob
+		Registered problem.
+	variable: precision
+		Storage precision (double or single).
+	variable: simtime
+		Simulation time.
+
+	Return
+	------
+	variable: model
+		Badlands model at the end of the simulation.
+	variable: walltime
+		Wall time (s) of the simulation.
+	"""
+	model = badlandsModel()
+	model.load_xml('0', prob.xmlinput, muted = True, precision = precision)
+	tstart = time.time()
+	model.run_to_time(simtime, muted = True)
+
+	return model, time.time() - tstart
+
+def main():
+
+	parser = argparse.ArgumentParser(description='BayesLands single precision validation')
+	parser.add_argument('-p','--problems', help='Problem ids or names (defaults to all the registered problems)', nargs='+', default=None, dest="problems")
+	parser.add_argument('-s','--simtime', help='Simulation time (defaults to the problems simulation time)', default=None, dest="simtime", type=float)
+	parser.add_argument('-t','--tolerance', help='Maximum relative difference between the precisions', default=1.e-3, dest="tolerance", type=float)
+	parser.add_argument('--registry', help='Problem registry file', default=bl_problems.REGISTRY, dest="registry")
+	args = parser.parse_args()
+
+	if args.problems is None:
+		problems = bl_problems.load_problems(args.registry)
+	else:
+		problems = [bl_problems.get_problem(key, args.registry) for key in args.problems]
+
+	failed = False
+	print '%-15s %8s %10s %10s %12s %12s %12s %10s %10s' % ('problem', 'nodes', 'F64 (s)', 'F32 (s)', 'max diff', 'rms diff', 'mass diff', 'F64 (MB)', 'F32 (MB)')
+	for prob in problems:
+		simtime = prob.simtime if args.simtime is None else args.simtime
+		model64, t64 = run_model(prob, 'double', simtime)
+		model32, t32 = run_model(prob, 'single', simtime)
+
+		# Elevation differences relative to the elevation range
+		ids = model64.inIDs
+		elev64 = model64.elevation[ids]
+		scale = max(elev64.max() - elev64.min(), 1.e-12)
+		diff = np.abs(model32.elevation[ids] - elev64)
+		maxdiff = diff.max()/scale
+		rmsdiff = np.sqrt(np.mean(diff**2))/scale
+
+		# Eroded/deposited volumes accumulated in double precision
+		vol64 = np.sum(model64.cumdiff[ids]*np.asarray(model64.FVmesh.control_volumes[ids], dtype=float))
+		vol32 = np.sum(model32.cumdiff[ids]*np.asarray(model32.FVmesh.control_volumes[ids], dtype=float))
+		voltot = np.sum(np.abs(model64.cumdiff[ids])*np.asarray(model64.FVmesh.control_volumes[ids], dtype=float))
+		massdiff = abs(vol32 - vol64)/max(voltot, 1.e-12)
+
+		print '%-15s %8d %10.3f %10.3f %12.3e %12.3e %12.3e %10.2f %10.2f' % (prob.name, len(model64.elevation), t64, t32,
+			maxdiff, rmsdiff, massdiff, state_nbytes(model64)/1.e6, state_nbytes(model32)/1.e6)
+		if max(maxdiff, massdiff) > args.tolerance:
+			print '   - %s single and double precision runs differ by more than %.3e' % (prob.name, args.tolerance)
+			failed = True
+
+	if failed:
+		sys.exit(1)
+
+if __name__ == "__main__": main()
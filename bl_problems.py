@@ -0,0 +1,184 @@
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+##                                                                                   ##
+##  This file forms part of the BayesLands surface processes modelling companion.    ##
+##                                                                                   ##
+##  For full license and copyright information, please refer to the LICENSE.md file  ##
+##  located at the project root, or contact the authors.                             ##
+##                                                                                   ##
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+
+"""
+Problem registry of BayesLands. The experiments (directory, XmL input, simulation time,
+parameter limits, true values and erosion/deposition coordinates) are defined in the
+problems.xml file and shared by bl_mcmc, bl_surflikl, bl_postproc and bl_topogenr.
+
+This module also provides the creation of unique result directories, which is safe when
+several runs are launched concurrently on the same problem.
+"""
+import os
+import errno
+import numpy as np
+import xml.etree.ElementTree as ET
+
+REGISTRY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'problems.xml')
+
+class Problem(object):
+	"""
+	Parameters of one BayesLands experiment read from the registry.
+
+	Parameters
+	----------
+	variable : element
+		XmL element describing the problem.
+	"""
+	def __init__(self, element):
+
+		self.id = int(element.get('id'))
+		self.name = element.get('name')
+
+		self.directory = self._text(element, 'directory')
+		if self.directory is None:
+			raise ValueError('Error in the problem registry: directory is required for problem %s.' % self.name)
+		xml = self._text(element, 'xml')
+		if xml is None:
+			raise ValueError('Error in the problem registry: xml input is required for problem %s.' % self.name)
+		self.xmlinput = '%s/%s' % (self.directory, xml)
+
+		simtime = self._text(element, 'simtime')
+		if simtime is None:
+			raise ValueError('Error in the problem registry: simtime is required for problem %s.' % self.name)
+		self.simtime = int(float(simtime))
+
+		self.rainlimits = self._limits(element, 'rainlimits', [0.0, 3.0])
+		self.erodlimits = self._limits(element, 'erodlimits', None)
+		self.mlimit = self._limits(element, 'mlimit', [0.4, 0.6])
+		self.nlimit = self._limits(element, 'nlimit', [0.9, 1.1])
+		self.marinelimit = self._limits(element, 'marinelimit', None)
+		self.aeriallimit = self._limits(element, 'aeriallimit', None)
+
+		self.true_rain = self._float(element, 'true_rain', 1.5)
+		self.true_erod = self._float(element, 'true_erod', None)
+		self.true_m = self._float(element, 'true_m', 0.5)
+		self.true_n = self._float(element, 'true_n', 1.)
+
+		self.likl_sed = self._float(element, 'likl_sed', 0) > 0
+		self.checkuplift = self._float(element, 'checkuplift', 0) > 0
+
+		coords = self._text(element, 'erdp_coords')
+		if coords is not None:
+			self.erdp_coords = np.array([[int(v) for v in pt.split(',')] for pt in coords.split()])
+		else:
+			self.erdp_coords = np.zeros((0,2), dtype=int)
+
+	@staticmethod
+	def _text(element, name):
+
+		child = element.find(name)
+		if child is not None and child.text is not None:
+			return child.text.strip()
+
+		return None
+
+	def _float(self, element, name, default):
+
+		text = self._text(element, name)
+		if text is not None:
+			return float(text)
+
+		return default
+
+	def _limits(self, element, name, default):
+
+		text = self._text(element, name)
+		if text is not None:
+			limits = [float(v) for v in text.split()]
+			if len(limits) != 2 or limits[0] > limits[1]:
+				raise ValueError('Error in the problem registry: %s of problem %s needs to be defined as "min max".' % (name, self.name))
+			return limits
+
+		return default
+
+	def require(self, *names):
+		"""
+		Check that optional parameters needed by a script are defined for this problem.
+		"""
+		for name in names:
+			if getattr(self, name) is None:
+				raise ValueError('Error in the problem registry: %s is not defined for problem %s.' % (name, self.name))
+
+		return
+
+def load_problems(registry=REGISTRY):
+	"""
+	Read all the problems defined in the registry.
+
+	Parameters
+	----------
+	variable : registry
+		Path to the registry XmL file.
+
+	Return
+	------
+	variable: problems
+		List of Problem objects ordered as in the registry.
+	"""
+	tree = ET.parse(registry)
+	root = tree.getroot()
+
+	return [Problem(element) for element in root.iter('problem')]
+
+def get_problem(key, registry=REGISTRY):
+	"""
+	Find a problem in the registry from its id or its name.
+
+	Parameters
+	----------
+	variable : key
+		Problem id (int or numeric string) or name.
+	variable : registry
+		Path to the registry XmL file.
+	"""
+	problems = load_problems(registry)
+	for problem in problems:
+		if str(problem.id) == str(key) or problem.name == str(key):
+			return problem
+
+	choices = ', '.join(['%s-%s' % (problem.id, problem.name) for problem in problems])
+	raise ValueError('Invalid selection %s, please choose a problem from the list: %s' % (key, choices))
+
+def make_run_dir(directory, prefix, subdirs=['plots', 'prediction_data']):
+	"""
+	Create the first free result directory <directory>/<prefix>_<N>. The directory is
+	created atomically so that concurrent runs never share the same run number.
+
+	Parameters
+	----------
+	variable : directory
+		Problem directory.
+	variable : prefix
+		Prefix of the result directory (e.g. mcmcresults).
+	variable : subdirs
+		Sub-directories to create in the result directory.
+
+	Return
+	------
+	variable: run_nb
+		Run number.
+	variable: filename
+		Path of the result directory.
+	"""
+	run_nb = 0
+	while True:
+		filename = '%s/%s_%s' % (directory, prefix, run_nb)
+		try:
+			os.makedirs(filename)
+			break
+		except OSError as e:
+			if e.errno != errno.EEXIST:
+				raise
+			run_nb += 1
+
+	for sub in subdirs:
+		os.makedirs('%s/%s' % (filename, sub))
+
+	return run_nb, filename
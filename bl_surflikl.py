@@ -21,36 +21,16 @@ import math
 import copy
 import fnmatch
 import shutil
-import plotly
-import collections
-import plotly.plotly as py
-import matplotlib as mpl
-import matplotlib.mlab as mlab
-import matplotlib.pyplot as plt
-import cmocean as cmo
-import plotly.graph_objs as go
+import argparse
+import bl_worker
+import bl_problems
 from copy import deepcopy
-from pylab import rcParams
-from PIL import Image
-from io import StringIO
-from cycler import cycler
-from matplotlib.patches import Polygon
-from matplotlib.collections import PatchCollection
-from scipy.spatial import cKDTree
-from scipy import stats 
-from sklearn.preprocessing import normalize
-from pyBadlands.model import Model as badlandsModel
-from mpl_toolkits.axes_grid1 import make_axes_locatable
-from mpl_toolkits.mplot3d import Axes3D
-from scipy.stats import multivariate_normal
-from plotly.graph_objs import *
-from plotly.offline.offline import _plot_html
-plotly.offline.init_notebook_mode()
-from matplotlib import cm
-from matplotlib.ticker import LinearLocator, FormatStrFormatter
+
+# Plotting libraries (plotly, matplotlib...) are imported lazily inside the plotting
+# methods so that likelihood workers do not pay their import cost.
 
 class BayesLands():
-	def __init__(self, muted, simtime, samples, real_elev , real_erdp, real_erdp_pts, erdp_coords, filename, xmlinput, erodlimits, rainlimits, mlimit, nlimit, marinelimit, aeriallimit, run_nb, likl_sed):
+	def __init__(self, muted, simtime, samples, real_elev , real_erdp, real_erdp_pts, erdp_coords, filename, xmlinput, erodlimits, rainlimits, mlimit, nlimit, marinelimit, aeriallimit, run_nb, likl_sed, meshcache=None):
 		self.filename = filename
 		self.input = xmlinput
 		self.real_elev = real_elev
@@ -59,6 +39,7 @@ class BayesLands():
 		self.real_erdp_pts = real_erdp_pts
 		self.erdp_coords = erdp_coords
 		self.likl_sed = likl_sed
+		self.meshcache = meshcache
 
 		self.simtime = simtime
 		self.samples = samples
@@ -108,49 +89,9 @@ class BayesLands():
 		variable: erdp
 			Cumulative erosion/deposition accumulation as a 2D numpy array (regularly spaced as well)
 		"""
-		tstart = time.clock()
-		# Re-initialise badlands model
-		model = badlandsModel()
-
-		# Load the XmL input file
-		model.load_xml(str(self.run_nb), self.input, muted = self.muted)
-
-		# Adjust erodibility based on given parameter
-		model.input.SPLero = erodibility
-		model.flow.erodibility.fill(erodibility)
-
-		# Adjust precipitation values based on given parameter
-		model.force.rainVal[:] = rain
-
-		#Adjust m and n values
-		model.input.SPLm = m
-		model.input.SPLn = n
-
-		model.input.CDm = marinediff
-		model.input.CDa = aerialdiff
-
-		elev_vec = collections.OrderedDict()
-		erdp_vec = collections.OrderedDict()
-		erdp_pts_vec = collections.OrderedDict()
-		
-		for x in range(len(self.sim_interval)):
-			
-			self.simtime = self.sim_interval[x]
-
-			model.run_to_time(self.simtime, muted = self.muted)
-			
-			elev, erdp = self.interpolateArray(model.FVmesh.node_coords[:, :2], model.elevation, model.cumdiff)
-			
-			erdp_pts = np.zeros((self.erdp_coords.shape[0]))
-
-			for count, val in enumerate(self.erdp_coords):
-				erdp_pts[count] = erdp[val[0], val[1]]
-
-			elev_vec[self.simtime] = elev
-			erdp_vec[self.simtime] = erdp
-			erdp_pts_vec[self.simtime] = erdp_pts
-			
-			# print 'Badlands black box model took (s):',time.clock()-tstart
+		elev_vec, erdp_vec, erdp_pts_vec = bl_worker.blackBox(self.input, self.run_nb, self.sim_interval, self.erdp_coords,
+			rain, erodibility, m, n, marinediff, aerialdiff, muted = self.muted, meshcache = self.meshcache)
+		self.simtime = self.sim_interval[-1]
 
 		return elev_vec, erdp_vec, erdp_pts_vec
 
@@ -158,36 +99,7 @@ class BayesLands():
 		"""
 		Interpolate the irregular spaced dataset from badlands on a regular grid.
 		"""
-		x, y = np.hsplit(coords, 2)
-		dx = (x[1]-x[0])[0]
-
-		nx = int((x.max() - x.min())/dx+1)
-		ny = int((y.max() - y.min())/dx+1)
-		xi = np.linspace(x.min(), x.max(), nx)
-		yi = np.linspace(y.min(), y.max(), ny)
-
-		xi, yi = np.meshgrid(xi, yi)
-		xyi = np.dstack([xi.flatten(), yi.flatten()])[0]
-		XY = np.column_stack((x,y))
-
-		tree = cKDTree(XY)
-		distances, indices = tree.query(xyi, k=3)
-		if len(z[indices].shape) == 3:
-			z_vals = z[indices][:,:,0]
-			dz_vals = dz[indices][:,:,0]
-		else:
-			z_vals = z[indices]
-			dz_vals = dz[indices]
-
-		zi = np.average(z_vals,weights=(1./distances), axis=1)
-		dzi = np.average(dz_vals,weights=(1./distances), axis=1)
-		onIDs = np.where(distances[:,0] == 0)[0]
-		if len(onIDs) > 0:
-			zi[onIDs] = z[indices[onIDs,0]]
-			dzi[onIDs] = dz[indices[onIDs,0]]
-		zreg = np.reshape(zi,(ny,nx))
-		dzreg = np.reshape(dzi,(ny,nx))
-		return zreg,dzreg
+		return bl_worker.interpolateArray(coords, z, dz)
 
 	def viewGrid(self, plot_name ,fname, Z, rain, erod, width = 1000, height = 1000, zmin = None, zmax = None, zData = None, title='Export Grid'):
 		"""
@@ -212,6 +124,8 @@ class BayesLands():
 		variable: title
 		    Title of the graph.
 		"""
+		import plotly
+		from plotly.graph_objs import Data, Figure, Layout, Scene, Surface, XAxis, YAxis, ZAxis
 
 		zData = Z
 
@@ -253,6 +167,11 @@ class BayesLands():
 		return
 
 	def plotFunctions(self, fname, pos_likl, pos_rain, pos_erod):
+		import matplotlib.pyplot as plt
+		from matplotlib import cm
+		from matplotlib.ticker import LinearLocator, FormatStrFormatter
+		from mpl_toolkits.mplot3d import Axes3D
+
 		nb_bins=30
 		font = 9
 		width = 1
@@ -340,33 +259,11 @@ class BayesLands():
 		"""
 		pred_elev_vec, pred_erdp_vec, pred_erdp_pts_vec = self.blackBox(input_vector[0], input_vector[1], input_vector[2], input_vector[3], input_vector[4], input_vector[5])
 
-		tausq_elev = (np.sum(np.square(pred_elev_vec[self.simtime] - real_elev)))/real_elev.size
-		sq_error_elev = (np.sum(np.square(pred_elev_vec[self.simtime] - real_elev)))/real_elev.size
-
-		tausq_erdp_pts = np.zeros(self.sim_interval.size)
-		for i in range(self.sim_interval.size):
-			tausq_erdp_pts[i] = np.sum(np.square(pred_erdp_pts_vec[self.sim_interval[i]] - self.real_erdp_pts[i]))/real_erdp_pts.shape[1]
-		
-		# print 'tausq_erdp_pts' , tausq_erdp_pts
-
-		likelihood_elev = -0.5 * np.log(2* math.pi * tausq_elev) - 0.5 * np.square(pred_elev_vec[self.simtime] - real_elev) / tausq_elev
-		likelihood_erdp_pts = 0
+		likelihood, sq_error, sq_error_elev, sq_error_erdp_pts = bl_worker.likelihood(pred_elev_vec, pred_erdp_pts_vec, real_elev,
+			real_erdp_pts, self.sim_interval, self.likl_sed)
 
 		if self.likl_sed:
-			#likelihood_erdp  = -0.5 * np.log(2* math.pi * tausq_erdp) - 0.5 * np.square(pred_erdp_vec[self.simtime] - real_erdp) / tausq_erdp		
-			for i in range(1,self.sim_interval.size):
-				likelihood_erdp_pts += np.sum(-0.5 * np.log(2* math.pi * tausq_erdp_pts[i]) - 0.5 * np.square(pred_erdp_pts_vec[self.sim_interval[i]] - self.real_erdp_pts[i]) / tausq_erdp_pts[i])
-			
-			likelihood = np.sum(likelihood_elev) + (likelihood_erdp_pts)
-
-			sq_error_erdp_pts = np.sum(np.square(pred_erdp_pts_vec[self.sim_interval[i]] - self.real_erdp_pts[i]))/real_erdp_pts.shape[1]
-			sq_error = sq_error_elev+ sq_error_erdp_pts
 			print 'Using sediment pts in the likelihood'
-		
-		else:
-			likelihood = np.sum(likelihood_elev)
-			sq_error_erdp_pts = 0
-			sq_error = sq_error_elev + sq_error_erdp_pts
 
 		return likelihood, sq_error, sq_error_elev, sq_error_erdp_pts
 
@@ -461,109 +358,37 @@ class BayesLands():
 
 def main():
 
-	random.seed(time.time())
-	muted = True
-	run_nb = 0
-	directory = ""
-	likl_sed = False
-	
-	erdp_coords_crater = np.array([[60,60],[52,67],[74,76],[62,45],[72,66],[85,73],[90,75],[44,86],[100,80],[88,69]])
-	erdp_coords_crater_fast = np.array([[60,60],[72,66],[85,73],[90,75],[44,86],[100,80],[88,69],[79,91],[96,77],[42,49]])
-	erdp_coords_etopo = np.array([[42,10],[39,8],[75,51],[59,13],[40,5],[6,20],[14,66],[4,40],[72,73],[46,64]])
-	erdp_coords_etopo_fast = np.array([[42,10],[39,8],[75,51],[59,13],[40,5],[6,20],[14,66],[4,40],[68,40],[72,44]])
-
-	choice = input("Please choose a Badlands example to run the likelihood surface generator on:\n 1) crater_fast\n 2) crater\n 3) etopo_fast\n 4) etopo\n")
-	samples = input("Please enter number of samples (Make sure it is a perfect square): \n")
-
-	if choice == 1:
-		directory = 'Examples/crater_fast'
-		xmlinput = '%s/crater.xml' %(directory)
-		simtime = 15000
-		rainlimits = [0.0, 3.0]
-		erodlimits = [3.e-5, 7.e-5]
-		mlimit = [0.4, 0.6]
-		nlimit = [0.9, 1.1]
-		marinelimit = [5.e-3,4.e-2]
-		aeriallimit = [3.e-2,7.e-2]
-		true_rain = 1.5
-		true_erod = 5.e-5
-		likl_sed = True
-		erdp_coords = erdp_coords_crater_fast
-
-	elif choice == 2:
-		directory = 'Examples/crater'
-		xmlinput = '%s/crater.xml' %(directory)
-		simtime = 50000
-		rainlimits = [0.0, 3.0]
-		erodlimits = [3.e-5, 7.e-5]
-		mlimit = [0.4, 0.6]
-		nlimit = [0.9, 1.1]
-		marinelimit = [5.e-3,4.e-2]
-		aeriallimit = [3.e-2,7.e-2]
-		true_rain = 1.5
-		true_erod = 5.e-5
-		likl_sed = True
-		erdp_coords = erdp_coords_crater
-
-	elif choice == 3:
-		directory = 'Examples/etopo_fast'
-		xmlinput = '%s/etopo.xml' %(directory)
-		simtime = 500000
-		rainlimits = [0.0, 3.0]
-		erodlimits = [3.e-6, 7.e-6]
-		mlimit = [0.4, 0.6]
-		nlimit = [0.9, 1.1]
-		marinelimit = [0.3,0.7]
-		aeriallimit = [0.6,1.0]
-		true_rain = 1.5
-		true_erod = 5.e-6
-		likl_sed = True
-		erdp_coords = erdp_coords_etopo_fast
-
-	elif choice == 4:
-		directory = 'Examples/etopo'
-		xmlinput = '%s/etopo.xml' %(directory)
-		simtime = 1000000
-		rainlimits = [0.0, 3.0]
-		erodlimits = [3.e-6, 7.e-6]
-		mlimit = [0.4, 0.6]
-		nlimit = [0.9, 1.1]
-		marinelimit = [0.3,0.7]
-		aeriallimit = [0.6,1.0]
-		true_rain = 1.5
-		true_erod = 5.e-6
-		likl_sed = True
-		erdp_coords = erdp_coords_etopo
-
-	elif choice == 5:
-		directory = 'Examples/mountain'
-		xmlinput = '%s/mountain.xml' %(directory)
-		simtime = 1000000
-		rainlimits = [0.0, 3.0]
-		erodlimits = [3.e-6, 7.e-6]
-		mlimit = [0.4, 0.6]
-		nlimit = [0.9, 1.1]
-		marinelimit = [0.3,0.7]
-		aeriallimit = [0.6,1.0]
-		true_rain = 1.5
-		true_erod = 5.e-6
-		likl_sed = True
-		erdp_coords = erdp_coords_etopo
+	parser=argparse.ArgumentParser(description='BayesLands likelihood surface')
+
+	parser.add_argument('-p','--problem', help='Problem id or name from the registry (problems.xml): 1-crater-fast,2-crater,3-etopo-fast,4-etopo,6-mountain', required=True, dest="problem")
+	parser.add_argument('-s','--samples', help='Number of samples (make sure it is a perfect square)', default=100, dest="samples",type=int)
+	parser.add_argument('--seed', help='Random seed (defaults to the current time)', default=None, dest="seed",type=int)
+	parser.add_argument('--registry', help='Problem registry file', default=bl_problems.REGISTRY, dest="registry")
+	parser.add_argument('--meshcache', help='Mesh cache directory (shared by concurrent runs)', default=None, dest="meshcache")
+
+	args = parser.parse_args()
+	samples = args.samples
+
+	if args.seed is not None:
+		random.seed(args.seed)
+		np.random.seed(args.seed)
 	else:
-		print('Invalid selection, please choose a problem from the list ')
+		random.seed(time.time())
+	muted = True
+
+	prob = bl_problems.get_problem(args.problem, args.registry)
+	prob.require('erodlimits', 'marinelimit', 'aeriallimit')
+	directory = prob.directory
+	erodlimits = prob.erodlimits
+	rainlimits = prob.rainlimits
+	erdp_coords = prob.erdp_coords
+	likl_sed = prob.likl_sed
 
 	final_elev = np.loadtxt('%s/data/final_elev.txt' %(directory))
 	final_erdp = np.loadtxt('%s/data/final_erdp.txt' %(directory))
 	final_erdp_pts = np.loadtxt('%s/data/final_erdp_pts.txt' %(directory))	
 
-	while os.path.exists('%s/liklSurface_%s' % (directory,run_nb)):
-		run_nb+=1
-	if not os.path.exists('%s/liklSurface_%s' % (directory,run_nb)):
-		os.makedirs('%s/liklSurface_%s' % (directory,run_nb))
-		os.makedirs('%s/liklSurface_%s/plots' % (directory,run_nb))
-		os.makedirs('%s/liklSurface_%s/prediction_data' % (directory,run_nb))
-		filename = ('%s/liklSurface_%s' % (directory,run_nb))
-
+	run_nb, filename = bl_problems.make_run_dir(directory, 'liklSurface')
 
 	with file(('%s/liklSurface_%s/description.txt' % (directory,run_nb)),'a') as outfile:
 			outfile.write('\n\tsamples: {0}'.format(samples))
@@ -576,7 +401,8 @@ def main():
 	print '\nInput file shape', final_elev.shape, '\n'
 	run_nb_str = 'liklSurface_' + str(run_nb)
 
-	bLands = BayesLands(muted, simtime, samples, final_elev, final_erdp, final_erdp_pts, erdp_coords, filename, xmlinput, erodlimits, rainlimits, mlimit, nlimit, marinelimit, aeriallimit, run_nb_str, likl_sed)
+	bLands = BayesLands(muted, prob.simtime, samples, final_elev, final_erdp, final_erdp_pts, erdp_coords, filename, prob.xmlinput, erodlimits, rainlimits,
+		prob.mlimit, prob.nlimit, prob.marinelimit, prob.aeriallimit, run_nb_str, likl_sed, args.meshcache)
 	[pos_rain, pos_erod, pos_likl] = bLands.likelihoodSurface()
 
 	print 'Results are stored in ', filename
@@ -38,6 +38,7 @@ from matplotlib.patches import Polygon
 from matplotlib.collections import PatchCollection
 from scipy.spatial import cKDTree
 from scipy import stats 
+import bl_problems
 from pyBadlands.model import Model as badlandsModel
 from mpl_toolkits.axes_grid1 import make_axes_locatable
 from mpl_toolkits.mplot3d import Axes3D
@@ -49,7 +50,8 @@ plotly.offline.init_notebook_mode()
 
 parser=argparse.ArgumentParser(description='PTBayeslands modelling')
 
-parser.add_argument('-p','--problem', help='Problem Number 1-crater-fast,2-crater,3-etopo-fast,4-etopo,5-null,6-mountain', required=True, dest="problem",type=int)
+parser.add_argument('-p','--problem', help='Problem id or name from the registry (problems.xml): 1-crater-fast,2-crater,3-etopo-fast,4-etopo,5-tasmania,6-mountain,7-australia', required=True, dest="problem")
+parser.add_argument('--registry', help='Problem registry file', default=bl_problems.REGISTRY, dest="registry")
 
 args = parser.parse_args()
 problem = args.problem
@@ -436,82 +438,18 @@ def main():
 	"""
 	
 	"""
-	uplift_verified = False
-	# problem = input("Please choose a Badlands example to create an Initial and Final Topography for:\n 1) crater_fast\n 2) crater\n 3) etopo_fast\n 4) etopo\n 5) mountain\n 6) tasmania\n 7) australia\n")
-	directory = ""
-
-	erdp_coords_crater = np.array([[60,60],[52,67],[74,76],[62,45],[72,66],[85,73],[90,75],[44,86],[100,80],[88,69]])
-	erdp_coords_crater_fast = np.array([[60,60],[72,66],[85,73],[90,75],[44,86],[100,80],[88,69],[79,91],[96,77],[42,49]])
-	erdp_coords_etopo = np.array([[42,10],[39,8],[75,51],[59,13],[40,5],[6,20],[14,66],[4,40],[72,73],[46,64]])
-	erdp_coords_etopo_fast = np.array([[42,10],[39,8],[75,51],[59,13],[40,5],[6,20],[14,66],[4,40],[68,40],[72,44]])
-	erdp_coords_mountain = np.array([[5,5],[10,10],[20,20],[30,30],[40,40],[50,50],[25,25],[37,30],[44,27],[46,10]])
-	erdp_coords_tasmania = np.array([[260,320],[400,350],[270,180],[290,50],[500,120],[500,195],[44,200],[5,315],[450,50],[95,260]])  # need to hand pick given your problem
-	erdp_coords_australia = np.array([[260,320],[400,350],[270,180],[290,50],[500,120],[500,195],[44,200],[5,315],[450,50],[95,260]])  # need to hand pick given your problem
-
 	final_noise = True
 
-	if problem == 1:
-		
-		tstart = time.clock()
-		directory = 'Examples/crater_fast'
-		topoGenerator(directory,'%s/crater.xml' %(directory), 1.5 , 5.e-5, 0.5, 1, 15000, erdp_coords_crater,final_noise)
-		print 'TopoGen for crater_fast completed in (s):',time.clock()-tstart
-		
-	elif problem == 2:
-		
-		tstart = time.clock()
-		directory = 'Examples/crater'
-		# topoGenerator(directory,'%s/crater.xml' %(directory), 1.5 , 5.e-5, 0.5, 1, 50000, erdp_coords_crater,final_noise)
-		
-		#combination 1
-		# topoGenerator(directory,'%s/crater.xml' %(directory), 1.14 , 5.72e-5, 0.5, 1, 50000, erdp_coords_crater,final_noise)
-		#combination 2
-		topoGenerator(directory,'%s/crater.xml' %(directory), 1.98 , 4.36e-5, 0.5, 1, 50000, erdp_coords_crater,final_noise)
-		
-		print 'TopoGen for crater completed in (s):',time.clock()-tstart
-
-	elif problem == 3:
-
-		tstart = time.clock()
-		directory = 'Examples/etopo_fast'
-		topoGenerator(directory,'%s/etopo.xml' %(directory), 1.5 , 5.e-6, 0.5, 1, 500000, erdp_coords_etopo,final_noise)
-		
-		print 'TopoGen for etopo fast completed in (s):',time.clock()-tstart
+	prob = bl_problems.get_problem(problem, args.registry)
+	prob.require('true_erod')
+	directory = prob.directory
 
-	elif problem == 4:
-
-		tstart = time.clock()
-		directory = 'Examples/etopo'
-		# topoGenerator(directory,'%s/etopo.xml' %(directory), 1.5 , 5.e-6, 0.5, 1, 1000000, erdp_coords_etopo,final_noise)
-		#combination 1
-		# topoGenerator(directory,'%s/etopo.xml' %(directory), 2.64 , 3.96e-6, 0.5, 1, 1000000, erdp_coords_etopo,final_noise)
-		#combination 2
-		topoGenerator(directory,'%s/etopo.xml' %(directory), 2.58 , 3.4e-6, 0.5, 1, 1000000, erdp_coords_etopo,final_noise)
-		
-		print 'TopoGen for etopo completed in (s):',time.clock()-tstart
-
-	elif problem == 5:
-
-		tstart = time.clock()
-		directory = 'Examples/mountain'
+	tstart = time.clock()
+	uplift_verified = True
+	if prob.checkuplift:
 		uplift_verified = checkUplift(directory, '/data/uplift', '/data/nodes')
-		# uplift_verified = True
-		if uplift_verified:
-			topoGenerator(directory,'%s/mountain.xml' %(directory), 1.5 , 5.e-6, 0.5, 1, 1000000, erdp_coords_mountain,final_noise)
-		print 'TopoGen for mountain completed in (s):',time.clock()-tstart
-
-	elif problem == 6:
-
-		tstart = time.clock()
-		directory = 'Examples/tasmania'
-		topoGenerator(directory,'%s/tasmania.xml' %(directory), 1.5 , 5.e-6, 0.5, 1, 1000000, erdp_coords_tasmania,final_noise)
-		print 'TopoGen for tasmania completed in (s):',time.clock()-tstart
-
-	elif problem == 7:
-
-		tstart = time.clock()
-		directory = 'Examples/australia'
-		topoGenerator(directory,'%s/australia.xml' %(directory), 1.5 , 1.e-6, 0.5, 1, 10000000, erdp_coords_australia,final_noise)
-		print 'TopoGen for australia completed in (s):',time.clock()-tstart
+	if uplift_verified:
+		topoGenerator(directory, prob.xmlinput, prob.true_rain, prob.true_erod, prob.true_m, prob.true_n, prob.simtime, prob.erdp_coords, final_noise)
+	print 'TopoGen for %s completed in (s):' % (prob.name), time.clock()-tstart
 
 if __name__ == "__main__": main()
\ No newline at end of file
@@ -0,0 +1,488 @@
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+##                                                                                   ##
+##  This file forms part of the BayesLands surface processes modelling companion.    ##
+##                                                                                   ##
+##  For full license and copyright information, please refer to the LICENSE.md file  ##
+##  located at the project root, or contact the authors.                             ##
+##                                                                                   ##
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+
+"""
+Headless worker for BayesLands: runs the Badlands "black box" model and evaluates the
+likelihood without pulling in any of the plotting libraries (plotly, matplotlib, PIL...).
+
+It is used by bl_mcmc.py and bl_surflikl.py, and can be imported directly by worker
+processes on compute nodes that only need the model/likelihood path.
+"""
+import math
+import time
+import resource
+import argparse
+import contextlib
+import collections
+import numpy as np
+from scipy.spatial import cKDTree
+from pyBadlands.model import Model as badlandsModel
+from pyBadlands.ensemble import Ensemble
+
+class SampleTimer(object):
+	"""
+	Per-sample instrumentation of the model/likelihood path. For each phase (model construction,
+	run_to_time segments, interpolation, likelihood, I/O...) the wall time and the peak resident
+	memory of the process are recorded as one CSV row. Aggregates per phase are kept to produce
+	a summary table at the end of the run.
+
+	Parameters
+	----------
+	variable: filename
+		CSV file where the records are written (no file is written if None).
+	"""
+	def __init__(self, filename=None):
+
+		self.sample = 0
+		self.stats = collections.OrderedDict()
+		self.outfile = None
+		if filename is not None:
+			self.outfile = open(filename, 'w')
+			self.outfile.write('sample,phase,segment,wall,peak_rss_kb\n')
+
+	def start(self, sample):
+		"""
+		Set the sample number attached to the following records.
+		"""
+		self.sample = sample
+		if self.outfile is not None:
+			self.outfile.flush()
+
+	@contextlib.contextmanager
+	def phase(self, name, segment=''):
+		"""
+		Context manager timing one phase of the current sample.
+
+		Parameters
+		----------
+		variable: name
+			Name of the phase.
+		variable: segment
+			Optional label of the segment (e.g. simulation time of a run_to_time call).
+		"""
+		tstart = time.time()
+		try:
+			yield
+		finally:
+			self.add(name, time.time() - tstart, segment)
+
+	def add(self, name, wall, segment=''):
+		"""
+		Record the wall time of one phase of the current sample, measured by the caller.
+
+		Parameters
+		----------
+		variable: name
+			Name of the phase.
+		variable: wall
+			Wall time (s) of the phase.
+		variable: segment
+			Optional label of the segment.
+		"""
+		peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+		if name not in self.stats:
+			self.stats[name] = [0, 0., 0., 0]
+		stat = self.stats[name]
+		stat[0] += 1
+		stat[1] += wall
+		stat[2] = max(stat[2], wall)
+		stat[3] = max(stat[3], peak)
+		if self.outfile is not None:
+			self.outfile.write('%d,%s,%s,%.6f,%d\n' % (self.sample, name, segment, wall, peak))
+
+	def summary(self, filename=None):
+		"""
+		Build the summary table (count, total, mean and max wall time, share of the total
+		time and peak memory for each phase).
+
+		Parameters
+		----------
+		variable: filename
+			Optional text file where the table is written.
+
+		Return
+		------
+		variable: table
+			Summary table as a string.
+		"""
+		total = sum([stat[1] for stat in self.stats.values()])
+		lines = ['%-14s %8s %12s %12s %12s %8s %14s' % ('phase', 'count', 'total (s)', 'mean (s)', 'max (s)', 'share', 'peak rss (kb)')]
+		for name, stat in self.stats.items():
+			share = 0.
+			if total > 0.:
+				share = 100.*stat[1]/total
+			lines.append('%-14s %8d %12.4f %12.4f %12.4f %7.2f%% %14d' % (name, stat[0], stat[1], stat[1]/stat[0], stat[2], share, stat[3]))
+		table = '\n'.join(lines)
+
+		if filename is not None:
+			with open(filename, 'w') as outfile:
+				outfile.write(table+'\n')
+
+		return table
+
+	def close(self):
+		"""
+		Close the CSV log.
+		"""
+		if self.outfile is not None:
+			self.outfile.close()
+			self.outfile = None
+
+def interpolateArray(coords=None, z=None, dz=None):
+	"""
+	Interpolate the irregular spaced dataset from badlands on a regular grid.
+
+	Parameters
+	----------
+	variable : coords
+		model grid coordinates
+	variable: z
+		elevation
+	variable: dz
+		cummulative difference in sediment
+
+	Return
+	------
+	The function returns 2D numpy arrays containing the following information:
+	variable: zreg
+		elevation on a regular grid
+	variable: dzreg
+		erodep on a regular grid
+	"""
+	x, y = np.hsplit(coords, 2)
+	dx = (x[1]-x[0])[0]
+
+	nx = int((x.max() - x.min())/dx+1)
+	ny = int((y.max() - y.min())/dx+1)
+	xi = np.linspace(x.min(), x.max(), nx)
+	yi = np.linspace(y.min(), y.max(), ny)
+
+	xi, yi = np.meshgrid(xi, yi)
+	xyi = np.dstack([xi.flatten(), yi.flatten()])[0]
+	XY = np.column_stack((x,y))
+
+	tree = cKDTree(XY)
+	distances, indices = tree.query(xyi, k=3)
+	if len(z[indices].shape) == 3:
+		z_vals = z[indices][:,:,0]
+		dz_vals = dz[indices][:,:,0]
+	else:
+		z_vals = z[indices]
+		dz_vals = dz[indices]
+
+	zi = np.average(z_vals,weights=(1./distances), axis=1)
+	dzi = np.average(dz_vals,weights=(1./distances), axis=1)
+	onIDs = np.where(distances[:,0] == 0)[0]
+	if len(onIDs) > 0:
+		zi[onIDs] = z[indices[onIDs,0]]
+		dzi[onIDs] = dz[indices[onIDs,0]]
+	zreg = np.reshape(zi,(ny,nx))
+	dzreg = np.reshape(dzi,(ny,nx))
+	return zreg,dzreg
+
+def blackBox(xmlinput, run_nb, sim_interval, erdp_coords, rain, erodibility, m, n, marinediff=None, aerialdiff=None, muted=True, timer=None, abort=None, meshcache=None):
+	"""
+	Main entry point for running badlands model with different forcing conditions.
+	The following forcing conditions can be used:
+		- different uniform rain (uniform meaning same precipitation value on the entire region)
+		- different uniform erodibility (uniform meaning same erodibility value on the entire region)
+
+	Parameters
+	----------
+	variable: xmlinput
+		XML file defining the parameters used to run Badlands simulation.
+	variable: run_nb
+		Name of the run used by badlands to build the output directory.
+	variable: sim_interval
+		Simulation times at which the model state is recorded.
+	variable: erdp_coords
+		Regular grid indices where erosion/deposition is extracted.
+	variable: rain
+		Requested uniform precipitation value.
+	variable: erodibility
+		Requested uniform erodibility value.
+	variable: m, n
+		Values of m and n indicate how the incision rate scales
+		with bed shear stress for constant value of sediment flux
+		and sediment transport capacity.
+	variable: marinediff, aerialdiff
+		Optional marine and aerial diffusion coefficients.
+	variable: timer
+		Optional SampleTimer recording the time spent in each phase.
+	variable: abort
+		Optional function called as abort(simtime, elev, erdp_pts) after each recorded time.
+		When it returns True the simulation is stopped and the predictions recorded so
+		far are returned. The likelihood of these incomplete predictions is -inf.
+	variable: meshcache
+		Optional mesh cache directory. The mesh is built once and then memory mapped by every
+		run, so that concurrent workers share the mesh arrays.
+
+	Returns
+	------
+	variable: elev_vec
+		Elevation as a 2D numpy array (regularly spaced dataset with resolution equivalent to simulation one)
+	variable: erdp_vec
+		Cumulative erosion/deposition accumulation as a 2D numpy array (regularly spaced as well)
+	variable: erdp_pts_vec
+		Cumulative erosion/deposition at particular co-ordinates on the grid stored in erdp_coords
+	"""
+	if timer is None:
+		timer = SampleTimer()
+
+	with timer.phase('build'):
+		# Re-initialise badlands model
+		model = badlandsModel()
+
+		# Load the XmL input file
+		model.load_xml(str(run_nb), xmlinput, muted = muted, meshcache = meshcache)
+
+	# Adjust erodibility based on given parameter
+	model.input.SPLero = erodibility
+	model.flow.erodibility.fill(erodibility)
+
+	# Adjust precipitation values based on given parameter
+	model.force.rainVal[:] = rain
+
+	#Adjust m and n values
+	model.input.SPLm = m
+	model.input.SPLn = n
+
+	# Adjust diffusion coefficients when requested, the hillslope component got its own
+	# copy of the XML values when the model was loaded
+	if marinediff is not None:
+		model.input.CDm = marinediff
+		model.hillslope.CDmarine = marinediff
+	if aerialdiff is not None:
+		model.input.CDa = aerialdiff
+		model.hillslope.CDaerial = aerialdiff
+
+	elev_vec = collections.OrderedDict()
+	erdp_vec = collections.OrderedDict()
+	erdp_pts_vec = collections.OrderedDict()
+
+	# Record the predictions while the model runs, labelled by the recorded simulation time
+	times = np.asarray(sim_interval, dtype=float)
+	def record(simtime, state):
+		with timer.phase('interpolate', simtime):
+			elev, erdp = interpolateArray(state['coords'][:, :2], state['elevation'], state['cumdiff'])
+
+		erdp_pts = np.zeros((erdp_coords.shape[0]))
+
+		for count, val in enumerate(erdp_coords):
+			erdp_pts[count] = erdp[val[0], val[1]]
+
+		elev_vec[simtime] = elev
+		erdp_vec[simtime] = erdp
+		erdp_pts_vec[simtime] = erdp_pts
+
+		if abort is not None:
+			return abort(simtime, elev, erdp_pts)
+
+		return False
+
+	# The run_to_time segments are timed between the observer calls, without the time spent in
+	# them. A segment is recorded when the next one starts, so that the work done by run_to_time
+	# after the last observer call (flexure, outputs) is counted in the last segment.
+	clock = {'start': None, 'simtime': None, 'wall': 0.}
+	def observe(tNow, state):
+		wall = time.time() - clock['start']
+		if clock['simtime'] is not None:
+			timer.add('run_to_time', clock['wall'], clock['simtime'])
+		clock['simtime'] = sim_interval[np.abs(times - tNow).argmin()]
+		clock['wall'] = wall
+		stop = record(clock['simtime'], state)
+		clock['start'] = time.time()
+
+		return stop
+
+	# The observers are only called after the current time, the initial state is recorded here
+	if times[0] <= model.tNow:
+		if record(sim_interval[0], model.state_views()):
+			return elev_vec, erdp_vec, erdp_pts_vec
+
+	model.add_observer(observe, times=sim_interval)
+
+	clock['start'] = time.time()
+	model.run_to_time(sim_interval[-1], muted = muted)
+	wall = clock['wall'] + time.time() - clock['start']
+	timer.add('run_to_time', wall, clock['simtime'] if clock['simtime'] is not None else sim_interval[-1])
+
+	return elev_vec, erdp_vec, erdp_pts_vec
+
+def blackBoxEnsemble(xmlinput, run_nb, sim_interval, erdp_coords, params, muted=True, timer=None, meshcache=None):
+	"""
+	Run badlands model for several parameter sets sharing a single mesh (see pyBadlands.ensemble).
+	The mesh and forcing conditions are built once and the parameter sets are advanced in lockstep
+	from one simulation interval to the next.
+
+	Parameters
+	----------
+	variable: xmlinput
+		XML file defining the parameters used to run Badlands simulation.
+	variable: run_nb
+		Name of the run used by badlands to build the output directory.
+	variable: sim_interval
+		Simulation times at which the model state is recorded.
+	variable: erdp_coords
+		Regular grid indices where erosion/deposition is extracted.
+	variable: params
+		List of dictionaries with the rain, erodibility, m, n and optional marinediff and
+		aerialdiff values of each parameter set.
+	variable: timer
+		Optional SampleTimer recording the time spent in each phase.
+	variable: meshcache
+		Optional mesh cache directory.
+
+	Returns
+	------
+	variable: predictions
+		List of (elev_vec, erdp_vec, erdp_pts_vec) as returned by blackBox for each parameter set.
+	"""
+	if timer is None:
+		timer = SampleTimer()
+
+	with timer.phase('build'):
+		model = badlandsModel()
+		model.load_xml(str(run_nb), xmlinput, muted = muted, meshcache = meshcache)
+		ensemble = Ensemble(model, len(params))
+
+	for k, param in enumerate(params):
+		ensemble.set_parameters(k, rain=param['rain'], erodibility=param['erodibility'], m=param['m'],
+			n=param['n'], marinediff=param.get('marinediff'), aerialdiff=param.get('aerialdiff'))
+
+	predictions = [(collections.OrderedDict(), collections.OrderedDict(), collections.OrderedDict()) for param in params]
+
+	for simtime in sim_interval:
+
+		with timer.phase('run_to_time', simtime):
+			ensemble.run_to_time(simtime, muted = muted)
+
+		with timer.phase('interpolate', simtime):
+			for k in range(len(params)):
+				elev, erdp = interpolateArray(model.FVmesh.node_coords[:, :2], ensemble.elevation[k], ensemble.cumdiff[k])
+
+				erdp_pts = np.zeros((erdp_coords.shape[0]))
+
+				for count, val in enumerate(erdp_coords):
+					erdp_pts[count] = erdp[val[0], val[1]]
+
+				predictions[k][0][simtime] = elev
+				predictions[k][1][simtime] = erdp
+				predictions[k][2][simtime] = erdp_pts
+
+	return predictions
+
+def prepare_mesh(xmlinput, meshcache, run_nb='meshcache'):
+	"""
+	Build the mesh of a Badlands input and store it in the mesh cache. This is done once by a
+	parent (or a single worker) so that the workers started next all memory map the same
+	cached mesh instead of building their own copy.
+
+	Parameters
+	----------
+	variable: xmlinput
+		XML file defining the parameters used to run Badlands simulation.
+	variable: meshcache
+		Mesh cache directory.
+	variable: run_nb
+		Name of the run used by badlands to build the output directory.
+	"""
+	model = badlandsModel()
+	model.load_xml(str(run_nb), xmlinput, muted = True, meshcache = meshcache)
+
+	return
+
+def likelihood(pred_elev_vec, pred_erdp_pts_vec, real_elev, real_erdp_pts, sim_interval, likl_sed, sed_weight=1.):
+	"""
+	Gaussian log-likelihood of a black box prediction against the observed final elevation
+	and, when likl_sed is set, against the erosion/deposition points at each simulation interval.
+
+	Parameters
+	----------
+	variable: pred_elev_vec, pred_erdp_pts_vec
+		Predictions returned by blackBox.
+	variable: real_elev, real_erdp_pts
+		Observed elevation and erosion/deposition points.
+	variable: sim_interval
+		Simulation times used to produce the predictions.
+	variable: likl_sed
+		Flag to include the erosion/deposition points in the likelihood.
+	variable: sed_weight
+		Weight applied to the erosion/deposition points likelihood.
+
+	Returns
+	------
+	variable: likelihood, sq_error, sq_error_elev, sq_error_erdp_pts
+		The likelihood is -inf and the errors are inf when the predictions miss simulation
+		times, i.e. when blackBox was stopped by its abort function.
+	"""
+	simtime = sim_interval[-1]
+
+	# Aborted runs are rejected
+	for t in sim_interval:
+		if t not in pred_erdp_pts_vec or t not in pred_elev_vec:
+			return -np.inf, np.inf, np.inf, np.inf
+
+	tausq_elev = (np.sum(np.square(pred_elev_vec[simtime] - real_elev)))/real_elev.size
+	sq_error_elev = tausq_elev
+
+	tausq_erdp_pts = np.zeros(sim_interval.size)
+	for i in range(sim_interval.size):
+		tausq_erdp_pts[i] = np.sum(np.square(pred_erdp_pts_vec[sim_interval[i]] - real_erdp_pts[i]))/real_erdp_pts.shape[1]
+
+	likelihood_elev = -0.5 * np.log(2* math.pi * tausq_elev) - 0.5 * np.square(pred_elev_vec[simtime] - real_elev) / tausq_elev
+	likelihood_erdp_pts = 0
+
+	if likl_sed:
+		for i in range(1,sim_interval.size):
+			likelihood_erdp_pts += np.sum(-0.5 * np.log(2* math.pi * tausq_erdp_pts[i]) - 0.5 * np.square(pred_erdp_pts_vec[sim_interval[i]] - real_erdp_pts[i]) / tausq_erdp_pts[i])
+
+		likelihood = np.sum(likelihood_elev) + (likelihood_erdp_pts*sed_weight)
+
+		sq_error_erdp_pts = np.sum(np.square(pred_erdp_pts_vec[sim_interval[i]] - real_erdp_pts[i]))/real_erdp_pts.shape[1]
+	else:
+		likelihood = np.sum(likelihood_elev)
+		sq_error_erdp_pts = 0
+
+	sq_error = sq_error_elev + sq_error_erdp_pts
+
+	return likelihood, sq_error, sq_error_elev, sq_error_erdp_pts
+
+def main():
+	"""
+	Run a single black box evaluation and store the predictions in a numpy archive.
+	"""
+	parser = argparse.ArgumentParser(description='BayesLands headless worker')
+	parser.add_argument('-x','--xml', help='Badlands XmL input file', required=True, dest="xmlinput")
+	parser.add_argument('-t','--simtime', help='Simulation time', required=True, dest="simtime", type=float)
+	parser.add_argument('-r','--rain', help='Uniform precipitation value', required=True, dest="rain", type=float)
+	parser.add_argument('-e','--erod', help='Uniform erodibility value', required=True, dest="erod", type=float)
+	parser.add_argument('-m', help='Stream power law m exponent', default=0.5, dest="m", type=float)
+	parser.add_argument('-n', help='Stream power law n exponent', default=1.0, dest="n", type=float)
+	parser.add_argument('-c','--coords', help='Text file with erosion/deposition grid indices', default=None, dest="coords")
+	parser.add_argument('-o','--output', help='Output numpy archive', default='worker_pred.npz', dest="output")
+	parser.add_argument('--run', help='Badlands run name', default='worker', dest="run_nb")
+	parser.add_argument('--meshcache', help='Mesh cache directory shared by the workers', default=None, dest="meshcache")
+	args = parser.parse_args()
+
+	sim_interval = np.arange(0, args.simtime+1, args.simtime/4)
+	if args.coords is not None:
+		erdp_coords = np.loadtxt(args.coords, dtype=int, ndmin=2)
+	else:
+		erdp_coords = np.zeros((0,2), dtype=int)
+
+	elev_vec, erdp_vec, erdp_pts_vec = blackBox(args.xmlinput, args.run_nb, sim_interval, erdp_coords,
+		args.rain, args.erod, args.m, args.n, meshcache = args.meshcache)
+
+	np.savez(args.output, sim_interval=sim_interval,
+		elev=np.array(elev_vec.values()), erdp=np.array(erdp_vec.values()), erdp_pts=np.array(erdp_pts_vec.values()))
+
+	print 'Predictions stored in ', args.output
+
+if __name__ == "__main__": main()
@@ -21,6 +21,7 @@ from .underland import stratiWedge
 from .underland import carbMesh
 from .flow import visualiseFlow
 from .hillslope import diffLinear
+from .hillslope import diffImplicit
 from .surface import elevationTIN
 from .surface import partitionTIN
 from .surface import visualiseTIN
@@ -0,0 +1,231 @@
+import numpy as np
+
+def _share_state(value, base, memo, used):
+    """
+    Replace the arrays of a member snapshot equal to the ones of the initial snapshot by
+    the latter. An array of the initial snapshot is only used in place of one array of the
+    member, so that the arrays aliased in the restored member are the same as in the model.
+    """
+    if isinstance(value, np.ndarray):
+        key = id(value)
+        if key not in memo:
+            memo[key] = value
+            if isinstance(base, np.ndarray) and base.shape == value.shape and \
+                    base.dtype == value.dtype and np.array_equal(base, value) and \
+                    used.setdefault(id(base), key) == key:
+                memo[key] = base
+        return memo[key]
+    if isinstance(value, list) and isinstance(base, list) and len(base) == len(value):
+        return [_share_state(v, b, memo, used) for v, b in zip(value, base)]
+    if isinstance(value, tuple) and isinstance(base, tuple) and len(base) == len(value):
+        return tuple(_share_state(v, b, memo, used) for v, b in zip(value, base))
+    if isinstance(value, dict) and isinstance(base, dict):
+        return dict((k, _share_state(v, base.get(k), memo, used)) for k, v in value.items())
+    return value
+
+class Ensemble(object):
+    """
+    Ensemble of parameter sets advanced in lockstep on the mesh of one pyBadlands model.
+
+    The TIN, the Finite Volume discretisation, the forcing grids and every other read-only
+    precomputation are built once by the model and shared by all the members. Each member
+    only owns its simulation state: elevation, cumulative erosion/deposition, erodibility
+    and rain are stored for all members in struct-of-arrays layout (one row per member)
+    and the remaining state (forcing clocks, flow network caches, stratigraphy) is kept as
+    model snapshots. The arrays of these snapshots which are still equal to the ones of the
+    initial state are not copied but shared with the initial snapshot.
+
+    Members are advanced one after the other through the model kernels for each
+    synchronisation time given to run_to_time. The runs are suspended at these times
+    without the end of run processes, so that each member follows the time steps of a
+    single run recording its state at the same times (as bl_worker.blackBox). Members
+    cannot be used with 3D displacements as the mesh would then differ between members.
+    """
+
+    def __init__(self, model, size):
+        """
+        Constructor.
+
+        Parameters
+        ----------
+        model : Model
+            Model with a loaded XML input, used to build the shared mesh.
+
+        size : int
+            Number of members.
+        """
+
+        assert hasattr(model, 'recGrid'), "DEM file has not been loaded. Configure one in your XML file or call the build_mesh function."
+        if model.input.disp3d:
+            raise ValueError('Ensembles require a fixed mesh and cannot be used with 3D displacements.')
+        if size < 1:
+            raise ValueError('The number of ensemble members needs to be positive.')
+
+        self.model = model
+        self.size = size
+        self.tNow = np.full(size, model.tNow)
+
+        # State arrays of the members (struct-of-arrays)
+        self.elevation = np.tile(model.elevation, (size, 1))
+        self.cumdiff = np.tile(model.cumdiff, (size, 1))
+        self.erodibility = np.tile(model.flow.erodibility, (size, 1))
+        self.rain = np.tile(model.rain, (size, 1))
+
+        # Parameters of the XML input, used by the members which do not override them
+        self._base = {'erodibility': model.input.SPLero, 'rain': np.copy(model.force.rainVal),
+                      'm': model.input.SPLm, 'n': model.input.SPLn, 'marinediff': model.input.CDm,
+                      'aerialdiff': model.input.CDa}
+
+        # Remaining state, shared by all members until they are advanced
+        self._initial = model.snapshot()
+        self._states = [self._member_state(self._initial, k) for k in range(size)]
+        self._params = [{} for k in range(size)]
+
+    def _member_state(self, snap, k):
+        """
+        Build the snapshot of a member, its state arrays being rows of the ensemble arrays.
+        """
+
+        state = dict(snap)
+        state['model'] = dict(snap['model'])
+        state['model']['elevation'] = self.elevation[k]
+        state['model']['cumdiff'] = self.cumdiff[k]
+        state['model']['rain'] = self.rain[k]
+        state['components'] = dict(snap['components'])
+        state['components']['flow'] = dict(snap['components']['flow'])
+        state['components']['flow']['erodibility'] = self.erodibility[k]
+
+        return state
+
+    def set_parameters(self, k, rain=None, erodibility=None, m=None, n=None,
+                       marinediff=None, aerialdiff=None):
+        """
+        Define the parameters of one member. Parameters which are not given keep the value
+        previously set for this member or, by default, the one defined in the XML input file.
+
+        Parameters
+        ----------
+        k : int
+            Member index.
+
+        rain : float
+            Uniform precipitation value (applied at the next precipitation update).
+
+        erodibility : float
+            Uniform erodibility value.
+
+        m, n : float
+            Stream power law exponents.
+
+        marinediff, aerialdiff : float
+            Marine and aerial diffusion coefficients.
+        """
+
+        params = self._params[k]
+        if rain is not None:
+            params['rain'] = rain
+        if erodibility is not None:
+            params['erodibility'] = erodibility
+            self.erodibility[k].fill(erodibility)
+        if m is not None:
+            params['m'] = m
+        if n is not None:
+            params['n'] = n
+        if marinediff is not None:
+            params['marinediff'] = marinediff
+        if aerialdiff is not None:
+            params['aerialdiff'] = aerialdiff
+
+        return
+
+    def activate(self, k):
+        """
+        Load the state and the parameters of one member in the model.
+
+        Parameters
+        ----------
+        k : int
+            Member index.
+
+        Returns
+        -------
+        model : Model
+            Model holding the member state.
+        """
+
+        model = self.model
+        model.restore(self._states[k])
+        params = dict(self._base)
+        params.update(self._params[k])
+
+        model.input.SPLero = params['erodibility']
+        model.force.rainVal[:] = params['rain']
+        model.input.SPLm = params['m']
+        model.input.SPLn = params['n']
+        if model.hillslope.CDmarine != params['marinediff'] or model.hillslope.CDaerial != params['aerialdiff']:
+            model.hillslope.updatedt = 0
+        model.input.CDm = params['marinediff']
+        model.hillslope.CDmarine = params['marinediff']
+        model.input.CDa = params['aerialdiff']
+        model.hillslope.CDaerial = params['aerialdiff']
+
+        return model
+
+    def _store(self, k):
+        """
+        Store the model state in the member k.
+        """
+
+        model = self.model
+        self.tNow[k] = model.tNow
+        self.elevation[k] = model.elevation
+        self.cumdiff[k] = model.cumdiff
+        self.erodibility[k] = model.flow.erodibility
+        self.rain[k] = model.rain
+
+        # Only keep the arrays which differ from the initial state
+        snap = model.snapshot()
+        memo = {}
+        used = {}
+        for name in ('model', 'components'):
+            snap[name] = _share_state(snap[name], self._initial[name], memo, used)
+        snap['shared'] = snap['shared'] | self._initial['shared']
+        self._states[k] = self._member_state(snap, k)
+
+        return
+
+    def run_to_time(self, tEnd, members=None, muted=True, verbose=False):
+        """
+        Advance the members to a specified point in time (tEnd).
+
+        Parameters
+        ----------
+        tEnd : float
+            Run the simulation to this many years.
+
+        members : list
+            Indices of the members to advance (default to all members).
+
+        muted : bool
+            When False, the members write their outputs (in the same output directory).
+
+        verbose : bool
+            If True, output additional debug information.
+
+        Returns
+        -------
+        stopped : numpy array
+            True for the members stopped early by a model observer.
+        """
+
+        if members is None:
+            members = range(self.size)
+
+        stopped = np.zeros(self.size, dtype=bool)
+        for k in members:
+            model = self.activate(k)
+            model.run_to_time(tEnd, muted=muted, verbose=verbose, finalise=False)
+            stopped[k] = model.earlyStop
+            self._store(k)
+
+        return stopped
@@ -18,7 +18,7 @@ import mpi4py.MPI as mpi
 from scipy.spatial import cKDTree
 from scipy.interpolate import RegularGridInterpolator
 from scipy.ndimage.filters import gaussian_filter
-from matplotlib import path
+from pyBadlands.simulation.workBuffers import workBuffers
 
 import h5py
 import pandas as pd
@@ -57,6 +57,12 @@ class flowNetwork:
         self.localstack1 = None
         self.stack = None
         self.stack1 = None
+        self.stackNbs = None
+        self.stackNbs1 = None
+        self.incremental = input.incremental
+        self.routeCounts = {'reuse': 0, 'repair': 0, 'rebuild': 0}
+        self._rcvStack = None
+        self._rcvStack1 = None
         self.partFlow = None
         self.maxdonors = 0
         self.CFL = None
@@ -64,6 +70,7 @@ class flowNetwork:
         self.mindt = None
         self.spl = False
         self.depo = 0
+        self.implicit = input.splimplicit
 
         self.discharge = None
         self.localsedflux = None
@@ -99,6 +106,8 @@ class flowNetwork:
         self.straTIN = 0
         self.activelay = None
 
+        self.halo = None
+        self.buffers = workBuffers()
         self.borders = None
         self.domain = None
         self.insideIDs = None
@@ -114,7 +123,52 @@ class flowNetwork:
         self._rank = self._comm.Get_rank()
         self._size = self._comm.Get_size()
 
-    def compute_hillslope_diffusion(self, elev, neighbours, edges, distances, globalIDs, type, Sc):
+    @staticmethod
+    def set_threads(nb):
+        """
+        Set the number of OpenMP threads used by each processor in the flow kernels (stream power
+        law, marine and hillslope sediment diffusion and CFL condition). Without OpenMP support in
+        the FLOWalgo library, the kernels remain single-threaded.
+
+        Parameters
+        ----------
+        nb
+            Number of threads.
+
+        Returns
+        -------
+        threads
+            Number of threads used by the kernels.
+        """
+
+        FLOWalgo.flowcompute.setthreads(nb)
+
+        return FLOWalgo.flowcompute.getthreads()
+
+    def _gather_nodes(self, array, op):
+        """
+        Make a nodal array computed on the local grids complete on all processors. With a halo,
+        the values of the nodes owned by each partition are gathered, otherwise the local arrays
+        are reduced with the given operation.
+
+        Parameters
+        ----------
+        array
+            Numpy array of nodal values updated in place.
+
+        op
+            MPI reduction operation used without halo.
+        """
+
+        if self.halo is not None:
+            self.halo.gather(array)
+        else:
+            self._comm.Allreduce(mpi.IN_PLACE, array, op=op)
+
+        return
+
+    def compute_hillslope_diffusion(self, elev, neighbours, edges, distances, globalIDs, type, Sc,
+                                    offsets=None):
         """
         Perform hillslope evolution based on diffusion processes.
 
@@ -137,9 +191,26 @@ class flowNetwork:
 
         type
             Flag to compute the diffusion when multiple rocks are used.
+
+        offsets
+            Numpy integer-type array with the CSR neighbourhood offsets. When given, neighbours, edges
+            and distances are the flat CSR arrays of the Finite Volume mesh.
         """
 
-        if type == 0:
+        if offsets is not None:
+            if type == 0:
+                if Sc > 0.:
+                    tSc = numpy.zeros(1)
+                    tSc[0] = Sc
+                    diff_flux = sfd.diffusionnl_csr(tSc, elev, self.borders2, offsets, neighbours, edges,
+                                                    distances, globalIDs)
+                else:
+                    diff_flux = sfd.diffusion_csr(elev, self.borders2, offsets, neighbours, edges,
+                                                  distances, globalIDs)
+            else:
+                diff_flux = sfd.diffusionero_csr(elev, self.borders2, offsets, neighbours, edges,
+                                                 distances, globalIDs)
+        elif type == 0:
             if Sc > 0.:
                 tSc = numpy.zeros(1)
                 tSc[0] = Sc
@@ -150,12 +221,12 @@ class flowNetwork:
             diff_flux = sfd.diffusionero(elev, self.borders2, neighbours, edges, distances, globalIDs)
 
         # Send local diffusion flux globally
-        self._comm.Allreduce(mpi.IN_PLACE,diff_flux,op=mpi.MAX)
+        self._gather_nodes(diff_flux, mpi.MAX)
 
         return diff_flux
 
     def compute_marine_diffusion(self, elev, depoH, neighbours, edges, distances, coeff,
-                                 globalIDs, seal, maxth, tstep):
+                                 globalIDs, seal, maxth, tstep, offsets=None, ghosts=False):
         """
         Perform river transported marine sediments diffusion.
 
@@ -178,12 +249,27 @@ class flowNetwork:
 
         globalIDs
             Numpy integer-type array containing for local nodes their global IDs.
+
+        offsets
+            Numpy integer-type array with the CSR neighbourhood offsets. When given, neighbours, edges
+            and distances are the flat CSR arrays of the Finite Volume mesh.
+
+        ghosts
+            When True and a halo is defined, globalIDs are the nodes owned by the partition and only
+            the ghost nodes of the local grid are updated with the fluxes computed by their owners.
         """
-        diff_flux, ndt = FLOWalgo.flowcompute.diffmarine(elev, self.borders, depoH, neighbours, edges,
+        if offsets is not None:
+            diff_flux, ndt = FLOWalgo.flowcompute.diffmarinecsr(elev, self.borders, depoH, offsets, neighbours,
+                                           edges, distances, coeff, globalIDs, seal, maxth, tstep)
+        else:
+            diff_flux, ndt = FLOWalgo.flowcompute.diffmarine(elev, self.borders, depoH, neighbours, edges,
                                            distances, coeff, globalIDs, seal, maxth, tstep)
 
         # Send local diffusion flux globally
-        self._comm.Allreduce(mpi.IN_PLACE,diff_flux,op=mpi.MAX)
+        if ghosts and self.halo is not None:
+            self.halo.update_ghosts(diff_flux)
+        else:
+            self._gather_nodes(diff_flux, mpi.MAX)
         mindt = numpy.array(ndt)
         self._comm.Allreduce(mpi.IN_PLACE,mindt,op=mpi.MIN)
 
@@ -220,8 +306,8 @@ class flowNetwork:
         diff_prop, diff_flux = FLOWalgo.flowcompute.diffsedmarine(elev, self.borders, dep, sdep,
                                            seal, maxth, coeff, neighbours, edges, distances, globalIDs)
         # Send local diffusion flux globally
-        self._comm.Allreduce(mpi.IN_PLACE,diff_flux,op=mpi.MAX)
-        self._comm.Allreduce(mpi.IN_PLACE,diff_prop,op=mpi.MAX)
+        self._gather_nodes(diff_flux, mpi.MAX)
+        self._gather_nodes(diff_prop, mpi.MAX)
 
         return diff_prop,diff_flux
 
@@ -260,13 +346,13 @@ class flowNetwork:
                                            layh, coeff, neighbours, edges, distances, globalIDs)
 
         # Send local diffusion flux globally
-        self._comm.Allreduce(mpi.IN_PLACE,ero,op=mpi.MAX)
-        self._comm.Allreduce(mpi.IN_PLACE,depo,op=mpi.MAX)
-        self._comm.Allreduce(mpi.IN_PLACE,sumdiff,op=mpi.MAX)
+        self._gather_nodes(ero, mpi.MAX)
+        self._gather_nodes(depo, mpi.MAX)
+        self._gather_nodes(sumdiff, mpi.MAX)
 
         return sumdiff,ero,depo
 
-    def SFD_receivers(self, fillH, elev, neighbours, edges, distances, globalIDs):
+    def SFD_receivers(self, fillH, elev, neighbours, edges, distances, globalIDs, offsets=None):
         """
         Single Flow Direction function computes downslope flow directions by inspecting the neighborhood
         elevations around each node. The SFD method assigns a unique flow direction towards the steepest
@@ -291,40 +377,50 @@ class flowNetwork:
 
         globalIDs
             Numpy integer-type array containing for local nodes their global IDs.
+
+        offsets
+            Numpy integer-type array with the CSR neighbourhood offsets. When given, neighbours, edges
+            and distances are the flat CSR arrays of the Finite Volume mesh.
         """
 
         # Call the SFD function from libUtils
         # Get the directions from true surface
-        base1, receivers1 = sfd.directions_base(elev, neighbours, edges, distances, globalIDs)
+        if offsets is not None:
+            base1, receivers1 = sfd.directions_base_csr(elev, offsets, neighbours, globalIDs)
+        else:
+            base1, receivers1 = sfd.directions_base(elev, neighbours, edges, distances, globalIDs)
 
         # Send local base level globally
-        self._comm.Allreduce(mpi.IN_PLACE,base1,op=mpi.MAX)
+        self._gather_nodes(base1, mpi.MAX)
         bpos = numpy.where(base1 >= 0)[0]
         self.base1 = base1[bpos]
 
         # Send local receivers globally
-        self._comm.Allreduce(mpi.IN_PLACE,receivers1,op=mpi.MAX)
+        self._gather_nodes(receivers1, mpi.MAX)
         self.receivers1 = receivers1
 
         # Get the directions from filled surface
-        base, receivers, maxh, maxdep = sfd.directions(fillH, elev, neighbours, edges, distances, globalIDs)
+        if offsets is not None:
+            base, receivers, maxh, maxdep = sfd.directions_csr(fillH, elev, offsets, neighbours, globalIDs)
+        else:
+            base, receivers, maxh, maxdep = sfd.directions(fillH, elev, neighbours, edges, distances, globalIDs)
 
         # Send local base level globally
-        self._comm.Allreduce(mpi.IN_PLACE,base,op=mpi.MAX)
+        self._gather_nodes(base, mpi.MAX)
         bpos = numpy.where(base >= 0)[0]
         self.base = base[bpos]
         numpy.random.shuffle(self.base)
 
         # Send local receivers globally
-        self._comm.Allreduce(mpi.IN_PLACE,receivers,op=mpi.MAX)
+        self._gather_nodes(receivers, mpi.MAX)
         self.receivers = receivers
 
         # Send local maximum height globally
-        self._comm.Allreduce(mpi.IN_PLACE,maxh,op=mpi.MAX)
+        self._gather_nodes(maxh, mpi.MAX)
         self.maxh = maxh
 
         # Send local maximum deposition globally
-        self._comm.Allreduce(mpi.IN_PLACE,maxdep,op=mpi.MAX)
+        self._gather_nodes(maxdep, mpi.MAX)
         self.maxdep = maxdep
 
     def _donors_number_array(self):
@@ -415,6 +511,217 @@ class flowNetwork:
         stids = numpy.where(lstcks > -1 )[0]
         self.localstack1 = lstcks[stids]
 
+    def _upstream_nodes(self, receivers, seeds, maxNb):
+        """
+        Find the nodes draining through a set of seed nodes by walking the donors of the
+        receivers network level by level.
+
+        Parameters
+        ----------
+        receivers
+            Numpy integer-type array containing the receiver of each node.
+
+        seeds
+            Numpy integer-type array with the seed nodes IDs.
+
+        maxNb
+            Maximum number of upstream nodes, the search is stopped above this number.
+
+        Returns
+        -------
+        ids
+            Numpy integer-type array with the seed and upstream nodes IDs, ordered by level
+            from the seeds, or None if there are more than maxNb nodes.
+
+        levels
+            Numpy integer-type array with the level of each node (0 for the seeds).
+
+        roots
+            Numpy integer-type array with the seed from which each node is reached.
+        """
+
+        # Donors array of the receivers network (base levels are their own donors)
+        numPts = len(receivers)
+        offsets = numpy.zeros(numPts+1, dtype=int)
+        numpy.cumsum(numpy.bincount(receivers, minlength=numPts), out=offsets[1:])
+        donors, lstcks = FLWnetwork.fstack.build(numpy.zeros(0, dtype=int), receivers, offsets)
+
+        ids = [seeds]
+        levels = [numpy.zeros(len(seeds), dtype=int)]
+        roots = [seeds]
+        total = len(seeds)
+        front = seeds
+        frontRoots = seeds
+        lvl = 0
+        while len(front) > 0:
+            nb = offsets[front+1] - offsets[front]
+            if nb.sum() == 0:
+                break
+            # Positions of the donors of the front nodes in the donors array
+            start = numpy.repeat(offsets[front], nb)
+            shift = numpy.arange(nb.sum()) - numpy.repeat(numpy.cumsum(nb)-nb, nb)
+            front = donors[start+shift]
+            frontRoots = numpy.repeat(frontRoots, nb)
+            upstream = receivers[front] != front
+            front = front[upstream]
+            frontRoots = frontRoots[upstream]
+            total += len(front)
+            if total > maxNb:
+                return None, None, None
+            lvl += 1
+            ids.append(front)
+            levels.append(numpy.full(len(front), lvl, dtype=int))
+            roots.append(frontRoots)
+
+        return numpy.concatenate(ids), numpy.concatenate(levels), numpy.concatenate(roots)
+
+    def _repair_stack(self, receivers, oldReceivers, stack, stackNbs):
+        """
+        Repair the global stack after the receivers of a limited number of nodes have changed.
+
+        The nodes draining through a node whose receiver changed are removed from the stack. The
+        order of the remaining nodes is kept, as their receivers are unchanged. Each removed subtree
+        is then inserted, ordered by level, right after its new receiver in the stack part of the
+        processor owning the receiver, or at the end of the stack part of a processor when its root
+        becomes a base level. Basins remain contiguous in the stack.
+
+        Parameters
+        ----------
+        receivers
+            Numpy integer-type array containing the new receiver of each node.
+
+        oldReceivers
+            Numpy integer-type array containing the receivers used to build the stack.
+
+        stack
+            Numpy integer-type array with the global stack.
+
+        stackNbs
+            List with the number of nodes in the stack part of each processor.
+
+        Returns
+        -------
+        stack
+            Numpy integer-type array with the repaired global stack or None when the number of
+            affected nodes is above the incremental threshold.
+
+        stackNbs
+            List with the number of nodes in the repaired stack part of each processor.
+        """
+
+        numPts = len(receivers)
+        maxNb = int(self.incremental*numPts)
+        changed = numpy.where(receivers != oldReceivers)[0]
+        if len(changed) > maxNb:
+            return None, None
+
+        # Nodes affected by the changes
+        ids, levels, roots = self._upstream_nodes(receivers, changed, maxNb)
+        if ids is None:
+            return None, None
+        affected = numpy.zeros(numPts, dtype=bool)
+        affected[ids] = True
+
+        # Subtrees of changed nodes draining through other changed nodes are visited twice,
+        # only the visits from the most downstream changed nodes are kept
+        top = affected[receivers[changed]] & (receivers[changed] != changed)
+        inner = numpy.zeros(numPts, dtype=bool)
+        inner[changed[top]] = True
+        keep = ~inner[roots]
+        ids = ids[keep]
+        levels = levels[keep]
+        roots = roots[keep]
+
+        # Remaining part of the stack
+        owner = numpy.repeat(numpy.arange(len(stackNbs)), stackNbs)
+        remain = ~affected[stack]
+        rstack = stack[remain]
+        rowner = owner[remain]
+        rpos = numpy.zeros(numPts, dtype=int)
+        rpos[rstack] = numpy.arange(len(rstack))
+        rend = numpy.cumsum(numpy.bincount(rowner, minlength=len(stackNbs)))
+
+        # Insertion position of the subtrees in the remaining stack
+        rootIDs = numpy.unique(roots)
+        rootPos = numpy.zeros(numPts, dtype=int)
+        rootOwner = numpy.zeros(numPts, dtype=int)
+        base = receivers[rootIDs] == rootIDs
+        inner = rootIDs[~base]
+        rootPos[inner] = rpos[receivers[inner]] + 1
+        rootOwner[inner] = rowner[rpos[receivers[inner]]]
+        rootOwner[rootIDs[base]] = rootIDs[base] % len(stackNbs)
+        rootPos[rootIDs[base]] = rend[rootOwner[rootIDs[base]]]
+
+        # Insert the subtrees ordered by level
+        order = numpy.lexsort((levels, roots, rootPos[roots]))
+        ids = ids[order]
+        roots = roots[order]
+        newStack = numpy.insert(rstack, rootPos[roots], ids).astype(stack.dtype)
+        newOwner = numpy.insert(rowner, rootPos[roots], rootOwner[roots])
+        newNbs = list(numpy.bincount(newOwner, minlength=len(stackNbs)))
+
+        return newStack, newNbs
+
+    def update_stack(self, filled=True):
+        """
+        Update the stack from the previous one when the receivers network is unchanged or when the
+        receivers of a limited number of nodes have changed. The number of updates taken by each
+        path (reuse, repair or rebuild) is counted in routeCounts.
+
+        Parameters
+        ----------
+        filled
+            Update the stack of the filled surface (True) or of the real surface (False).
+
+        Returns
+        -------
+        updated
+            True if the stack has been reused or repaired, False if it needs to be rebuilt.
+        """
+
+        if filled:
+            receivers = self.receivers
+            oldReceivers = self._rcvStack
+            self._rcvStack = numpy.copy(receivers)
+        else:
+            receivers = self.receivers1
+            oldReceivers = self._rcvStack1
+            self._rcvStack1 = numpy.copy(receivers)
+
+        if self.incremental <= 0. or oldReceivers is None or len(oldReceivers) != len(receivers):
+            self.routeCounts['rebuild'] += 1
+            return False
+
+        if filled:
+            stack, stackNbs = self.stack, self.stackNbs
+        else:
+            stack, stackNbs = self.stack1, self.stackNbs1
+        if stack is None or len(stack) != len(receivers):
+            self.routeCounts['rebuild'] += 1
+            return False
+
+        if numpy.array_equal(receivers, oldReceivers):
+            self.routeCounts['reuse'] += 1
+            return True
+
+        stack, stackNbs = self._repair_stack(receivers, oldReceivers, stack, stackNbs)
+        if stack is None:
+            self.routeCounts['rebuild'] += 1
+            return False
+        self.routeCounts['repair'] += 1
+
+        start = sum(stackNbs[:self._rank])
+        localstack = stack[start:start+stackNbs[self._rank]]
+        localbase = localstack[receivers[localstack] == localstack]
+        if filled:
+            self.stack, self.stackNbs = stack, stackNbs
+            self.localstack, self.localbase = localstack, localbase
+        else:
+            self.stack1, self.stackNbs1 = stack, stackNbs
+            self.localstack1, self.localbase1 = localstack, localbase
+
+        return True
+
     def compute_flow(self, elev, Acell, rain):
         """
         Calculates the drainage area and water discharge at each node.
@@ -433,12 +740,12 @@ class flowNetwork:
 
         numPts = len(Acell)
 
-        self.discharge = numpy.zeros(numPts, dtype=float)
-        self.discharge[self.stack] = Acell[self.stack] * rain[self.stack]
+        discharge = self.buffers.zeros('discharge', numPts)
+        discharge[self.stack] = Acell[self.stack] * rain[self.stack]
 
         # Compute discharge using libUtils
         self.discharge, self.activelay = FLOWalgo.flowcompute.discharge(self.localstack, self.receivers,
-                                                        elev, self.discharge)
+                                                        elev, discharge)
         self._comm.Allreduce(mpi.IN_PLACE, self.discharge, op=mpi.MAX)
         self._comm.Allreduce(mpi.IN_PLACE, self.activelay, op=mpi.MAX)
 
@@ -477,13 +784,13 @@ class flowNetwork:
         base, receivers = sfd.dirview(fillH, elev, neighbours, edges, distances, globalIDs, sea)
 
         # Send local base level globally
-        self._comm.Allreduce(mpi.IN_PLACE,base,op=mpi.MAX)
+        self._gather_nodes(base, mpi.MAX)
         bpos = numpy.where(base >= 0)[0]
         self.base = base[bpos]
         numpy.random.shuffle(self.base)
 
         # Send local receivers globally
-        self._comm.Allreduce(mpi.IN_PLACE,receivers,op=mpi.MAX)
+        self._gather_nodes(receivers, mpi.MAX)
         self.receivers = receivers
         self.localbase = numpy.array_split(self.base, self._size)[self._rank]
         self.ordered_node_array_filled()
@@ -493,6 +800,8 @@ class flowNetwork:
         self._comm.Allgatherv(sendbuf=[self.localstack, mpi.INT],
                         recvbuf=[globalstack, (stackNbs, None), mpi.INT])
         self.stack = globalstack
+        self.stackNbs = stackNbs
+        self._rcvStack = None
 
         return
 
@@ -508,8 +817,11 @@ class flowNetwork:
 
         # Get basin starting IDs for each local partition
         cumbase = numpy.zeros(size+1)
+        isbase = self.receivers[self.stack] == self.stack
+        start = 0
         for i in range(size):
-            cumbase[i+1] = len(numpy.array_split(self.base, size)[i])+cumbase[i]+1
+            cumbase[i+1] = isbase[start:start+self.stackNbs[i]].sum()+cumbase[i]+1
+            start += self.stackNbs[i]
 
         # Compute discharge using libUtils
         chi, basinID = FLOWalgo.flowcompute.parameters(self.localstack,self.receivers,
@@ -576,6 +888,33 @@ class flowNetwork:
             self.pitDrain = -numpy.ones(len(pitID))
             self.allDrain = -numpy.ones(len(pitID))
 
+    def _stream_power(self, Acell, elev, fillH, dt, eroCoeff, actlay, rivqs, sealevel, perc_dep, slp_cr):
+        """
+        Computes the stream power law erosion/deposition volumes and the sediment loads. With the
+        implicit solver, detachment-limited erosion is solved implicitly along the stack (which is
+        unconditionally stable) before being routed with the deposition rules of the explicit kernel.
+        """
+
+        impero = self.buffers.zeros('impero', len(elev))
+        if self.implicit:
+            if len(eroCoeff.shape) == 1 or eroCoeff.shape[1] == 1:
+                kero = eroCoeff.reshape(len(elev))
+            else:
+                # Average erodibility of the rocks present in the active layer
+                totlay = numpy.sum(actlay,axis=1)
+                totlay[totlay<=0.] = 1.
+                kero = numpy.sum(eroCoeff*actlay,axis=1)/totlay
+            impero = FLOWalgo.flowcompute.implicitspl(self.localstack,self.receivers,self.xycoords,
+                                                      self.discharge,fillH,elev,kero,sealevel,dt)
+
+        cdepo, cero, sedload = FLOWalgo.flowcompute.streampower(self.localstack,self.receivers,self.pitID, \
+                 self.pitVolume,self.pitDrain,self.xycoords,Acell,self.maxh,self.maxdep,self.discharge,fillH, \
+                 elev,rivqs,eroCoeff,actlay,perc_dep,slp_cr,sealevel,dt,self.borders,int(self.implicit),impero)
+        self._comm.Allreduce(mpi.IN_PLACE,cdepo,op=mpi.MAX)
+        self._comm.Allreduce(mpi.IN_PLACE,cero,op=mpi.MIN)
+
+        return cdepo, cero, sedload
+
     def compute_sedflux(self, Acell, elev, rain, fillH, dt, actlay, rockCk, rivqs,
         sealevel, perc_dep, slp_cr, ngbh, verbose=False):
         """
@@ -626,9 +965,9 @@ class flowNetwork:
         newdt = numpy.copy(dt)
 
         if actlay is None:
-            sedflux = numpy.zeros((len(elev),1))
+            sedflux = self.buffers.zeros('sedflux', (len(elev),1))
         else:
-            sedflux = numpy.zeros((len(elev),len(rockCk)))
+            sedflux = self.buffers.zeros('sedflux', (len(elev),len(rockCk)))
 
         # Compute sediment flux using libUtils
         # Stream power law
@@ -643,21 +982,18 @@ class flowNetwork:
                     rp = numpy.power(rain,self.mp).reshape((len(elev),1))
                     eroCoeff = rockCk * rp
                 else:
-                    eroCoeff = self.erodibility*numpy.power(rain,self.mp)
-                    eroCoeff.reshape((len(elev),1))
+                    eroCoeff = numpy.power(rain, self.mp, out=self.buffers.get('erocoeff', len(elev)))
+                    eroCoeff *= self.erodibility
             else:
                 if self.straTIN == 1:
                     eroCoeff = numpy.tile(rockCk,(len(elev),1))
                 else:
                     eroCoeff = self.erodibility.reshape((len(elev),1))
             if actlay is None:
-                actlay = numpy.zeros((len(elev),1))
+                actlay = self.buffers.zeros('actlay', (len(elev),1))
 
-            cdepo, cero, sedload = FLOWalgo.flowcompute.streampower(self.localstack,self.receivers,self.pitID, \
-                     self.pitVolume,self.pitDrain,self.xycoords,Acell,self.maxh,self.maxdep,self.discharge,fillH, \
-                     elev,rivqs,eroCoeff,actlay,perc_dep,slp_cr,sealevel,newdt,self.borders)
-            comm.Allreduce(mpi.IN_PLACE,cdepo,op=mpi.MAX)
-            comm.Allreduce(mpi.IN_PLACE,cero,op=mpi.MIN)
+            cdepo, cero, sedload = self._stream_power(Acell, elev, fillH, newdt, eroCoeff, actlay, rivqs,
+                                                      sealevel, perc_dep, slp_cr)
 
             if self.depo == 0:
                 volChange = cero
@@ -674,7 +1010,7 @@ class flowNetwork:
             if nb1>0 and nb2>0:
                 ids = id1[:nb1]
                 intID = id2[:nb2]
-                search = self.domain.contains_points(self.xycoords[intID])
+                search = self.domain[intID]
                 # For all these closed basins find the ones overfilled
                 if len(search) > 0:
                     overfilled = numpy.intersect1d(intID[search],ids)
@@ -693,11 +1029,8 @@ class flowNetwork:
                 time1 = time.clock()
 
             if newdt < dt:
-                cdepo, cero, sedload = FLOWalgo.flowcompute.streampower(self.localstack,self.receivers,self.pitID, \
-                        self.pitVolume,self.pitDrain,self.xycoords,Acell,self.maxh,self.maxdep,self.discharge,fillH, \
-                        elev,rivqs,eroCoeff,actlay,perc_dep,slp_cr,sealevel,newdt,self.borders)
-                comm.Allreduce(mpi.IN_PLACE,cdepo,op=mpi.MAX)
-                comm.Allreduce(mpi.IN_PLACE,cero,op=mpi.MIN)
+                cdepo, cero, sedload = self._stream_power(Acell, elev, fillH, newdt, eroCoeff, actlay, rivqs,
+                                                          sealevel, perc_dep, slp_cr)
                 volChange = cdepo+cero
                 if rank==0 and verbose:
                     print "   - Compute volumetric fluxes with updated dt ", time.clock() - time1
@@ -707,7 +1040,7 @@ class flowNetwork:
                     # Ensure no overfilling remains
                     tmpChange = numpy.sum(volChange,axis=1)
                     ids = numpy.where(numpy.logical_and(tmpChange>self.pitVolume,self.pitVolume>0.))[0]
-                    search = self.domain.contains_points(self.xycoords[intID])
+                    search = self.domain[intID]
                     if (len(search)>0) and (len(ids)>0):
                         overfilled = numpy.intersect1d(intID[search],ids)
                         if len(overfilled) > 0:
@@ -719,7 +1052,7 @@ class flowNetwork:
             self.sedload = sedld/(newdt*3.154e7)
 
             # Compute erosion
-            erosion = numpy.zeros(cero.shape)
+            erosion = self.buffers.zeros('erosion', cero.shape)
             erosion[self.insideIDs,:] = cero[self.insideIDs,:]/Acell[self.insideIDs].reshape(len(self.insideIDs),1)
             if rank==0 and verbose:
                 print "   - Compute erosion ", time.clock() - time1
@@ -728,11 +1061,11 @@ class flowNetwork:
             # Compute deposition
             if self.depo == 0:
                 # Purely erosive case
-                deposition = numpy.zeros(cdepo.shape)
+                deposition = self.buffers.zeros('deposition', cdepo.shape)
             else:
-                depo = numpy.zeros(cdepo.shape)
+                depo = self.buffers.zeros('depo', cdepo.shape)
                 depo[self.insideIDs,:] = cdepo[self.insideIDs,:]
-                deposition = numpy.zeros(depo.shape)
+                deposition = self.buffers.zeros('deposition', depo.shape)
 
                 # Compute alluvial plain deposition
                 plainid,landid,seaid,perc,nplain,nland,nsea,ndepo = FLOWalgo.flowcompute.getids(fillH,elev,depo,
@@ -749,16 +1082,20 @@ class flowNetwork:
                 # Compute land pit deposition
                 if nland > 0:
                     landIDs = landid[:nland]
-                    for p in range(len(landIDs)):
-                        tmp = numpy.where(self.pitID==landIDs[p])[0]
-
-                        if len(tmp) == 1:
-                            deposition[tmp,:] = (fillH[tmp]-elev[tmp])*perc[landIDs[p],:]
-                        else:
-                            deposition[tmp,:] = (fillH[tmp]-elev[tmp]).reshape(len(tmp),1)*perc[landIDs[p],:]
-                        tmpd = numpy.sum(deposition[tmp,:]*Acell[tmp].reshape(len(Acell[tmp]),1))
-                        dfrac = numpy.sum(depo[landIDs[p],:])/tmpd
-                        deposition[tmp,:] *= dfrac
+                    # Group the nodes of all land pits at once (pitID is -1 outside depressions)
+                    landPit = self.buffers.zeros('landpit', len(elev)+1, dtype=bool)
+                    landPit[landIDs] = True
+                    tmp = numpy.where(landPit[self.pitID])[0]
+                    pits = self.pitID[tmp]
+
+                    # Fill each pit proportionally to its water depth and scale the deposits
+                    # to the volume of sediment reaching the pit
+                    deposition[tmp,:] = (fillH[tmp]-elev[tmp]).reshape(len(tmp),1)*perc[pits,:]
+                    tmpd = numpy.bincount(pits,weights=numpy.sum(deposition[tmp,:],axis=1)*Acell[tmp],
+                                          minlength=len(elev))
+                    dfrac = self.buffers.zeros('dfrac', len(elev))
+                    dfrac[landIDs] = numpy.sum(depo[landIDs,:],axis=1)/tmpd[landIDs]
+                    deposition[tmp,:] *= dfrac[pits].reshape(len(tmp),1)
 
                     depo[landIDs,:] = 0.
                     if rank==0 and verbose:
@@ -769,7 +1106,7 @@ class flowNetwork:
                 if nsea > 0:
                     # Distribute marine sediments based on angle of repose
                     seaIDs = seaid[:nsea]
-                    seavol = numpy.zeros(depo.shape)
+                    seavol = self.buffers.zeros('seavol', depo.shape)
                     seavol[seaIDs,:] = depo[seaIDs,:]
                     seadep = PDalgo.pdstack.marine_distribution(elev, seavol, sealevel, self.borders, seaIDs)
                     deposition += seadep
@@ -877,6 +1214,11 @@ class flowNetwork:
             Numpy integer-type array containing for local nodes their global IDs.
         """
 
+        # The implicit solver is unconditionally stable
+        if self.implicit:
+            self.CFL = 1.e6
+            return
+
         # Initialise MPI communications
         comm = mpi.COMM_WORLD
         rank = comm.Get_rank()
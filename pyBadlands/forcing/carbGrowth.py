@@ -21,7 +21,6 @@ from scipy.ndimage.filters import gaussian_filter
 from scipy import interpolate
 from scipy.spatial import cKDTree
 from collections import OrderedDict
-from matplotlib import contour as cntr
 
 class carbGrowth:
     """
@@ -306,6 +305,9 @@ class carbGrowth:
             Water level defined in the input.
         """
 
+        # Imported here so that loading the model does not load the plotting libraries
+        from matplotlib import contour as cntr
+
         c = cntr.Cntr(self.xi, self.yi, z)
         contour = c.trace(lvl)
 
@@ -12,14 +12,57 @@ processes related to climate, tectonic and sea level.
 """
 import os
 import numpy
+import collections
 import pandas
 import triangle
 import mpi4py.MPI as mpi
 from pyBadlands.libUtils import ORmodel
+from pyBadlands.surface import elevationTIN
+from pyBadlands.simulation.workBuffers import workBuffers
 from scipy.ndimage.filters import gaussian_filter
 from scipy import interpolate
+from scipy import sparse
 from scipy.spatial import cKDTree
 
+# Forcing maps read from their files, shared by all the models of a process. The least recently
+# used maps are evicted when the cached maps exceed MAPS_NBYTES.
+MAPS_NBYTES = 512*1024**2
+_maps = collections.OrderedDict()
+
+def read_map(filename):
+    """
+    Read a regular grid forcing map (rain or displacements) once per process.
+
+    Parameters
+    ----------
+    filename : string
+        Path to the forcing map file.
+
+    Returns
+    -------
+    values
+        Read-only numpy array containing the map values in the file order.
+    """
+
+    filename = str(filename)
+    path = os.path.abspath(filename)
+    mtime = os.path.getmtime(filename)
+    cached = _maps.pop(path, None)
+    if cached is not None and cached[0] == mtime:
+        values = cached[1]
+    else:
+        values = pandas.read_csv(filename, sep=r'\s+', engine='c', header=None, na_filter=False,
+                                 dtype=numpy.float, low_memory=False).values
+        values.setflags(write=False)
+    _maps[path] = (mtime, values)
+
+    # Evict the least recently used maps, the requested one is always kept
+    nbytes = sum(item[1].nbytes for item in _maps.values())
+    while nbytes > MAPS_NBYTES and len(_maps) > 1:
+        nbytes -= _maps.popitem(last=False)[1][1].nbytes
+
+    return values
+
 class forceSim:
     """
     This class defines external forcing parameters.
@@ -124,6 +167,8 @@ class forceSim:
         self.xyi = numpy.dstack([self.xi.flatten(), self.yi.flatten()])[0]
         self.tree = None
         self.dx = None
+        self.tinOp = None
+        self.tinIDs = None
 
         self.rivNb = rivNb
         self.rivPos = rivPos
@@ -133,6 +178,7 @@ class forceSim:
         self.rivQs = None
         self.rivQw = None
         self.rockNb = rockNb
+        self.buffers = workBuffers()
 
         self.Map_rain = MapRain
         self.rainVal = ValRain
@@ -192,6 +238,8 @@ class forceSim:
         if self.seafile != None:
             self._build_Sea_function()
 
+        self._preload_maps()
+
     def average_wave(self):
         """
         Compute average wave height.
@@ -208,6 +256,70 @@ class forceSim:
 
         return
 
+    def _preload_maps(self):
+        """
+        Read all the rain and displacements maps of the simulation, so that loading an event
+        does not parse its file again.
+        """
+
+        for maps in [self.Map_rain, self.Map_disp]:
+            if maps is None:
+                continue
+            for filename in maps:
+                if filename != None:
+                    read_map(filename)
+
+        return
+
+    def _interpolation_operator(self, xy):
+        """
+        Build the sparse bilinear interpolation operator from the regular grid to a set of points.
+
+        Parameters
+        ----------
+        xy
+            Numpy float-type array containing the points XY coordinates.
+
+        Returns
+        -------
+        operator
+            Sparse matrix interpolating the regular grid values (ordered along X first, as in the
+            forcing maps files) on the points.
+        """
+
+        # Points outside the regular grid are rejected, as with interpolate.interpn
+        outside = (xy[:,0] < self.regX[0]) | (xy[:,0] > self.regX[-1]) | \
+                  (xy[:,1] < self.regY[0]) | (xy[:,1] > self.regY[-1])
+        if outside.any():
+            raise ValueError('One of the requested points is out of the forcing maps regular grid.')
+
+        nx = len(self.regX)
+        ny = len(self.regY)
+        i = numpy.searchsorted(self.regX, xy[:,0], side='right') - 1
+        j = numpy.searchsorted(self.regY, xy[:,1], side='right') - 1
+        i = i.clip(0, nx-2)
+        j = j.clip(0, ny-2)
+        tx = ((xy[:,0] - self.regX[i])/(self.regX[i+1] - self.regX[i])).clip(0., 1.)
+        ty = ((xy[:,1] - self.regY[j])/(self.regY[j+1] - self.regY[j])).clip(0., 1.)
+
+        rows = numpy.tile(numpy.arange(len(xy)), 4)
+        cols = numpy.concatenate((i + j*nx, i+1 + j*nx, i + (j+1)*nx, i+1 + (j+1)*nx))
+        weights = numpy.concatenate(((1.-tx)*(1.-ty), tx*(1.-ty), (1.-tx)*ty, tx*ty))
+
+        return sparse.csr_matrix((weights, (rows, cols)), shape=(len(xy), nx*ny))
+
+    def _tin_operator(self, inIDs):
+        """
+        Get the interpolation operator from the regular grid to the given TIN nodes. It is only
+        rebuilt when the nodes or the TIN change.
+        """
+
+        if self.tinOp is None or not numpy.array_equal(self.tinIDs, inIDs):
+            self.tinOp = self._interpolation_operator(self.tXY[inIDs,:])
+            self.tinIDs = numpy.copy(inIDs)
+
+        return self.tinOp
+
     def _build_Sea_function(self):
         """
         Using Pandas library to read the sea level file and define sea level interpolation
@@ -263,11 +375,8 @@ class forceSim:
             Numpy array containing sediment discharge from rivers.
         """
 
-        self.rivQw = numpy.zeros(len(self.tXY))
-        if self.rockNb == 0:
-            self.rivQs = numpy.zeros((len(self.tXY),1))
-        else:
-            self.rivQs = numpy.zeros((len(self.tXY),self.rockNb))
+        self.rivQw = self.buffers.zeros('rivQw', len(self.tXY))
+        self.rivQs = self.buffers.zeros('rivQs', (len(self.tXY),max(self.rockNb,1)))
 
         if self.rivNb > 0:
             active = numpy.where(numpy.logical_and(self.rivTime[:,0] <= time, self.rivTime[:,1] > time))[0]
@@ -292,6 +401,7 @@ class forceSim:
             Numpy float-type array containing the coordinates for each nodes in the TIN (in m2)
         """
         self.tXY = tXY
+        self.tinOp = None
         self.tree = cKDTree(self.tXY)
         self.dx = self.tXY[1,0] - self.tXY[0,0]
 
@@ -337,11 +447,8 @@ class forceSim:
             tinRain = self.rainVal[event]
             self.next_rain = self.T_rain[event,1]
         else:
-            rainMap = pandas.read_csv(str(self.Map_rain[event]), sep=r'\s+', engine='c',
-                               header=None, na_filter=False, dtype=numpy.float, low_memory=False)
-
-            rectRain = numpy.reshape(rainMap.values,(len(self.regX), len(self.regY)),order='F')
-            tinRain = interpolate.interpn( (self.regX, self.regY), rectRain, self.tXY[inIDs,:], method='linear')
+            rainMap = read_map(self.Map_rain[event])
+            tinRain = self._tin_operator(inIDs).dot(numpy.ravel(rainMap, order='F'))
             self.next_rain = self.T_rain[event,1]
 
         return tinRain
@@ -393,11 +500,11 @@ class forceSim:
         smthRain = gaussian_filter(rectRain, sigma=3)
 
         # Interpolate
-        tinRain = interpolate.interpn( (self.regX, self.regY), smthRain, self.tXY[inIDs,:], method='linear')
+        tinRain = self._tin_operator(inIDs).dot(smthRain.ravel(order='F'))
 
         return tinRain
 
-    def disp_border(self, disp, neighbours, edge_length, boundPts):
+    def disp_border(self, disp, neighbours, edge_length, boundPts, parents=None):
         """
         This function defines the displacement of the TIN edges.
 
@@ -415,38 +522,22 @@ class forceSim:
         boundPts
             Number of nodes on the edges of the TIN surface.
 
+        parents
+            Dictionary of boundary parents of the mesh (see elevationTIN.boundary_parents),
+            computed when not given.
+
         Returns
         -------
         disps
             Numpy array containing the updated displacements on the edges.
         """
 
-        disp[:boundPts] = 1.e7
-        missedPts = []
-        for id in range(boundPts):
-            ngbhs = neighbours[id,:]
-            ids = numpy.where(ngbhs >= boundPts)[0]
-            if len(ids) == 1:
-                disp[id] = disp[ngbhs[ids]]
-            elif len(ids) > 1:
-                lselect = edge_length[id,ids]
-                picked = numpy.argmin(lselect)
-                disp[id] = disp[ngbhs[ids[picked]]]
-            else:
-                missedPts = numpy.append(missedPts,id)
+        if parents is None:
+            parents = elevationTIN.boundary_parents(neighbours, edge_length, boundPts)
 
-        if len(missedPts) > 0 :
-            for p in range(len(missedPts)):
-                id = int(missedPts[p])
-                ngbhs = neighbours[id,:]
-                ids = numpy.where((disp[ngbhs] < 9.e6) & (ngbhs >= 0))[0]
-                if len(ids) == 0:
-                    raise ValueError('Error while getting boundary displacement for point ''%d''.' % id)
-                lselect = edge_length[id,ids]
-                picked = numpy.argmin(lselect)
-                disp[id] = disp[ngbhs[ids[picked]]]
+        disp[:boundPts] = 1.e7
 
-        return disp
+        return elevationTIN.gather_border(disp, parents, 0, 'displacement')
 
     def load_Tecto_map(self, time, inIDs):
         """
@@ -478,12 +569,9 @@ class forceSim:
             if self.injected_disps is not None:
                 dispMap = self.injected_disps
             else:
-                dispMap = pandas.read_csv(str(self.Map_disp[event]), sep=r'\s+', engine='c', header=None, na_filter=False, \
-                                   dtype=numpy.float, low_memory=False).values
+                dispMap = read_map(self.Map_disp[event])
 
-
-            rectDisp = numpy.reshape(dispMap,(len(self.regX), len(self.regY)),order='F')
-            tinDisp = interpolate.interpn( (self.regX, self.regY), rectDisp, self.tXY[inIDs,:], method='linear')
+            tinDisp = self._tin_operator(inIDs).dot(numpy.ravel(dispMap, order='F'))
             dt = (self.T_disp[event,1] - self.T_disp[event,0])
             if dt <= 0:
                 raise ValueError('Problem computing the displacements rate for event %d.'%event)
@@ -524,18 +612,17 @@ class forceSim:
         size = comm.Get_size()
 
         self.tXY = tXY
+        self.tinOp = None
         totPts = len(tXY[:,0])
         dispX = numpy.zeros(totPts, dtype=float)
         dispY = numpy.zeros(totPts, dtype=float)
         dispZ = numpy.zeros(totPts, dtype=float)
-        dpXY = tXY[inIDs,:]
 
         if strata:
             totsPts = len(sXY[:,0])
             sdispX = numpy.zeros(totsPts, dtype=float)
             sdispY = numpy.zeros(totsPts, dtype=float)
             sdispZ = numpy.zeros(totsPts, dtype=float)
-            dpsXY = sXY[insIDs,:]
 
         events = numpy.where( (self.T_disp[:,1] - time) <= 0)[0]
         event = len(events)
@@ -560,17 +647,12 @@ class forceSim:
             if self.injected_disps is not None:
                 dvals = self.injected_disps
             else:
-                disps = pandas.read_csv(str(self.Map_disp[event]), sep=r'\s+', engine='c', header=None, na_filter=False, \
-                            dtype=numpy.float, low_memory=False)
-                dvals = disps.values
-
+                dvals = read_map(self.Map_disp[event])
 
-            disprX = numpy.reshape(dvals[:,0],(len(self.regX), len(self.regY)),order='F')
-            disprY = numpy.reshape(dvals[:,1],(len(self.regX), len(self.regY)),order='F')
-            disprZ = numpy.reshape(dvals[:,2],(len(self.regX), len(self.regY)),order='F')
-            dispX[inIDs] = interpolate.interpn( (self.regX, self.regY), disprX, dpXY, method='linear')
-            dispY[inIDs] = interpolate.interpn( (self.regX, self.regY), disprY, dpXY, method='linear')
-            dispZ[inIDs] = interpolate.interpn( (self.regX, self.regY), disprZ, dpXY, method='linear')
+            tinDisps = self._tin_operator(inIDs).dot(dvals[:,:3])
+            dispX[inIDs] = tinDisps[:,0]
+            dispY[inIDs] = tinDisps[:,1]
+            dispZ[inIDs] = tinDisps[:,2]
             comm.Allreduce(mpi.IN_PLACE, dispX, op=mpi.MAX)
             comm.Allreduce(mpi.IN_PLACE, dispY, op=mpi.MAX)
             comm.Allreduce(mpi.IN_PLACE, dispZ, op=mpi.MAX)
@@ -579,8 +661,9 @@ class forceSim:
             if strata:
                 sdispX.fill(-1.e6)
                 sdispY.fill(-1.e6)
-                sdispX[insIDs] = interpolate.interpn( (self.regX, self.regY), disprX, dpsXY, method='linear')
-                sdispY[insIDs] = interpolate.interpn( (self.regX, self.regY), disprY, dpsXY, method='linear')
+                sDisps = self._interpolation_operator(sXY[insIDs,:]).dot(dvals[:,:2])
+                sdispX[insIDs] = sDisps[:,0]
+                sdispY[insIDs] = sDisps[:,1]
                 comm.Allreduce(mpi.IN_PLACE, sdispX, op=mpi.MAX)
                 comm.Allreduce(mpi.IN_PLACE, sdispY, op=mpi.MAX)
 
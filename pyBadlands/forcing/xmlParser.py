@@ -45,7 +45,13 @@ class xmlParser:
         self.fillmax = 200.
         self.Afactor = 1
         self.nopit = 0
+        self.pitfill = 'pd'
+        self.incremental = 0.
         self.udw = 0
+        self.meshcache = None
+        self.partition = 'simple'
+        self.partcost = 1.
+        self.precision = 'double'
 
         self.restart = False
         self.rForlder = None
@@ -104,6 +110,7 @@ class xmlParser:
         self.diffnb = 5
         self.diffprop = 0.9
         self.spl = False
+        self.splimplicit = False
 
         self.incisiontype = 0
         self.mp = 0.
@@ -115,6 +122,7 @@ class xmlParser:
         self.bedslptype = 0
 
         self.Hillslope = False
+        self.diffimplicit = False
         self.CDa = 0.
         self.CDm = 0.
         self.Sc = 0.
@@ -262,6 +270,22 @@ class xmlParser:
             else:
                 self.nopit = 0
             element = None
+            element = grid.find('pitfill')
+            if element is not None:
+                self.pitfill = element.text.strip()
+                if self.pitfill != 'pd' and self.pitfill != 'priority':
+                    raise ValueError('Error in the definition of the grid structure: pitfill is either: pd or priority')
+            else:
+                self.pitfill = 'pd'
+            element = None
+            element = grid.find('incremental')
+            if element is not None:
+                self.incremental = float(element.text)
+                if self.incremental < 0. or self.incremental > 1.:
+                    raise ValueError('Error in the definition of the grid structure: incremental needs to be between 0 and 1')
+            else:
+                self.incremental = 0.
+            element = None
             element = grid.find('udw')
             if element is not None:
                 self.udw = int(element.text)
@@ -271,6 +295,36 @@ class xmlParser:
                     self.udw = 1
             else:
                 self.udw = 0
+            element = None
+            element = grid.find('meshcache')
+            if element is not None:
+                self.meshcache = element.text.strip()
+            else:
+                self.meshcache = None
+            element = None
+            element = grid.find('partition')
+            if element is not None:
+                self.partition = element.text.strip()
+                if self.partition != 'simple' and self.partition != 'hilbert' and self.partition != 'morton':
+                    raise ValueError('Error in the definition of the grid structure: partition is either: simple, hilbert or morton')
+            else:
+                self.partition = 'simple'
+            element = None
+            element = grid.find('partcost')
+            if element is not None:
+                self.partcost = float(element.text)
+                if self.partcost <= 0.:
+                    raise ValueError('Error in the definition of the grid structure: partcost needs to be positive')
+            else:
+                self.partcost = 1.
+            element = None
+            element = grid.find('precision')
+            if element is not None:
+                self.precision = element.text.strip()
+                if self.precision != 'double' and self.precision != 'single':
+                    raise ValueError('Error in the definition of the grid structure: precision is either: double or single')
+            else:
+                self.precision = 'double'
         else:
             raise ValueError('Error in the XmL file: grid structure definition is required!')
 
@@ -936,6 +990,12 @@ class xmlParser:
                     raise ValueError('Proportion of marine sediment deposited on downstream nodes needs to be range between ]0,1[')
             else:
                 self.diffprop = 0.9
+            element = None
+            element = spl.find('implicit')
+            if element is not None:
+                self.splimplicit = bool(int(element.text))
+            else:
+                self.splimplicit = False
         else:
             self.depo = 0
             self.SPLm = 1.
@@ -996,6 +1056,10 @@ class xmlParser:
             else:
                 self.bedslptype = 0
 
+        # The implicit stream power solver only applies to detachment-limited erosion
+        if self.splimplicit and (self.incisiontype != 0 or self.bedslptype != 0):
+            raise ValueError('The implicit stream power law solver is only available for detachment-limited erosion without bedload function.')
+
         # Extract linear and nonlinear slope diffusion structure parameters
         creep = None
         creep = root.find('creep')
@@ -1026,6 +1090,12 @@ class xmlParser:
                 self.CDr = float(element.text)
             else:
                 self.CDr = 0.
+            element = None
+            element = creep.find('implicit')
+            if element is not None:
+                self.diffimplicit = bool(int(element.text))
+            else:
+                self.diffimplicit = False
             self.Hillslope = True
         else:
             self.CDa = 0.
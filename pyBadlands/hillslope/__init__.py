@@ -11,3 +11,4 @@
 """
 
 from .diffLinear import diffLinear
+from .diffImplicit import diffImplicit
@@ -0,0 +1,188 @@
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+##                                                                                   ##
+##  This file forms part of the Badlands surface processes modelling application.    ##
+##                                                                                   ##
+##  For full license and copyright information, please refer to the LICENSE.md file  ##
+##  located at the project root, or contact the authors.                             ##
+##                                                                                   ##
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+"""
+This module encapsulates the implicit (backward Euler) resolution of the linear diffusion
+processes: hillslope creep and diffusion of the river sediments deposited in the marine
+environment.
+
+The Finite Volume diffusion operator is assembled as a sparse matrix from the CSR neighbourhood
+of the mesh (see FVmethod.build_csr). The weight of each edge (voronoi edge length over edge
+length) is computed once per mesh and only the active edges and the diffusion coefficients are
+updated before each solve. The factorisation of each operator (hillslope and marine) is kept as
+long as the time step, the coefficients and the active edges are unchanged. Each processor solves the
+complete system, so that no communication is needed.
+"""
+
+import numpy
+from scipy import sparse
+from scipy.sparse.linalg import splu
+
+class diffImplicit:
+    """
+    Class for solving the linear diffusion equations implicitly on the Finite Volume mesh.
+
+    Parameters
+    ----------
+    offsets
+        Numpy integer-type array with the CSR neighbourhood offsets.
+
+    neighbours
+        Numpy integer-type array with the CSR neighbourhood IDs.
+
+    edges
+        Numpy real-type array with the voronoi edges length for each neighbours of the TIN nodes.
+
+    distances
+        Numpy real-type array with the distances between each connection in the TIN.
+    """
+
+    def __init__(self, offsets, neighbours, edges, distances):
+
+        self.nodes = len(offsets)-1
+        self.rows = numpy.repeat(numpy.arange(self.nodes, dtype=numpy.int32), numpy.diff(offsets))
+        self.cols = numpy.asarray(neighbours, dtype=numpy.int32)
+        self.weights = numpy.zeros(len(self.cols))
+        valid = numpy.asarray(distances) > 0.
+        self.weights[valid] = numpy.asarray(edges)[valid]/numpy.asarray(distances)[valid]
+
+        self._diag = numpy.arange(self.nodes, dtype=numpy.int32)
+        self._key = {}
+        self._lu = {}
+
+    def _factorise(self, active, coeff, dt):
+        """
+        Factorise the backward Euler operator I - dt*C*L restricted to the active edges, where L is
+        the Finite Volume diffusion operator and C the diagonal matrix of the nodal coefficients.
+        """
+
+        rows = self.rows[active]
+        flux = dt*coeff[rows]*self.weights[active]
+        diag = 1. + numpy.bincount(rows, weights=flux, minlength=self.nodes)
+
+        matrix = sparse.csc_matrix((numpy.concatenate((-flux, diag)),
+                                   (numpy.concatenate((rows, self._diag)),
+                                    numpy.concatenate((self.cols[active], self._diag)))),
+                                   shape=(self.nodes, self.nodes))
+
+        return splu(matrix)
+
+    def _solve(self, name, elev, active, coeff, dt):
+        """
+        Solve the backward Euler system of an operator (hillslope or marine) for a time step. The
+        factorisation of the operator is kept while the time step, the coefficients and the active
+        edges are unchanged.
+        """
+
+        key = self._key.get(name)
+        if key is None or key[0] != dt or not numpy.array_equal(key[1], active) \
+                or not numpy.array_equal(key[2], coeff):
+            self._lu[name] = self._factorise(active, coeff, dt)
+            self._key[name] = (dt, active, numpy.copy(coeff))
+
+        return self._lu[name].solve(elev)
+
+    def hillslope(self, elev, coeff, borders, dt):
+        """
+        Perform linear hillslope diffusion over a time step. As in the explicit scheme (sfd.diffusion),
+        the nodes flagged in borders exchange sediments with each other and lose sediments to the
+        lower border nodes.
+
+        Parameters
+        ----------
+        elev
+            Numpy arrays containing the elevation of the TIN nodes.
+
+        coeff
+            Numpy arrays containing the diffusion coefficient of each node divided by its voronoi area.
+
+        borders
+            Numpy integer-type array flagging the nodes inside the diffusion domain.
+
+        dt
+            Time step.
+
+        Returns
+        -------
+        cdiff
+            Numpy array containing the elevation change of each node.
+        """
+
+        inside = borders > 0
+        active = inside[self.rows] & (self.weights > 0.) & (coeff[self.rows] > 0.)
+        active &= inside[self.cols] | (elev[self.cols] < elev[self.rows])
+
+        return self._solve('hillslope', elev, active, coeff, dt) - elev
+
+    def marine(self, elev, depoH, coeff, borders, seal, maxth, tstep, halvings=4):
+        """
+        Perform the diffusion of the river sediments deposited in the marine environment.
+        The active edges follow the rules of the explicit scheme (FLOWalgo.diffmarine) evaluated at
+        the beginning of the step. The complete remaining time is diffused in a single solve, the
+        step being halved (at most halvings times) while a node would diffuse more sediment than it
+        has deposited. The losses of the last step are then limited to the deposits.
+
+        Parameters
+        ----------
+        elev
+            Numpy arrays containing the elevation of the TIN nodes.
+
+        depoH
+            Numpy arrays containing the deposited thickness of each node.
+
+        coeff
+            Numpy arrays containing the marine diffusion coefficient of each node divided by its
+            voronoi area.
+
+        borders
+            Numpy integer-type array flagging the nodes inside the simulation domain.
+
+        seal
+            Sea level.
+
+        maxth
+            Minimum deposited thickness which is diffused.
+
+        tstep
+            Remaining diffusion time.
+
+        halvings
+            Maximum number of step halvings.
+
+        Returns
+        -------
+        diff
+            Numpy array containing the elevation change of each node.
+
+        step
+            Diffusion step performed.
+        """
+
+        rows = self.rows
+        cols = self.cols
+        inside = borders > 0
+        depo = depoH > maxth
+        zr = elev[rows]
+        zc = elev[cols]
+
+        # Sediments leave deposited nodes downhill and enter marine nodes from upper deposited ones
+        active = inside[rows] & (zr < seal) & (self.weights > 0.) & (coeff[rows] > 0.)
+        give = depo[rows] & (zr > zc)
+        receive = inside[cols] & depo[cols] & (zr < zc) & (zc < seal)
+        active &= give | receive
+
+        step = tstep
+        for k in range(halvings+1):
+            diff = self._solve('marine', elev, active, coeff, step) - elev
+            if k == halvings or not numpy.any(diff < -depoH):
+                break
+            step *= 0.5
+
+        diff = numpy.maximum(diff, -depoH)
+
+        return diff, step
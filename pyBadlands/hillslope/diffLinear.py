@@ -36,6 +36,8 @@ class diffLinear:
         self.ids = None
         self.Sc = 0.
         self.updatedt = 0
+        self.implicit = False
+        self.solver = None
 
     def dt_stability(self, edgelen):
         """
@@ -62,9 +64,9 @@ class diffLinear:
         edgedist = edgelen.flatten()
         distIDs = numpy.where(edgedist > 0.)
 
-        # First-order, forward-in-time scheme
+        # First-order, forward-in-time scheme (the implicit scheme is unconditionally stable)
         CFL = numpy.zeros(1)
-        if maxCD > 0.:
+        if maxCD > 0. and not self.implicit:
             CFL[0] = 0.05*numpy.amin(edgedist[distIDs]**2)/maxCD
         else:
             CFL[0] = 1.e6
@@ -74,7 +76,7 @@ class diffLinear:
         self.CFL = CFL[0]
         self.updatedt = 1
 
-    def dt_stabilityCs(self, elev, neighbours, distances, globalIDs, borders):
+    def dt_stabilityCs(self, elev, neighbours, distances, globalIDs, borders, offsets=None):
         """
         This function computes the maximal timestep to ensure computation stability
         of the non-linear hillslope processes. This CFL-like condition is computed
@@ -87,6 +89,10 @@ class diffLinear:
 
         elevation
             Numpy arrays containing the edges of the TIN surface for the considered partition.
+
+        offsets
+            Numpy integer-type array with the CSR neighbourhood offsets. When given, neighbours and
+            distances are the flat CSR arrays of the Finite Volume mesh.
         """
 
         # Initialise MPI communications
@@ -103,7 +109,10 @@ class diffLinear:
             Sc[0] = self.Sc
             mCD = numpy.zeros(1)
             mCD[0] = maxCD
-            CFL = sfd.diffnlcfl(Sc, mCD, elev, borders, neighbours, distances, globalIDs)
+            if offsets is not None:
+                CFL = sfd.diffnlcfl_csr(Sc, mCD, elev, borders, offsets, neighbours, distances, globalIDs)
+            else:
+                CFL = sfd.diffnlcfl(Sc, mCD, elev, borders, neighbours, distances, globalIDs)
         else:
             CFL[0] = 1.e6
 
@@ -10,6 +10,8 @@
 ! This module implements flow parameters computation.
 module flowcompute
 
+  !$ use omp_lib
+
   implicit none
 
   integer :: incisiontype
@@ -50,6 +52,28 @@ contains
 
   end subroutine eroparams
 
+  subroutine setthreads(nb)
+
+    ! Number of OpenMP threads used by the kernels (no effect without OpenMP)
+    integer,intent(in) :: nb
+
+    !$ if(nb > 0) call omp_set_num_threads(nb)
+
+    return
+
+  end subroutine setthreads
+
+  subroutine getthreads(nb)
+
+    integer,intent(out) :: nb
+
+    nb = 1
+    !$ nb = omp_get_max_threads()
+
+    return
+
+  end subroutine getthreads
+
   subroutine discharge(pyStack, pyRcv, pyElev, pyDischarge, pyDis, pyLay, pylNodesNb, pygNodesNb)
 
       integer :: pygNodesNb
@@ -314,6 +338,7 @@ contains
       real(kind=8) :: dz, tmp, dist
 
       cfl_dt = 1.e6
+      !$omp parallel do private(d, r, dz, tmp, dist) reduction(min:cfl_dt)
       do p = 1, pylNodesNb
         d = pyIDs(p) + 1
         r = pyRcv(d) + 1
@@ -324,11 +349,88 @@ contains
             cfl_dt = min(tmp,cfl_dt)
         endif
       enddo
+      !$omp end parallel do
 
       return
 
   end subroutine flowcfl
 
+  subroutine implicitspl(pyStack, pyRcv, pyXY, pyDischarge, pyFillH, pyElev, Cero, sea, dt, &
+      pyEro, pylNodesNb, pygNodesNb)
+
+      integer :: pylNodesNb
+      integer :: pygNodesNb
+      real(kind=8),intent(in) :: dt
+      real(kind=8),intent(in) :: sea
+      integer,dimension(pylNodesNb),intent(in) :: pyStack
+      integer,dimension(pygNodesNb),intent(in) :: pyRcv
+      real(kind=8),dimension(pygNodesNb,2),intent(in) :: pyXY
+      real(kind=8),dimension(pygNodesNb),intent(in) :: pyDischarge
+      real(kind=8),dimension(pygNodesNb),intent(in) :: pyFillH
+      real(kind=8),dimension(pygNodesNb),intent(in) :: pyElev
+      real(kind=8),dimension(pygNodesNb),intent(in) :: Cero
+
+      real(kind=8),dimension(pygNodesNb),intent(out) :: pyEro
+
+      integer :: n, k, donor, recvr
+      real(kind=8) :: h0, h, hn, zr, lo, hi, dist, fct, f, df
+      real(kind=8),dimension(pygNodesNb) :: newZ
+
+      pyEro = 0.
+      newZ = pyElev
+
+      ! Detachment-limited erosion solved implicitly from the base levels upstream
+      ! (Braun & Willett, 2013), receivers being updated before their donors
+      do n = 1, pylNodesNb
+        donor = pyStack(n) + 1
+        recvr = pyRcv(donor) + 1
+        if(donor == recvr) cycle
+
+        ! Only nodes eroded by the explicit scheme: no depression and above sea
+        h0 = pyElev(donor)
+        if(pyFillH(donor)-h0 /= 0. .or. pyFillH(donor) < sea) cycle
+        zr = max(newZ(recvr),sea)
+        if(0.95*(h0-max(pyElev(recvr),sea)) < 0.001) cycle
+
+        dist = sqrt( (pyXY(donor,1)-pyXY(recvr,1))**2.0 + (pyXY(donor,2)-pyXY(recvr,2))**2.0 )
+        if(dist <= 0. .or. h0 <= zr) cycle
+        fct = Cero(donor) * pyDischarge(donor)**spl_m * dt / dist**spl_n
+        if(fct <= 0.) cycle
+
+        if(spl_n == 1.)then
+          h = (h0 + fct*zr)/(1. + fct)
+        else
+          ! Newton iterations on h - h0 + fct*(h-zr)**n = 0 with the root bracketed in [zr,h0]
+          lo = zr
+          hi = h0
+          h = h0
+          do k = 1, 50
+            f = h - h0 + fct*(h-zr)**spl_n
+            if(f > 0.)then
+              hi = h
+            else
+              lo = h
+            endif
+            df = 1. + fct*spl_n*(h-zr)**(spl_n-1.)
+            hn = h - f/df
+            ! Fall back to bisection when the Newton update leaves the bracket
+            if(hn <= lo .or. hn >= hi) hn = 0.5*(lo+hi)
+            if(abs(hn-h) < 1.e-8)then
+              h = hn
+              exit
+            endif
+            h = hn
+          enddo
+        endif
+
+        newZ(donor) = h
+        pyEro(donor) = h0 - h
+      enddo
+
+      return
+
+  end subroutine implicitspl
+
   subroutine diffmarine(pyZ, pyBord, pyDepoH, pyNgbs, pyEdge, pyDist, pyCoeff, pyGIDs, &
                         slvl, pymaxth, tstep, pyDiff, mindt, pylocalNb, pyglobalNb)
 
@@ -355,6 +457,7 @@ contains
 
       pyDiff = 0.
       mindt = tstep
+      !$omp parallel do private(gid, ngbid, p, flx) reduction(min:mindt)
       do k = 1, pylocalNb
         gid = pyGIDs(k)+1
         if(pyBord(gid)>0 .and. pyZ(gid)<slvl)then
@@ -382,11 +485,74 @@ contains
           endif
         endif
       enddo
+      !$omp end parallel do
 
       return
 
   end subroutine diffmarine
 
+  subroutine diffmarinecsr(pyZ, pyBord, pyDepoH, pyOffsets, pyNgbs, pyEdge, pyDist, pyCoeff, pyGIDs, &
+                        slvl, pymaxth, tstep, pyDiff, mindt, pylocalNb, pyglobalNb, pyedgeNb)
+
+      ! Same as diffmarine using the compressed sparse row neighbourhood layout
+      integer :: pyglobalNb
+      integer :: pylocalNb
+      integer :: pyedgeNb
+      integer,dimension(pylocalNb),intent(in) :: pyGIDs
+      integer,dimension(pyglobalNb),intent(in) :: pyBord
+      integer,dimension(pyglobalNb+1),intent(in) :: pyOffsets
+      integer,dimension(pyedgeNb),intent(in) :: pyNgbs
+
+      real(kind=8),intent(in) :: slvl
+      real(kind=8),intent(in) :: pymaxth
+      real(kind=8),intent(in) :: tstep
+      real(kind=8),dimension(pyglobalNb),intent(in) :: pyZ
+      real(kind=8),dimension(pyglobalNb),intent(in) :: pyCoeff
+      real(kind=8),dimension(pyglobalNb),intent(in) :: pyDepoH
+      real(kind=8),dimension(pyedgeNb),intent(in) :: pyEdge
+      real(kind=8),dimension(pyedgeNb),intent(in) :: pyDist
+
+      real(kind=8),intent(out) :: mindt
+      real(kind=8),dimension(pyglobalNb),intent(out) :: pyDiff
+
+      integer :: k, gid, ngbid, p
+      real(kind=8) :: flx
+
+      pyDiff = 0.
+      mindt = tstep
+      !$omp parallel do private(gid, ngbid, p, flx) reduction(min:mindt)
+      do k = 1, pylocalNb
+        gid = pyGIDs(k)+1
+        if(pyBord(gid)>0 .and. pyZ(gid)<slvl)then
+          do p = pyOffsets(gid)+1, pyOffsets(gid+1)
+            ngbid = pyNgbs(p)+1
+            if(pyBord(ngbid)>0.)then
+              flx = pyEdge(p)*(pyZ(ngbid)-pyZ(gid))/pyDist(p)
+              if(pyDepoH(gid)>pymaxth .and. pyZ(gid)>pyZ(ngbid))then
+                pyDiff(gid) = pyDiff(gid) + pyCoeff(gid)*flx
+              elseif(pyDepoH(ngbid)>pymaxth .and. pyZ(gid)<pyZ(ngbid) .and. pyZ(ngbid)<slvl)then
+                pyDiff(gid) = pyDiff(gid) + pyCoeff(gid)*flx
+              endif
+            elseif(pyBord(ngbid)<1)then
+              if(pyDepoH(gid)>pymaxth .and. pyZ(gid)>pyZ(ngbid))then
+                flx = pyEdge(p)*(pyZ(ngbid)-pyZ(gid))/pyDist(p)
+                pyDiff(gid) = pyDiff(gid) + pyCoeff(gid)*flx
+              endif
+            endif
+          enddo
+          ! In case we diffuse more sediment than what is available during the
+          ! considered time step, flag it
+          if(pyDiff(gid)<0. .and. pyDiff(gid)*tstep<-pyDepoH(gid))then
+            mindt = min(-pyDepoH(gid)/pyDiff(gid),mindt)
+          endif
+        endif
+      enddo
+      !$omp end parallel do
+
+      return
+
+  end subroutine diffmarinecsr
+
   subroutine diffsedmarine(pyZ, pyBord, pyDepo, pyDepoH, slvl, pymaxth, pyCoeff, pyNgbs, pyEdge, &
                           pyDist, pyGIDs, pyDiff, sumDiff, pylocalNb, pyglobalNb, pyRockNb)
 
@@ -415,6 +581,7 @@ contains
       pyDiff = 0.
       sumDiff = 0.
 
+      !$omp parallel do private(gid, ngbid, p, r, flx, frac, sfrac, tfrac, sed, tsed)
       do k = 1, pylocalNb
         gid = pyGIDs(k)+1
         if(pyBord(gid)>0 .and. pyZ(gid)<slvl)then
@@ -476,6 +643,7 @@ contains
           enddo loop
         endif
       enddo
+      !$omp end parallel do
 
       return
 
@@ -509,6 +677,7 @@ contains
       depo = 0.
       sumDiff = 0.
 
+      !$omp parallel do private(gid, ngbid, p, r, flx, frac, sfrac, tfrac, sed, tsed)
       do k = 1, pylocalNb
         gid = pyGIDs(k)+1
         if(pyBord(gid)>0)then
@@ -575,6 +744,7 @@ contains
           enddo loop
         endif
       enddo
+      !$omp end parallel do
 
       return
 
@@ -582,7 +752,7 @@ contains
 
   subroutine streampower(pyStack, pyRcv, pitID, pitVol1, pitDrain, pyXY, pyArea, pyMaxH, &
       pyMaxD, pyDischarge, pyFillH, pyElev, pyRiv, Cero, actlay, perc_dep, slp_cr, sea, dt, &
-      borders, pyDepo, pyEro, sedFluxes, pylNodesNb, pygNodesNb, pyRockNb)
+      borders, impl, pyImpEro, pyDepo, pyEro, sedFluxes, pylNodesNb, pygNodesNb, pyRockNb)
 
       integer :: pylNodesNb
       integer :: pygNodesNb
@@ -594,8 +764,10 @@ contains
       integer,dimension(pylNodesNb),intent(in) :: pyStack
       integer,dimension(pygNodesNb),intent(in) :: pyRcv
       integer,dimension(pygNodesNb),intent(in) :: pitID
+      integer,intent(in) :: impl
       integer,dimension(pygNodesNb),intent(in) :: borders
       integer,dimension(pygNodesNb),intent(in) :: pitDrain
+      real(kind=8),dimension(pygNodesNb),intent(in) :: pyImpEro
       real(kind=8),dimension(pygNodesNb,2),intent(in) :: pyXY
       real(kind=8),dimension(pygNodesNb),intent(in) :: pyArea
       real(kind=8),dimension(pygNodesNb),intent(in) :: pyDischarge
@@ -612,12 +784,14 @@ contains
       real(kind=8),dimension(pygNodesNb,pyRockNb),intent(out) :: pyEro
       real(kind=8),dimension(pygNodesNb,pyRockNb),intent(out) :: sedFluxes
 
-      integer :: n, donor, recvr, nID, tmpID, r
+      integer :: n, donor, recvr, nID, tmpID, r, b, nbasin
       real(kind=8) :: maxh, dh, waterH, fct, Qt, totflx, totspl, newdist
       real(kind=8) :: dist, slp, slpdh, updh, tmpdist, totdist, width, frac, upperslp, bedfrac
       real(kind=8),dimension(pyRockNb) :: SPL, Qs, Qb, frck, erodep, pitDep
       real(kind=8),dimension(pygNodesNb) :: upZ, updist, pitVol
       real(kind=8),dimension(pygNodesNb,pyRockNb) :: bedFluxes
+      integer,dimension(pylNodesNb+1) :: basinStart
+      integer,dimension(pygNodesNb) :: basin
 
       pyDepo = 0.
       pyEro = 0.
@@ -627,7 +801,37 @@ contains
       upZ = 1.e6
       updist = 0.
 
-      do n = pylNodesNb, 1, -1
+      ! Basins are contiguous in the stack, each one starting with its base level
+      nbasin = 0
+      basin = 0
+      do n = 1, pylNodesNb
+        donor = pyStack(n) + 1
+        if(pyRcv(donor)+1 == donor .or. n == 1)then
+          nbasin = nbasin + 1
+          basinStart(nbasin) = n
+        endif
+        basin(donor) = nbasin
+      enddo
+      basinStart(nbasin+1) = pylNodesNb + 1
+
+      ! Basins are processed independently unless sediments filling depressions
+      ! are distributed to another basin
+      do n = 1, pylNodesNb
+        donor = pyStack(n) + 1
+        if(pyFillH(donor) > pyElev(donor) .and. pitID(donor) > -1)then
+          if(basin(pitID(donor)+1) /= basin(donor)) nbasin = 1
+        endif
+        if(pitDrain(donor) > -1)then
+          if(basin(pitDrain(donor)+1) /= basin(donor)) nbasin = 1
+        endif
+      enddo
+      if(nbasin == 1) basinStart(2) = pylNodesNb + 1
+
+      !$omp parallel do schedule(dynamic) private(n, donor, recvr, nID, tmpID, r, maxh, dh, &
+      !$omp waterH, fct, Qt, totflx, totspl, newdist, dist, slp, slpdh, updh, tmpdist, totdist, &
+      !$omp width, frac, upperslp, bedfrac, SPL, Qs, Qb, frck, erodep, pitDep)
+      do b = 1, nbasin
+      do n = basinStart(b+1)-1, basinStart(b), -1
 
         SPL = 0.
         donor = pyStack(n) + 1
@@ -697,7 +901,13 @@ contains
 
               ! Incision rule types
               ! Detachment limited
-              if(incisiontype==0 .and. slpdh == 0.)then
+              if(incisiontype==0 .and. slpdh == 0. .and. impl == 1)then
+                ! Erosion computed by the implicit solver (implicitspl)
+                do r = 1, pyRockNb
+                  SPL(r) = -frck(r) * pyImpEro(donor) / dt
+                  totspl = totspl + SPL(r)
+                enddo
+              elseif(incisiontype==0 .and. slpdh == 0.)then
                 do r = 1, pyRockNb
                   SPL(r) = -Cero(donor,r) * frck(r) * bedfrac * (pyDischarge(donor))**spl_m * (slp)**spl_n
                   totspl = totspl + SPL(r)
@@ -1038,6 +1248,8 @@ contains
         if(upZ(recvr)==pyElev(donor)) updist(recvr) = dist
 
       enddo
+      enddo
+      !$omp end parallel do
 
       return
 
@@ -7,7 +7,7 @@
 !!                                                                                   !!
 !!~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~!!
 
-! This module implements Planchon & Darboux depression filling algorithm
+! This module implements Planchon & Darboux and priority-flood depression filling algorithms
 module pdstack
 
   use pdclass
@@ -51,10 +51,9 @@ contains
         if( demH(k) > elevation(k) )then
           ! Get minimum value
           hmin = 2.e6
-          loop: do p = 1, 20
-            if( neighbours(k,p) < 0 ) exit loop
-            hmin = min(hmin,demH(neighbours(k,p)+1))
-          enddo loop
+          do p = ngbOffsets(k)+1, ngbOffsets(k+1)
+            hmin = min(hmin,demH(ngbIDs(p)+1))
+          enddo
           if( elevation(k) >= hmin + eps )then
             demH(k) = elevation(k)
           else
@@ -106,10 +105,9 @@ contains
         if( demH(k) > elevation(k) )then
           ! Get minimum value
           hmin = 2.e6
-          loop: do p = 1, 20
-            if( neighbours(k,p) < 0 ) exit loop
-            hmin = min(hmin,demH(neighbours(k,p)+1))
-          enddo loop
+          do p = ngbOffsets(k)+1, ngbOffsets(k+1)
+            hmin = min(hmin,demH(ngbIDs(p)+1))
+          enddo
           if( elevation(k) >= hmin + eps )then
             demH(k) = elevation(k)
           else
@@ -166,10 +164,9 @@ contains
                 exit sfd_loop
               endif
               maxz = -1.e8
-              loop0: do p = 1, 20
-                if( neighbours(id,p) < 0 ) exit loop0
-                if(maxz<elev(neighbours(id,p)+1)) maxz = elev(neighbours(id,p)+1)
-              enddo loop0
+              do p = ngbOffsets(id)+1, ngbOffsets(id+1)
+                if(maxz<elev(ngbIDs(p)+1)) maxz = elev(ngbIDs(p)+1)
+              enddo
               if(maxz>sealevel) maxz = sealevel
               if(maxz<elev(id)) maxz = elev(id)
               vol = max(0.,diffprop*(maxz-elev(id))*area(id))
@@ -197,16 +194,15 @@ contains
                 minz = elev(id)
                 nid = 0
                 maxz = -1.e8
-                loop: do p = 1, 20
-                  if( neighbours(id,p) < 0 ) exit loop
-                  if(minz>elev(neighbours(id,p)+1))then
-                    nid = neighbours(id,p)+1
+                do p = ngbOffsets(id)+1, ngbOffsets(id+1)
+                  if(minz>elev(ngbIDs(p)+1))then
+                    nid = ngbIDs(p)+1
                     minz = elev(nid)
                   endif
-                  if(maxz<elev(neighbours(id,p)+1))then
-                    maxz = elev(neighbours(id,p)+1)
+                  if(maxz<elev(ngbIDs(p)+1))then
+                    maxz = elev(ngbIDs(p)+1)
                   endif
-                enddo loop
+                enddo
                 if(nid==0)then
                   dh = maxz-elev(id)+0.1
                   if(seadep(id) > dh*area(id))then
@@ -270,7 +266,7 @@ contains
 
   subroutine pitparams(pyNgbs,pyArea,pyDiff,pyProp,fillTH,epsilon,pybounds,pydnodes)
 
-    integer :: pydnodes
+    integer :: pydnodes, k, p, nb
     integer,intent(in) :: pybounds
     real(kind=8),intent(in) :: fillTH
     real(kind=8),intent(in) :: epsilon
@@ -290,13 +286,60 @@ contains
 
     call defineparameters
 
-    neighbours = pyNgbs
+    ! Compress the padded neighbourhood
+    ngbOffsets(1) = 0
+    do k = 1, pydnodes
+      nb = 0
+      loop: do p = 1, 20
+        if( pyNgbs(k,p) < 0 ) exit loop
+        nb = nb + 1
+      enddo loop
+      ngbOffsets(k+1) = ngbOffsets(k) + nb
+    enddo
+    allocate(ngbIDs(ngbOffsets(pydnodes+1)))
+    do k = 1, pydnodes
+      do p = 1, ngbOffsets(k+1) - ngbOffsets(k)
+        ngbIDs(ngbOffsets(k)+p) = pyNgbs(k,p)
+      enddo
+    enddo
     area = pyArea
 
     return
 
   end subroutine pitparams
 
+  subroutine pitparamscsr(pyOffsets,pyNgbs,pyArea,pyDiff,pyProp,fillTH,epsilon,pybounds,pydnodes,pyedgeNb)
+
+    integer :: pydnodes, pyedgeNb
+    integer,intent(in) :: pybounds
+    real(kind=8),intent(in) :: fillTH
+    real(kind=8),intent(in) :: epsilon
+    integer,intent(in) :: pyDiff
+    integer,intent(in) :: pyOffsets(pydnodes+1)
+    integer,intent(in) :: pyNgbs(pyedgeNb)
+    real(kind=8),intent(in) :: pyProp
+    real(kind=8),intent(in) :: pyArea(pydnodes)
+
+    dnodes = pydnodes
+
+    diffnbmax = pyDiff
+    diffprop = pyProp
+    bds = pybounds
+    block_size = pydnodes - bds
+    eps = epsilon
+    fill_TH = fillTH
+
+    call defineparameters
+
+    allocate(ngbIDs(pyedgeNb))
+    ngbOffsets = pyOffsets
+    ngbIDs = pyNgbs
+    area = pyArea
+
+    return
+
+  end subroutine pitparamscsr
+
   subroutine pitfilling(elevation,allfill,sealevel,demH,pydnodes)
 
     integer :: pydnodes
@@ -320,6 +363,56 @@ contains
 
   end subroutine pitfilling
 
+  subroutine priorityfilling(elevation,allfill,sealevel,demH,pydnodes)
+
+    integer :: pydnodes, k, p, n
+    integer,intent(in) :: allfill
+    real(kind=8),intent(in) :: sealevel
+    real(kind=8),intent(in) :: elevation(pydnodes)
+
+    real(kind=8),intent(out) :: demH(pydnodes)
+
+    real(kind=8) :: h, hmax
+
+    ! Priority-flood (Barnes et al., 2014) with epsilon filling: nodes are flooded from the
+    ! boundary by increasing water level, each node being filled to eps above the lowest
+    ! of its flooded neighbours. The filled surface is the one reached by Planchon & Darboux,
+    ! including the maximum filling thickness (fill_TH) when allfill is 0
+    demH(1:bds) = elevation(1:bds)
+    demH(bds+1:pydnodes) = 1.e6
+    heapNb = 0
+    do k = 1, bds
+      call heappush(k,demH(k))
+    enddo
+
+    do while(heapNb > 0)
+      call heappop(k,h)
+      ! Skip the outdated entries of nodes lowered after being pushed
+      if(h > demH(k)) cycle
+      do p = ngbOffsets(k)+1, ngbOffsets(k+1)
+        n = ngbIDs(p)+1
+        if(n <= bds) cycle
+        h = demH(k) + eps
+        if(allfill == 0)then
+          if(elevation(n) >= sealevel)then
+            hmax = elevation(n) + fill_TH
+          else
+            hmax = sealevel + fill_TH
+          endif
+          h = min(h,hmax)
+        endif
+        h = max(h,elevation(n))
+        if(h < demH(n))then
+          demH(n) = h
+          call heappush(n,h)
+        endif
+      enddo
+    enddo
+
+    return
+
+  end subroutine priorityfilling
+
   subroutine getactlay(alay,layTH,laySD,alayS,nbPts,nbLay,nbSed)
 
     integer :: nbPts
@@ -24,8 +24,14 @@ module pdclass
     ! Set the size of allocated memory blocks
     integer :: block_size
 
-    ! Set neighbourhood array
-    integer,allocatable, dimension(:,:) :: neighbours
+    ! Define the binary heap used by the priority-flood algorithm
+    integer :: heapNb = 0
+    integer, allocatable, dimension(:) :: heapID
+    real(kind=8), allocatable, dimension(:) :: heapH
+
+    ! Set neighbourhood arrays (compressed sparse row layout)
+    integer,allocatable, dimension(:) :: ngbOffsets
+    integer,allocatable, dimension(:) :: ngbIDs
 
     ! Set area cells array
     real(kind=8),allocatable, dimension(:) :: area
@@ -41,9 +47,10 @@ contains
 
     subroutine defineparameters
 
-      if(allocated(neighbours)) deallocate(neighbours)
+      if(allocated(ngbOffsets)) deallocate(ngbOffsets)
+      if(allocated(ngbIDs)) deallocate(ngbIDs)
       if(allocated(area)) deallocate(area)
-      allocate(neighbours(dnodes,20))
+      allocate(ngbOffsets(dnodes+1))
       allocate(area(dnodes))
 
       if(allocated(data1)) deallocate(data1)
@@ -51,8 +58,78 @@ contains
       allocate(data1(block_size))
       allocate(data2(block_size))
 
+      if(allocated(heapID)) deallocate(heapID)
+      if(allocated(heapH)) deallocate(heapH)
+      allocate(heapID(dnodes))
+      allocate(heapH(dnodes))
+      heapNb = 0
+
       return
 
     end subroutine defineparameters
 
+    subroutine heappush(id, h)
+
+      integer :: id, i, j
+      real(kind=8) :: h
+      integer, allocatable, dimension(:) :: tmpID
+      real(kind=8), allocatable, dimension(:) :: tmpH
+
+      ! Nodes can be pushed several times, the heap grows when needed
+      if(heapNb == size(heapID))then
+        allocate(tmpID(2*heapNb),tmpH(2*heapNb))
+        tmpID(1:heapNb) = heapID(1:heapNb)
+        tmpH(1:heapNb) = heapH(1:heapNb)
+        call move_alloc(tmpID,heapID)
+        call move_alloc(tmpH,heapH)
+      endif
+
+      heapNb = heapNb + 1
+      i = heapNb
+      do while(i > 1)
+        j = i/2
+        if(heapH(j) <= h) exit
+        heapH(i) = heapH(j)
+        heapID(i) = heapID(j)
+        i = j
+      enddo
+      heapH(i) = h
+      heapID(i) = id
+
+      return
+
+    end subroutine heappush
+
+    subroutine heappop(id, h)
+
+      integer :: id, i, j, lastID
+      real(kind=8) :: h, lastH
+
+      id = heapID(1)
+      h = heapH(1)
+      lastID = heapID(heapNb)
+      lastH = heapH(heapNb)
+      heapNb = heapNb - 1
+
+      i = 1
+      do
+        j = 2*i
+        if(j > heapNb) exit
+        if(j < heapNb)then
+          if(heapH(j+1) < heapH(j)) j = j + 1
+        endif
+        if(heapH(j) >= lastH) exit
+        heapH(i) = heapH(j)
+        heapID(i) = heapID(j)
+        i = j
+      enddo
+      if(heapNb > 0)then
+        heapH(i) = lastH
+        heapID(i) = lastID
+      endif
+
+      return
+
+    end subroutine heappop
+
 end module pdclass
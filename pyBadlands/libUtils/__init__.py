@@ -8,4 +8,75 @@
 ##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
 """
    Wrapping of C/Fortran functions used in Badlands.
-"""
\ No newline at end of file
+
+   When a compiled library is not available, the Python implementation of its functions
+   (libUtils/kernels, compiled with Numba when installed) is loaded under the same name.
+   The BADLANDS_KERNELS environment variable selects the backend:
+       + auto: compiled libraries, Python kernels for the missing ones (default)
+       + fortran: compiled libraries only
+       + jit: Python kernels only
+   The backend used for each library is recorded in the backends dictionary.
+"""
+
+import os
+import sys
+import types
+import importlib
+
+# Compiled libraries: name, wrapped Fortran module and Python kernels module
+_libraries = [('sfd', None, 'sfd'),
+              ('FLOWalgo', 'flowcompute', 'flowcompute'),
+              ('FLWnetwork', 'fstack', 'fstack'),
+              ('PDalgo', 'pdstack', 'pdstack'),
+              ('FASTloop', 'part', 'part'),
+              ('ORmodel', 'orographicrain', 'orographicrain'),
+              ('WAVEsed', 'wavesed', 'wavesed'),
+              ('FVframe', 'discretisation', 'discretisation')]
+
+backends = {}
+
+def _load(name, fmodule, kernel, choice):
+    """
+    Load a compiled library or the Python kernels replacing it.
+
+    Parameters
+    ----------
+    name
+        Name of the compiled library.
+
+    fmodule
+        Name of the Fortran module wrapped in the library (None for C libraries).
+
+    kernel
+        Name of the Python kernels module.
+
+    choice
+        Requested backend (auto, fortran or jit).
+    """
+
+    if choice != 'jit':
+        try:
+            module = importlib.import_module(__name__+'.'+name)
+            backends[name] = 'fortran'
+            return module
+        except ImportError:
+            if choice == 'fortran':
+                raise
+
+    kernels = importlib.import_module(__name__+'.kernels.'+kernel)
+    if fmodule is None:
+        module = kernels
+    else:
+        module = types.ModuleType(__name__+'.'+name, kernels.__doc__)
+        setattr(module, fmodule, kernels)
+    sys.modules[__name__+'.'+name] = module
+    backends[name] = 'jit'
+
+    return module
+
+_choice = os.environ.get('BADLANDS_KERNELS', 'auto').lower()
+if _choice not in ('auto', 'fortran', 'jit'):
+    raise ValueError('BADLANDS_KERNELS should be auto, fortran or jit, not %s' % _choice)
+
+for _name, _fmodule, _kernel in _libraries:
+    globals()[_name] = _load(_name, _fmodule, _kernel, _choice)
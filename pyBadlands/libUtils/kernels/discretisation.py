@@ -0,0 +1,489 @@
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+##                                                                                   ##
+##  This file forms part of the Badlands surface processes modelling application.    ##
+##                                                                                   ##
+##  For full license and copyright information, please refer to the LICENSE.md file  ##
+##  located at the project root, or contact the authors.                             ##
+##                                                                                   ##
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+"""
+Python implementation of the Finite Volume discretisation of the unstructured grid
+(libUtils/FVframe.f90, module discretisation).
+
+The Voronoi cells are built from the Delaunay/Voronoi duality as in the Fortran class
+(libUtils/FVclass.f90): the Voronoi vertices of each node are ordered with the convex hull
+algorithm (ACM 523) and the Voronoi edges are found from the Delaunay edges crossing them.
+As the f2py wrapping, the function takes 1-based IDs and returns 0-based neighbours IDs.
+"""
+
+import numpy
+from .jit import jit, intarray, realarray
+
+# Maximum number of neighbours of a node
+_maxngbs = 20
+
+def _anint(x):
+    """
+    Nearest integer, halfway cases rounded away from zero (Fortran anint).
+    """
+
+    r = numpy.round(x)
+    ties = numpy.abs(x - numpy.trunc(x)) == 0.5
+    r[ties] = numpy.trunc(x[ties]) + numpy.sign(x[ties])
+
+    return r
+
+def _findmap(vX, vY):
+    """
+    Map each Voronoi vertex to the first vertex with the same coordinates (rounded to 1.e-5).
+    """
+
+    mx = _anint(vX*100000.)/100000.
+    my = _anint(vY*100000.)/100000.
+    order = numpy.lexsort((my, mx))
+    sx = mx[order]
+    sy = my[order]
+    start = numpy.ones(len(order), dtype=bool)
+    start[1:] = (sx[1:] != sx[:-1]) | (sy[1:] != sy[:-1])
+    starts = numpy.where(start)[0]
+    mins = numpy.minimum.reduceat(order, starts)
+    mask = numpy.empty(len(order), dtype=numpy.int32)
+    mask[order] = numpy.repeat(mins, numpy.diff(numpy.append(starts, len(order))))
+
+    return mask
+
+@jit
+def _envelope(x, y, n, vertex):
+    """
+    Convex hull of the n points (x, y) stored from index 1 (ACM algorithm 523). The hull
+    vertices are returned in vertex (from index 1) and their number is returned.
+    """
+
+    if n < 2:
+        return -1
+
+    nxt = numpy.full(max(n, 20)+2, -1, dtype=numpy.int32)
+    iwk = numpy.full(n+1, -1, dtype=numpy.int32)
+    if x[1] > x[n]:
+        vertex[1] = n
+        vertex[2] = 1
+        xmin = x[n]
+        xmax = x[1]
+    else:
+        vertex[1] = 1
+        vertex[2] = n
+        xmin = x[1]
+        xmax = x[n]
+    for i in range(2, n):
+        temp = x[i]
+        if temp < xmin:
+            vertex[1] = i
+            xmin = temp
+        elif temp > xmax:
+            vertex[2] = i
+            xmax = temp
+
+    if xmax == xmin:
+        if y[1] > y[n]:
+            vertex[1] = n
+            vertex[2] = 1
+            ymin = y[n]
+            ymax = y[1]
+        else:
+            vertex[1] = 1
+            vertex[2] = n
+            ymin = y[1]
+            ymax = y[n]
+        for i in range(2, n):
+            temp = y[i]
+            if temp < ymin:
+                vertex[1] = i
+                ymin = temp
+            elif temp > ymax:
+                vertex[2] = i
+                ymax = temp
+        if ymax == ymin:
+            return 1
+        return 2
+
+    i1 = vertex[1]
+    i2 = vertex[2]
+    iwk[i1] = -1
+    iwk[i2] = -1
+    dx = xmax - xmin
+    y1 = y[i1]
+    dy = y[i2] - y1
+    dmax = 0.
+    dmin = 0.
+    for i in range(1, n+1):
+        if i == vertex[1] or i == vertex[2]:
+            continue
+        dist = (y[i] - y1)*dx - (x[i] - xmin)*dy
+        if dist > 0.:
+            iwk[i1] = i
+            i1 = i
+            if dist > dmax:
+                nxt[1] = i
+                dmax = dist
+        elif dist < 0.:
+            iwk[i2] = i
+            i2 = i
+            if dist < dmin:
+                nxt[2] = i
+                dmin = dist
+    iwk[i1] = -1
+    iwk[i2] = -1
+
+    nvert = 2
+    j = 1
+    while True:
+        if nxt[j] < 0:
+            if j == nvert:
+                return nvert
+            j += 1
+            continue
+        jp1 = j + 1
+        for i in range(nvert, jp1-1, -1):
+            vertex[i+1] = vertex[i]
+            nxt[i+1] = nxt[i]
+        jp2 = jp1 + 1
+        nvert += 1
+        if jp2 > nvert:
+            jp2 = 1
+        i1 = vertex[j]
+        i2 = nxt[j]
+        i3 = vertex[jp2]
+        vertex[jp1] = i2
+
+        x1 = x[i1]
+        x2 = x[i2]
+        y1 = y[i1]
+        y2 = y[i2]
+        dx1 = x2 - x1
+        dx2 = x[i3] - x2
+        dy1 = y2 - y1
+        dy2 = y[i3] - y2
+        dmax1 = 0.
+        dmax2 = 0.
+        nxt[j] = -1
+        nxt[jp1] = -1
+        i2save = i2
+        i2next = iwk[i2]
+        i = iwk[i1]
+        iwk[i1] = -1
+        iwk[i2] = -1
+
+        while True:
+            if i != i2save:
+                dist = (y[i] - y1)*dx1 - (x[i] - x1)*dy1
+                if dist > 0.:
+                    iwk[i1] = i
+                    i1 = i
+                    if dist > dmax1:
+                        nxt[j] = i
+                        dmax1 = dist
+                else:
+                    dist = (y[i] - y2)*dx2 - (x[i] - x2)*dy2
+                    if dist > 0.:
+                        iwk[i2] = i
+                        i2 = i
+                        if dist > dmax2:
+                            nxt[jp1] = i
+                            dmax2 = dist
+                i = iwk[i]
+            else:
+                i = i2next
+            if i <= 0:
+                break
+        iwk[i1] = -1
+        iwk[i2] = -1
+
+@jit
+def _intersect(x1, y1, x2, y2, x3, y3, x4, y4):
+    """
+    Check if the line (pt1,pt2) crosses the segment (pt3,pt4).
+    """
+
+    denom = (y4 - y3)*(x2 - x1) - (x4 - x3)*(y2 - y1)
+    if denom == 0.:
+        return False
+    mua = ((x4 - x3)*(y1 - y3) - (y4 - y3)*(x1 - x3))/denom
+
+    return mua >= 0. and mua <= 1.
+
+@jit
+def _addvertex(vid, vertexID, vertexNb, cell):
+    """
+    Add a Voronoi vertex to a node if it is not already recorded.
+    """
+
+    if vid < 0:
+        return
+    for p in range(vertexNb[cell]):
+        if vertexID[cell,p] == vid:
+            return
+    if vertexNb[cell] < vertexID.shape[1]:
+        vertexID[cell,vertexNb[cell]] = vid
+        vertexNb[cell] += 1
+
+    return
+
+@jit
+def _addedges(cell, rk, side, start, tEdge, vEdge, ngbNb, ngbID, vertexNb, vertexID, border):
+    """
+    Record the neighbours and the Voronoi vertices of a node from the ranked Delaunay edges
+    starting at position start.
+    """
+
+    for n in range(start, len(rk)):
+        e = rk[n]
+        if tEdge[e,side] != cell:
+            break
+        ngb = tEdge[e,1-side]
+        if ngb >= 0:
+            rec = True
+            for k in range(ngbNb[cell]):
+                if ngbID[cell,k] == ngb:
+                    rec = False
+            if rec and ngbNb[cell] < ngbID.shape[1]:
+                ngbID[cell,ngbNb[cell]] = ngb
+                ngbNb[cell] += 1
+        _addvertex(vEdge[e,0], vertexID, vertexNb, cell)
+        if vEdge[e,1] != vEdge[e,0]:
+            _addvertex(vEdge[e,1], vertexID, vertexNb, cell)
+        if vEdge[e,0] < 0:
+            border[cell] = 1
+
+    return
+
+@jit
+def _duality(gids, tX, tY, tEdge, rk1, rk2, vX, vY, vEdge, ngbNb, ngbID, vorEdge, triDist,
+             area):
+
+    dnodes = len(tX)
+    maxngbs = ngbID.shape[1]
+    dminX = 1.e8
+    dminY = 1.e8
+    dmaxX = -1.e8
+    dmaxY = -1.e8
+    for n in range(dnodes):
+        dminX = min(dminX, tX[n])
+        dminY = min(dminY, tY[n])
+        dmaxX = max(dmaxX, tX[n])
+        dmaxY = max(dmaxY, tY[n])
+
+    vertexNb = numpy.zeros(dnodes, dtype=numpy.int32)
+    vertexID = numpy.full((dnodes, maxngbs), -1, dtype=numpy.int32)
+    border = numpy.zeros(dnodes, dtype=numpy.int32)
+    ngbNb[:] = 0
+    ngbID[:, :] = -1
+    vorEdge[:, :] = 0
+    triDist[:, :] = 0.
+    area[:] = 0.
+    vnx = numpy.zeros(maxngbs+1)
+    vny = numpy.zeros(maxngbs+1)
+    vsort = numpy.zeros(maxngbs+2, dtype=numpy.int32)
+    sortedID = numpy.zeros(maxngbs, dtype=numpy.int32)
+    failed = -1
+
+    k1 = -1
+    k2 = -1
+    for c in range(len(gids)):
+        cell = gids[c]
+        id1 = -1
+        id2 = -1
+        for n in range(k1+1, len(rk1)):
+            if tEdge[rk1[n],0] == cell:
+                id1 = n
+                k1 = n
+                break
+        for n in range(k2+1, len(rk2)):
+            if tEdge[rk2[n],1] == cell:
+                id2 = n
+                k2 = n
+                break
+        if id1 >= 0:
+            _addedges(cell, rk1, 0, id1, tEdge, vEdge, ngbNb, ngbID, vertexNb, vertexID, border)
+        if id2 >= 0:
+            _addedges(cell, rk2, 1, id2, tEdge, vEdge, ngbNb, ngbID, vertexNb, vertexID, border)
+
+        if border[cell] == 0:
+            n = vertexNb[cell]
+            for p in range(n):
+                vnx[p+1] = vX[vertexID[cell,p]]
+                vny[p+1] = vY[vertexID[cell,p]]
+            nvert = _envelope(vnx, vny, n, vsort)
+            if nvert != vertexNb[cell]:
+                if tX[cell] > dminX and tX[cell] < dmaxX and tY[cell] > dminY and tY[cell] < dmaxY:
+                    failed = cell
+                    break
+                else:
+                    border[cell] = 1
+            if border[cell] == 0:
+                for p in range(nvert):
+                    sortedID[p] = vertexID[cell,vsort[p+1]-1]
+                for p in range(nvert):
+                    vertexID[cell,p] = sortedID[p]
+                for p in range(nvert):
+                    i = sortedID[p]
+                    i3 = sortedID[(p+1) % nvert]
+                    a = (vX[i] - tX[cell])*(vY[i3] - tY[cell]) - (vX[i3] - tX[cell])*(vY[i] - tY[cell])
+                    area[cell] += 0.5*abs(a)
+
+    for c in range(len(gids)):
+        cell = gids[c]
+        if border[cell] != 0:
+            continue
+        x1 = tX[cell]
+        y1 = tY[cell]
+        nv = vertexNb[cell]
+        for n in range(ngbNb[cell]):
+            ngb = ngbID[cell,n]
+            x2 = tX[ngb]
+            y2 = tY[ngb]
+            s1 = 0.
+            pt1 = -1
+            pt2 = -1
+            if x1 != x2:
+                s1 = abs((y2 - y1)/(x2 - x1))
+            for p in range(nv):
+                k = (p+1) % nv
+                x3 = vX[vertexID[cell,p]]
+                y3 = vY[vertexID[cell,p]]
+                x4 = vX[vertexID[cell,k]]
+                y4 = vY[vertexID[cell,k]]
+                s2 = 0.
+                if x4 != x3:
+                    s2 = abs((y3 - y4)/(x3 - x4))
+                # The Voronoi edge is perpendicular to the Delaunay edge
+                if abs(s1*s2 - 1.) < 0.001 or (x1 == x2 and y4 == y3) or (y1 == y2 and x4 == x3):
+                    if _intersect(x1, y1, x2, y2, x3, y3, x4, y4):
+                        pt1 = vertexID[cell,k]
+                        pt2 = vertexID[cell,p]
+                        break
+            # The Voronoi edges length is stored as an integer in the Fortran class
+            if pt1 >= 0 and pt2 >= 0:
+                vorEdge[cell,n] = int(numpy.sqrt((vX[pt1] - vX[pt2])**2 + (vY[pt2] - vY[pt1])**2))
+            triDist[cell,n] = numpy.sqrt((x1 - x2)**2 + (y1 - y2)**2)
+
+    return failed
+
+@jit
+def _export(gids, oids, ngbNb, ngbID, vorEdge, triDist, vorArea, varea, ngbs, vlen, dlen):
+
+    dnodes = len(vorArea)
+    varea[:] = 0.
+    ngbs[:, :] = -2
+    vlen[:, :] = 0.
+    dlen[:, :] = 0.
+    maxNgbh = 0
+    for c in range(len(gids)):
+        cell = gids[c]
+        varea[cell] = vorArea[cell]
+        maxNgbh = max(ngbNb[cell], maxNgbh)
+        for o in range(ngbNb[cell]):
+            if ngbID[cell,o] >= 0:
+                ngbs[cell,o] = oids[ngbID[cell,o]]
+            vlen[cell,o] = vorEdge[cell,o]
+            dlen[cell,o] = triDist[cell,o]
+
+    # Make the edges lengths symmetric
+    for c in range(len(gids)):
+        cell = gids[c]
+        for o in range(ngbNb[cell]):
+            idd = ngbs[cell,o]
+            if ngbID[cell,o] < 0 or idd < 0 or idd >= dnodes:
+                continue
+            for o2 in range(ngbNb[idd]):
+                if ngbs[idd,o2] == cell:
+                    if dlen[cell,o] != dlen[idd,o2]:
+                        if dlen[cell,o] == 0.:
+                            dlen[cell,o] = dlen[idd,o2]
+                        if dlen[idd,o2] == 0.:
+                            dlen[idd,o2] = dlen[cell,o]
+                    if vlen[cell,o] != vlen[idd,o2]:
+                        vlen[cell,o] = vlen[idd,o2]
+
+    return maxNgbh
+
+def build(pyOids, pyGids, pytX, pytY, pytEdge, pytElmt, pyvX, pyvY, pyvEdge):
+    """
+    Build the Finite Volume discretisation of the TIN.
+
+    Parameters
+    ----------
+    pyOids
+        Numpy integer-type array with the global IDs of the local nodes (1-based).
+
+    pyGids
+        Numpy integer-type array with the local IDs of the nodes of the partition (1-based).
+
+    pytX, pytY
+        Numpy arrays with the TIN nodes coordinates.
+
+    pytEdge
+        Numpy integer-type array with the TIN edges (1-based).
+
+    pytElmt
+        Numpy integer-type array with the TIN cells (1-based).
+
+    pyvX, pyvY
+        Numpy arrays with the Voronoi vertices coordinates.
+
+    pyvEdge
+        Numpy integer-type array with the Voronoi edges (1-based, 0 for infinite rays).
+
+    Returns
+    -------
+    pyVarea
+        Numpy array with the Voronoi area of each node.
+
+    pyNgbs
+        Numpy integer-type array with the neighbours of each node (-2 otherwise).
+
+    pyVlenght
+        Numpy array with the Voronoi edges length.
+
+    pyDlenght
+        Numpy array with the Delaunay edges length.
+
+    pymaxNgbh
+        Maximum number of neighbours.
+    """
+
+    tX = realarray(pytX)
+    tY = realarray(pytY)
+    vX = realarray(pyvX)
+    vY = realarray(pyvY)
+    dnodes = len(tX)
+
+    # Merge the duplicated Voronoi vertices and convert the IDs to 0-based
+    tEdge = intarray(pytEdge) - 1
+    vEdge = intarray(pyvEdge).copy()
+    mask = _findmap(vX, vY)
+    vEdge[vEdge > 0] = mask[vEdge[vEdge > 0]-1] + 1
+    vEdge = vEdge - 1
+    gids = intarray(pyGids) - 1
+    oids = intarray(pyOids) - 1
+
+    # Delaunay edges ranked by their first and second nodes
+    rk1 = numpy.argsort(tEdge[:,0], kind='mergesort').astype(numpy.int32)
+    rk2 = numpy.argsort(tEdge[:,1], kind='mergesort').astype(numpy.int32)
+
+    ngbNb = numpy.empty(dnodes, dtype=numpy.int32)
+    ngbID = numpy.empty((dnodes, _maxngbs), dtype=numpy.int32)
+    vorEdge = numpy.empty((dnodes, _maxngbs), dtype=numpy.int32)
+    triDist = numpy.empty((dnodes, _maxngbs))
+    vorArea = numpy.empty(dnodes)
+    failed = _duality(gids, tX, tY, tEdge, rk1, rk2, vX, vY, vEdge, ngbNb, ngbID, vorEdge, triDist,
+                      vorArea)
+    if failed >= 0:
+        print('Failed during creation of voronoi convex hull %d' % (failed+1))
+
+    varea = numpy.empty(dnodes)
+    ngbs = numpy.empty((dnodes, _maxngbs), dtype=numpy.int32)
+    vlen = numpy.empty((dnodes, _maxngbs))
+    dlen = numpy.empty((dnodes, _maxngbs))
+    maxNgbh = _export(gids, oids, ngbNb, ngbID, vorEdge, triDist, vorArea, varea, ngbs, vlen, dlen)
+
+    return varea, ngbs, vlen, dlen, maxNgbh
@@ -0,0 +1,1064 @@
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+##                                                                                   ##
+##  This file forms part of the Badlands surface processes modelling application.    ##
+##                                                                                   ##
+##  For full license and copyright information, please refer to the LICENSE.md file  ##
+##  located at the project root, or contact the authors.                             ##
+##                                                                                   ##
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+"""
+Python implementation of the flow parameters computation (libUtils/FLOWalgo.f90, module
+flowcompute).
+
+The functions have the signatures of the f2py wrapping: the output arguments are returned in
+their declaration order. As in the Fortran module, the erosion parameters set by eroparams are
+shared by the following calls.
+"""
+
+import numpy
+from .jit import jit, intarray, realarray
+from .sfd import _compress
+
+# Real literals of the Fortran stream power law, which are single precision constants
+_f32 = numpy.float32
+_R0_001 = float(_f32(0.001))
+_R0_02 = float(_f32(0.02))
+_R0_0201 = float(_f32(0.0201))
+_R0_0323 = float(_f32(0.0323))
+_R0_08 = float(_f32(0.08))
+_R0_1 = float(_f32(0.1))
+_R0_35 = float(_f32(0.35))
+_R0_60965 = float(_f32(0.60965))
+_R0_8499389 = float(_f32(0.8499389))
+_R0_95 = float(_f32(0.95))
+_R0_99 = float(_f32(0.99))
+_R1_181 = float(_f32(1.181))
+_R1_912 = float(_f32(1.912))
+_R2_6 = float(_f32(2.6))
+_R0_22SQ = float(_f32(0.22)*_f32(0.22))
+_R0_6SQ = float(_f32(0.6)*_f32(0.6))
+_RINVSQRT3 = float(_f32(1.)/numpy.sqrt(_f32(3.)))
+_R0_98SQRT3 = float(_f32(0.98)*numpy.sqrt(_f32(3.)))
+
+# Erosion parameters (see eroparams)
+_incisiontype = 0
+_bedslptype = 0
+_spl_m = 0.
+_spl_n = 0.
+_sed_mt = 0.
+_sed_nt = 0.
+_sed_kt = 0.
+_width_kw = 0.
+_width_b = 0.
+
+def eroparams(typefct, m, n, mt, nt, kt, kw, b, bsfct):
+    """
+    Set the erosion parameters: incision rule type, stream power law exponents, transport
+    capacity and channel width coefficients and bedload function type.
+    """
+
+    global _incisiontype, _bedslptype, _spl_m, _spl_n, _sed_mt, _sed_nt, _sed_kt
+    global _width_kw, _width_b
+
+    _incisiontype = int(typefct)
+    _bedslptype = int(bsfct)
+    _spl_m = float(m)
+    _spl_n = float(n)
+    _sed_mt = float(mt)
+    _sed_nt = float(nt)
+    _sed_kt = float(kt)
+    _width_kw = float(kw)
+    _width_b = float(b)
+
+    return
+
+def setthreads(nb):
+    """
+    Number of threads used by the kernels. The Python kernels are not threaded.
+    """
+
+    return
+
+def getthreads():
+    """
+    Get the number of threads used by the kernels.
+    """
+
+    return 1
+
+@jit
+def _discharge(stack, rcv, elev, dis, lay):
+
+    lay[:] = 0.
+    for n in range(len(stack)-1, -1, -1):
+        donor = stack[n]
+        recvr = rcv[donor]
+        if donor != recvr:
+            dis[recvr] += dis[donor]
+        lay[donor] = elev[donor] - elev[recvr]
+
+    return
+
+def discharge(pyStack, pyRcv, pyElev, pyDischarge):
+    """
+    Accumulate the discharge along the stack and compute the elevation difference of each node
+    with its receiver.
+
+    Returns
+    -------
+    pyDis
+        Numpy array with the accumulated discharge.
+
+    pyLay
+        Numpy array with the elevation difference between each node and its receiver.
+    """
+
+    dis = numpy.array(pyDischarge, dtype=numpy.float64)
+    lay = numpy.empty(len(dis))
+    _discharge(intarray(pyStack), intarray(pyRcv), realarray(pyElev), dis, lay)
+
+    return dis, lay
+
+@jit
+def _parameters(stack, rcv, disch, xy, bid0, spl_m, spl_n, chi, basinID):
+
+    if spl_n > 0:
+        slp2 = spl_m / spl_n
+    else:
+        slp2 = 1.
+    chi[:] = 0.
+    basinID[:] = -1
+    bID = bid0
+    for n in range(len(stack)):
+        donor = stack[n]
+        recvr = rcv[donor]
+        if donor == recvr:
+            bID += 1
+        basinID[donor] = bID
+        disch1 = disch[donor]
+        disch2 = disch[recvr]
+        if donor != recvr and disch1 > 0. and disch2 > 0.:
+            dist = numpy.sqrt((xy[donor,0] - xy[recvr,0])**2 + (xy[donor,1] - xy[recvr,1])**2)
+            if spl_n > 0:
+                chi[donor] = chi[recvr] + 0.5*((1./disch2)**slp2 + (1./disch1)**slp2) * dist
+            else:
+                chi[donor] = 0.
+
+    return
+
+def parameters(pyStack, pyRcv, pyDischarge, pyXY, pyBid0):
+    """
+    Compute the chi parameter and the basin ID of each node.
+
+    Returns
+    -------
+    pyChi
+        Numpy array with the chi parameter.
+
+    pyBasinID
+        Numpy integer-type array with the basin ID of each node.
+    """
+
+    nb = len(pyRcv)
+    chi = numpy.empty(nb)
+    basinID = numpy.empty(nb, dtype=numpy.int32)
+    _parameters(intarray(pyStack), intarray(pyRcv), realarray(pyDischarge), realarray(pyXY),
+                int(pyBid0), _spl_m, _spl_n, chi, basinID)
+
+    return chi, basinID
+
+@jit
+def _basinparameters(stack, rcv, elev, watH, area, basinID, volume):
+
+    basinID[:] = -1
+    volume[:] = -1.
+    pitID = -1
+    for n in range(len(stack)):
+        donor = stack[n]
+        recvr = rcv[donor]
+        if donor == recvr:
+            pitID = donor
+            basinID[donor] = pitID
+        if watH[donor] > elev[donor] and pitID > -1:
+            basinID[donor] = pitID
+            volume[pitID] += (watH[donor] - elev[donor]) * area[donor]
+
+    return
+
+def basinparameters(pyStack, pyRcv, pyElev, pyWatH, pyArea):
+    """
+    Compute the depression ID and the depression volume of each node.
+
+    Returns
+    -------
+    pyBasinID
+        Numpy integer-type array with the depression ID of each node.
+
+    pyVolume
+        Numpy array with the volume of each depression (stored on its base node).
+    """
+
+    nb = len(pyRcv)
+    basinID = numpy.empty(nb, dtype=numpy.int32)
+    volume = numpy.empty(nb)
+    _basinparameters(intarray(pyStack), intarray(pyRcv), realarray(pyElev), realarray(pyWatH),
+                     realarray(pyArea), basinID, volume)
+
+    return basinID, volume
+
+@jit
+def _basindrainage(orderPits, pitID, rcv, pIDs, fillH, sea, withsea, drain):
+
+    pitNb = len(orderPits)
+    drain[:] = -1
+    chainDrain = numpy.full(pitNb, -1, dtype=numpy.int32)
+    for n in range(pitNb):
+        nID = pIDs[orderPits[n]]
+        donor = nID
+        exist = drain[nID] > -1
+        if withsea and fillH[nID] < sea:
+            exist = True
+            drain[nID] = nID
+        while not exist:
+            recvr = rcv[donor]
+            # If this is an internal drained basin or an edge node
+            if recvr == donor:
+                drain[nID] = recvr
+                chainDrain[:] = -1
+                exist = True
+            elif withsea and fillH[recvr] < sea:
+                drain[nID] = recvr
+                chainDrain[:] = -1
+                exist = True
+            elif pitID[recvr] == -1 or pitID[recvr] == nID:
+                donor = recvr
+            # As in the Fortran kernel, the pit ID is used as a 1-based index
+            elif withsea and fillH[pitID[recvr]-1] < sea:
+                donor = recvr
+            else:
+                p = 0
+                newpit = True
+                newDrain = pitID[recvr]
+                while p < pitNb and chainDrain[p] >= 0:
+                    if chainDrain[p] == newDrain:
+                        newpit = False
+                    p += 1
+                if newpit and p < pitNb:
+                    chainDrain[p] = newDrain
+                    drain[nID] = newDrain
+                    donor = newDrain
+                    nID = newDrain
+                else:
+                    donor = recvr
+
+    return
+
+def basindrainage(orderPits, pitID, pyRcv, pIDs, fillH, sea):
+    """
+    Find the depression or the node where each depression drains, stopping at the sea.
+
+    Returns
+    -------
+    pyDrain
+        Numpy integer-type array with the draining node of each depression.
+    """
+
+    drain = numpy.empty(len(pyRcv), dtype=numpy.int32)
+    _basindrainage(intarray(orderPits), intarray(pitID), intarray(pyRcv), intarray(pIDs),
+                   realarray(fillH), float(sea), True, drain)
+
+    return drain
+
+def basindrainageall(orderPits, pitID, pyRcv, pIDs):
+    """
+    Find the depression or the node where each depression drains.
+
+    Returns
+    -------
+    pyDrain
+        Numpy integer-type array with the draining node of each depression.
+    """
+
+    drain = numpy.empty(len(pyRcv), dtype=numpy.int32)
+    _basindrainage(intarray(orderPits), intarray(pitID), intarray(pyRcv), intarray(pIDs),
+                   numpy.zeros(1), 0., False, drain)
+
+    return drain
+
+@jit
+def _flowcfl(ids, rcv, xy, elev, disch, Cero, spl_m, spl_n):
+
+    cfl_dt = 1.e6
+    for p in range(len(ids)):
+        d = ids[p]
+        r = rcv[d]
+        dz = elev[d] - elev[r]
+        if d != r and dz > 0. and disch[d] > 0.:
+            dist = numpy.sqrt((xy[d,0] - xy[r,0])**2 + (xy[d,1] - xy[r,1])**2)
+            tmp = dist / (Cero[d] * disch[d]**spl_m * (dz/dist)**(spl_n-1.))
+            cfl_dt = min(tmp, cfl_dt)
+
+    return cfl_dt
+
+def flowcfl(pyIDs, pyRcv, pyXY, pyElev, pyDischarge, Cero):
+    """
+    Compute the CFL condition of the stream power law.
+
+    Returns
+    -------
+    cfl_dt
+        Stable time step.
+    """
+
+    return _flowcfl(intarray(pyIDs), intarray(pyRcv), realarray(pyXY), realarray(pyElev),
+                    realarray(pyDischarge), realarray(Cero), _spl_m, _spl_n)
+
+@jit
+def _implicitspl(stack, rcv, xy, disch, fillH, elev, Cero, sea, dt, spl_m, spl_n, ero):
+
+    ero[:] = 0.
+    newZ = elev.copy()
+
+    # Detachment-limited erosion solved implicitly from the base levels upstream
+    # (Braun & Willett, 2013), receivers being updated before their donors
+    for n in range(len(stack)):
+        donor = stack[n]
+        recvr = rcv[donor]
+        if donor == recvr:
+            continue
+
+        # Only nodes eroded by the explicit scheme: no depression and above sea
+        h0 = elev[donor]
+        if fillH[donor] - h0 != 0. or fillH[donor] < sea:
+            continue
+        zr = max(newZ[recvr], sea)
+        if 0.95*(h0 - max(elev[recvr], sea)) < 0.001:
+            continue
+
+        dist = numpy.sqrt((xy[donor,0] - xy[recvr,0])**2 + (xy[donor,1] - xy[recvr,1])**2)
+        if dist <= 0. or h0 <= zr:
+            continue
+        fct = Cero[donor] * disch[donor]**spl_m * dt / dist**spl_n
+        if fct <= 0.:
+            continue
+
+        if spl_n == 1.:
+            h = (h0 + fct*zr)/(1. + fct)
+        else:
+            # Newton iterations on h - h0 + fct*(h-zr)**n = 0 with the root bracketed in [zr,h0]
+            lo = zr
+            hi = h0
+            h = h0
+            for k in range(50):
+                f = h - h0 + fct*(h - zr)**spl_n
+                if f > 0.:
+                    hi = h
+                else:
+                    lo = h
+                df = 1. + fct*spl_n*(h - zr)**(spl_n - 1.)
+                hn = h - f/df
+                # Fall back to bisection when the Newton update leaves the bracket
+                if hn <= lo or hn >= hi:
+                    hn = 0.5*(lo + hi)
+                if abs(hn - h) < 1.e-8:
+                    h = hn
+                    break
+                h = hn
+
+        newZ[donor] = h
+        ero[donor] = h0 - h
+
+    return
+
+def implicitspl(pyStack, pyRcv, pyXY, pyDischarge, pyFillH, pyElev, Cero, sea, dt):
+    """
+    Solve the detachment-limited stream power law implicitly.
+
+    Returns
+    -------
+    pyEro
+        Numpy array with the eroded thickness of each node.
+    """
+
+    ero = numpy.empty(len(pyRcv))
+    _implicitspl(intarray(pyStack), intarray(pyRcv), realarray(pyXY), realarray(pyDischarge),
+                 realarray(pyFillH), realarray(pyElev), realarray(Cero), float(sea), float(dt),
+                 _spl_m, _spl_n, ero)
+
+    return ero
+
+@jit
+def _diffmarine(z, bord, depoH, offsets, ngbs, edge, dist, coeff, gids, slvl, maxth, tstep, diff):
+
+    diff[:] = 0.
+    mindt = tstep
+    for k in range(len(gids)):
+        gid = gids[k]
+        if bord[gid] > 0 and z[gid] < slvl:
+            for p in range(offsets[gid], offsets[gid+1]):
+                ngbid = ngbs[p]
+                if bord[ngbid] > 0:
+                    flx = edge[p]*(z[ngbid] - z[gid])/dist[p]
+                    if depoH[gid] > maxth and z[gid] > z[ngbid]:
+                        diff[gid] += coeff[gid]*flx
+                    elif depoH[ngbid] > maxth and z[gid] < z[ngbid] and z[ngbid] < slvl:
+                        diff[gid] += coeff[gid]*flx
+                elif depoH[gid] > maxth and z[gid] > z[ngbid]:
+                    flx = edge[p]*(z[ngbid] - z[gid])/dist[p]
+                    diff[gid] += coeff[gid]*flx
+            # In case we diffuse more sediment than what is available during the
+            # considered time step, flag it
+            if diff[gid] < 0. and diff[gid]*tstep < -depoH[gid]:
+                mindt = min(-depoH[gid]/diff[gid], mindt)
+
+    return mindt
+
+def diffmarine(pyZ, pyBord, pyDepoH, pyNgbs, pyEdge, pyDist, pyCoeff, pyGIDs, slvl, pymaxth, tstep):
+    """
+    Compute the diffusion flux of the marine deposits and the stable diffusion step.
+
+    Returns
+    -------
+    pyDiff
+        Numpy array with the diffusion flux of each node.
+
+    mindt
+        Stable diffusion step.
+    """
+
+    offsets, ngbs, edge, dist = _compress(pyNgbs, pyEdge, pyDist)
+
+    return diffmarinecsr(pyZ, pyBord, pyDepoH, offsets, ngbs, edge, dist, pyCoeff, pyGIDs,
+                         slvl, pymaxth, tstep)
+
+def diffmarinecsr(pyZ, pyBord, pyDepoH, pyOffsets, pyNgbs, pyEdge, pyDist, pyCoeff, pyGIDs,
+                  slvl, pymaxth, tstep):
+    """
+    Same as diffmarine using the compressed sparse row neighbourhood layout.
+    """
+
+    diff = numpy.empty(len(pyZ))
+    mindt = _diffmarine(realarray(pyZ), intarray(pyBord), realarray(pyDepoH), intarray(pyOffsets),
+                        intarray(pyNgbs), realarray(pyEdge), realarray(pyDist), realarray(pyCoeff),
+                        intarray(pyGIDs), float(slvl), float(pymaxth), float(tstep), diff)
+
+    return diff, mindt
+
+@jit
+def _addsed(lay, layh, nid, coeff, flx, sed):
+    """
+    Diffused volume of each sediment class given the composition of node nid.
+    """
+
+    sfrac = 0.
+    tsed = 0.
+    for r in range(len(sed)):
+        frac = lay[nid,r]/layh[nid]
+        sfrac += frac
+        sed[r] = coeff*frac*flx
+        tsed += sed[r]
+
+    return sfrac, tsed
+
+@jit
+def _diffsedmarine(z, bord, depo, depoH, slvl, maxth, coeff, offsets, ngbs, edge, dist, gids,
+                   diff, sumDiff):
+
+    diff[:, :] = 0.
+    sumDiff[:] = 0.
+    sed = numpy.zeros(depo.shape[1])
+    for k in range(len(gids)):
+        gid = gids[k]
+        if bord[gid] > 0 and z[gid] < slvl:
+            for p in range(offsets[gid], offsets[gid+1]):
+                ngbid = ngbs[p]
+                sfrac = 0.
+                if bord[ngbid] > 0:
+                    flx = edge[p]*(z[ngbid] - z[gid])/dist[p]
+                    if depoH[gid] > maxth and z[gid] > z[ngbid]:
+                        sfrac, tsed = _addsed(depo, depoH, gid, coeff[gid], flx, sed)
+                    elif depoH[ngbid] > maxth and z[gid] < z[ngbid] and z[ngbid] < slvl:
+                        sfrac, tsed = _addsed(depo, depoH, ngbid, coeff[gid], flx, sed)
+                elif depoH[gid] > maxth and z[gid] > z[ngbid]:
+                    flx = edge[p]*(z[ngbid] - z[gid])/dist[p]
+                    sfrac, tsed = _addsed(depo, depoH, gid, coeff[gid], flx, sed)
+                if sfrac > 0.:
+                    tfrac = 1./sfrac
+                    diff[gid,:] += tfrac*sed
+                    sumDiff[gid] += tfrac*tsed
+
+    return
+
+def diffsedmarine(pyZ, pyBord, pyDepo, pyDepoH, slvl, pymaxth, pyCoeff, pyNgbs, pyEdge, pyDist,
+                  pyGIDs):
+    """
+    Compute the diffusion flux of each sediment class of the marine deposits.
+
+    Returns
+    -------
+    pyDiff
+        Numpy array with the diffusion flux of each sediment class.
+
+    sumDiff
+        Numpy array with the total diffusion flux of each node.
+    """
+
+    offsets, ngbs, edge, dist = _compress(pyNgbs, pyEdge, pyDist)
+    depo = realarray(pyDepo)
+    diff = numpy.empty(depo.shape)
+    sumDiff = numpy.empty(len(pyZ))
+    _diffsedmarine(realarray(pyZ), intarray(pyBord), depo, realarray(pyDepoH), float(slvl),
+                   float(pymaxth), realarray(pyCoeff), offsets, ngbs, edge, dist, intarray(pyGIDs),
+                   diff, sumDiff)
+
+    return diff, sumDiff
+
+@jit
+def _diffsedhillslope(z, bord, difflay, maxlayh, coeff, offsets, ngbs, edge, dist, gids,
+                      sumDiff, ero, depo):
+
+    ero[:, :] = 0.
+    depo[:, :] = 0.
+    sumDiff[:] = 0.
+    sed = numpy.zeros(difflay.shape[1])
+    for k in range(len(gids)):
+        gid = gids[k]
+        if bord[gid] > 0:
+            for p in range(offsets[gid], offsets[gid+1]):
+                ngbid = ngbs[p]
+                sfrac = 0.
+                if bord[ngbid] > 0:
+                    if z[gid] > z[ngbid]:
+                        flx = edge[p]*(z[ngbid] - z[gid])/dist[p]
+                        sfrac, tsed = _addsed(difflay, maxlayh, gid, coeff[gid], flx, sed)
+                    elif z[gid] < z[ngbid]:
+                        flx = edge[p]*(z[ngbid] - z[gid])/dist[p]
+                        sfrac, tsed = _addsed(difflay, maxlayh, ngbid, coeff[gid], flx, sed)
+                elif z[gid] > z[ngbid]:
+                    flx = edge[p]*(z[ngbid] - z[gid])/dist[p]
+                    sfrac, tsed = _addsed(difflay, maxlayh, gid, coeff[gid], flx, sed)
+                if sfrac > 0.:
+                    tfrac = 1./sfrac
+                    if tsed < 0.:
+                        ero[gid,:] += tfrac*sed
+                    if tsed > 0.:
+                        depo[gid,:] += tfrac*sed
+                    sumDiff[gid] += tfrac*tsed
+
+    return
+
+def diffsedhillslope(pyZ, pyBord, difflay, maxlayh, pyCoeff, pyNgbs, pyEdge, pyDist, pyGIDs):
+    """
+    Compute the hillslope diffusion flux of each sediment class.
+
+    Returns
+    -------
+    sumDiff
+        Numpy array with the total diffusion flux of each node.
+
+    ero
+        Numpy array with the eroded volume of each sediment class.
+
+    depo
+        Numpy array with the deposited volume of each sediment class.
+    """
+
+    offsets, ngbs, edge, dist = _compress(pyNgbs, pyEdge, pyDist)
+    difflay = realarray(difflay)
+    sumDiff = numpy.empty(len(pyZ))
+    ero = numpy.empty(difflay.shape)
+    depo = numpy.empty(difflay.shape)
+    _diffsedhillslope(realarray(pyZ), intarray(pyBord), difflay, realarray(maxlayh),
+                      realarray(pyCoeff), offsets, ngbs, edge, dist, intarray(pyGIDs),
+                      sumDiff, ero, depo)
+
+    return sumDiff, ero, depo
+
+@jit
+def _limitspl(SPL, totspl, dh, dt):
+    """
+    Limit the erosion to the elevation difference with the receiver.
+    """
+
+    if -totspl*dt > dh:
+        if dh == 0.:
+            SPL[:] = 0.
+            totspl = 0.
+        else:
+            frac = dh/(-totspl*dt)
+            for r in range(len(SPL)):
+                SPL[r] = SPL[r]*frac
+            totspl = -dh
+
+    return totspl
+
+@jit
+def _streampower(stack, rcv, pitID, pitVol1, pitDrain, xy, area, maxH, maxD, disch, fillH,
+                 elev, riv, Cero, actlay, perc_dep, slp_cr, sea, dt, borders, impl, impEro,
+                 incisiontype, bedslptype, spl_m, spl_n, sed_mt, sed_nt, sed_kt, width_kw,
+                 width_b, depo, ero, sedFluxes):
+
+    nodes = riv.shape[0]
+    rockNb = riv.shape[1]
+    depo[:, :] = 0.
+    ero[:, :] = 0.
+    pitVol = pitVol1.copy()
+    for k in range(nodes):
+        for r in range(rockNb):
+            sedFluxes[k,r] = riv[k,r]*dt
+    bedFluxes = numpy.zeros((nodes, rockNb))
+    upZ = numpy.full(nodes, 1.e6)
+    updist = numpy.zeros(nodes)
+    SPL = numpy.zeros(rockNb)
+    Qs = numpy.zeros(rockNb)
+    Qb = numpy.zeros(rockNb)
+    frck = numpy.zeros(rockNb)
+    erodep = numpy.zeros(rockNb)
+    pitDep = numpy.zeros(rockNb)
+
+    # The basins of the stack are independent (see the Fortran kernel), the stack is
+    # processed from its end as a whole
+    for n in range(len(stack)-1, -1, -1):
+
+        SPL[:] = 0.
+        donor = stack[n]
+        recvr = rcv[donor]
+        dh = _R0_95*(elev[donor] - elev[recvr])
+
+        if elev[donor] > sea and elev[recvr] < sea:
+            dh = _R0_99*(elev[donor] - sea)
+        if dh < _R0_001:
+            dh = 0.
+        waterH = fillH[donor] - elev[donor]
+        dist = numpy.sqrt((xy[donor,0] - xy[recvr,0])**2 + (xy[donor,1] - xy[recvr,1])**2)
+
+        # Compute stream power law
+        slpdh = 0.
+        bedfrac = _R0_02
+        totspl = 0.
+        totdist = 0.
+        if recvr != donor and dh > 0.:
+            # In case where there is no depression or we are above sea-water
+            if waterH == 0. and fillH[donor] >= sea:
+                slp = dh/dist
+
+                # Check if this is an alluvial plain in which case we force deposition
+                if updist[donor] > 0. and dist > 0. and slp_cr > 0.:
+                    updh = upZ[donor] - elev[donor]
+                    if sedFluxes[donor,:].max() > 0. and updh/updist[donor] < slp_cr \
+                            and slp < slp_cr and updh > 0:
+                        slpdh = perc_dep*updh
+                        slpdh = min(slpdh, maxD[donor])
+                elif incisiontype > 0 and dist > 0. and updist[donor] > 0.:
+                    slpdh = upZ[donor] - elev[donor]
+
+                if bedslptype > 0 and updist[donor] > 0.:
+                    # Compute upper slope
+                    upperslp = abs(upZ[donor] - elev[donor])/updist[donor]
+                    # Find bedload fraction in current node
+                    if upperslp >= _RINVSQRT3:
+                        bedfrac = 1.
+                    elif bedslptype == 1:
+                        bedfrac = _R0_98SQRT3*upperslp + _R0_02
+                    elif bedslptype == 2:
+                        bedfrac = (1./(1. + abs((upperslp - _R0_60965)/_R0_08)**_R1_912) - _R0_0201)*_R1_181 + _R0_02
+                    elif bedslptype == 3:
+                        bedfrac = (_R0_8499389 - 1./(1. + abs((upperslp + _R0_0323)/_R0_08)**_R1_912))*_R1_181 + _R0_02
+                elif bedslptype > 0 and updist[donor] == 0.:
+                    bedfrac = _R0_02
+                elif bedslptype == 0:
+                    bedfrac = 1.
+
+                # Compute the stream power law expressed in m/y
+                if dist > 0.:
+                    SPL[:] = 0.
+                    totspl = 0.
+
+                    # Get fraction of each rock type present in the active layer
+                    if rockNb > 1:
+                        totflx = 0.
+                        for r in range(rockNb):
+                            totflx += actlay[donor,r]
+                        for r in range(rockNb):
+                            frck[r] = actlay[donor,r]/totflx
+                    else:
+                        frck[0] = 1.
+
+                    # Detachment limited
+                    if incisiontype == 0 and slpdh == 0. and impl == 1:
+                        # Erosion computed by the implicit solver (implicitspl)
+                        for r in range(rockNb):
+                            SPL[r] = -frck[r]*impEro[donor]/dt
+                            totspl += SPL[r]
+                    elif incisiontype == 0 and slpdh == 0.:
+                        for r in range(rockNb):
+                            SPL[r] = -Cero[donor,r]*frck[r]*bedfrac*disch[donor]**spl_m*slp**spl_n
+                            totspl += SPL[r]
+                        totspl = _limitspl(SPL, totspl, dh, dt)
+
+                    # Sediment flux dependent incision rules
+                    elif incisiontype > 0:
+                        Qt = sed_kt*disch[donor]**sed_mt*slp**sed_nt
+                        totflx = 0.
+                        for r in range(rockNb):
+                            if bedslptype > 0:
+                                totflx += bedFluxes[donor,r]
+                            else:
+                                totflx += sedFluxes[donor,r]
+                        fct = 0.
+                        if Qt > 0.:
+                            # Generalised undercapacity model and saltation abrasion
+                            if incisiontype == 1 or incisiontype == 4:
+                                fct = 1. - totflx/Qt
+                            # Almost parabolic sedflux dependency
+                            elif incisiontype == 2:
+                                frac = totflx/Qt
+                                if frac < _R0_1:
+                                    fct = _R2_6*frac + _R0_1
+                                else:
+                                    fct = 1. - 4*(frac - 0.5)**2
+                            # Asymmetric sedflux dependency
+                            elif incisiontype == 3:
+                                frac = totflx/Qt
+                                if frac < _R0_35:
+                                    fct = numpy.exp(-(frac - _R0_35)**2/_R0_22SQ)
+                                else:
+                                    fct = numpy.exp(-(frac - _R0_35)**2/_R0_6SQ)
+                            if fct < 0.:
+                                fct = 0.
+                            if fct > 1.:
+                                fct = 1.
+                        if incisiontype < 4:
+                            for r in range(rockNb):
+                                SPL[r] = -Cero[donor,r]*frck[r]*fct*disch[donor]**spl_m*slp**spl_n
+                                totspl += SPL[r]
+                            totspl = _limitspl(SPL, totspl, dh, dt)
+                        elif incisiontype == 4:
+                            # Channel width
+                            width = width_kw*disch[donor]**width_b
+                            if width > 0:
+                                for r in range(rockNb):
+                                    SPL[r] = -Cero[donor,r]*frck[r]*totflx/width*fct*disch[donor]**spl_m*slp**spl_n
+                                    totspl += SPL[r]
+                            else:
+                                SPL[:] = 0.
+
+        maxh = maxH[donor]
+        if waterH > 0.:
+            maxh = waterH
+        elif elev[donor] < sea:
+            maxh = sea - elev[donor]
+        elif slpdh > 0. and slp_cr > 0.:
+            maxh = slpdh
+        elif slpdh > 0. and incisiontype > 0:
+            maxh = slpdh
+        maxh = _R0_95*maxh
+
+        Qs[:] = 0.
+        Qb[:] = 0.
+        erodep[:] = 0.
+        pitDep[:] = 0.
+        # Erosion case
+        if totspl < 0.:
+            # Limit erosion based on active layer rock proportion
+            for r in range(rockNb):
+                if rockNb > 1 and -SPL[r]*dt > actlay[donor,r]:
+                    erodep[r] = -actlay[donor,r]*area[donor]
+                else:
+                    erodep[r] = SPL[r]*dt*area[donor]
+                Qs[r] = -erodep[r] + sedFluxes[donor,r]
+                if bedslptype > 0:
+                    Qb[r] = -erodep[r]*bedfrac + bedFluxes[donor,r]
+
+        # Deposition case
+        elif totspl >= 0. and area[donor] > 0.:
+            # Fill depression
+            if waterH > 0. and fillH[donor] > sea:
+                totdist = 0.
+                for r in range(rockNb):
+                    pitDep[r] = sedFluxes[donor,r]
+                    totdist += pitDep[r]
+
+            # Marine deposit
+            elif elev[donor] <= sea:
+                for r in range(rockNb):
+                    erodep[r] = sedFluxes[donor,r]
+
+            # Alluvial plain deposit
+            elif maxh > 0. and waterH == 0. and donor != recvr and elev[donor] > sea:
+                totflx = 0.
+                for r in range(rockNb):
+                    totflx += sedFluxes[donor,r]
+                if totflx/area[donor] < maxh:
+                    for r in range(rockNb):
+                        erodep[r] = sedFluxes[donor,r]
+                else:
+                    for r in range(rockNb):
+                        frac = sedFluxes[donor,r]/totflx
+                        erodep[r] = frac*maxh*area[donor]
+                        Qs[r] = sedFluxes[donor,r] - erodep[r]
+                        if bedslptype > 0:
+                            Qb[r] = max(0., bedFluxes[donor,r] - erodep[r])
+
+            # Base-level (sink)
+            elif donor == recvr:
+                for r in range(rockNb):
+                    erodep[r] = sedFluxes[donor,r]
+            else:
+                for r in range(rockNb):
+                    Qs[r] = sedFluxes[donor,r]
+                    if bedslptype > 0:
+                        Qb[r] = bedFluxes[donor,r]
+
+        # Update sediment volume in receiver node
+        if pitDep.max() == 0.:
+            for r in range(rockNb):
+                sedFluxes[recvr,r] += Qs[r]
+                if bedslptype > 0:
+                    bedFluxes[recvr,r] += Qb[r]
+                if erodep[r] < 0.:
+                    ero[donor,r] += erodep[r]
+                else:
+                    depo[donor,r] += erodep[r]
+
+        # In case we fill a depression
+        elif pitDep.max() > 0. and pitID[donor] > -1 and area[pitID[donor]] > 0.:
+            # Perform distribution
+            tmpID = pitID[donor]
+            while totdist > 0.:
+                # Get the volume already deposited on the considered node
+                tmpdist = 0.
+                for r in range(rockNb):
+                    tmpdist += depo[tmpID,r]
+
+                # In case the depression is underwater
+                if fillH[tmpID] < sea:
+                    if elev[donor] < sea:
+                        for r in range(rockNb):
+                            depo[donor,r] += pitDep[r]
+                    else:
+                        for r in range(rockNb):
+                            sedFluxes[recvr,r] += pitDep[r]
+                    totdist = 0.
+                    nID = recvr
+
+                # In case the depression is not filled
+                elif tmpdist + totdist <= pitVol[tmpID]:
+                    for r in range(rockNb):
+                        depo[tmpID,r] += pitDep[r]
+                    totdist = 0.
+                    nID = tmpID
+
+                # In case this is an internally drained depression
+                elif pitDrain[tmpID] == tmpID:
+                    for r in range(rockNb):
+                        depo[tmpID,r] += pitDep[r]
+                    totdist = 0.
+                    nID = tmpID
+
+                # Otherwise get the amount to distibute towards draining basins
+                else:
+                    nID = tmpID
+                    if borders[tmpID] == 0:
+                        totdist = 0.
+                    elif tmpdist != pitVol[tmpID]:
+                        newdist = 0.
+                        totflx = 0.
+                        for r in range(rockNb):
+                            frac = pitDep[r]/totdist
+                            depo[tmpID,r] += (pitVol[tmpID] - tmpdist)*frac
+                            pitDep[r] = (totdist - (pitVol[tmpID] - tmpdist))*frac
+                            newdist += pitDep[r]
+                            totflx += depo[tmpID,r]
+                        totdist = newdist
+                        pitVol[tmpID] = totflx
+
+                if pitDrain[nID] < 0:
+                    break
+                tmpID = pitDrain[nID]
+
+        # For alluvial deposition
+        upZ[recvr] = min(elev[donor], upZ[recvr])
+        if upZ[recvr] == elev[donor]:
+            updist[recvr] = dist
+
+    return
+
+def streampower(pyStack, pyRcv, pitID, pitVol1, pitDrain, pyXY, pyArea, pyMaxH, pyMaxD,
+                pyDischarge, pyFillH, pyElev, pyRiv, Cero, actlay, perc_dep, slp_cr, sea, dt,
+                borders, impl, pyImpEro):
+    """
+    Compute the erosion and deposition of each sediment class with the stream power law and
+    the selected incision rule, routing the sediment fluxes down the stack.
+
+    Returns
+    -------
+    pyDepo
+        Numpy array with the deposited volume of each sediment class.
+
+    pyEro
+        Numpy array with the eroded volume of each sediment class.
+
+    sedFluxes
+        Numpy array with the sediment flux of each sediment class.
+    """
+
+    riv = realarray(pyRiv)
+    if riv.ndim == 1:
+        riv = riv.reshape((len(riv), 1))
+    depo = numpy.empty(riv.shape)
+    ero = numpy.empty(riv.shape)
+    sedFluxes = numpy.empty(riv.shape)
+    Cero = realarray(Cero).reshape(riv.shape)
+    actlay = realarray(actlay).reshape(riv.shape)
+    _streampower(intarray(pyStack), intarray(pyRcv), intarray(pitID), realarray(pitVol1),
+                 intarray(pitDrain), realarray(pyXY), realarray(pyArea), realarray(pyMaxH),
+                 realarray(pyMaxD), realarray(pyDischarge), realarray(pyFillH), realarray(pyElev),
+                 riv, Cero, actlay, float(perc_dep), float(slp_cr), float(sea), float(dt),
+                 intarray(borders), int(impl), realarray(pyImpEro), _incisiontype, _bedslptype,
+                 _spl_m, _spl_n, _sed_mt, _sed_nt, _sed_kt, _width_kw, _width_b,
+                 depo, ero, sedFluxes)
+
+    return depo, ero, sedFluxes
+
+@jit
+def _getid1(volc, vol, alldrain, pit, sumvol, ids, ids2):
+
+    newNb = 0
+    newNb2 = 0
+    sumvol[:] = 0.
+    ids[:] = 0
+    ids2[:] = 0
+    for p in range(len(vol)):
+        for s in range(volc.shape[1]):
+            sumvol[p] += volc[p,s]
+        if sumvol[p] > vol[p] and vol[p] > 0.:
+            ids[newNb] = p
+            newNb += 1
+        if pit[p] >= 0 and alldrain[p] == pit[p]:
+            ids2[newNb2] = p
+            newNb2 += 1
+
+    return newNb, newNb2
+
+def getid1(volc, vol, alldrain, pit):
+    """
+    Find the depressions receiving more sediment than their volume and the internally
+    drained depressions.
+
+    Returns
+    -------
+    sumvol
+        Numpy array with the total sediment volume of each node.
+
+    ids, ids2
+        Numpy integer-type arrays with the IDs of the overfilled and of the internally
+        drained depressions (first newNb and newNb2 values).
+
+    newNb, newNb2
+        Number of overfilled and internally drained depressions.
+    """
+
+    volc = realarray(volc)
+    if volc.ndim == 1:
+        volc = volc.reshape((len(volc), 1))
+    nb = len(vol)
+    sumvol = numpy.empty(nb)
+    ids = numpy.empty(nb, dtype=numpy.int32)
+    ids2 = numpy.empty(nb, dtype=numpy.int32)
+    newNb, newNb2 = _getid1(volc, realarray(vol), intarray(alldrain), intarray(pit), sumvol,
+                            ids, ids2)
+
+    return sumvol, ids, ids2, newNb, newNb2
+
+@jit
+def _getids(fillH, elev, depo, vol, seal, ids, ids2, ids3, perc, ndepo):
+
+    newNb = 0
+    newNb2 = 0
+    newNb3 = 0
+    ids[:] = 0
+    ids2[:] = 0
+    ids3[:] = 0
+    perc[:, :] = 0.
+    sedNb = depo.shape[1]
+    for p in range(len(elev)):
+        for s in range(sedNb):
+            ndepo[p,s] = depo[p,s]
+        inplain = False
+        sumdep = 0.
+        sumperc = 0.
+        # Get alluvial plain deposition ID
+        if elev[p] > seal and fillH[p] == elev[p]:
+            inplain = True
+            for s in range(sedNb):
+                sumdep += depo[p,s]
+            if sumdep > 0.:
+                ids[newNb] = p
+                newNb += 1
+
+        # Get land pit deposition ID
+        if elev[p] > seal and fillH[p] > seal and vol[p] > 0.:
+            if sumdep == 0. and not inplain:
+                nvol = 0.
+                for s in range(sedNb):
+                    if depo[p,s]/vol[p] > 1.e-8:
+                        nvol += depo[p,s]
+                for s in range(sedNb):
+                    if depo[p,s]/vol[p] > 1.e-8:
+                        perc[p,s] = depo[p,s]/nvol
+                        sumperc += perc[p,s]
+                    else:
+                        ndepo[p,s] = 0.
+                        perc[p,s] = 0.
+            if sumperc > 0.:
+                ids2[newNb2] = p
+                newNb2 += 1
+                if abs(sumperc - 1.) > 1.e-8:
+                    for s in range(sedNb):
+                        perc[p,s] = perc[p,s]/sumperc
+
+        # Get water deposition ID
+        if elev[p] <= seal:
+            for s in range(sedNb):
+                sumdep += depo[p,s]
+            if sumdep > 0.:
+                ids3[newNb3] = p
+                newNb3 += 1
+
+    return newNb, newNb2, newNb3
+
+def getids(fillH, elev, depo, vol, seal):
+    """
+    Find the nodes of the alluvial plain, land depression and marine deposits and the
+    composition of the land depression deposits.
+
+    Returns
+    -------
+    ids, ids2, ids3
+        Numpy integer-type arrays with the IDs of the alluvial plain, land depression and
+        marine deposits (first newNb, newNb2 and newNb3 values).
+
+    perc
+        Numpy array with the proportion of each sediment class in the land depressions.
+
+    newNb, newNb2, newNb3
+        Number of alluvial plain, land depression and marine deposits.
+
+    ndepo
+        Numpy array with the deposits, negligible classes of the land depressions removed.
+    """
+
+    depo = realarray(depo)
+    if depo.ndim == 1:
+        depo = depo.reshape((len(depo), 1))
+    nb = len(elev)
+    ids = numpy.empty(nb, dtype=numpy.int32)
+    ids2 = numpy.empty(nb, dtype=numpy.int32)
+    ids3 = numpy.empty(nb, dtype=numpy.int32)
+    perc = numpy.empty(depo.shape)
+    ndepo = numpy.empty(depo.shape)
+    newNb, newNb2, newNb3 = _getids(realarray(fillH), realarray(elev), depo, realarray(vol),
+                                    float(seal), ids, ids2, ids3, perc, ndepo)
+
+    return ids, ids2, ids3, perc, newNb, newNb2, newNb3, ndepo
@@ -0,0 +1,89 @@
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+##                                                                                   ##
+##  This file forms part of the Badlands surface processes modelling application.    ##
+##                                                                                   ##
+##  For full license and copyright information, please refer to the LICENSE.md file  ##
+##  located at the project root, or contact the authors.                             ##
+##                                                                                   ##
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+"""
+Python implementation of the flow network stack (libUtils/FLWnetwork.f90, module fstack).
+"""
+
+import numpy
+from .jit import jit, intarray
+
+@jit
+def _build(base, rcv, delta, donors, stack):
+
+    nodes = len(rcv)
+    counts = numpy.zeros(nodes, dtype=numpy.int32)
+    for k in range(nodes):
+        r = rcv[k]
+        donors[delta[r] + counts[r]] = k
+        counts[r] += 1
+
+    # Depth-first traversal of the donors from each base level, in the order of the
+    # recursive Fortran implementation
+    allocs = numpy.full(nodes, -1, dtype=numpy.int32)
+    nodeStack = numpy.empty(nodes+1, dtype=numpy.int32)
+    posStack = numpy.empty(nodes+1, dtype=numpy.int32)
+    stack[:] = -1
+    j = 0
+    for b in range(len(base)):
+        k = base[b]
+        stack[j] = k
+        j += 1
+        allocs[k] = b
+        top = 0
+        nodeStack[0] = k
+        posStack[0] = delta[k]
+        while top >= 0:
+            node = nodeStack[top]
+            n = posStack[top]
+            if n >= delta[node+1]:
+                top -= 1
+                continue
+            posStack[top] = n + 1
+            donor = donors[n]
+            if allocs[donor] != b:
+                stack[j] = donor
+                j += 1
+                allocs[donor] = b
+                top += 1
+                nodeStack[top] = donor
+                posStack[top] = delta[donor]
+
+    return
+
+def build(pyBase, pyRcv, pyDelta):
+    """
+    Build the ordered stack of the nodes from their base levels (Braun & Willett, 2013).
+
+    Parameters
+    ----------
+    pyBase
+        Numpy integer-type array with the base level nodes.
+
+    pyRcv
+        Numpy integer-type array with the receiver of each node.
+
+    pyDelta
+        Numpy integer-type array with the offsets of the donors of each node.
+
+    Returns
+    -------
+    pyDonors
+        Numpy integer-type array with the donors of each node (grouped by receiver).
+
+    pyStackOrder
+        Numpy integer-type array with the ordered stack (-1 for the nodes not reached from
+        a base level).
+    """
+
+    rcv = intarray(pyRcv)
+    donors = numpy.zeros(len(rcv), dtype=numpy.int32)
+    stack = numpy.empty(len(rcv), dtype=numpy.int32)
+    _build(intarray(pyBase), rcv, intarray(pyDelta), donors, stack)
+
+    return donors, stack
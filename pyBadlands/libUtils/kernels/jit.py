@@ -0,0 +1,59 @@
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+##                                                                                   ##
+##  This file forms part of the Badlands surface processes modelling application.    ##
+##                                                                                   ##
+##  For full license and copyright information, please refer to the LICENSE.md file  ##
+##  located at the project root, or contact the authors.                             ##
+##                                                                                   ##
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+"""
+This module provides the just-in-time compilation decorator of the Python kernels.
+
+The kernels are compiled with Numba when it is installed. Otherwise the decorator leaves
+the functions unchanged and the kernels run as plain Python, which gives the same results
+but is only suitable for small meshes.
+"""
+
+import numpy
+
+try:
+    from numba import njit
+    NUMBA = True
+except ImportError:
+    NUMBA = False
+
+def intarray(array):
+    """
+    Convert an argument to a contiguous integer array, as f2py does for integer arguments.
+    """
+
+    return numpy.ascontiguousarray(array, dtype=numpy.int32)
+
+def realarray(array):
+    """
+    Convert an argument to a contiguous double precision array, as f2py does for real(kind=8)
+    arguments.
+    """
+
+    return numpy.ascontiguousarray(array, dtype=numpy.float64)
+
+def jit(func):
+    """
+    Compile a kernel in nopython mode. Divisions by zero follow the IEEE rules (as in the
+    Fortran and C kernels) and the compiled code is cached on disk.
+
+    Parameters
+    ----------
+    func
+        Kernel function using only numpy arrays and scalars.
+
+    Returns
+    -------
+    func
+        Compiled kernel or the function itself when Numba is not available.
+    """
+
+    if not NUMBA:
+        return func
+
+    return njit(cache=True, error_model='numpy')(func)
@@ -0,0 +1,121 @@
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+##                                                                                   ##
+##  This file forms part of the Badlands surface processes modelling application.    ##
+##                                                                                   ##
+##  For full license and copyright information, please refer to the LICENSE.md file  ##
+##  located at the project root, or contact the authors.                             ##
+##                                                                                   ##
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+"""
+Python implementation of the linear orographic precipitation model of Smith and Barstad
+(2004) (libUtils/ORmodel.f90, module orographicrain).
+
+The Fourier transforms of the Fortran model are replaced by the numpy ones. The computation
+is performed in double precision and the precipitation is returned in single precision, as
+by the Fortran model.
+"""
+
+import numpy
+
+def compute(pyElev, pyDx, pywindX, pywindY, pyminRain, pymaxRain, pybackRain, pyNm, pyCw, pyHw,
+            pytauC, pytauF):
+    """
+    Compute the orographic precipitation on a regular grid.
+
+    Parameters
+    ----------
+    pyElev
+        Numpy array with the elevation of the regular grid.
+
+    pyDx
+        Grid resolution.
+
+    pywindX, pywindY
+        Horizontal wind components (m/s).
+
+    pyminRain, pymaxRain
+        Precipitation range (m/a).
+
+    pybackRain
+        Background precipitation rate (m/a).
+
+    pyNm
+        Moist stability frequency (/s).
+
+    pyCw
+        Uplift sensitivity factor (kg/m3).
+
+    pyHw
+        Water vapor scale height (m).
+
+    pytauC, pytauF
+        Conversion and fallout times (s).
+
+    Returns
+    -------
+    pyRain
+        Numpy array with the precipitation of the regular grid.
+    """
+
+    elev = numpy.asarray(pyElev, dtype=numpy.float64)
+    pynx, pyny = elev.shape
+
+    # Define computational grid, the elevation being extrapolated on the borders
+    nx = int(pynx/2.) + pynx
+    ny = int(pyny/2.) + pyny
+    i1 = int(pynx/4.) - 1
+    j1 = int(pyny/4.) - 1
+    hh = numpy.pad(elev, ((i1, nx-i1-pynx), (j1, ny-j1-pyny)), mode='edge')
+
+    # FFT terrain
+    hh = numpy.fft.fft2(hh)
+    hr = hh.real
+    hi = hh.imag
+
+    # Wavenumbers
+    wk = numpy.arange(nx)
+    wk[wk > nx//2] -= nx
+    wl = numpy.arange(ny)
+    wl[wl > ny//2] -= ny
+    k1 = 2.*numpy.pi*wk/(nx*pyDx)
+    k2 = 2.*numpy.pi*wl/(ny*pyDx)
+    k1, k2 = numpy.meshgrid(k1, k2, indexing='ij')
+
+    # FFT precipitation
+    nm2 = pyNm*pyNm
+    sigma = pywindX*k1 + pywindY*k2
+    mr = numpy.zeros(hh.shape)
+    mi = numpy.zeros(hh.shape)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        fct = nm2/(sigma*sigma) - 1.
+        ids = numpy.where((sigma != 0.) & (fct >= 0.))
+        mr[ids] = numpy.sqrt(fct[ids]*(k1[ids]**2 + k2[ids]**2))*numpy.sign(sigma[ids])
+        ids = numpy.where((sigma != 0.) & (fct < 0.))
+        mi[ids] = numpy.sqrt(-fct[ids]*(k1[ids]**2 + k2[ids]**2))
+
+    tauc = pytauC
+    tauf = pytauF
+    hw = pyHw
+    denom = ((1+mi*hw)**2 + mr*mr*hw*hw)*(1+sigma*sigma*tauc*tauc)*(1+sigma*sigma*tauf*tauf)
+    t1 = hi*(1+mi*hw) + hr*mr*hw
+    t2 = hr*(1+mi*hw) - hi*mr*hw
+    funcr = -pyCw*sigma*(t1*(1-sigma*sigma*tauc*tauf) - t2*sigma*(tauc+tauf))/denom
+    funci = pyCw*sigma*(t2*(1-sigma*sigma*tauc*tauf) + t1*sigma*(tauc+tauf))/denom
+
+    # Conversion in mm/hr
+    pr = 3600.*((funcr - funci) + 1j*(funci + funcr))
+
+    # Precipitation field in physical space converted from mm/hr to m/yr
+    prr = numpy.fft.ifft2(pr).real*24.*365./1000.
+
+    # Define precipitation using user range
+    rain = prr[i1:i1+pynx, j1:j1+pyny] + pybackRain
+    minprr = min(rain.min(), 1000.)
+    maxprr = max(rain.max(), -1000.)
+    aa = (pybackRain - pyminRain)/(pybackRain - minprr)
+    bb = pyminRain - aa*minprr
+    aa2 = (pymaxRain - pybackRain)/(maxprr - pybackRain)
+    bb2 = pybackRain - aa2*pybackRain
+    rain = numpy.where(rain <= pybackRain, aa*rain + bb, aa2*rain + bb2)
+
+    return rain.astype(numpy.float32)
@@ -0,0 +1,38 @@
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+##                                                                                   ##
+##  This file forms part of the Badlands surface processes modelling application.    ##
+##                                                                                   ##
+##  For full license and copyright information, please refer to the LICENSE.md file  ##
+##  located at the project root, or contact the authors.                             ##
+##                                                                                   ##
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+"""
+Python implementation of the partition overlap search (libUtils/FASTloop.f90, module part).
+"""
+
+import numpy
+from .jit import realarray
+
+def overlap(pyX, pyY, pyXst, pyYst, pyXed, pyYed):
+    """
+    Find the nodes located inside a rectangular extent.
+
+    Parameters
+    ----------
+    pyX, pyY
+        Numpy arrays with the nodes coordinates.
+
+    pyXst, pyYst, pyXed, pyYed
+        Extent of the rectangle.
+
+    Returns
+    -------
+    pyPart
+        Numpy integer-type array with the ID of the nodes inside the extent and -1 outside.
+    """
+
+    x = realarray(pyX)
+    y = realarray(pyY)
+    inside = (x >= pyXst) & (x <= pyXed) & (y >= pyYst) & (y <= pyYed)
+
+    return numpy.where(inside, numpy.arange(len(x), dtype=numpy.int32), -1).astype(numpy.int32)
@@ -0,0 +1,635 @@
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+##                                                                                   ##
+##  This file forms part of the Badlands surface processes modelling application.    ##
+##                                                                                   ##
+##  For full license and copyright information, please refer to the LICENSE.md file  ##
+##  located at the project root, or contact the authors.                             ##
+##                                                                                   ##
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+"""
+Python implementation of the Planchon & Darboux and priority-flood depression filling
+algorithms and of the stratigraphic layers update (libUtils/PDalgo.f90, module pdstack).
+
+As in the Fortran module, the mesh parameters set by pitparams (or pitparamscsr) are shared
+by the following calls.
+"""
+
+import numpy
+from .jit import jit, intarray, realarray
+from .sfd import _compress
+
+# Sediment distribution parameters
+_max_it_cyc = 500000
+_diff_res = 1.e-2
+
+# Mesh and filling parameters (see pitparams)
+_offsets = None
+_ngbs = None
+_area = None
+_diffnbmax = 0
+_diffprop = 0.
+_bds = 0
+_eps = 0.
+_fill_TH = 0.
+
+def pitparams(pyNgbs, pyArea, pyDiff, pyProp, fillTH, epsilon, pybounds):
+    """
+    Set the mesh and depression filling parameters.
+
+    Parameters
+    ----------
+    pyNgbs
+        Numpy integer-type array with the neighbours of each node (padded with negative values).
+
+    pyArea
+        Numpy array with the Voronoi area of each node.
+
+    pyDiff
+        Number of steps used to distribute the marine sediments.
+
+    pyProp
+        Proportion of the accommodation space filled at each distribution step.
+
+    fillTH
+        Maximum filling thickness.
+
+    epsilon
+        Elevation increment between the filled nodes.
+
+    pybounds
+        Number of boundary nodes, stored first.
+    """
+
+    offsets, ngbs = _compress(pyNgbs)
+    pitparamscsr(offsets, ngbs, pyArea, pyDiff, pyProp, fillTH, epsilon, pybounds)
+
+    return
+
+def pitparamscsr(pyOffsets, pyNgbs, pyArea, pyDiff, pyProp, fillTH, epsilon, pybounds):
+    """
+    Same as pitparams using the compressed sparse row neighbourhood layout.
+    """
+
+    global _offsets, _ngbs, _area, _diffnbmax, _diffprop, _bds, _eps, _fill_TH
+
+    _offsets = intarray(pyOffsets)
+    _ngbs = intarray(pyNgbs)
+    _area = realarray(pyArea)
+    _diffnbmax = int(pyDiff)
+    _diffprop = float(pyProp)
+    _bds = int(pybounds)
+    _eps = float(epsilon)
+    _fill_TH = float(fillTH)
+
+    return
+
+@jit
+def _pitfilling(elev, allfill, sea, offsets, ngbs, bds, eps, fill_TH, demH):
+
+    nodes = len(elev)
+
+    # Initialisation phase
+    data1 = numpy.empty(max(nodes-bds, 0), dtype=numpy.int32)
+    data2 = numpy.empty(max(nodes-bds, 0), dtype=numpy.int32)
+    s1 = 0
+    s2 = 0
+    for k in range(nodes):
+        if k < bds:
+            demH[k] = elev[k]
+        else:
+            demH[k] = 1.e6
+            data1[s1] = k
+            s1 += 1
+
+    # Filling phase
+    change = True
+    while change:
+        change = False
+        for n in range(s1):
+            k = data1[n]
+            if demH[k] > elev[k]:
+                # Get minimum value
+                hmin = 2.e6
+                for p in range(offsets[k], offsets[k+1]):
+                    hmin = min(hmin, demH[ngbs[p]])
+                if elev[k] >= hmin + eps:
+                    demH[k] = elev[k]
+                else:
+                    if demH[k] > hmin + eps:
+                        demH[k] = hmin + eps
+                        if allfill != 0:
+                            change = True
+                        elif elev[k] >= sea:
+                            if demH[k] - elev[k] > fill_TH:
+                                demH[k] = elev[k] + fill_TH
+                            else:
+                                change = True
+                        else:
+                            if demH[k] - sea > fill_TH:
+                                demH[k] = sea + fill_TH
+                            else:
+                                change = True
+                    data2[s2] = k
+                    s2 += 1
+        if s2 > 0:
+            s1 = s2
+            data1[:s1] = data2[:s2]
+            s2 = 0
+
+    return
+
+def pitfilling(elevation, allfill, sealevel):
+    """
+    Fill the depressions with the Planchon & Darboux algorithm.
+
+    Parameters
+    ----------
+    elevation
+        Numpy array with the elevation of each node.
+
+    allfill
+        Flag (0) to limit the filling to the maximum filling thickness.
+
+    sealevel
+        Sea level.
+
+    Returns
+    -------
+    demH
+        Numpy array with the filled elevation.
+    """
+
+    elev = realarray(elevation)
+    demH = numpy.empty(len(elev))
+    _pitfilling(elev, int(allfill), float(sealevel), _offsets, _ngbs, _bds, _eps, _fill_TH, demH)
+
+    return demH
+
+@jit
+def _heappush(heapID, heapH, heapNb, nid, h):
+    """
+    Push a node in the binary heap, growing the heap when needed.
+    """
+
+    if heapNb == len(heapID):
+        tmpID = numpy.empty(2*heapNb, dtype=numpy.int32)
+        tmpH = numpy.empty(2*heapNb)
+        tmpID[:heapNb] = heapID[:heapNb]
+        tmpH[:heapNb] = heapH[:heapNb]
+        heapID = tmpID
+        heapH = tmpH
+
+    i = heapNb
+    heapNb += 1
+    while i > 0:
+        j = (i - 1)//2
+        if heapH[j] <= h:
+            break
+        heapH[i] = heapH[j]
+        heapID[i] = heapID[j]
+        i = j
+    heapH[i] = h
+    heapID[i] = nid
+
+    return heapID, heapH, heapNb
+
+@jit
+def _heappop(heapID, heapH, heapNb):
+    """
+    Pop the lowest node of the binary heap.
+    """
+
+    nid = heapID[0]
+    h = heapH[0]
+    lastID = heapID[heapNb-1]
+    lastH = heapH[heapNb-1]
+    heapNb -= 1
+
+    i = 0
+    while True:
+        j = 2*i + 1
+        if j >= heapNb:
+            break
+        if j < heapNb - 1 and heapH[j+1] < heapH[j]:
+            j += 1
+        if heapH[j] >= lastH:
+            break
+        heapH[i] = heapH[j]
+        heapID[i] = heapID[j]
+        i = j
+    if heapNb > 0:
+        heapH[i] = lastH
+        heapID[i] = lastID
+
+    return nid, h, heapNb
+
+@jit
+def _priorityfilling(elev, allfill, sea, offsets, ngbs, bds, eps, fill_TH, demH):
+
+    nodes = len(elev)
+    heapID = numpy.empty(max(nodes, 1), dtype=numpy.int32)
+    heapH = numpy.empty(max(nodes, 1))
+    heapNb = 0
+    for k in range(nodes):
+        if k < bds:
+            demH[k] = elev[k]
+            heapID, heapH, heapNb = _heappush(heapID, heapH, heapNb, k, demH[k])
+        else:
+            demH[k] = 1.e6
+
+    while heapNb > 0:
+        k, h, heapNb = _heappop(heapID, heapH, heapNb)
+        # Skip the outdated entries of nodes lowered after being pushed
+        if h > demH[k]:
+            continue
+        for p in range(offsets[k], offsets[k+1]):
+            n = ngbs[p]
+            if n < bds:
+                continue
+            h = demH[k] + eps
+            if allfill == 0:
+                if elev[n] >= sea:
+                    hmax = elev[n] + fill_TH
+                else:
+                    hmax = sea + fill_TH
+                h = min(h, hmax)
+            h = max(h, elev[n])
+            if h < demH[n]:
+                demH[n] = h
+                heapID, heapH, heapNb = _heappush(heapID, heapH, heapNb, n, h)
+
+    return
+
+def priorityfilling(elevation, allfill, sealevel):
+    """
+    Fill the depressions with the priority-flood algorithm (Barnes et al., 2014).
+
+    Parameters
+    ----------
+    elevation
+        Numpy array with the elevation of each node.
+
+    allfill
+        Flag (0) to limit the filling to the maximum filling thickness.
+
+    sealevel
+        Sea level.
+
+    Returns
+    -------
+    demH
+        Numpy array with the filled elevation.
+    """
+
+    elev = realarray(elevation)
+    demH = numpy.empty(len(elev))
+    _priorityfilling(elev, int(allfill), float(sealevel), _offsets, _ngbs, _bds, _eps, _fill_TH,
+                     demH)
+
+    return demH
+
+@jit
+def _marine_distribution(elevation, seavol, sea, border, depIDs, offsets, ngbs, area, diffnbmax,
+                         diffprop, max_it_cyc, diff_res, diffsed):
+
+    elev = elevation.copy()
+    for s in range(seavol.shape[1]):
+        newelev = elev.copy()
+        for m in range(diffnbmax):
+            seadep = seavol[:,s]/float(diffnbmax)
+            for k in range(len(depIDs)):
+                n = depIDs[k]
+                nid = n
+                ide = n
+                it = 0
+                while True:
+                    if border[ide] < 1:
+                        seadep[ide] = 0.
+                        break
+                    maxz = -1.e8
+                    for p in range(offsets[ide], offsets[ide+1]):
+                        if maxz < elev[ngbs[p]]:
+                            maxz = elev[ngbs[p]]
+                    if maxz > sea:
+                        maxz = sea
+                    if maxz < elev[ide]:
+                        maxz = elev[ide]
+                    vol = max(0., diffprop*(maxz - elev[ide])*area[ide])
+
+                    if it > max_it_cyc or seadep[ide]/area[ide] < diff_res:
+                        elev[ide] += seadep[ide]/area[ide]
+                        seadep[ide] = 0.
+                        break
+                    it += 1
+                    if seadep[ide] < vol:
+                        elev[ide] += seadep[ide]/area[ide]
+                        seadep[ide] = 0.
+                        break
+                    else:
+                        seadep[ide] -= vol
+                        elev[ide] += vol/area[ide]
+
+                    if seadep[ide] > 0.:
+                        minz = elev[ide]
+                        nid = -1
+                        maxz = -1.e8
+                        for p in range(offsets[ide], offsets[ide+1]):
+                            if minz > elev[ngbs[p]]:
+                                nid = ngbs[p]
+                                minz = elev[nid]
+                            if maxz < elev[ngbs[p]]:
+                                maxz = elev[ngbs[p]]
+                        if nid == -1:
+                            dh = maxz - elev[ide] + 0.1
+                            if seadep[ide] > dh*area[ide]:
+                                elev[ide] += dh
+                                seadep[ide] -= dh*area[ide]
+                                nid = depIDs[k]
+                                it = 0
+                                if nid != ide:
+                                    seadep[nid] += seadep[ide]
+                                    seadep[ide] = 0.
+                                ide = depIDs[k]
+                            else:
+                                elev[ide] += seadep[ide]/area[ide]
+                                seadep[ide] = 0.
+                                break
+                        elif minz > elev[ide]:
+                            dh = (minz - elev[ide]) + 0.1
+                            if seadep[ide] > dh*area[ide]:
+                                elev[ide] += dh
+                                seadep[ide] -= dh*area[ide]
+                            else:
+                                elev[ide] += seadep[ide]/area[ide]
+                                seadep[ide] = 0.
+                                break
+                            nid = depIDs[k]
+                            seadep[nid] += seadep[ide]
+                            seadep[ide] = 0.
+                            ide = nid
+                            it = 0
+                        else:
+                            seadep[nid] += seadep[ide]
+                            seadep[ide] = 0.
+                            ide = nid
+                    else:
+                        seadep[ide] = 0.
+                        break
+
+        for k in range(len(elev)):
+            diffsed[k,s] = elev[k] - newelev[k]
+
+    return
+
+def marine_distribution(elevation, seavol, sealevel, border, depIDs):
+    """
+    Distribute the sediments deposited in the marine environment over the accommodation
+    space available downstream.
+
+    Parameters
+    ----------
+    elevation
+        Numpy array with the elevation of each node.
+
+    seavol
+        Numpy array with the volume of each sediment class to distribute.
+
+    sealevel
+        Sea level.
+
+    border
+        Numpy integer-type array with the domain nodes (1) and the border nodes (0).
+
+    depIDs
+        Numpy integer-type array with the IDs of the nodes receiving marine sediments.
+
+    Returns
+    -------
+    diffsed
+        Numpy array with the deposited thickness of each sediment class.
+    """
+
+    seavol = realarray(seavol)
+    if seavol.ndim == 1:
+        seavol = seavol.reshape((len(seavol), 1))
+    diffsed = numpy.empty(seavol.shape)
+    _marine_distribution(realarray(elevation), seavol, float(sealevel), intarray(border),
+                         intarray(depIDs), _offsets, _ngbs, _area, _diffnbmax, _diffprop,
+                         _max_it_cyc, _diff_res, diffsed)
+
+    return diffsed
+
+@jit
+def _getactlay(alay, layTH, laySD, alayS):
+
+    nbLay = layTH.shape[1]
+    nbSed = laySD.shape[2]
+    alayS[:, :] = 0.
+    for n in range(layTH.shape[0]):
+        # Compute cumulative stratal thicknesses
+        cumh = layTH[n,nbLay-1]
+        alayh = 0.
+        lid = nbLay - 1
+        if cumh <= alay[n]:
+            alayh = cumh
+            for s in range(nbSed):
+                alayS[n,s] = laySD[n,nbLay-1,s]
+            for k in range(nbLay-2, -1, -1):
+                cumh += layTH[n,k]
+                # Store stratal thicknesses lower than active layer thickness
+                if alay[n] >= cumh:
+                    alayh = cumh
+                    for s in range(nbSed):
+                        alayS[n,s] += laySD[n,k,s]
+                else:
+                    lid = k
+                    break
+
+        # Find the proportion of sediment that still needs to be passed to the active layer
+        if layTH[n,lid] > 0.:
+            prop = (alay[n] - alayh)/layTH[n,lid]
+            prop = min(prop, 1.)
+            prop = max(prop, 0.)
+            if prop > 0.:
+                for s in range(nbSed):
+                    alayS[n,s] += prop*laySD[n,lid,s]
+
+    return
+
+def getactlay(alay, layTH, laySD):
+    """
+    Compute the sediment composition of the active layer.
+
+    Parameters
+    ----------
+    alay
+        Numpy array with the active layer thickness of each node.
+
+    layTH
+        Numpy array with the stratigraphic layers thickness.
+
+    laySD
+        Numpy array with the thickness of each sediment class in the stratigraphic layers.
+
+    Returns
+    -------
+    alayS
+        Numpy array with the thickness of each sediment class in the active layer.
+    """
+
+    laySD = realarray(laySD)
+    alayS = numpy.empty((laySD.shape[0], laySD.shape[2]))
+    _getactlay(realarray(alay), realarray(layTH), laySD, alayS)
+
+    return alayS
+
+def getactlay2(alay, layTH, laySD):
+    """
+    Same as getactlay with a uniform active layer thickness.
+    """
+
+    layTH = realarray(layTH)
+
+    return getactlay(numpy.full(layTH.shape[0], float(alay)), layTH, laySD)
+
+@jit
+def _updatestrati(eros, depo, newH, newS):
+
+    nbLay = newH.shape[1]
+    for n in range(newH.shape[0]):
+        for s in range(newS.shape[2]):
+            ero = -eros[n,s]
+            dep = depo[n,s]
+            if ero > 0.:
+                for k in range(nbLay-1, -1, -1):
+                    if newS[n,k,s] > 0.:
+                        if newS[n,k,s] >= ero:
+                            newS[n,k,s] -= ero
+                            newH[n,k] -= ero
+                            break
+                        else:
+                            ero -= newS[n,k,s]
+                            newH[n,k] -= newS[n,k,s]
+                            newS[n,k,s] = 0.
+            if dep > 0.:
+                newH[n,nbLay-1] += dep
+                newS[n,nbLay-1,s] += dep
+
+    return
+
+def updatestrati(layS, layH, eros, depo):
+    """
+    Update the stratigraphic layers with the eroded and deposited thickness of each sediment
+    class.
+
+    Returns
+    -------
+    newH
+        Numpy array with the updated layers thickness.
+
+    newS
+        Numpy array with the updated thickness of each sediment class in the layers.
+    """
+
+    newS = numpy.array(layS, dtype=numpy.float64)
+    newH = numpy.array(layH, dtype=numpy.float64)
+    _updatestrati(realarray(eros), realarray(depo), newH, newS)
+
+    return newH, newS
+
+@jit
+def _updatecstrati(eros, depo, newH, newS):
+
+    nbLay = newH.shape[1]
+    for n in range(newH.shape[0]):
+        ero = -eros[n]
+        dep = depo[n]
+        if ero > 0.:
+            for k in range(nbLay-1, -1, -1):
+                if newS[n,k] > 0.:
+                    if newS[n,k] >= ero:
+                        newS[n,k] -= ero
+                        newH[n,k] -= ero
+                        break
+                    else:
+                        ero -= newS[n,k]
+                        newH[n,k] -= newS[n,k]
+                        newS[n,k] = 0.
+        if dep > 0.:
+            newH[n,nbLay-1] += dep
+            newS[n,nbLay-1] += dep
+
+    return
+
+def updatecstrati(layS, layH, eros, depo):
+    """
+    Update the stratigraphic layers made of a single sediment class with the eroded and
+    deposited thickness.
+
+    Returns
+    -------
+    newH
+        Numpy array with the updated layers thickness.
+
+    newS
+        Numpy array with the updated sediment thickness in the layers.
+    """
+
+    newS = numpy.array(numpy.asarray(layS)[:, :, 0], dtype=numpy.float64)
+    newH = numpy.array(layH, dtype=numpy.float64)
+    _updatecstrati(realarray(eros), realarray(depo), newH, newS)
+
+    return newH, newS
+
+@jit
+def _stratcarb(clastic, newH, newS):
+
+    nbLay = newH.shape[1]
+    nbSed = newS.shape[2]
+    for n in range(newH.shape[0]):
+        if clastic[n] < 0.:
+            ero = -clastic[n]
+            done = False
+            for k in range(nbLay-1, -1, -1):
+                if newH[n,k] > ero:
+                    for s in range(nbSed):
+                        if newS[n,k,s] >= ero:
+                            newS[n,k,s] -= ero
+                            newH[n,k] -= ero
+                            done = True
+                            break
+                        else:
+                            ero -= newS[n,k,s]
+                            newH[n,k] -= newS[n,k,s]
+                            newS[n,k,s] = 0.
+                    if done:
+                        break
+                else:
+                    ero -= newH[n,k]
+                    newH[n,k] = 0.
+                    for s in range(nbSed):
+                        newS[n,k,s] = 0.
+        if clastic[n] > 0.:
+            newH[n,nbLay-1] += clastic[n]
+            newS[n,nbLay-1,0] += clastic[n]
+
+    return
+
+def stratcarb(layS, layH, clastic):
+    """
+    Update the stratigraphic layers with the carbonate thickness.
+
+    Returns
+    -------
+    newH
+        Numpy array with the updated layers thickness.
+
+    newS
+        Numpy array with the updated thickness of each sediment class in the layers.
+    """
+
+    newS = numpy.array(layS, dtype=numpy.float64)
+    newH = numpy.array(layH, dtype=numpy.float64)
+    _stratcarb(realarray(clastic), newH, newS)
+
+    return newH, newS
@@ -0,0 +1,412 @@
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+##                                                                                   ##
+##  This file forms part of the Badlands surface processes modelling application.    ##
+##                                                                                   ##
+##  For full license and copyright information, please refer to the LICENSE.md file  ##
+##  located at the project root, or contact the authors.                             ##
+##                                                                                   ##
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+"""
+Python implementation of the Single Flow Direction functions (libUtils/sfd.c).
+
+The functions have the signatures of the f2py wrapping (sfd.pyf): the output arrays are returned
+and the array sizes are taken from the arguments. Neighbourhoods are given either as padded
+arrays of 20 neighbours per node (negative IDs marking the end of the list) or in the compressed
+sparse row (CSR) layout for the _csr variants.
+"""
+
+import numpy
+from .jit import jit, intarray, realarray
+
+MAX_NEIGHBOURS = 20
+
+@jit
+def _dirview(elev, z, ngbs, gids, sealimit, base, rcv):
+
+    base[:] = -1
+    rcv[:] = -1
+    for k in range(len(gids)):
+        gid = gids[k]
+        lowestID = gid
+        for p in range(MAX_NEIGHBOURS):
+            ngbid = ngbs[gid,p]
+            if ngbid < 0:
+                break
+            if elev[ngbid] < elev[lowestID]:
+                lowestID = ngbid
+        rcv[gid] = lowestID
+        if z[gid] < sealimit:
+            rcv[gid] = gid
+        if gid == rcv[gid]:
+            base[gid] = gid
+
+    return
+
+@jit
+def _directions(elev, z, offsets, ngbs, gids, base, rcv, maxh, maxdep):
+
+    base[:] = -1
+    rcv[:] = -1
+    maxh[:] = 1.e6
+    maxdep[:] = 0.
+    for k in range(len(gids)):
+        gid = gids[k]
+        lowestID = gid
+        diffH = 1.e6
+        diffD = 0.
+        for p in range(offsets[gid], offsets[gid+1]):
+            ngbid = ngbs[p]
+            if elev[ngbid] < elev[lowestID]:
+                lowestID = ngbid
+            dh = z[ngbid] - z[gid]
+            if dh >= 0. and dh < diffH:
+                diffH = dh
+            if dh > diffD:
+                diffD = dh
+        rcv[gid] = lowestID
+        if gid == rcv[gid]:
+            base[gid] = gid
+        if diffH > 9.99e5:
+            diffH = 0.
+        maxh[gid] = diffH
+        maxdep[gid] = diffD
+
+    return
+
+@jit
+def _directions_base(z, offsets, ngbs, gids, base, rcv):
+
+    base[:] = -1
+    rcv[:] = -1
+    for k in range(len(gids)):
+        gid = gids[k]
+        lowestID = gid
+        for p in range(offsets[gid], offsets[gid+1]):
+            ngbid = ngbs[p]
+            if z[ngbid] < z[lowestID]:
+                lowestID = ngbid
+        rcv[gid] = lowestID
+        if gid == rcv[gid]:
+            base[gid] = gid
+
+    return
+
+@jit
+def _diffusion(z, bord, offsets, ngbs, edge, dist, gids, diff):
+
+    diff[:] = 0.
+    for k in range(len(gids)):
+        gid = gids[k]
+        if bord[gid] > 0:
+            for p in range(offsets[gid], offsets[gid+1]):
+                ngbid = ngbs[p]
+                if dist[p] <= 0.:
+                    continue
+                if bord[ngbid] > 0 or z[ngbid] < z[gid]:
+                    diff[gid] += edge[p] * (z[ngbid] - z[gid]) / dist[p]
+
+    return
+
+@jit
+def _diffnlcfl(Sc, Kd, z, bord, offsets, ngbs, dist, gids):
+
+    cfl = 1.e6
+    Sc2 = Sc * Sc
+    kd = 20. * Kd
+    for k in range(len(gids)):
+        gid = gids[k]
+        if bord[gid] > 0:
+            for p in range(offsets[gid], offsets[gid+1]):
+                ngbid = ngbs[p]
+                if dist[p] <= 0.:
+                    continue
+                if bord[ngbid] > 0 or z[ngbid] < z[gid]:
+                    dh = abs(z[ngbid] - z[gid])
+                    num = dist[p] * dist[p] - (dh / Sc2)
+                    if num > 0. and cfl > num / kd:
+                        cfl = num / kd
+
+    return cfl
+
+@jit
+def _diffusionnl(Sc, z, bord, offsets, ngbs, edge, dist, gids, diff):
+
+    diff[:] = 0.
+    Sc2 = Sc * Sc
+    for k in range(len(gids)):
+        gid = gids[k]
+        if bord[gid] > 0:
+            for p in range(offsets[gid], offsets[gid+1]):
+                ngbid = ngbs[p]
+                if dist[p] <= 0.:
+                    continue
+                if bord[ngbid] > 0 or z[ngbid] < z[gid]:
+                    dh = (z[ngbid] - z[gid]) / dist[p]
+                    denom = 1. - (dh * dh / Sc2)
+                    if denom < 0.1:
+                        denom = 0.1
+                    diff[gid] += edge[p] * dh / denom
+
+    return
+
+@jit
+def _diffusionero(z, bord, offsets, ngbs, edge, dist, gids, ero):
+
+    ero[:] = 0.
+    for k in range(len(gids)):
+        gid = gids[k]
+        if bord[gid] > 0:
+            for p in range(offsets[gid], offsets[gid+1]):
+                ngbid = ngbs[p]
+                if z[ngbid] < z[gid] and dist[p] > 0.:
+                    ero[gid] += edge[p] * (z[ngbid] - z[gid]) / dist[p]
+
+    return
+
+@jit
+def _diffusionmarine(z, bord, dep, offsets, ngbs, edge, dist, gids, diff):
+
+    diff[:] = 0.
+    for k in range(len(gids)):
+        gid = gids[k]
+        if bord[gid] > 0:
+            for p in range(offsets[gid], offsets[gid+1]):
+                ngbid = ngbs[p]
+                if dist[p] <= 0.:
+                    continue
+                if bord[ngbid] > 0:
+                    if dep[gid] > 0 and z[gid] > z[ngbid]:
+                        diff[gid] += edge[p] * (z[ngbid] - z[gid]) / dist[p]
+                    if dep[ngbid] > 0 and z[gid] < z[ngbid]:
+                        diff[gid] += edge[p] * (z[ngbid] - z[gid]) / dist[p]
+                elif z[ngbid] < z[gid] and dep[gid] > 0:
+                    diff[gid] += edge[p] * (z[ngbid] - z[gid]) / dist[p]
+
+    return
+
+def _compress(ngbs, edge=None, dist=None):
+    """
+    Convert a padded neighbourhood (20 neighbours per node, the list ending at the first
+    negative ID) to the CSR layout used by the kernels.
+    """
+
+    ngbs = intarray(ngbs)
+    valid = numpy.cumprod(ngbs >= 0, axis=1).astype(bool)
+    offsets = numpy.zeros(len(ngbs)+1, dtype=numpy.int32)
+    offsets[1:] = numpy.cumsum(valid.sum(axis=1))
+    csr = [ngbs[valid]]
+    if edge is not None:
+        csr.append(realarray(edge)[valid])
+    if dist is not None:
+        csr.append(realarray(dist)[valid])
+
+    return [offsets] + csr
+
+def dirview(pyElev, pyZ, pyNgbs, pyEdge, pyDist, pyGIDs, sealimit):
+    """
+    Compute the receivers of the nodes for the flow view: the lowest neighbour, sea nodes
+    draining to themselves.
+
+    Returns
+    -------
+    pyBase
+        Numpy integer-type array with the base level nodes (-1 otherwise).
+
+    pyRcv
+        Numpy integer-type array with the receiver of each node (-1 outside the partition).
+    """
+
+    nb = len(pyElev)
+    base = numpy.empty(nb, dtype=numpy.int32)
+    rcv = numpy.empty(nb, dtype=numpy.int32)
+    _dirview(realarray(pyElev), realarray(pyZ), intarray(pyNgbs), intarray(pyGIDs),
+             float(sealimit), base, rcv)
+
+    return base, rcv
+
+def directions(pyElev, pyZ, pyNgbs, pyEdge, pyDist, pyGIDs):
+    """
+    Compute the receivers of the nodes (lowest neighbour on the filled surface), the minimum
+    height above the nodes and the maximum depth of their neighbours.
+
+    Returns
+    -------
+    pyBase
+        Numpy integer-type array with the base level nodes (-1 otherwise).
+
+    pyRcv
+        Numpy integer-type array with the receiver of each node.
+
+    pyMaxh
+        Numpy array with the minimum elevation difference with the higher neighbours.
+
+    pyMaxDep
+        Numpy array with the maximum elevation difference with the neighbours.
+    """
+
+    offsets, ngbs = _compress(pyNgbs)
+
+    return directions_csr(pyElev, pyZ, offsets, ngbs, pyGIDs)
+
+def directions_base(pyZ, pyNgbs, pyEdge, pyDist, pyGIDs):
+    """
+    Compute the receivers of the nodes (lowest neighbour).
+
+    Returns
+    -------
+    pyBase
+        Numpy integer-type array with the base level nodes (-1 otherwise).
+
+    pyRcv
+        Numpy integer-type array with the receiver of each node.
+    """
+
+    offsets, ngbs = _compress(pyNgbs)
+
+    return directions_base_csr(pyZ, offsets, ngbs, pyGIDs)
+
+def diffusion(pyZ, pyBord, pyNgbs, pyEdge, pyDist, pyGIDs):
+    """
+    Compute the linear diffusion flux of each node.
+
+    Returns
+    -------
+    pyDiff
+        Numpy array with the diffusion flux of each node.
+    """
+
+    offsets, ngbs, edge, dist = _compress(pyNgbs, pyEdge, pyDist)
+
+    return diffusion_csr(pyZ, pyBord, offsets, ngbs, edge, dist, pyGIDs)
+
+def diffnlcfl(pySc, pyKd, pyZ, pyBord, pyNgbs, pyDist, pyGIDs):
+    """
+    Compute the CFL condition of the non-linear diffusion.
+
+    Returns
+    -------
+    pyCFL
+        Numpy array of size 1 with the stable time step.
+    """
+
+    offsets, ngbs, dist = _compress(pyNgbs, dist=pyDist)
+
+    return diffnlcfl_csr(pySc, pyKd, pyZ, pyBord, offsets, ngbs, dist, pyGIDs)
+
+def diffusionnl(pySc, pyZ, pyBord, pyNgbs, pyEdge, pyDist, pyGIDs):
+    """
+    Compute the non-linear diffusion flux of each node.
+
+    Returns
+    -------
+    pyDiff
+        Numpy array with the diffusion flux of each node.
+    """
+
+    offsets, ngbs, edge, dist = _compress(pyNgbs, pyEdge, pyDist)
+
+    return diffusionnl_csr(pySc, pyZ, pyBord, offsets, ngbs, edge, dist, pyGIDs)
+
+def diffusionero(pyZ, pyBord, pyNgbs, pyEdge, pyDist, pyGIDs):
+    """
+    Compute the erosive part of the linear diffusion flux of each node.
+
+    Returns
+    -------
+    pyEro
+        Numpy array with the erosion flux of each node.
+    """
+
+    offsets, ngbs, edge, dist = _compress(pyNgbs, pyEdge, pyDist)
+
+    return diffusionero_csr(pyZ, pyBord, offsets, ngbs, edge, dist, pyGIDs)
+
+def diffusionmarine(pyZ, pyBord, pyDep, pyNgbs, pyEdge, pyDist, pyGIDs):
+    """
+    Compute the diffusion flux of the marine deposits.
+
+    Returns
+    -------
+    pyDiff
+        Numpy array with the diffusion flux of each node.
+    """
+
+    offsets, ngbs, edge, dist = _compress(pyNgbs, pyEdge, pyDist)
+    diff = numpy.empty(len(pyZ))
+    _diffusionmarine(realarray(pyZ), intarray(pyBord), intarray(pyDep), offsets, ngbs,
+                     edge, dist, intarray(pyGIDs), diff)
+
+    return diff
+
+def directions_csr(pyElev, pyZ, pyOffsets, pyNgbs, pyGIDs):
+    """
+    Same as directions using the CSR neighbourhood layout.
+    """
+
+    nb = len(pyElev)
+    base = numpy.empty(nb, dtype=numpy.int32)
+    rcv = numpy.empty(nb, dtype=numpy.int32)
+    maxh = numpy.empty(nb)
+    maxdep = numpy.empty(nb)
+    _directions(realarray(pyElev), realarray(pyZ), intarray(pyOffsets), intarray(pyNgbs),
+                intarray(pyGIDs), base, rcv, maxh, maxdep)
+
+    return base, rcv, maxh, maxdep
+
+def directions_base_csr(pyZ, pyOffsets, pyNgbs, pyGIDs):
+    """
+    Same as directions_base using the CSR neighbourhood layout.
+    """
+
+    nb = len(pyZ)
+    base = numpy.empty(nb, dtype=numpy.int32)
+    rcv = numpy.empty(nb, dtype=numpy.int32)
+    _directions_base(realarray(pyZ), intarray(pyOffsets), intarray(pyNgbs), intarray(pyGIDs),
+                     base, rcv)
+
+    return base, rcv
+
+def diffusion_csr(pyZ, pyBord, pyOffsets, pyNgbs, pyEdge, pyDist, pyGIDs):
+    """
+    Same as diffusion using the CSR neighbourhood layout.
+    """
+
+    diff = numpy.empty(len(pyZ))
+    _diffusion(realarray(pyZ), intarray(pyBord), intarray(pyOffsets), intarray(pyNgbs),
+               realarray(pyEdge), realarray(pyDist), intarray(pyGIDs), diff)
+
+    return diff
+
+def diffnlcfl_csr(pySc, pyKd, pyZ, pyBord, pyOffsets, pyNgbs, pyDist, pyGIDs):
+    """
+    Same as diffnlcfl using the CSR neighbourhood layout.
+    """
+
+    cfl = _diffnlcfl(float(realarray(pySc).flat[0]), float(realarray(pyKd).flat[0]),
+                     realarray(pyZ), intarray(pyBord), intarray(pyOffsets), intarray(pyNgbs),
+                     realarray(pyDist), intarray(pyGIDs))
+
+    return numpy.array([cfl])
+
+def diffusionnl_csr(pySc, pyZ, pyBord, pyOffsets, pyNgbs, pyEdge, pyDist, pyGIDs):
+    """
+    Same as diffusionnl using the CSR neighbourhood layout.
+    """
+
+    diff = numpy.empty(len(pyZ))
+    _diffusionnl(float(realarray(pySc).flat[0]), realarray(pyZ), intarray(pyBord),
+                 intarray(pyOffsets), intarray(pyNgbs), realarray(pyEdge), realarray(pyDist),
+                 intarray(pyGIDs), diff)
+
+    return diff
+
+def diffusionero_csr(pyZ, pyBord, pyOffsets, pyNgbs, pyEdge, pyDist, pyGIDs):
+    """
+    Same as diffusionero using the CSR neighbourhood layout.
+    """
+
+    ero = numpy.empty(len(pyZ))
+    _diffusionero(realarray(pyZ), intarray(pyBord), intarray(pyOffsets), intarray(pyNgbs),
+                  realarray(pyEdge), realarray(pyDist), intarray(pyGIDs), ero)
+
+    return ero
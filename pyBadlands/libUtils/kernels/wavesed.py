@@ -0,0 +1,353 @@
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+##                                                                                   ##
+##  This file forms part of the Badlands surface processes modelling application.    ##
+##                                                                                   ##
+##  For full license and copyright information, please refer to the LICENSE.md file  ##
+##  located at the project root, or contact the authors.                             ##
+##                                                                                   ##
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+"""
+Python implementation of the reduced complexity model for wave/sedimentation computation
+(libUtils/WAVEsed.f90, module wavesed).
+"""
+
+import numpy
+from .jit import jit, intarray, realarray
+
+grav = 9.81
+onpi2 = 1./(2.*numpy.pi)
+
+# Real literals of the Fortran model, which are single precision constants
+_f32 = numpy.float32
+_R0_01 = float(_f32(0.01))
+_R0_47 = float(_f32(0.47))
+_R6_76 = float(_f32(6.76))
+
+# Neighbourhood used by the Huygens principle (distances in cells, computed in single
+# precision as in the Fortran model)
+_iradius = numpy.array([-2,-1,1,2,-2,-1,0,1,2,-1,0,1,-2,-1,0,1,2,-1,0,-1], dtype=numpy.int32)
+_jradius = numpy.array([0,0,0,0,1,1,1,1,1,2,2,2,-1,-1,-1,-1,-1,-2,-2,-2], dtype=numpy.int32)
+_dist = numpy.sqrt((_iradius**2 + _jradius**2).astype(_f32)).astype(numpy.float64)
+
+@jit
+def _airymodel(dx, dd, h0, depth, src, inland, shadow, iradius, jradius, dist, c, l, travel,
+               waveH):
+
+    numrow = depth.shape[0]
+    numcol = depth.shape[1]
+    c[:, :] = 0.
+    ks = numpy.ones((numrow, numcol))
+    waveH[:, :] = 0.
+
+    # Calculate wave length (deep water)
+    tperiod0 = max(_R0_47*h0 + _R6_76, numpy.pi*numpy.pi*numpy.sqrt(h0/grav))
+    l0 = grav*tperiod0**2*onpi2
+    # Airy wave theory, deep water phase speed
+    c0 = grav*tperiod0*onpi2
+
+    # Set the step size
+    l[:, :] = l0
+    for j in range(numcol):
+        for i in range(numrow):
+            # Areas exposed and in deep water get the open water conditions
+            TM = l0
+            if inland[i,j] == 0:
+                while True:
+                    MN = 0.5*(l[i,j] + TM)
+                    TM = l[i,j]
+                    l[i,j] = l0*numpy.tanh(2.*numpy.pi*depth[i,j]/MN)
+                    if abs(l[i,j] - TM) < 1.e-8:
+                        break
+                c[i,j] = c0*l[i,j]/l0
+                kh = depth[i,j]*2.*numpy.pi/l[i,j]
+                tmp = 1. + 2.*kh/numpy.sinh(2.*kh)
+                waveH[i,j] = h0/numpy.sqrt(numpy.tanh(kh)*tmp)
+                n = 0.5*tmp
+                ks[i,j] = numpy.sqrt(c0/(2.*n*c[i,j]))
+
+    # Assign source points
+    travel[:, :] = src
+
+    # Perform Huygen's principle to find travel time and wave front
+    keeploop = 1
+    while keeploop == 1:
+        keeploop = 0
+        for j in range(numcol):
+            for i in range(numrow):
+                if travel[i,j] >= 0:
+                    for k in range(20):
+                        ix = i + iradius[k]
+                        jx = j + jradius[k]
+                        if ix >= 0 and ix < numrow and jx >= 0 and jx < numcol:
+                            update = False
+                            if inland[ix,jx] == 1:
+                                travel[ix,jx] = -1
+                            elif travel[ix,jx] < 0:
+                                travel[ix,jx] = travel[i,j] + dist[k]*dx/c[i,j]
+                                keeploop = 1
+                                update = True
+                            else:
+                                dt = travel[i,j] + dist[k]*dx/c[i,j]
+                                if travel[ix,jx] > dt and dt > 0:
+                                    travel[ix,jx] = dt
+                                    keeploop = 1
+                                    update = True
+                            if update:
+                                if depth[i,j]/l[i,j] < 0.5:
+                                    frac = 2.*(1. - dd)*depth[i,j]/l[i,j] + dd
+                                    if waveH[ix,jx] > frac*waveH[i,j]:
+                                        waveH[ix,jx] = frac*waveH[i,j]
+                                elif shadow == 1 and waveH[ix,jx] > waveH[i,j]:
+                                    waveH[ix,jx] = waveH[i,j]
+
+    for j in range(numcol):
+        for i in range(numrow):
+            waveH[i,j] = waveH[i,j]*ks[i,j]
+
+    return
+
+def airymodel(pdx, pdd, ph0, pdepth, psrc, pinland, pshadow):
+    """
+    Compute the wave parameters based on the Airy wave theory and the wave front propagation
+    using the Huygens principle.
+
+    Parameters
+    ----------
+    pdx
+        Grid resolution.
+
+    pdd
+        Wave height decrease factor in shallow water.
+
+    ph0
+        Deep water wave height.
+
+    pdepth
+        Numpy array with the water depth.
+
+    psrc
+        Numpy array with the travel time of the source points (-1 otherwise).
+
+    pinland
+        Numpy integer-type array with the inland (1) and water (0) cells.
+
+    pshadow
+        Flag (1) to limit the wave height in the shadow zones.
+
+    Returns
+    -------
+    pc
+        Numpy array with the wave celerity.
+
+    pl
+        Numpy array with the wave length.
+
+    ptravel
+        Numpy array with the travel time.
+
+    pwaveH
+        Numpy array with the wave height.
+    """
+
+    depth = realarray(pdepth)
+    c = numpy.empty(depth.shape)
+    l = numpy.empty(depth.shape)
+    travel = numpy.empty(depth.shape)
+    waveH = numpy.empty(depth.shape)
+    _airymodel(float(pdx), float(pdd), float(ph0), depth, realarray(psrc), intarray(pinland),
+               int(pshadow), _iradius, _jradius, _dist, c, l, travel, waveH)
+
+    return c, l, travel, waveH
+
+@jit
+def _movesed(ent, ndepth, dz, i, j, i1, j1, trans, ntrans):
+    """
+    Move the sediment entrained in cell (i,j) towards cell (i1,j1) along one axis.
+    """
+
+    if trans > 0:
+        # Inland deposit inside cell
+        if ndepth[i1,j1] <= 0:
+            dz[i,j] += trans*ent[i,j]
+            ndepth[i,j] -= trans*ent[i,j]
+        # In case the directions are following the same trend
+        elif ntrans >= 0:
+            ent[i1,j1] += trans*ent[i,j]
+        # In case the directions are facing each others
+        else:
+            dz[i,j] += 0.5*trans*ent[i,j]
+            ndepth[i,j] -= 0.5*trans*ent[i,j]
+            dz[i1,j1] += 0.5*trans*ent[i,j]
+            ndepth[i1,j1] -= 0.5*trans*ent[i,j]
+    elif trans < 0:
+        if ndepth[i1,j1] <= 0:
+            dz[i,j] -= trans*ent[i,j]
+            ndepth[i,j] += trans*ent[i,j]
+        elif ntrans <= 0:
+            ent[i1,j1] -= trans*ent[i,j]
+        else:
+            dz[i,j] -= 0.5*trans*ent[i,j]
+            ndepth[i,j] += 0.5*trans*ent[i,j]
+            dz[i1,j1] -= 0.5*trans*ent[i,j]
+            ndepth[i1,j1] += 0.5*trans*ent[i,j]
+
+    return
+
+@jit
+def _transport(its, depth, hent, transX, transY, dz, dist):
+
+    nrow = depth.shape[0]
+    ncol = depth.shape[1]
+    dz[:, :] = 0.
+    steps = 20
+    ndepth = depth + hent
+
+    for k in range(steps):
+        ent = hent/float(steps)
+        loop = 0
+        it = 0
+        while loop == 0 and it < its:
+            loop = 1
+            it += 1
+            for j in range(1, ncol-1):
+                for i in range(1, nrow-1):
+                    if ent[i,j] > _R0_01:
+                        loop = 0
+                        # Below critical shear stress for entrainment deposit everything
+                        if hent[i,j] == 0.:
+                            dz[i,j] += ent[i,j]
+                            ndepth[i,j] -= ent[i,j]
+                        else:
+                            # Along the X-axis (East or West)
+                            if transX[i,j] > 0:
+                                _movesed(ent, ndepth, dz, i, j, i+1, j, transX[i,j], transX[i+1,j])
+                            elif transX[i,j] < 0:
+                                _movesed(ent, ndepth, dz, i, j, i-1, j, transX[i,j], transX[i-1,j])
+                            # Along the Y-axis (North or South)
+                            if transY[i,j] > 0:
+                                _movesed(ent, ndepth, dz, i, j, i, j+1, transY[i,j], transY[i,j+1])
+                            elif transY[i,j] < 0:
+                                _movesed(ent, ndepth, dz, i, j, i, j-1, transY[i,j], transY[i,j-1])
+                        ent[i,j] = 0.
+                    else:
+                        dz[i,j] += ent[i,j]
+                        ndepth[i,j] += ent[i,j]
+                        ent[i,j] = 0.
+        if it >= its:
+            for j in range(ncol):
+                for i in range(nrow):
+                    dz[i,j] += ent[i,j]
+                    ndepth[i,j] -= ent[i,j]
+
+    # Find reworked sediment above water level
+    dist[:, :] = 0.
+    for j in range(ncol):
+        for i in range(nrow):
+            if dz[i,j] > depth[i,j] + hent[i,j] and depth[i,j] + hent[i,j] > 0.:
+                dist[i,j] = dz[i,j] - depth[i,j] - hent[i,j]
+                dz[i,j] = depth[i,j] + hent[i,j]
+
+    return
+
+def transport(pyits, pydepth, pyhent, pytransX, pytransY):
+    """
+    Transport the sediment entrained by the waves along the wave-induced currents.
+
+    Parameters
+    ----------
+    pyits
+        Maximum number of iterations.
+
+    pydepth
+        Numpy array with the water depth.
+
+    pyhent
+        Numpy array with the entrained sediment thickness.
+
+    pytransX, pytransY
+        Numpy arrays with the sediment transport directions.
+
+    Returns
+    -------
+    pydz
+        Numpy array with the deposited thickness.
+
+    pydist
+        Numpy array with the reworked thickness above water level.
+    """
+
+    depth = realarray(pydepth)
+    dz = numpy.empty(depth.shape)
+    dist = numpy.empty(depth.shape)
+    _transport(int(pyits), depth, realarray(pyhent), realarray(pytransX), realarray(pytransY),
+               dz, dist)
+
+    return dz, dist
+
+@jit
+def _diffusion(oelev, coeff, maxth, tstep, nstep, depo):
+
+    numrow = oelev.shape[0]
+    numcol = oelev.shape[1]
+    elev = oelev.copy()
+    diffmarine = numpy.zeros((numrow, numcol))
+    iss = numpy.array([1, 0, -1, 0])
+    jss = numpy.array([0, 1, 0, -1])
+
+    for it in range(nstep):
+        diffmarine[:, :] = 0.
+        mindt = tstep
+        for j in range(1, numcol-1):
+            for i in range(1, numrow-1):
+                for k in range(4):
+                    i1 = i + iss[k]
+                    j1 = j + jss[k]
+                    flx = elev[i1,j1] - elev[i,j]
+                    if depo[i,j] > maxth and elev[i,j] > elev[i1,j1]:
+                        diffmarine[i,j] += flx*coeff
+                    elif depo[i1,j1] > maxth and elev[i,j] < elev[i1,j1]:
+                        diffmarine[i,j] += flx*coeff
+                if diffmarine[i,j] < 0. and diffmarine[i,j]*tstep < -depo[i,j]:
+                    mindt = min(-depo[i,j]/diffmarine[i,j], mindt)
+        for j in range(numcol):
+            for i in range(numrow):
+                depo[i,j] += diffmarine[i,j]*mindt
+                elev[i,j] += diffmarine[i,j]*mindt
+
+    return
+
+def diffusion(oelevpy, dzpy, coeffpy, maxthpy, tsteppy, nsteppy):
+    """
+    Diffuse the wave-induced deposits.
+
+    Parameters
+    ----------
+    oelevpy
+        Numpy array with the elevation.
+
+    dzpy
+        Numpy array with the deposited thickness.
+
+    coeffpy
+        Diffusion coefficient.
+
+    maxthpy
+        Minimum thickness of the diffused deposits.
+
+    tsteppy
+        Diffusion time step.
+
+    nsteppy
+        Number of diffusion steps.
+
+    Returns
+    -------
+    depopy
+        Numpy array with the diffused deposits thickness.
+    """
+
+    depo = numpy.array(dzpy, dtype=numpy.float64)
+    _diffusion(realarray(oelevpy), float(coeffpy), float(maxthpy), float(tsteppy), int(nsteppy),
+               depo)
+
+    return depo
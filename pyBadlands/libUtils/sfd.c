@@ -348,3 +348,214 @@ void diffusionmarine(double pyZ[], int pyBord[], int pyDep[], int pyNgbs[][MAX_N
         }
     }
 }
+
+// Kernels using the compressed sparse row (CSR) neighbourhood layout: the neighbours of
+// node gid are pyNgbs[pyOffsets[gid]:pyOffsets[gid+1]] and the voronoi edges and
+// distances are stored in the same order in pyEdge and pyDist.
+
+void directions_csr(double pyElev[], double pyZ[], int pyOffsets[], int pyNgbs[],
+    int pyGIDs[], int pyBase[], int pyRcv[], double pyMaxh[], double pyMaxDep[],
+    int pylocalNb, int pyglobalNb, int pyedgeNb)
+{
+    int i;
+
+    for (i = 0; i < pyglobalNb; i++) {
+        pyBase[i] = -1;
+        pyRcv[i] = -1;
+        pyMaxh[i] = 1.e6;
+        pyMaxDep[i] = 0.;
+    }
+
+    int k;
+    for (k = 0; k < pylocalNb; k++) {
+        int gid = pyGIDs[k];
+        int lowestID = gid;
+        double diffH = 1.e6;
+        double diffD = 0.;
+        int p;
+
+        for (p = pyOffsets[gid]; p < pyOffsets[gid+1]; p++) {
+            int ngbid = pyNgbs[p];
+
+            if (pyElev[ngbid] < pyElev[lowestID]) {
+                lowestID = ngbid;
+            }
+
+            double dh = pyZ[ngbid] - pyZ[gid];
+
+            if (dh >= 0. && dh < diffH) {
+                diffH = dh;
+            }
+
+            if (dh > diffD) {
+                diffD = dh;
+            }
+        }
+
+        pyRcv[gid] = lowestID;
+
+        if (gid == pyRcv[gid]) {
+            pyBase[gid] = gid;
+        }
+
+        if (diffH > 9.99e5) {
+            diffH = 0.;
+        }
+
+        pyMaxh[gid] = diffH;
+        pyMaxDep[gid] = diffD;
+    }
+}
+
+void directions_base_csr(double pyZ[], int pyOffsets[], int pyNgbs[], int pyGIDs[],
+    int pyBase[], int pyRcv[], int pylocalNb, int pyglobalNb, int pyedgeNb)
+{
+    int i;
+
+    for (i = 0; i < pyglobalNb; i++) {
+        pyBase[i] = -1;
+        pyRcv[i] = -1;
+    }
+
+    int k;
+    for (k = 0; k < pylocalNb; k++) {
+        int gid = pyGIDs[k];
+        int lowestID = gid;
+        int p;
+
+        for (p = pyOffsets[gid]; p < pyOffsets[gid+1]; p++) {
+            int ngbid = pyNgbs[p];
+
+            if (pyZ[ngbid] < pyZ[lowestID]) {
+                lowestID = ngbid;
+            }
+        }
+
+        pyRcv[gid] = lowestID;
+        if (gid == pyRcv[gid]) {
+            pyBase[gid] = gid;
+        }
+    }
+}
+
+void diffusion_csr(double pyZ[], int pyBord[], int pyOffsets[], int pyNgbs[], double pyEdge[],
+    double pyDist[], int pyGIDs[], double pyDiff[], int pylocalNb, int pyglobalNb, int pyedgeNb)
+{
+    int i;
+
+    for (i = 0; i < pyglobalNb; i++) {
+        pyDiff[i] = 0.;
+    }
+
+    int k;
+    for (k = 0; k < pylocalNb; k++) {
+        int gid = pyGIDs[k];
+        int p;
+        if (pyBord[gid]>0) {
+          for (p = pyOffsets[gid]; p < pyOffsets[gid+1]; p++) {
+              int ngbid = pyNgbs[p];
+              if (pyDist[p] <= 0.){
+                continue;
+              }
+              if (pyBord[ngbid]>0 || pyZ[ngbid] < pyZ[gid]){
+                pyDiff[gid] += pyEdge[p] * (pyZ[ngbid] - pyZ[gid]) / pyDist[p];
+              }
+          }
+        }
+    }
+}
+
+void diffnlcfl_csr(double pySc[], double pyKd[], double pyZ[], int pyBord[], int pyOffsets[],
+    int pyNgbs[], double pyDist[], int pyGIDs[], double pyCFL[], int pylocalNb, int pyglobalNb,
+    int pyedgeNb)
+{
+    pyCFL[0] = 1.e6;
+
+    int k;
+    double Sc2 = pySc[0] * pySc[0];
+    double kd = 20. * pyKd[0];
+
+    for (k = 0; k < pylocalNb; k++) {
+        int gid = pyGIDs[k];
+        int p;
+        if (pyBord[gid]>0) {
+          for (p = pyOffsets[gid]; p < pyOffsets[gid+1]; p++) {
+              int ngbid = pyNgbs[p];
+              if (pyDist[p] <= 0.){
+                continue;
+              }
+              if (pyBord[ngbid]>0 || pyZ[ngbid] < pyZ[gid]){
+                double dh = pyZ[ngbid] - pyZ[gid];
+                if (dh < 0.){
+                  dh = -dh;
+                }
+                double num = pyDist[p] * pyDist[p] - (dh / Sc2);
+                if (num > 0.){
+                  if (pyCFL[0] > num / kd){
+                    pyCFL[0] = num / kd;
+                  }
+                }
+              }
+          }
+        }
+    }
+}
+
+void diffusionnl_csr(double pySc[], double pyZ[], int pyBord[], int pyOffsets[], int pyNgbs[],
+    double pyEdge[], double pyDist[], int pyGIDs[], double pyDiff[], int pylocalNb, int pyglobalNb,
+    int pyedgeNb)
+{
+    int i;
+
+    for (i = 0; i < pyglobalNb; i++) {
+        pyDiff[i] = 0.;
+    }
+
+    int k;
+    double Sc2 = pySc[0] * pySc[0];
+
+    for (k = 0; k < pylocalNb; k++) {
+        int gid = pyGIDs[k];
+        int p;
+        if (pyBord[gid]>0) {
+          for (p = pyOffsets[gid]; p < pyOffsets[gid+1]; p++) {
+              int ngbid = pyNgbs[p];
+              if (pyDist[p] <= 0.){
+                continue;
+              }
+              if (pyBord[ngbid]>0 || pyZ[ngbid] < pyZ[gid]){
+                double dh = (pyZ[ngbid] - pyZ[gid]) / pyDist[p];
+                double denom = 1. - ( dh*dh / Sc2 );
+                if (denom < 0.1){
+                  denom = 0.1;
+                }
+                pyDiff[gid] += pyEdge[p] * dh / denom;
+              }
+          }
+        }
+    }
+}
+
+void diffusionero_csr(double pyZ[], int pyBord[], int pyOffsets[], int pyNgbs[], double pyEdge[],
+    double pyDist[], int pyGIDs[], double pyEro[], int pylocalNb, int pyglobalNb, int pyedgeNb)
+{
+    int i;
+
+    for (i = 0; i < pyglobalNb; i++) {
+        pyEro[i] = 0.;
+    }
+
+    int k;
+    for (k = 0; k < pylocalNb; k++) {
+        int gid = pyGIDs[k];
+        int p;
+        if (pyBord[gid]>0) {
+          for (p = pyOffsets[gid]; p < pyOffsets[gid+1]; p++) {
+              int ngbid = pyNgbs[p];
+              if (pyZ[ngbid] < pyZ[gid] && pyDist[p] > 0.){
+                pyEro[gid] += pyEdge[p] * (pyZ[ngbid] - pyZ[gid]) / pyDist[p];
+              }
+          }
+        }
+    }
+}
@@ -3,6 +3,9 @@ import numpy as np
 import mpi4py.MPI as mpi
 
 from scipy.spatial import cKDTree
+from pyBadlands.simulation.phaseProfiler import profiler
+from pyBadlands.simulation.workBuffers import workBuffers
+from pyBadlands.surface.haloExchange import haloExchange
 from pyBadlands import (diffLinear, flowNetwork, buildMesh, waveSed,  #oceanDyn,
                         checkPoints, buildFlux, xmlParser, carbGrowth,
                         pelagicGrowth)
@@ -15,9 +18,63 @@ import StringIO
 
 #from pyBadlands.libUtils  import simswan as swan
 
+def _copy_state(value, memo, shared):
+    """
+    Copy a state value for a snapshot. Arrays are copied once (aliases are kept through
+    the memo dictionary) and read-only arrays are shared. Containers are copied
+    recursively and any other object is kept by reference.
+    """
+    if isinstance(value, np.ndarray):
+        key = id(value)
+        if key not in memo:
+            if value.flags.writeable:
+                memo[key] = np.array(value, copy=True)
+                memo[key].flags.writeable = False
+            else:
+                memo[key] = value
+                shared.add(key)
+        return memo[key]
+    if isinstance(value, list):
+        return [_copy_state(v, memo, shared) for v in value]
+    if isinstance(value, tuple):
+        return tuple(_copy_state(v, memo, shared) for v in value)
+    if isinstance(value, dict):
+        return dict((k, _copy_state(v, memo, shared)) for k, v in value.items())
+    return value
+
+def _restore_state(value, memo, shared):
+    """
+    Get a writable copy of a snapshot state value.
+    """
+    if isinstance(value, np.ndarray):
+        key = id(value)
+        if key in shared:
+            return value
+        if key not in memo:
+            memo[key] = np.array(value, copy=True)
+        return memo[key]
+    if isinstance(value, list):
+        return [_restore_state(v, memo, shared) for v in value]
+    if isinstance(value, tuple):
+        return tuple(_restore_state(v, memo, shared) for v in value)
+    if isinstance(value, dict):
+        return dict((k, _restore_state(v, memo, shared)) for k, v in value.items())
+    return value
+
 class Model(object):
     """State object for the pyBadlands model."""
 
+    # Model attributes captured by snapshots. Mesh attributes are only replaced
+    # (never modified) when the TIN is rebuilt after 3D displacements.
+    _stateAttrs = ['tNow', 'waveID', 'outputStep', 'disp', 'prop', 'carbval', 'carbval2',
+                   'pelaval', 'applyDisp', 'simStarted', 'exitTime', 'nbStep', 'elevation', 'cumdiff',
+                   'cumhill', 'cumflex', 'tinFlex', 'wavediff', 'rain', 'fillH', 'oldsed',
+                   'FVmesh', 'tMesh', 'lGIDs', 'inIDs', 'inGIDs', 'totPts', 'fixIDs', 'halo']
+
+    # Model components whose attributes are captured by snapshots
+    _stateComponents = ['force', 'flow', 'hillslope', 'strata', 'mapero', 'straTIN',
+                        'carbTIN', 'flex', 'carb', 'pelagic', 'wave']
+
     def __init__(self):
         """
         Constructor.
@@ -42,8 +99,12 @@ class Model(object):
         self.initial_rain = [] 
         self.opt_erod = [] 
         self.opt_rain = [] 
+        self.nbStep = 0
+        self.earlyStop = False
+        self._observers = []
+        self.buffers = workBuffers()
 
-    def load_xml(self, run_nb, filename, verbose=False, muted = False): 
+    def load_xml(self, run_nb, filename, verbose=False, muted = False, meshcache=None, precision=None):
         """
         Load an XML configuration file.
 
@@ -54,6 +115,18 @@ class Model(object):
 
         verbose : bool
             When True, output additional debug information.
+
+        meshcache : string
+            Mesh cache directory overriding the one defined in the XML file. Cached meshes
+            are memory mapped, so that models loaded by several processes on the same node
+            share a single copy of the mesh arrays.
+
+        precision : string
+            Storage precision (double or single) overriding the one defined in the XML file.
+            In single precision, the Finite Volume geometry, the rain and the stratigraphic
+            layers are stored as float32 while the elevation and the cumulative changes are
+            still accumulated in double precision. The kernels get double precision copies of
+            the geometry, built once per mesh.
         """
 
         np.seterr(divide='ignore',invalid='ignore')
@@ -61,6 +134,12 @@ class Model(object):
         # Only the first node should create a unique output dir
         self.input = xmlParser.xmlParser(run_nb, muted, filename, makeUniqueOutputDir=(self._rank == 0))
         self.tNow = self.input.tStart
+        if meshcache is not None:
+            self.input.meshcache = meshcache
+        if precision is not None:
+            if precision != 'double' and precision != 'single':
+                raise ValueError('precision is either: double or single')
+            self.input.precision = precision
 
         # Sync the chosen output dir to all nodes
         self.input.outDir = self._comm.bcast(self.input.outDir, root=0)
@@ -103,16 +182,24 @@ class Model(object):
             self.wavediff = None
 
         # Define hillslope parameters
-        self.rain = np.zeros(self.totPts, dtype=float)
+        self.rain = np.zeros(self.totPts, dtype=buildMesh.real_type(self.input))
         self.hillslope = diffLinear()
         self.hillslope.CDaerial = self.input.CDa
         self.hillslope.CDmarine = self.input.CDm
         self.hillslope.CDriver = self.input.CDr
         self.hillslope.Sc = self.input.Sc
         self.hillslope.updatedt = 0
+        self.hillslope.implicit = self.input.diffimplicit and self.straTIN is None
+
+        # Define nodal communications between partitions
+        self.halo = haloExchange(self.FVmesh.partIDs, self.lGIDs)
 
         # Define flow parameters
+        self.buffers.reset()
         self.flow = flowNetwork(self.input)
+        self.flow.halo = self.halo
+        self.flow.buffers = self.buffers
+        self.force.buffers = self.buffers
 
         if self.input.erolays is None:
             self.flow.erodibility = np.full(self.totPts, self.input.SPLero)
@@ -163,6 +250,9 @@ class Model(object):
         self.FVmesh, self.tMesh, self.lGIDs, self.inIDs, \
             self.inGIDs, self.totPts = buildMesh.reconstruct_mesh(self.recGrid,
                                                                   self.input, verbose)
+        self.halo = haloExchange(self.FVmesh.partIDs, self.lGIDs)
+        self.flow.halo = self.halo
+        self.buffers.reset()
 
         # Update edges elevation
         tree1 = cKDTree(self.FVmesh.node_coords[self.fixIDs:,:2])
@@ -170,10 +260,11 @@ class Model(object):
         distances, indices = tree1.query(self.FVmesh.node_coords[:self.fixIDs,:2], k=1)
         self.elevation[:self.fixIDs] = tmpelev[indices]
         self.hillslope.ids = None
+        self.hillslope.solver = None
 
         # Reset TIN kdtree and rain
         self.force.update_force_TIN(self.FVmesh.node_coords[:,:2])
-        self.rain = np.zeros(self.totPts, dtype=float)
+        self.rain = np.zeros(self.totPts, dtype=buildMesh.real_type(self.input))
         self.rain[self.inIDs] = self.force.get_Rain(self.tNow, self.elevation, self.inIDs)
 
         # Update flexural isostasy
@@ -215,7 +306,7 @@ class Model(object):
         self.pelaval = None
         self.prop = np.zeros((self.totPts,1))
 
-    def run_to_time(self, tEnd, profile=False, verbose=False, muted = False):
+    def run_to_time(self, tEnd, profile=False, verbose=False, muted = False, finalise=True):
         """
         Run the simulation to a specified point in time (tEnd).
 
@@ -229,6 +320,11 @@ class Model(object):
 
         verbose : bool
             If True, output additional debug information.
+
+        finalise : bool
+            When False, the end of run processes (flexure, output of the final state and
+            stratigraphic layer) are not applied, so that the next call resumes the
+            simulation as if it had not been stopped.
         """
         if profile:
             pid = os.getpid()
@@ -259,6 +355,7 @@ class Model(object):
             self.simStarted = True
 
         outStrata = 0
+        self.earlyStop = False
         last_time = time.clock()
         last_output = time.clock()
 
@@ -275,20 +372,20 @@ class Model(object):
             if self.force.next_rain <= self.tNow and self.force.next_rain < self.input.tEnd:
                 if self.tNow == self.input.tStart:
                     self.force.getSea(self.tNow)
-                self.rain = np.zeros(self.totPts, dtype=float)
+                self.rain = self.buffers.zeros('rain', self.totPts, buildMesh.real_type(self.input))
                 self.rain[self.inIDs] = self.force.get_Rain(self.tNow, self.elevation, self.inIDs)
-                self._comm.Allreduce(mpi.IN_PLACE, self.rain, op=mpi.MAX)
+                self.halo.gather(self.rain)
 
             # Load tectonic grid
             if not self.input.disp3d:
                 # Vertical displacements
                 if self.force.next_disp <= self.tNow and self.force.next_disp < self.input.tEnd:
-                    ldisp = np.zeros(self.totPts, dtype=float)
-                    ldisp.fill(-1.e6)
+                    ldisp = self.buffers.full('ldisp', self.totPts, -1.e6)
                     ldisp[self.inIDs] = self.force.load_Tecto_map(self.tNow,self.inIDs)
-                    self._comm.Allreduce(mpi.IN_PLACE, ldisp, op=mpi.MAX)
+                    self.halo.gather(ldisp)
                     self.disp = self.force.disp_border(ldisp, self.FVmesh.neighbours,
-                                                       self.FVmesh.edge_length, self.recGrid.boundsPt)
+                                                       self.FVmesh.edge_length, self.recGrid.boundsPt,
+                                                       parents=self.FVmesh.bndParents)
                     self.applyDisp = True
             else:
                 # 3D displacements
@@ -306,7 +403,8 @@ class Model(object):
                     # Update mesh when a 3D displacements field has been loaded
                     if updateMesh:
                         self.force.dispZ = self.force.disp_border(self.force.dispZ, self.FVmesh.neighbours,
-                                           self.FVmesh.edge_length, self.recGrid.boundsPt)
+                                           self.FVmesh.edge_length, self.recGrid.boundsPt,
+                                           parents=self.FVmesh.bndParents)
                         # Define flexural flags
                         fflex = 0
                         flexiso = None
@@ -353,11 +451,13 @@ class Model(object):
             if self.tNow >= self.force.next_flexure:
                 flextime = time.clock()
                 self.force.getSea(self.tNow)
-                self.tinFlex = self.flex.get_flexure(self.elevation, self.cumdiff,
-                            self.force.sealevel,self.recGrid.boundsPt, initFlex=False)
-                # Get border values
-                self.tinFlex = self.force.disp_border(self.tinFlex, self.FVmesh.neighbours,
-                                                      self.FVmesh.edge_length, self.recGrid.boundsPt)
+                with profiler.phase('flexure'):
+                    self.tinFlex = self.flex.get_flexure(self.elevation, self.cumdiff,
+                                self.force.sealevel,self.recGrid.boundsPt, initFlex=False)
+                    # Get border values
+                    self.tinFlex = self.force.disp_border(self.tinFlex, self.FVmesh.neighbours,
+                                                          self.FVmesh.edge_length, self.recGrid.boundsPt,
+                                                          parents=self.FVmesh.bndParents)
                 # Update flexural parameters
                 self.elevation += self.tinFlex
                 self.cumflex += self.tinFlex
@@ -377,8 +477,9 @@ class Model(object):
                 else:
                     actlay = None
                 # Compute wave field and associated bottom current conditions
-                waveED,nactlay = self.wave.compute_wavesed(self.tNow, self.input, self.force,
-                                                   self.elevation, actlay)
+                with profiler.phase('waves'):
+                    waveED,nactlay = self.wave.compute_wavesed(self.tNow, self.input, self.force,
+                                                       self.elevation, actlay)
                 # Update elevation / cumulative changes based on wave-induced sediment transport
                 self.elevation += waveED
                 self.cumdiff  += waveED
@@ -399,31 +500,32 @@ class Model(object):
                     # Update erosion/deposition due to river and diffusion on carbTIN
                     self.carbTIN.update_layers(self.cumdiff-self.oldsed,self.elevation)
                 # Compute reef growth
-                if self.input.carbonate:
-                    self.carbval, self.carbval2 = self.carb.computeCarbonate(self.force.meanH, self.cumdiff-self.oldsed,
-                                                            depth, self.input.tCarb)
-                    if self.carbval2 is not None:
-                        self.cumdiff +=  self.carbval + self.carbval2
-                        self.elevation += self.carbval + self.carbval2
-                    else:
-                        self.cumdiff +=  self.carbval
-                        self.elevation += self.carbval
-                    if self.carbTIN is not None:
-                        self.carbTIN.paleoDepth[:,self.carbTIN.step] = self.elevation
-                        self.carbTIN.depoThick[:,self.carbTIN.step,1] += self.carbval
-                        self.carbTIN.layerThick[:,self.carbTIN.step] += self.carbval
+                with profiler.phase('carbonate'):
+                    if self.input.carbonate:
+                        self.carbval, self.carbval2 = self.carb.computeCarbonate(self.force.meanH, self.cumdiff-self.oldsed,
+                                                                depth, self.input.tCarb)
                         if self.carbval2 is not None:
-                            self.carbTIN.depoThick[:,self.carbTIN.step,2] += self.carbval2
-                            self.carbTIN.layerThick[:,self.carbTIN.step] += self.carbval2
-                # Compute pelagic rain
-                if self.input.pelagic:
-                    self.pelaval = self.pelagic.computePelagic(depth, self.input.tCarb)
-                    self.cumdiff +=  self.pelaval
-                    self.elevation += self.pelaval
-                    if self.carbTIN is not None:
-                        self.carbTIN.paleoDepth[:,self.carbTIN.step] = self.elevation
-                        self.carbTIN.depoThick[:,self.carbTIN.step,0] += self.pelaval
-                        self.carbTIN.layerThick[:,self.carbTIN.step] += self.pelaval
+                            self.cumdiff +=  self.carbval + self.carbval2
+                            self.elevation += self.carbval + self.carbval2
+                        else:
+                            self.cumdiff +=  self.carbval
+                            self.elevation += self.carbval
+                        if self.carbTIN is not None:
+                            self.carbTIN.paleoDepth[:,self.carbTIN.step] = self.elevation
+                            self.carbTIN.depoThick[:,self.carbTIN.step,1] += self.carbval
+                            self.carbTIN.layerThick[:,self.carbTIN.step] += self.carbval
+                            if self.carbval2 is not None:
+                                self.carbTIN.depoThick[:,self.carbTIN.step,2] += self.carbval2
+                                self.carbTIN.layerThick[:,self.carbTIN.step] += self.carbval2
+                    # Compute pelagic rain
+                    if self.input.pelagic:
+                        self.pelaval = self.pelagic.computePelagic(depth, self.input.tCarb)
+                        self.cumdiff +=  self.pelaval
+                        self.elevation += self.pelaval
+                        if self.carbTIN is not None:
+                            self.carbTIN.paleoDepth[:,self.carbTIN.step] = self.elevation
+                            self.carbTIN.depoThick[:,self.carbTIN.step,0] += self.pelaval
+                            self.carbTIN.layerThick[:,self.carbTIN.step] += self.pelaval
                 # Update proportion based on top layer
                 if self.prop is not None:
                     ids = np.where(self.carbTIN.layerThick[:,self.carbTIN.step]>0.)[0]
@@ -434,21 +536,23 @@ class Model(object):
                             self.prop[ids,2] = self.carbTIN.depoThick[ids,self.carbTIN.step,2]/self.carbTIN.layerThick[ids,self.carbTIN.step]
 
                 # Update current cumulative erosion deposition
-                self.oldsed = np.copy(self.cumdiff)
+                self.oldsed = self.buffers.copy('oldsed', self.cumdiff)
                 self.force.next_carb += self.input.tCarb
                 if self._rank == 0:
                     print "   - Compute carbonate growth ", time.clock() - carbtime
 
             # Compute stream network
-            self.fillH, self.elevation = buildFlux.streamflow(self.input, self.FVmesh, self.recGrid, self.force, self.hillslope, \
-                                              self.flow, self.elevation, self.lGIDs, self.rain, self.tNow, verbose)
+            with profiler.phase('streamflow'):
+                self.fillH, self.elevation = buildFlux.streamflow(self.input, self.FVmesh, self.recGrid, self.force, self.hillslope, \
+                                                  self.flow, self.elevation, self.lGIDs, self.rain, self.tNow, verbose)
 
             # Create checkpoint files and write HDF5 output
             if self.tNow >= self.force.next_display:
                 if self.force.next_display > self.input.tStart:
                     outStrata = 1
                 if not muted:
-                    checkPoints.write_checkpoints(self.input, self.recGrid, self.lGIDs, self.inIDs, self.tNow, self.FVmesh, self.tMesh, self.force, self.flow, self.rain, self.elevation, self.fillH, self.cumdiff, self.cumhill, self.wavediff, self.outputStep, self.prop, self.mapero, self.cumflex)
+                    with profiler.phase('checkpoint'):
+                        checkPoints.write_checkpoints(self.input, self.recGrid, self.lGIDs, self.inIDs, self.tNow, self.FVmesh, self.tMesh, self.force, self.flow, self.rain, self.elevation, self.fillH, self.cumdiff, self.cumhill, self.wavediff, self.outputStep, self.prop, self.mapero, self.cumflex)
                 if self.straTIN is not None and self.outputStep % self.input.tmesh==0:
                     meshtime = time.clock()
                     if not muted:
@@ -483,11 +587,20 @@ class Model(object):
             # Get the maximum time before updating one of the above processes / components
             tStop = min([self.force.next_display, self.force.next_layer, self.force.next_flexure,
                         tEnd, self.force.next_wave, self.force.next_disp, self.force.next_rain,
-                        self.force.next_carb])
+                        self.force.next_carb, self._next_observer_time()])
+
+            with profiler.phase('sediment_flux'):
+                self.tNow, self.elevation, self.cumdiff, self.cumhill = buildFlux.sediment_flux(self.input, self.recGrid, self.hillslope, \
+                                  self.FVmesh, self.tMesh, self.flow, self.force, self.rain, self.lGIDs, self.applyDisp, self.straTIN, self.mapero,  \
+                                  self.cumdiff, self.cumhill, self.fillH, self.disp, self.inGIDs, self.elevation, self.tNow, tStop, verbose)
 
-            self.tNow, self.elevation, self.cumdiff, self.cumhill = buildFlux.sediment_flux(self.input, self.recGrid, self.hillslope, \
-                              self.FVmesh, self.tMesh, self.flow, self.force, self.rain, self.lGIDs, self.applyDisp, self.straTIN, self.mapero,  \
-                              self.cumdiff, self.cumhill, self.fillH, self.disp, self.inGIDs, self.elevation, self.tNow, tStop, verbose)
+            # Call the registered observers and stop the simulation when requested
+            self.nbStep += 1
+            if self._notify_observers():
+                self.earlyStop = True
+                if self._rank == 0 and verbose:
+                    print 'Simulation stopped by an observer at time', self.tNow
+                break
 
             # Update carbonate/pelagic stratigraphic layers
             # if self.carbTIN is not None:
@@ -508,47 +621,52 @@ class Model(object):
         # if self._rank == 0:
         #     print 'tNow = %s (%0.02f seconds)' % (self.tNow, tloop)
 
-        # Isostatic flexure
-        if self.input.flexure:
-            flextime = time.clock()
-            self.force.getSea(self.tNow)
-            self.tinFlex = self.flex.get_flexure(self.elevation, self.cumdiff,
-                        self.force.sealevel,self.recGrid.boundsPt,initFlex=False)
-            # Get border values
-            self.tinFlex = self.force.disp_border(self.tinFlex, self.FVmesh.neighbours,
-                                                  self.FVmesh.edge_length, self.recGrid.boundsPt)
-            # Update flexural parameters
-            self.elevation += self.tinFlex
-            self.cumflex += self.tinFlex
-            # Update next flexure time
-            self.force.next_flexure += self.input.ftime
-            if self._rank == 0:
-                print "   - Compute flexural isostasy ", time.clock() - flextime
-
-        # Create checkpoint files and write HDF5 output
-        if self.input.udw == 0 or self.tNow == self.input.tEnd or self.tNow == self.force.next_display:
-            if not muted:
-                checkPoints.write_checkpoints(self.input, self.recGrid, self.lGIDs, self.inIDs, self.tNow, self.FVmesh, self.tMesh, self.force, self.flow, self.rain, self.elevation, self.fillH, self.cumdiff, self.cumhill, self.wavediff, self.outputStep, self.prop, self.mapero, self.cumflex)
-            self.force.next_display += self.input.tDisplay
-            self.outputStep += 1
-            if self.straTIN is not None:
-                print 'Processing'
-                if not muted:
-                    self.straTIN.write_hdf5_stratigraphy(self.lGIDs,self.outputStep-1,self._rank)
-            if self.carbTIN is not None:
+        # End of run processes, which are left to the next call when the run is suspended
+        if finalise:
+            # Isostatic flexure
+            if self.input.flexure:
+                flextime = time.clock()
+                self.force.getSea(self.tNow)
+                with profiler.phase('flexure'):
+                    self.tinFlex = self.flex.get_flexure(self.elevation, self.cumdiff,
+                                self.force.sealevel,self.recGrid.boundsPt,initFlex=False)
+                    # Get border values
+                    self.tinFlex = self.force.disp_border(self.tinFlex, self.FVmesh.neighbours,
+                                                          self.FVmesh.edge_length, self.recGrid.boundsPt,
+                                                          parents=self.FVmesh.bndParents)
+                # Update flexural parameters
+                self.elevation += self.tinFlex
+                self.cumflex += self.tinFlex
+                # Update next flexure time
+                self.force.next_flexure += self.input.ftime
+                if self._rank == 0:
+                    print "   - Compute flexural isostasy ", time.clock() - flextime
+
+            # Create checkpoint files and write HDF5 output
+            if self.input.udw == 0 or self.tNow == self.input.tEnd or self.tNow == self.force.next_display:
                 if not muted:
-                    self.carbTIN.write_hdf5_stratigraphy(self.lGIDs,self.outputStep-1,self._rank)
-                self.carbTIN.step += 1
+                    with profiler.phase('checkpoint'):
+                        checkPoints.write_checkpoints(self.input, self.recGrid, self.lGIDs, self.inIDs, self.tNow, self.FVmesh, self.tMesh, self.force, self.flow, self.rain, self.elevation, self.fillH, self.cumdiff, self.cumhill, self.wavediff, self.outputStep, self.prop, self.mapero, self.cumflex)
+                self.force.next_display += self.input.tDisplay
+                self.outputStep += 1
+                if self.straTIN is not None:
+                    print 'Processing'
+                    if not muted:
+                        self.straTIN.write_hdf5_stratigraphy(self.lGIDs,self.outputStep-1,self._rank)
+                if self.carbTIN is not None:
+                    if not muted:
+                        self.carbTIN.write_hdf5_stratigraphy(self.lGIDs,self.outputStep-1,self._rank)
+                    self.carbTIN.step += 1
 
-        # Update next stratal layer time
-        if self.tNow >= self.force.next_layer:
-            self.force.next_layer += self.input.laytime
-            self.strata.buildStrata(self.elevation, self.cumdiff, self.force.sealevel,
-                                    self._rank, 1, self.outputStep-1)
+            # Update next stratal layer time
+            if self.tNow >= self.force.next_layer:
+                self.force.next_layer += self.input.laytime
+                self.strata.buildStrata(self.elevation, self.cumdiff, self.force.sealevel,
+                                        self._rank, 1, self.outputStep-1)
 
-        # Finalise SWAN model run
-        if self.input.waveOn and self.tNow == self.input.tEnd:
-            swan.model.final(self.fcomm)
+            # Finalise SWAN model run
+            if self.input.waveOn and self.tNow == self.input.tEnd:
+                swan.model.final(self.fcomm)
 
         if profile:
             pr.disable()
@@ -557,6 +675,258 @@ class Model(object):
             ps = pstats.Stats(pr, stream=s).sort_stats(sortby)
             ps.dump_stats('/tmp/profile-%d' % pid)
 
+    def add_observer(self, callback, times=None, every=None):
+        """
+        Register a function called during run_to_time.
+
+        The callback is called as callback(tNow, state) where state is a dictionary of
+        read-only views (no copy) of the model arrays: elevation, cumdiff, cumhill, cumflex,
+        rain and fillH, together with the TIN node coordinates (coords) and the number of
+        internal steps performed (step). When the callback returns True the simulation
+        stops and run_to_time returns as if tEnd was reached.
+
+        Parameters
+        ----------
+        callback : function
+            Function called with the simulation time and the state views.
+
+        times : list
+            Simulation times at which the callback is called. The model time step is
+            adjusted so that these times are reached exactly.
+
+        every : int
+            Call the callback every N internal time steps.
+
+        Returns
+        -------
+        observer : dict
+            Observer handle used by remove_observer.
+        """
+
+        if times is None and every is None:
+            raise ValueError('An observer requires simulation times or a number of steps.')
+        if every is not None and every < 1:
+            raise ValueError('The number of steps between observer calls needs to be positive.')
+
+        observer = {'callback': callback, 'every': every, 'times': []}
+        if times is not None:
+            observer['times'] = sorted([float(t) for t in times if t > self.tNow])
+        self._observers.append(observer)
+
+        return observer
+
+    def remove_observer(self, observer=None):
+        """
+        Unregister an observer or all of them when no observer is given.
+
+        Parameters
+        ----------
+        observer : dict
+            Observer handle returned by add_observer.
+        """
+
+        if observer is None:
+            self._observers = []
+        elif observer in self._observers:
+            self._observers.remove(observer)
+
+        return
+
+    def _next_observer_time(self):
+        """
+        Get the next simulation time at which an observer needs to be called.
+        """
+
+        tNext = self.input.tEnd + 1.e5
+        for observer in self._observers:
+            if len(observer['times']) > 0:
+                tNext = min(tNext, observer['times'][0])
+
+        return tNext
+
+    def state_views(self):
+        """
+        Get read-only views of the model state arrays, as passed to the observers (see
+        add_observer). It gives the state at the current time, e.g. before run_to_time.
+        """
+
+        state = {}
+        for name in ['elevation', 'cumdiff', 'cumhill', 'cumflex', 'rain', 'fillH']:
+            value = getattr(self, name, None)
+            if value is not None:
+                value = value.view()
+                value.flags.writeable = False
+            state[name] = value
+        state['coords'] = self.FVmesh.node_coords
+        state['step'] = self.nbStep
+
+        return state
+
+    def _notify_observers(self):
+        """
+        Call the observers due at the current time step.
+
+        Returns
+        -------
+        stop : bool
+            True when one of the observers requested to stop the simulation.
+        """
+
+        stop = False
+        state = None
+        for observer in list(self._observers):
+            due = False
+            if observer['every'] is not None and self.nbStep % observer['every'] == 0:
+                due = True
+            while len(observer['times']) > 0 and observer['times'][0] <= self.tNow:
+                observer['times'].pop(0)
+                due = True
+            if due:
+                if state is None:
+                    state = self.state_views()
+                if observer['callback'](self.tNow, state):
+                    stop = True
+
+        return stop
+
+    def profile_phases(self, enable=True):
+        """
+        Enable or disable the phase profiler recording the time spent by each processor in
+        the main simulation phases (pit filling, receivers, stack ordering, communications,
+        discharge, sediment fluxes, diffusion, flexure, waves, carbonate, checkpoints) and the
+        allocations of the work buffers. The work buffers are only allocated by the first time
+        step and after a TIN rebuild, so that steady-state steps record no allocation.
+
+        Parameters
+        ----------
+        enable : bool
+            Start (True) or stop (False) recording the phases.
+        """
+
+        if enable:
+            profiler.enable()
+        else:
+            profiler.disable()
+
+        return
+
+    def set_threads(self, nb):
+        """
+        Set the number of threads used by each processor in the flow kernels (stream power law,
+        sediment diffusion and CFL condition). The basins of the stack are processed in parallel
+        by the stream power law and the nodes by the diffusion kernels, so that one processor per
+        socket with several threads can replace several processors. The default is given by the
+        OMP_NUM_THREADS environment variable.
+
+        Parameters
+        ----------
+        nb : int
+            Number of threads.
+
+        Returns
+        -------
+        threads : int
+            Number of threads used by the kernels (1 when the libUtils are built without OpenMP).
+        """
+
+        return flowNetwork.set_threads(nb)
+
+    def write_phase_report(self, prefix=None):
+        """
+        Gather the recorded phases of all processors and write them in JSON and CSV formats.
+        This function needs to be called by all processors.
+
+        Parameters
+        ----------
+        prefix : string
+            Path and prefix of the report files (default to <outDir>/phases).
+
+        Returns
+        -------
+        report : dict
+            Phases report on the master processor and None on the other processors.
+        """
+
+        if prefix is None:
+            prefix = '%s/phases' % self.input.outDir
+
+        return profiler.write_report(prefix)
+
+    def snapshot(self):
+        """
+        Capture the simulation state in memory.
+
+        The snapshot holds read-only copies of the state arrays (elevation, cumulative
+        changes, flexure, stratigraphic and erodibility layers, flow network caches), the
+        values of the forcing clocks and the state of the random number generator, which
+        orders the flow network base nodes. Arrays shared between components are copied
+        once.
+
+        The other objects of the model and of its components are kept by reference:
+
+        - the mesh (FVmesh, tMesh and the TIN of the grid), which is replaced but never
+          modified when the TIN is rebuilt;
+        - the halo exchange patterns (halo, flow.halo), which only depend on the mesh;
+        - the work buffers (flow.buffers, force.buffers), which are overwritten before
+          being read on each step;
+        - the search trees (force.tree, flex.tree, carb.tree, strata.tree, wave.tree or
+          wave.wtree) and the interpolation functions (force.seaFunc, carbonate and pelagic
+          growth functions) built from the inputs;
+        - the cached operators (force.tinOp, hillslope.solver), which are rebuilt or
+          factorised again when the nodes, coefficients or time step they were built for
+          change.
+
+        Restored runs share these objects but their results do not depend on it. A
+        snapshot can be restored any number of times, so that several runs sharing a
+        common period (e.g. a spin-up) can branch from it without recomputing it. External
+        solvers (SWAN) and output files are not part of the snapshot.
+
+        Returns
+        -------
+        snap : dict
+            Simulation state.
+        """
+
+        assert hasattr(self, 'recGrid'), "DEM file has not been loaded. Configure one in your XML file or call the build_mesh function."
+
+        memo = {}
+        shared = set()
+        snap = {'model': {}, 'components': {}, 'shared': shared}
+        for name in self._stateAttrs:
+            if hasattr(self, name):
+                snap['model'][name] = _copy_state(getattr(self, name), memo, shared)
+        for name in self._stateComponents:
+            obj = getattr(self, name, None)
+            if obj is not None:
+                snap['components'][name] = _copy_state(obj.__dict__, memo, shared)
+        snap['tinMesh'] = self.recGrid.tinMesh
+        snap['random'] = np.random.get_state()
+
+        return snap
+
+    def restore(self, snap):
+        """
+        Restore the simulation state from a snapshot.
+
+        Parameters
+        ----------
+        snap : dict
+            Simulation state returned by the snapshot function.
+        """
+
+        memo = {}
+        shared = snap['shared']
+        for name, value in snap['model'].items():
+            setattr(self, name, _restore_state(value, memo, shared))
+        for name, state in snap['components'].items():
+            obj = getattr(self, name)
+            for key, value in state.items():
+                setattr(obj, key, _restore_state(value, memo, shared))
+        self.recGrid.tinMesh = snap['tinMesh']
+        np.random.set_state(snap['random'])
+
+        return
+
     def ncpus(self):
         """Return the number of CPUs used to generate the results."""
         return 1
@@ -14,9 +14,9 @@ import sys
 import time
 import numpy as np
 import mpi4py.MPI as mpi
-from matplotlib import path
 
-from pyBadlands import (elevationTIN)
+from pyBadlands import (elevationTIN, diffImplicit)
+from pyBadlands.simulation.phaseProfiler import profiler
 
 def streamflow(input, FVmesh, recGrid, force, hillslope, flow, elevation, \
                  lGIDs, rain, tNow, verbose=False):
@@ -35,65 +35,98 @@ def streamflow(input, FVmesh, recGrid, force, hillslope, flow, elevation, \
 
     # Update river input
     force.getRivers(tNow)
-    riverrain = rain+force.rivQw
+    riverrain = flow.buffers.get('riverrain', len(rain))
+    np.add(rain, force.rivQw, out=riverrain)
 
     # Build an initial depression-less surface at start time if required
-    if input.tStart == tNow and input.nopit == 1 :
-        fillH = elevationTIN.pit_stack_PD(elevation,input.nopit,force.sealevel)
-        elevation = fillH
+    if input.pitfill == 'priority':
+        pit_stack = elevationTIN.pit_stack_PF
     else:
-        fillH = elevationTIN.pit_stack_PD(elevation,0,force.sealevel)
+        pit_stack = elevationTIN.pit_stack_PD
+    with profiler.phase('pit_filling'):
+        if input.tStart == tNow and input.nopit == 1 :
+            fillH = pit_stack(elevation,input.nopit,force.sealevel)
+            elevation = fillH
+        else:
+            fillH = pit_stack(elevation,0,force.sealevel)
 
     if rank == 0 and verbose and input.spl:
-        print " -   depression-less algorithm PD with stack", time.clock() - walltime
+        if input.pitfill == 'priority':
+            print " -   depression-less algorithm priority-flood with heap", time.clock() - walltime
+        else:
+            print " -   depression-less algorithm PD with stack", time.clock() - walltime
 
     # Compute stream network
     walltime = time.clock()
-    flow.SFD_receivers(fillH, elevation, FVmesh.neighbours,
-                       FVmesh.vor_edges, FVmesh.edge_length,
-                       lGIDs)
+    with profiler.phase('receivers'):
+        flow.SFD_receivers(fillH, elevation, FVmesh.ngbIDs,
+                           FVmesh.ngbEdges, FVmesh.ngbDist,
+                           lGIDs, offsets=FVmesh.ngbOffsets)
 
     if rank == 0 and verbose:
         print " -   compute receivers parallel ", time.clock() - walltime
 
-    # Distribute evenly local minimas to processors on filled surface
+    # Reuse or repair the previous stack when the receivers network is (almost) unchanged
     walltime = time.clock()
-    flow.localbase = np.array_split(flow.base, size)[rank]
-    flow.ordered_node_array_filled()
-    if rank == 0 and verbose:
-        print " -   compute stack order locally for filled surface", time.clock() - walltime
+    with profiler.phase('stack_update'):
+        updated = flow.update_stack(filled=True)
+    if rank == 0 and verbose and updated:
+        print " -   update stack order for filled surface", time.clock() - walltime
+
+    # Distribute evenly local minimas to processors on filled surface
+    if not updated:
+        walltime = time.clock()
+        with profiler.phase('stack_order'):
+            flow.localbase = np.array_split(flow.base, size)[rank]
+            flow.ordered_node_array_filled()
+        if rank == 0 and verbose:
+            print " -   compute stack order locally for filled surface", time.clock() - walltime
+
+        walltime = time.clock()
+        with profiler.phase('allgatherv_stack'):
+            stackNbs = comm.allgather(len(flow.localstack))
+            globalstack = np.zeros(sum(stackNbs), dtype=flow.localstack.dtype)
+            comm.Allgatherv(sendbuf=[flow.localstack, mpi.INT],
+                            recvbuf=[globalstack, (stackNbs, None), mpi.INT])
+        flow.stack = globalstack
+        flow.stackNbs = stackNbs
+        if rank == 0 and verbose:
+            print " -   send stack order for filled surface globally ", time.clock() - walltime
 
     walltime = time.clock()
-    stackNbs = comm.allgather(len(flow.localstack))
-    globalstack = np.zeros(sum(stackNbs), dtype=flow.localstack.dtype)
-    comm.Allgatherv(sendbuf=[flow.localstack, mpi.INT],
-                    recvbuf=[globalstack, (stackNbs, None), mpi.INT])
-    flow.stack = globalstack
-    if rank == 0 and verbose:
-        print " -   send stack order for filled surface globally ", time.clock() - walltime
+    with profiler.phase('stack_update'):
+        updated = flow.update_stack(filled=False)
+    if rank == 0 and verbose and updated:
+        print " -   update stack order for real surface", time.clock() - walltime
 
     # Distribute evenly local minimas on real surface
-    walltime = time.clock()
-    flow.localbase1 = np.array_split(flow.base1, size)[rank]
-    flow.ordered_node_array_elev()
-    if rank == 0 and verbose:
-        print " -   compute stack order locally for real surface", time.clock() - walltime
+    if not updated:
+        walltime = time.clock()
+        with profiler.phase('stack_order'):
+            flow.localbase1 = np.array_split(flow.base1, size)[rank]
+            flow.ordered_node_array_elev()
+        if rank == 0 and verbose:
+            print " -   compute stack order locally for real surface", time.clock() - walltime
 
-    walltime = time.clock()
-    stackNbs1 = comm.allgather(len(flow.localstack1))
-    globalstack1 = np.zeros(sum(stackNbs1), dtype=flow.localstack1.dtype)
-    comm.Allgatherv(sendbuf=[flow.localstack1, mpi.INT],
-                    recvbuf=[globalstack1, (stackNbs1, None), mpi.INT])
-    flow.stack1 = globalstack1
-    if rank == 0 and verbose:
-        print " -   send stack order for real surface globally ", time.clock() - walltime
+        walltime = time.clock()
+        with profiler.phase('allgatherv_stack'):
+            stackNbs1 = comm.allgather(len(flow.localstack1))
+            globalstack1 = np.zeros(sum(stackNbs1), dtype=flow.localstack1.dtype)
+            comm.Allgatherv(sendbuf=[flow.localstack1, mpi.INT],
+                            recvbuf=[globalstack1, (stackNbs1, None), mpi.INT])
+        flow.stack1 = globalstack1
+        flow.stackNbs1 = stackNbs1
+        if rank == 0 and verbose:
+            print " -   send stack order for real surface globally ", time.clock() - walltime
 
     # Compute a unique ID for each local depression and their downstream draining nodes
-    flow.compute_parameters_depression(fillH,elevation,FVmesh.control_volumes,force.sealevel)
+    with profiler.phase('depressions'):
+        flow.compute_parameters_depression(fillH,elevation,FVmesh.kernel_array('control_volumes'),force.sealevel)
 
     # Compute discharge
     walltime = time.clock()
-    flow.compute_flow(elevation, FVmesh.control_volumes, riverrain)
+    with profiler.phase('discharge'):
+        flow.compute_flow(elevation, FVmesh.kernel_array('control_volumes'), riverrain)
     if rank == 0 and verbose:
         print " -   compute discharge ", time.clock() - walltime
 
@@ -109,6 +142,7 @@ def sediment_flux(input, recGrid, hillslope, FVmesh, tMesh, flow, force, rain, l
     size = mpi.COMM_WORLD.size
     comm = mpi.COMM_WORLD
     flow_time = time.clock()
+    buffers = flow.buffers
     #verbose = True
 
     # Get active layer
@@ -128,45 +162,35 @@ def sediment_flux(input, recGrid, hillslope, FVmesh, tMesh, flow, force, rain, l
         activelay = None
         eroCk = 0.
 
-    # Find border/inside nodes
+    # Find border/inside nodes (classified once per mesh)
     if flow.domain is None:
-        ids = np.arange(len(FVmesh.control_volumes))
-        tmp1 = np.where(FVmesh.control_volumes>0.)[0]
-        xyMin = [recGrid.regX.min()-1., recGrid.regY.min()-1.]
-        xyMax = [recGrid.regX.max()+1., recGrid.regY.max()+1.]
-        flow.domain = path.Path([(xyMin[0],xyMin[1]),(xyMax[0],xyMin[1]), (xyMax[0],xyMax[1]), (xyMin[0],xyMax[1])])
-        tmp2 = flow.domain.contains_points(flow.xycoords)
-        flow.insideIDs = np.intersect1d(tmp1,ids[tmp2])
-        flow.borders = np.zeros(len(FVmesh.control_volumes),dtype=int)
-        flow.borders[flow.insideIDs] = 1
-        flow.outsideIDs = np.where(flow.borders==0)[0]
-        xyMin2 = [recGrid.regX.min()+recGrid.resEdges, recGrid.regY.min()+recGrid.resEdges]
-        xyMax2 = [recGrid.regX.max()-recGrid.resEdges, recGrid.regY.max()-recGrid.resEdges]
-        xyMin2 = [recGrid.regX.min()+1, recGrid.regY.min()+1]
-        xyMax2 = [recGrid.regX.max()-1, recGrid.regY.max()-1]
-        domain = path.Path([(xyMin2[0],xyMin2[1]),(xyMax2[0],xyMin2[1]), (xyMax2[0],xyMax2[1]), (xyMin2[0],xyMax2[1])])
-        tmp3 = domain.contains_points(flow.xycoords)
-        flow.insideIDs2 = ids[tmp3]
-        flow.borders2 = np.zeros(len(FVmesh.control_volumes),dtype=int)
-        flow.borders2[flow.insideIDs2] = 1
-        flow.outsideIDs2 = np.where(flow.borders2==0)[0]
+        if FVmesh.domain is None:
+            FVmesh.build_domain(recGrid.regX, recGrid.regY)
+        flow.domain = FVmesh.domain
+        flow.insideIDs = FVmesh.insideIDs
+        flow.outsideIDs = FVmesh.outsideIDs
+        flow.borders = FVmesh.borders
+        flow.insideIDs2 = FVmesh.insideIDs2
+        flow.outsideIDs2 = FVmesh.outsideIDs2
+        flow.borders2 = FVmesh.borders2
 
     # Compute CFL condition
     walltime = time.clock()
-    if input.Hillslope and hillslope.updatedt == 0:
-        if hillslope.Sc == 0:
-            hillslope.dt_stability(FVmesh.edge_length[inGIDs,:tMesh.maxNgbh])
-        else:
-            hillslope.dt_stabilityCs(elevation, FVmesh.neighbours, FVmesh.edge_length,
-                    lGIDs, flow.borders2)
-            if hillslope.CFL < input.minDT:
-                print 'Decrease your hillslope diffusion coefficients to ensure stability.'
-                sys.exit(0)
-        hillslope.dt_stability_ms(FVmesh.edge_length[inGIDs,:tMesh.maxNgbh])
-    elif hillslope.CFL is None:
-        hillslope.CFL = tEnd-tNow
-
-    flow.dt_stability(fillH, inGIDs)
+    with profiler.phase('cfl'):
+        if input.Hillslope and hillslope.updatedt == 0:
+            if hillslope.Sc == 0:
+                hillslope.dt_stability(FVmesh.edge_length[inGIDs,:tMesh.maxNgbh])
+            else:
+                hillslope.dt_stabilityCs(elevation, FVmesh.ngbIDs, FVmesh.ngbDist,
+                        lGIDs, flow.borders2, offsets=FVmesh.ngbOffsets)
+                if hillslope.CFL < input.minDT:
+                    print 'Decrease your hillslope diffusion coefficients to ensure stability.'
+                    sys.exit(0)
+            hillslope.dt_stability_ms(FVmesh.edge_length[inGIDs,:tMesh.maxNgbh])
+        elif hillslope.CFL is None:
+            hillslope.CFL = tEnd-tNow
+
+        flow.dt_stability(fillH, inGIDs)
     CFLtime = min(flow.CFL, hillslope.CFL)
     if CFLtime>1.:
         CFLtime = float(round(CFLtime-0.5,0))
@@ -180,71 +204,109 @@ def sediment_flux(input, recGrid, hillslope, FVmesh, tMesh, flow, force, rain, l
 
     # Compute sediment fluxes
     if input.erolays >= 0:
-        oldelev = np.copy(elevation)
+        oldelev = buffers.copy('oldelev', elevation)
 
     # Initial cumulative elevation change
     walltime = time.clock()
-    timestep, sedchange, erosion, deposition = flow.compute_sedflux(FVmesh.control_volumes, elevation, rain, fillH,
-                                          CFLtime, activelay, eroCk, force.rivQs, force.sealevel, input.perc_dep,
-                                          input.slp_cr, FVmesh.neighbours, verbose=False)
+    with profiler.phase('sedflux'):
+        timestep, sedchange, erosion, deposition = flow.compute_sedflux(FVmesh.kernel_array('control_volumes'), elevation, rain, fillH,
+                                              CFLtime, activelay, eroCk, force.rivQs, force.sealevel, input.perc_dep,
+                                              input.slp_cr, FVmesh.neighbours, verbose=False)
 
     if rank == 0 and verbose:
         print " -   Get stream fluxes ", time.clock() - walltime
-    ed = np.sum(sedchange,axis=1)
+    ed = np.sum(sedchange, axis=1, out=buffers.get('ed', len(elevation)))
     elevation += ed
     cumdiff += ed
 
+    # Assemble the implicit diffusion operator once per mesh
+    if hillslope.implicit and hillslope.solver is None:
+        hillslope.solver = diffImplicit(FVmesh.ngbOffsets, FVmesh.ngbIDs, FVmesh.ngbEdges, FVmesh.ngbDist)
+
     # Compute marine sediment diffusion
     if hillslope.CDriver > 0.:
         walltime = time.clock()
 
         # Initialise marine sediments diffusion array
         it = 0
-        sumdep = np.sum(deposition,axis=1)
+        sumdep = np.sum(deposition, axis=1, out=buffers.get('sumdep', len(elevation)))
         maxth = 0.1
         diffstep = timestep
         diffcoeff = hillslope.sedfluxmarine(force.sealevel, elevation, FVmesh.control_volumes)
 
+        # Without stratigraphy, the implicit solver diffuses the complete mesh on each processor.
+        # Otherwise the explicit iterations only need the owned and ghost nodes of the
+        # partition to be up to date: fluxes are exchanged on the halo and the updated
+        # elevations are gathered once the diffusion is done
+        implicit = hillslope.solver is not None and straTIN is None
+        ghosts = flow.halo is not None and straTIN is None and not implicit
+        if ghosts:
+            diffIDs = inGIDs
+        else:
+            diffIDs = lGIDs
+
         # Perform river related sediment diffusion
-        while diffstep > 0. and it < 1000:
-            # Define maximum time step
-            maxstep = min(hillslope.CFLms,diffstep)
-            # Compute maximum marine fluxes and maximum timestep to avoid excessive diffusion erosion
-            diffmarine, mindt = flow.compute_marine_diffusion(elevation, sumdep, FVmesh.neighbours, FVmesh.vor_edges,
-                                            FVmesh.edge_length, diffcoeff, lGIDs, force.sealevel, maxth, maxstep)
-            diffmarine[flow.outsideIDs] = 0.
-            maxstep = min(mindt,maxstep)
-            # if maxstep < input.minDT:
-            #    print 'WARNING: marine diffusion time step is smaller than minimum timestep:',maxstep
-            #    print 'You will need to decrease your diffusion coefficient for criver'
-            #    stop
-
-            # Update diffusion time step and total diffused thicknesses
-            diffstep -= maxstep
-
-            # Distribute rock based on their respective proportions in the deposited columns
-            if straTIN is not None:
-                # Compute multi-rock diffusion
-                sedpropflux, difftot = flow.compute_sediment_marine(elevation, deposition, sumdep,
-                                                diffcoeff*maxstep, FVmesh.neighbours, force.sealevel,
-                                                maxth, FVmesh.vor_edges, FVmesh.edge_length, lGIDs)
-                difftot[flow.outsideIDs] = 0.
-                sedpropflux[flow.outsideIDs,:] = 0.
-
-                # Update deposition for each rock type
-                deposition += sedpropflux
-                deposition[deposition<0] = 0.
-
-                # Update elevation, erosion/deposition
-                sumdep += difftot
-                elevation += difftot
-                cumdiff += difftot
+        with profiler.phase('marine_diffusion'):
+            if implicit:
+                # Implicit diffusion steps are not limited by the CFL condition, each solve takes the
+                # remaining time unless the deposited thicknesses are exhausted
+                while diffstep > 0. and it < 1000:
+                    difftot, maxstep = hillslope.solver.marine(elevation, sumdep, diffcoeff, flow.borders,
+                                                force.sealevel, maxth, diffstep)
+                    difftot[flow.outsideIDs] = 0.
+                    diffstep -= maxstep
+
+                    # Update elevation, erosion/deposition
+                    sumdep += difftot
+                    elevation += difftot
+                    cumdiff += difftot
+                    it += 1
             else:
-                # Update elevation, erosion/deposition
-                sumdep += diffmarine*maxstep
-                elevation += diffmarine*maxstep
-                cumdiff += diffmarine*maxstep
-            it += 1
+                while diffstep > 0. and it < 1000:
+                    # Define maximum time step
+                    maxstep = min(hillslope.CFLms,diffstep)
+                    # Compute maximum marine fluxes and maximum timestep to avoid excessive diffusion erosion
+                    diffmarine, mindt = flow.compute_marine_diffusion(elevation, sumdep, FVmesh.ngbIDs, FVmesh.ngbEdges,
+                                                    FVmesh.ngbDist, diffcoeff, diffIDs, force.sealevel, maxth, maxstep,
+                                                    offsets=FVmesh.ngbOffsets, ghosts=ghosts)
+                    diffmarine[flow.outsideIDs] = 0.
+                    maxstep = min(mindt,maxstep)
+                    # if maxstep < input.minDT:
+                    #    print 'WARNING: marine diffusion time step is smaller than minimum timestep:',maxstep
+                    #    print 'You will need to decrease your diffusion coefficient for criver'
+                    #    stop
+
+                    # Update diffusion time step and total diffused thicknesses
+                    diffstep -= maxstep
+
+                    # Distribute rock based on their respective proportions in the deposited columns
+                    if straTIN is not None:
+                        # Compute multi-rock diffusion
+                        sedpropflux, difftot = flow.compute_sediment_marine(elevation, deposition, sumdep,
+                                                        diffcoeff*maxstep, FVmesh.neighbours, force.sealevel,
+                                                        maxth, FVmesh.kernel_array('vor_edges'), FVmesh.kernel_array('edge_length'), lGIDs)
+                        difftot[flow.outsideIDs] = 0.
+                        sedpropflux[flow.outsideIDs,:] = 0.
+
+                        # Update deposition for each rock type
+                        deposition += sedpropflux
+                        deposition[deposition<0] = 0.
+
+                        # Update elevation, erosion/deposition
+                        sumdep += difftot
+                        elevation += difftot
+                        cumdiff += difftot
+                    else:
+                        # Update elevation, erosion/deposition
+                        diffmarine *= maxstep
+                        sumdep += diffmarine
+                        elevation += diffmarine
+                        cumdiff += diffmarine
+                    it += 1
+
+            if ghosts:
+                flow.halo.gather(elevation)
+                flow.halo.gather(cumdiff)
 
         if rank == 0 and verbose:
             print " -   Get river sediment marine fluxes ", time.clock() - walltime
@@ -254,63 +316,70 @@ def sediment_flux(input, recGrid, hillslope, FVmesh, tMesh, flow, force, rain, l
     if straTIN is None:
         dtype = 0
     walltime = time.clock()
-    area = np.copy(FVmesh.control_volumes)
-    area[flow.outsideIDs2] = 0.
-    diffcoeff = hillslope.sedflux(force.sealevel, elevation, FVmesh.control_volumes)
-    diffcoeff[flow.outsideIDs2] = 0.
-    diff_flux = flow.compute_hillslope_diffusion(elevation, FVmesh.neighbours, FVmesh.vor_edges,
-                       FVmesh.edge_length, lGIDs, dtype, hillslope.Sc)
-    diff_flux[flow.outsideIDs2] = 0.
-    cdiff = diffcoeff*diff_flux*timestep
-
-    if straTIN is None:
-        if input.btype == 'outlet':
-            cdiff[flow.insideIDs[0]] = 0.
-        # Update dataset
-        elevation[flow.insideIDs] += cdiff[flow.insideIDs]
-        cumdiff[flow.insideIDs] += cdiff[flow.insideIDs]
-        cumhill[flow.insideIDs] += cdiff[flow.insideIDs]
-    else:
-        straTIN.update_layers(erosion, deposition, elevation, verbose)
-        # Get the active layer thickness to erode using diffusion
-        maxlayh = -cdiff
-        maxlayh[maxlayh<1.] = 1.
-        straTIN.get_active_layer(maxlayh)
-        # Compute multi-rock diffusion
-        tdiff, erosion, deposition = flow.compute_sediment_hillslope(elevation, straTIN.alayR,
-                                        diffcoeff*timestep, FVmesh.neighbours, FVmesh.vor_edges,
-                                        maxlayh, FVmesh.edge_length, lGIDs)
-        if input.btype == 'outlet':
-            tdiff[flow.insideIDs[0],:] = 0.
-        # # Update dataset
-        elevation += tdiff
-        cumdiff += tdiff
-        cumhill += tdiff
-        # Update active layer
-        straTIN.update_layers(erosion, deposition, elevation, verbose)
-
-    if input.btype == 'slope':
-        elevation[:len(flow.parentIDs)] = elevation[flow.parentIDs]-0.1
-    elif input.btype == 'flat':
-        elevation[:len(flow.parentIDs)] = elevation[flow.parentIDs]
-    elif input.btype == 'wall':
-        elevation[:len(flow.parentIDs)] = elevation[flow.parentIDs]+100.
-    elif input.btype == 'outlet':
-        elevation[1:len(flow.parentIDs)] = elevation[flow.parentIDs[1:]]+100.
-    elif input.btype == 'wall1':
-        elevation[:len(flow.parentIDs)] = elevation[flow.parentIDs]-0.1
-        elevation[:recGrid.nx+1] = elevation[flow.parentIDs[:recGrid.nx+1]]+100.
+    with profiler.phase('hillslope'):
+        diffcoeff = hillslope.sedflux(force.sealevel, elevation, FVmesh.control_volumes)
+        diffcoeff[flow.outsideIDs2] = 0.
+        if hillslope.solver is not None and straTIN is None and hillslope.Sc == 0:
+            cdiff = hillslope.solver.hillslope(elevation, diffcoeff, flow.borders2, timestep)
+        else:
+            diff_flux = flow.compute_hillslope_diffusion(elevation, FVmesh.ngbIDs, FVmesh.ngbEdges,
+                               FVmesh.ngbDist, lGIDs, dtype, hillslope.Sc, offsets=FVmesh.ngbOffsets)
+            diff_flux[flow.outsideIDs2] = 0.
+            cdiff = diff_flux
+            cdiff *= diffcoeff
+            cdiff *= timestep
+
+        if straTIN is None:
+            if input.btype == 'outlet':
+                cdiff[flow.insideIDs[0]] = 0.
+            # Update dataset
+            elevation[flow.insideIDs] += cdiff[flow.insideIDs]
+            cumdiff[flow.insideIDs] += cdiff[flow.insideIDs]
+            cumhill[flow.insideIDs] += cdiff[flow.insideIDs]
+        else:
+            straTIN.update_layers(erosion, deposition, elevation, verbose)
+            # Get the active layer thickness to erode using diffusion
+            maxlayh = -cdiff
+            maxlayh[maxlayh<1.] = 1.
+            straTIN.get_active_layer(maxlayh)
+            # Compute multi-rock diffusion
+            tdiff, erosion, deposition = flow.compute_sediment_hillslope(elevation, straTIN.alayR,
+                                            diffcoeff*timestep, FVmesh.neighbours, FVmesh.kernel_array('vor_edges'),
+                                            maxlayh, FVmesh.kernel_array('edge_length'), lGIDs)
+            if input.btype == 'outlet':
+                tdiff[flow.insideIDs[0],:] = 0.
+            # # Update dataset
+            elevation += tdiff
+            cumdiff += tdiff
+            cumhill += tdiff
+            # Update active layer
+            straTIN.update_layers(erosion, deposition, elevation, verbose)
+
+        if input.btype == 'slope':
+            elevation[:len(flow.parentIDs)] = elevation[flow.parentIDs]-0.1
+        elif input.btype == 'flat':
+            elevation[:len(flow.parentIDs)] = elevation[flow.parentIDs]
+        elif input.btype == 'wall':
+            elevation[:len(flow.parentIDs)] = elevation[flow.parentIDs]+100.
+        elif input.btype == 'outlet':
+            elevation[1:len(flow.parentIDs)] = elevation[flow.parentIDs[1:]]+100.
+        elif input.btype == 'wall1':
+            elevation[:len(flow.parentIDs)] = elevation[flow.parentIDs]-0.1
+            elevation[:recGrid.nx+1] = elevation[flow.parentIDs[:recGrid.nx+1]]+100.
 
     if rank == 0 and verbose:
         print " -   Get hillslope fluxes ", time.clock() - walltime
 
     # Update erodibility values
     if input.erolays >= 0:
-        mapero.getErodibility(elevation-oldelev)
+        np.subtract(elevation, oldelev, out=oldelev)
+        mapero.getErodibility(oldelev)
         flow.erodibility = mapero.erodibility
 
     if applyDisp:
-        elevation += disp * timestep
+        dispdt = buffers.get('dispdt', len(elevation))
+        np.multiply(disp, timestep, out=dispdt)
+        elevation += dispdt
 
     tNow += timestep
 
@@ -16,6 +16,20 @@ import mpi4py.MPI as mpi
 
 from pyBadlands import (partitionTIN, FVmethod, elevationTIN, raster2TIN, waveSed,  #oceanDyn
                         eroMesh, strataMesh, isoFlex, stratiWedge, carbMesh, forceSim)
+from pyBadlands.surface import meshCache
+
+def real_type(input):
+    """
+    Get the numpy data type used to store the Finite Volume geometry, the rain and the
+    stratigraphic layers (float32 when the single precision mode is requested in the XML file).
+    Elevation and cumulative erosion/deposition are always stored in double precision, and the
+    compiled kernels get double precision copies of the geometry (see FVmethod.kernel_array).
+    """
+
+    if input.precision == 'single':
+        return np.float32
+
+    return np.float
 
 def construct_mesh(input, filename, verbose=False):
     """
@@ -36,8 +50,22 @@ def construct_mesh(input, filename, verbose=False):
     strata = None
     mapero = None
 
+    # Look for the mesh in the cache (all processors need to find it)
+    cachefile = None
+    cache = None
+    if input.meshcache is not None:
+        cachefile = meshCache.cache_file(input.meshcache, filename, input.Afactor, size,
+                                         '%s:%s' % (input.partition, input.partcost), input.precision)
+        cache = meshCache.load_mesh(cachefile)
+        if not comm.allreduce(cache is not None, op=mpi.MIN):
+            cache = None
+
     # Get DEM regular grid and create Badlands TIN.
-    recGrid = raster2TIN.raster2TIN(filename, areaDelFactor=input.Afactor)
+    if cache is not None:
+        tinData = dict((key[5:], cache[key]) for key in cache.keys() if key.startswith('grid_'))
+        recGrid = raster2TIN.raster2TIN(filename, areaDelFactor=input.Afactor, tinData=tinData)
+    else:
+        recGrid = raster2TIN.raster2TIN(filename, areaDelFactor=input.Afactor)
 
     fixIDs = recGrid.boundsPt + recGrid.edgesPt
 
@@ -57,50 +85,20 @@ def construct_mesh(input, filename, verbose=False):
         else:
             force.merge3d = input.merge3d
 
-    # Partition the TIN
-    walltime = time.clock()
-    FVmesh = FVmethod.FVmethod(recGrid.tinMesh['vertices'], recGrid.tinMesh['triangles'],
-                                recGrid.tinMesh['edges'])
-
-    # Perform partitioning by equivalent domain splitting
-    partitionIDs, RowProc, ColProc = partitionTIN.simple(recGrid.tinMesh['vertices'][:, 0],
-                                                         recGrid.tinMesh['vertices'][:, 1])
-    FVmesh.partIDs = partitionIDs
-
-    # Get each partition global node ID
-    inGIDs = np.where(partitionIDs == rank)[0]
-
-    # Build Finite Volume discretisation
-    # Define overlapping partitions
-    lGIDs, localTIN = partitionTIN.overlap(recGrid.tinMesh['vertices'][:, 0], recGrid.tinMesh['vertices'][:, 1],
-                                            RowProc, ColProc, 2*recGrid.resEdges, verbose)
-
-    # Set parameters of the finite volume mesh
-    tMesh = FVmethod.FVmethod(localTIN['vertices'], localTIN['triangles'], localTIN['edges'])
-
-    if rank == 0 and size > 1 and verbose:
-        print " - partition TIN amongst processors and create local TINs", time.clock() - walltime
-
-    # Define Finite Volume parameters
-    walltime = time.clock()
-    totPts = len(recGrid.tinMesh['vertices'][:, 0])
-    FVmesh.neighbours = np.zeros((totPts, 20), dtype=np.int32, order='F')
-    FVmesh.neighbours.fill(-2)
-    FVmesh.edge_length = np.zeros((totPts, 20), dtype=np.float, order='F')
-    FVmesh.vor_edges = np.zeros((totPts, 20), dtype=np.float, order='F')
-    FVmesh.control_volumes = np.zeros(totPts, dtype=np.float)
-
-    # Compute Finite Volume parameters
-    tGIDs, tNgbh, tEdgs, tVors, tVols = tMesh.construct_FV(inGIDs, lGIDs, totPts,
-                                                  recGrid.resEdges*input.Afactor, verbose)
-
-    FVmesh.neighbours[tGIDs,:tMesh.maxNgbh] = tNgbh
-    FVmesh.edge_length[tGIDs,:tMesh.maxNgbh] = tEdgs
-    FVmesh.vor_edges[tGIDs,:tMesh.maxNgbh] = tVors
-    FVmesh.control_volumes[tGIDs] = tVols
+    if cache is not None:
+        walltime = time.clock()
+        totPts = len(recGrid.tinMesh['vertices'][:, 0])
+        FVmesh, tMesh, lGIDs, inGIDs = _load_cached_FVmesh(cache, recGrid, rank)
+        if rank == 0 and verbose:
+            print " - load FV mesh from cache ", time.clock() - walltime
+    else:
+        FVmesh, tMesh, lGIDs, inGIDs, totPts = _build_FVmesh(input, recGrid, rank, size, verbose)
+        if cachefile is not None:
+            meshCache.save_mesh(cachefile, recGrid, FVmesh, tMesh, lGIDs)
 
-    if rank == 0 and verbose:
-        print " - FV mesh ", time.clock() - walltime
+    # Parents of the TIN edges
+    FVmesh.bndParents = elevationTIN.boundary_parents(FVmesh.neighbours, FVmesh.edge_length,
+                                                      recGrid.boundsPt)
 
     # Define TIN parameters
     if input.flexure:
@@ -142,11 +140,11 @@ def construct_mesh(input, filename, verbose=False):
             straTIN = stratiWedge.stratiWedge(layNb, input.initlayers, FVmesh.node_coords[:, :2], bPts,
                             ePts, input.layersData, input.actlay, input.outDir, input.strath5file,
                             input.rockNb, recGrid.regX, recGrid.regY, elevation, input.rockCk, cumdiff,
-                            input.rfolder, input.rstep)
+                            input.rfolder, input.rstep, dtype=real_type(input))
         else:
             straTIN = stratiWedge.stratiWedge(layNb, input.initlayers, FVmesh.node_coords[:, :2], bPts,
                                     ePts, input.layersData, input.actlay, input.outDir, input.strath5file,
-                                    input.rockNb, recGrid.regX, recGrid.regY, elevation, input.rockCk)
+                                    input.rockNb, recGrid.regX, recGrid.regY, elevation, input.rockCk, dtype=real_type(input))
     else:
         straTIN = None
 
@@ -162,11 +160,11 @@ def construct_mesh(input, filename, verbose=False):
         if input.restart:
             carbTIN = carbMesh.carbMesh(layNb, input.initlayers, FVmesh.node_coords[:, :2], bPts,
                             ePts, input.layersData, input.outDir, input.strath5file, input.baseMap, nbSed,
-                            recGrid.regX, recGrid.regY, elevation, input.rfolder, input.rstep)
+                            recGrid.regX, recGrid.regY, elevation, input.rfolder, input.rstep, dtype=real_type(input))
         else:
             carbTIN = carbMesh.carbMesh(layNb, input.initlayers, FVmesh.node_coords[:, :2], bPts,
                             ePts, input.layersData, input.outDir, input.strath5file, input.baseMap, nbSed,
-                            recGrid.regX, recGrid.regY, elevation)
+                            recGrid.regX, recGrid.regY, elevation, dtype=real_type(input))
     else:
         carbTIN = None
 
@@ -175,6 +173,113 @@ def construct_mesh(input, filename, verbose=False):
         cumhill, cumflex, strata, mapero, tinFlex, flex, wave, \
         straTIN, carbTIN
 
+def _build_FVmesh(input, recGrid, rank, size, verbose=False):
+    """
+    This function partitions the TIN and builds the Finite Volume discretisation.
+    """
+
+    # Partition the TIN
+    walltime = time.clock()
+    FVmesh = FVmethod.FVmethod(recGrid.tinMesh['vertices'], recGrid.tinMesh['triangles'],
+                                recGrid.tinMesh['edges'])
+
+    # Perform partitioning and define overlapping partitions
+    partitionIDs, lGIDs, localTIN = _partition_TIN(input, recGrid, rank, verbose)
+    FVmesh.partIDs = partitionIDs
+
+    # Get each partition global node ID
+    inGIDs = np.where(partitionIDs == rank)[0]
+
+    # Set parameters of the finite volume mesh
+    tMesh = FVmethod.FVmethod(localTIN['vertices'], localTIN['triangles'], localTIN['edges'])
+
+    if rank == 0 and size > 1 and verbose:
+        print " - partition TIN amongst processors and create local TINs", time.clock() - walltime
+
+    # Define Finite Volume parameters
+    walltime = time.clock()
+    totPts = len(recGrid.tinMesh['vertices'][:, 0])
+    FVmesh.neighbours = np.zeros((totPts, 20), dtype=np.int32, order='F')
+    FVmesh.neighbours.fill(-2)
+    FVmesh.edge_length = np.zeros((totPts, 20), dtype=real_type(input), order='F')
+    FVmesh.vor_edges = np.zeros((totPts, 20), dtype=real_type(input), order='F')
+    FVmesh.control_volumes = np.zeros(totPts, dtype=real_type(input))
+
+    # Compute Finite Volume parameters
+    tGIDs, tNgbh, tEdgs, tVors, tVols = tMesh.construct_FV(inGIDs, lGIDs, totPts,
+                                                  recGrid.resEdges*input.Afactor, verbose)
+
+    FVmesh.neighbours[tGIDs,:tMesh.maxNgbh] = tNgbh
+    FVmesh.edge_length[tGIDs,:tMesh.maxNgbh] = tEdgs
+    FVmesh.vor_edges[tGIDs,:tMesh.maxNgbh] = tVors
+    FVmesh.control_volumes[tGIDs] = tVols
+    FVmesh.build_csr()
+
+    if rank == 0 and verbose:
+        print " - FV mesh ", time.clock() - walltime
+
+    return FVmesh, tMesh, lGIDs, inGIDs, totPts
+
+def _partition_TIN(input, recGrid, rank, verbose=False):
+    """
+    This function partitions the TIN with the method defined in the XML input and builds the
+    overlapping local partition. Load-imbalance statistics are reported when verbose.
+    """
+
+    X = recGrid.tinMesh['vertices'][:, 0]
+    Y = recGrid.tinMesh['vertices'][:, 1]
+
+    # Node cost estimates from the DEM elevation
+    weights = None
+    if input.partcost != 1.:
+        elev = elevationTIN.getElevation(recGrid.regX, recGrid.regY, recGrid.regZ,
+                                         recGrid.tinMesh['vertices'][:, :2])
+        weights = partitionTIN.node_costs(elev, input.seapos, input.partcost)
+
+    if input.partition == 'simple':
+        # Perform partitioning by equivalent domain splitting
+        partitionIDs, RowProc, ColProc = partitionTIN.simple(X, Y)
+        lGIDs, localTIN = partitionTIN.overlap(X, Y, RowProc, ColProc, 2*recGrid.resEdges, verbose)
+    else:
+        # Split a space-filling curve in partitions of equal cost
+        partitionIDs = partitionTIN.space_filling(X, Y, weights, curve=input.partition)
+        lGIDs, localTIN = partitionTIN.overlap_bbox(X, Y, partitionIDs, 2*recGrid.resEdges, verbose)
+
+    if rank == 0 and verbose and mpi.COMM_WORLD.size > 1:
+        stats = partitionTIN.imbalance(partitionIDs, weights)
+        print " - partition nodes per processor ", stats['nodes'].tolist()
+        print " - partition imbalance (nodes, cost) ", stats['node_imbalance'], stats['cost_imbalance']
+
+    return partitionIDs, lGIDs, localTIN
+
+def _load_cached_FVmesh(cache, recGrid, rank):
+    """
+    This function restores the partitioning and the Finite Volume discretisation from the mesh cache.
+    """
+
+    FVmesh = FVmethod.FVmethod(recGrid.tinMesh['vertices'], recGrid.tinMesh['triangles'],
+                                recGrid.tinMesh['edges'])
+    FVmesh.partIDs = cache['partIDs']
+    FVmesh.neighbours = cache['neighbours']
+    FVmesh.edge_length = cache['edge_length']
+    FVmesh.vor_edges = cache['vor_edges']
+    FVmesh.control_volumes = cache['control_volumes']
+    FVmesh.ngbOffsets = cache['ngbOffsets']
+    FVmesh.ngbIDs = cache['ngbIDs']
+    FVmesh.ngbEdges = cache['ngbEdges']
+    FVmesh.ngbDist = cache['ngbDist']
+
+    # Get each partition global node ID
+    inGIDs = np.where(FVmesh.partIDs == rank)[0]
+
+    # Local partition
+    lGIDs = cache['local%d_lGIDs' % rank]
+    tMesh = FVmethod.FVmethod(cache['local%d_vertices' % rank], cache['local%d_triangles' % rank],
+                              cache['local%d_edges' % rank])
+    tMesh.maxNgbh = int(cache['maxNgbh'])
+
+    return FVmesh, tMesh, lGIDs, inGIDs
+
 def reconstruct_mesh(recGrid, input, verbose=False):
     """
     The following function is used after 3D displacements to:
@@ -191,9 +296,8 @@ def reconstruct_mesh(recGrid, input, verbose=False):
     FVmesh = FVmethod.FVmethod(recGrid.tinMesh['vertices'], recGrid.tinMesh['triangles'],
                                recGrid.tinMesh['edges'])
 
-    # Perform partitioning by equivalent domain splitting
-    partitionIDs, RowProc, ColProc = partitionTIN.simple(recGrid.tinMesh['vertices'][:, 0],
-                                                         recGrid.tinMesh['vertices'][:, 1])
+    # Perform partitioning and define overlapping partitions
+    partitionIDs, lGIDs, localTIN = _partition_TIN(input, recGrid, rank, verbose)
     FVmesh.partIDs = partitionIDs
 
     # Get each partition global node ID
@@ -202,13 +306,6 @@ def reconstruct_mesh(recGrid, input, verbose=False):
     if rank == 0 and verbose:
         print " - partition TIN amongst processors ", time.clock() - walltime
 
-    # Define overlapping partitions
-    walltime = time.clock()
-    lGIDs, localTIN = partitionTIN.overlap(recGrid.tinMesh['vertices'][:, 0],
-                                           recGrid.tinMesh['vertices'][:, 1],
-                                           RowProc, ColProc, 2*recGrid.resEdges,
-                                           verbose)
-
     # Set parameters of the finite volume mesh
     tMesh = FVmethod.FVmethod(localTIN['vertices'], localTIN['triangles'], localTIN['edges'])
 
@@ -216,9 +313,9 @@ def reconstruct_mesh(recGrid, input, verbose=False):
     totPts = len(recGrid.tinMesh['vertices'][:, 0])
     FVmesh.neighbours = np.zeros((totPts, 20), dtype=np.int32, order='F')
     FVmesh.neighbours.fill(-2)
-    FVmesh.edge_length = np.zeros((totPts, 20), dtype=np.float, order='F')
-    FVmesh.vor_edges = np.zeros((totPts, 20), dtype=np.float, order='F')
-    FVmesh.control_volumes = np.zeros(totPts, dtype=np.float)
+    FVmesh.edge_length = np.zeros((totPts, 20), dtype=real_type(input), order='F')
+    FVmesh.vor_edges = np.zeros((totPts, 20), dtype=real_type(input), order='F')
+    FVmesh.control_volumes = np.zeros(totPts, dtype=real_type(input))
 
     # Compute Finite Volume parameters
     tGIDs, tNgbh, tEdgs, tVors, tVols = tMesh.construct_FV(inGIDs, lGIDs, totPts,
@@ -228,14 +325,18 @@ def reconstruct_mesh(recGrid, input, verbose=False):
     FVmesh.edge_length[tGIDs,:tMesh.maxNgbh] = tEdgs
     FVmesh.vor_edges[tGIDs,:tMesh.maxNgbh] = tVors
     FVmesh.control_volumes[tGIDs] = tVols
+    FVmesh.build_csr()
+    FVmesh.bndParents = elevationTIN.boundary_parents(FVmesh.neighbours, FVmesh.edge_length,
+                                                      recGrid.boundsPt)
 
     if rank == 0 and verbose:
         print " - reconstructed FV mesh ", time.clock() - walltime
 
     inIDs = np.where(FVmesh.partIDs[recGrid.boundsPt:] == rank)[0]
     inIDs += recGrid.boundsPt
-    elevationTIN.assign_parameter_pit(FVmesh.neighbours, FVmesh.control_volumes, input.diffnb,
-                                      input.diffprop, recGrid.boundsPt, input.fillmax)
+    elevationTIN.assign_parameter_pit(FVmesh.ngbIDs, FVmesh.kernel_array('control_volumes'), input.diffnb,
+                                      input.diffprop, recGrid.boundsPt, input.fillmax,
+                                      offsets=FVmesh.ngbOffsets)
 
     return FVmesh, tMesh, lGIDs, inIDs, inGIDs, totPts
 
@@ -298,11 +399,13 @@ def _define_TINparams(totPts, input, FVmesh, recGrid, verbose=False):
 
     # Assign boundary values
     elevation, parentIDs = elevationTIN.update_border_elevation(local_elev, FVmesh.neighbours,
-                                FVmesh.edge_length, recGrid.boundsPt, btype=input.btype)
+                                FVmesh.edge_length, recGrid.boundsPt, btype=input.btype,
+                                parents=FVmesh.bndParents)
 
     # Define pit filling algorithm
-    elevationTIN.assign_parameter_pit(FVmesh.neighbours, FVmesh.control_volumes, input.diffnb,
-                                      input.diffprop, recGrid.boundsPt, input.fillmax)
+    elevationTIN.assign_parameter_pit(FVmesh.ngbIDs, FVmesh.kernel_array('control_volumes'), input.diffnb,
+                                      input.diffprop, recGrid.boundsPt, input.fillmax,
+                                      offsets=FVmesh.ngbOffsets)
 
     if rank == 0 and verbose:
         print " - define paramters on TIN grid ", time.clock() - walltime
@@ -331,10 +434,10 @@ def _build_strateroMesh(input, FVmesh, recGrid, cumdiff, rank, verbose=False):
         strata = None
         if input.restart:
             strata = strataMesh.strataMesh(sdx, bbX, bbY, layNb, FVmesh.node_coords[:, :2],
-                                input.outDir, input.sh5file, cumdiff, input.rfolder, input.rstep)
+                                input.outDir, input.sh5file, cumdiff, input.rfolder, input.rstep, dtype=real_type(input))
         else:
             strata = strataMesh.strataMesh(sdx, bbX, bbY, layNb, FVmesh.node_coords[:, :2],
-                                input.outDir, input.sh5file)
+                                input.outDir, input.sh5file, dtype=real_type(input))
         if rank == 0 and verbose:
             print " - create stratigraphic regions ", time.clock() - walltime
 
@@ -396,7 +499,8 @@ def _init_flexure(FVmesh, input, recGrid, force, elevation, cumdiff,
     force.getSea(input.tStart)
     tinFlex = flex.get_flexure(elevation, cumdiff, force.sealevel,
                                recGrid.boundsPt, initFlex=True)
-    tinFlex = force.disp_border(tinFlex, FVmesh.neighbours, FVmesh.edge_length, recGrid.boundsPt)
+    tinFlex = force.disp_border(tinFlex, FVmesh.neighbours, FVmesh.edge_length, recGrid.boundsPt,
+                                parents=FVmesh.bndParents)
     cumflex += tinFlex
     if rank == 0 and verbose:
         print "   - Initialise flexural isostasy ", time.clock() - walltime
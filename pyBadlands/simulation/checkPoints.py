@@ -63,8 +63,8 @@ def write_checkpoints(input, recGrid, lGIDs, inIDs, tNow, FVmesh, \
     comm.Allreduce(mpi.IN_PLACE, fline, op=mpi.MAX)
 
     # Compute flow parameters
-    flow.view_receivers(fillH, elevation, FVmesh.neighbours, FVmesh.vor_edges,
-                        FVmesh.edge_length, lGIDs, force.sealevel)
+    flow.view_receivers(fillH, elevation, FVmesh.neighbours, FVmesh.kernel_array('vor_edges'),
+                        FVmesh.kernel_array('edge_length'), lGIDs, force.sealevel)
     flow.compute_parameters()
     visdis = np.copy(flow.discharge)
     seaIDs = np.where(elevation<force.sealevel)[0]
@@ -0,0 +1,235 @@
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+##                                                                                   ##
+##  This file forms part of the Badlands surface processes modelling application.    ##
+##                                                                                   ##
+##  For full license and copyright information, please refer to the LICENSE.md file  ##
+##  located at the project root, or contact the authors.                             ##
+##                                                                                   ##
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+"""
+This module encapsulates the phase profiler of Badlands simulations.
+
+Named phases (pit filling, receivers, stack ordering, communications, discharge,
+sediment fluxes, diffusion, flexure...) are timed on each processor. The counts, total
+and maximum wall times of each phase are gathered on the master processor which reports
+them together with the load imbalance between processors. The allocations of the
+simulation work buffers (number and bytes) are recorded in the same way.
+"""
+
+import csv
+import json
+import time
+import mpi4py.MPI as mpi
+
+class _phase(object):
+    """
+    Context manager timing one execution of a phase.
+    """
+
+    __slots__ = ('stats', 'tstart')
+
+    def __init__(self, stats):
+        self.stats = stats
+        self.tstart = 0.
+
+    def __enter__(self):
+        self.tstart = time.time()
+        return self
+
+    def __exit__(self, *args):
+        walltime = time.time() - self.tstart
+        stats = self.stats
+        stats[0] += 1
+        stats[1] += walltime
+        if walltime > stats[2]:
+            stats[2] = walltime
+        return False
+
+class _nophase(object):
+    """
+    Context manager used when the profiler is disabled.
+    """
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+_NOPHASE = _nophase()
+
+class phaseProfiler:
+    """
+    Class for timing the phases of a Badlands simulation on each processor.
+    """
+
+    def __init__(self):
+        '''Initialization.'''
+        self.enabled = False
+        self.stats = {}
+        self.allocs = {}
+
+    def enable(self):
+        """
+        Start recording the phases.
+        """
+
+        self.enabled = True
+
+        return
+
+    def disable(self):
+        """
+        Stop recording the phases.
+        """
+
+        self.enabled = False
+
+        return
+
+    def reset(self):
+        """
+        Remove all the recorded phases and allocations.
+        """
+
+        self.stats = {}
+        self.allocs = {}
+
+        return
+
+    def phase(self, name):
+        """
+        Context manager timing a phase.
+
+        Parameters
+        ----------
+        name
+            Name of the phase.
+        """
+
+        if not self.enabled:
+            return _NOPHASE
+
+        stats = self.stats.get(name)
+        if stats is None:
+            stats = [0, 0., 0.]
+            self.stats[name] = stats
+
+        return _phase(stats)
+
+    def allocation(self, name, nbytes):
+        """
+        Record the allocation of a work buffer.
+
+        Parameters
+        ----------
+        name
+            Name of the work buffer.
+
+        nbytes
+            Size of the allocated buffer (in bytes).
+        """
+
+        if not self.enabled:
+            return
+
+        allocs = self.allocs.get(name)
+        if allocs is None:
+            allocs = [0, 0]
+            self.allocs[name] = allocs
+        allocs[0] += 1
+        allocs[1] += nbytes
+
+        return
+
+    def allocations(self):
+        """
+        Get the number of work buffer allocations recorded on this processor.
+
+        Returns
+        -------
+        count
+            Total number of allocations.
+        """
+
+        return sum(allocs[0] for allocs in self.allocs.values())
+
+    def gather(self):
+        """
+        Gather the phases recorded by each processor on the master processor.
+
+        Returns
+        -------
+        report
+            Dictionary with the number of processors and for each phase the count, total and
+            maximum wall time recorded by each processor, together with the load imbalance
+            (maximum over mean total time), and for each work buffer the number and bytes of
+            the allocations of each processor. None on the other processors.
+        """
+
+        comm = mpi.COMM_WORLD
+        allstats = comm.gather(self.stats, root=0)
+        allallocs = comm.gather(self.allocs, root=0)
+        if comm.Get_rank() > 0:
+            return None
+
+        size = len(allstats)
+        names = sorted(set(name for stats in allstats for name in stats))
+        phases = {}
+        for name in names:
+            count = [stats.get(name, [0, 0., 0.])[0] for stats in allstats]
+            total = [stats.get(name, [0, 0., 0.])[1] for stats in allstats]
+            maxtime = [stats.get(name, [0, 0., 0.])[2] for stats in allstats]
+            mean = sum(total)/size
+            if mean > 0.:
+                imbalance = max(total)/mean
+            else:
+                imbalance = 1.
+            phases[name] = {'count': count, 'total': total, 'max': maxtime,
+                            'mean_total': mean, 'imbalance': imbalance}
+
+        allocations = {}
+        for name in sorted(set(name for allocs in allallocs for name in allocs)):
+            allocations[name] = {'count': [allocs.get(name, [0, 0])[0] for allocs in allallocs],
+                                 'bytes': [allocs.get(name, [0, 0])[1] for allocs in allallocs]}
+
+        return {'nprocs': size, 'phases': phases, 'allocations': allocations}
+
+    def write_report(self, prefix):
+        """
+        Write the phases report in JSON (prefix.json) and CSV (prefix.csv) formats.
+        This function needs to be called by all processors.
+
+        Parameters
+        ----------
+        prefix
+            Path and prefix of the report files.
+
+        Returns
+        -------
+        report
+            Dictionary returned by the gather function on the master processor.
+        """
+
+        report = self.gather()
+        if report is None:
+            return None
+
+        with open('%s.json' % prefix, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+        with open('%s.csv' % prefix, 'w') as f:
+            writer = csv.writer(f)
+            writer.writerow(['phase', 'rank', 'count', 'total', 'max', 'imbalance'])
+            for name in sorted(report['phases']):
+                phase = report['phases'][name]
+                for p in range(report['nprocs']):
+                    writer.writerow([name, p, phase['count'][p], '%.6f' % phase['total'][p],
+                                     '%.6f' % phase['max'][p], '%.4f' % phase['imbalance']])
+
+        return report
+
+# Profiler shared by the simulation modules
+profiler = phaseProfiler()
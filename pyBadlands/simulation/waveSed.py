@@ -27,9 +27,7 @@ from scipy.spatial import cKDTree
 from scipy.interpolate import interpn
 from scipy.ndimage.filters import gaussian_filter
 
-from matplotlib.path import Path
 from collections import OrderedDict
-from matplotlib import contour as cntr
 
 import pyBadlands.libUtils.WAVEsed as ocean
 
@@ -303,6 +301,9 @@ class waveSed():
             Minimum island perimeter length to consider.
         """
 
+        # Imported here so that loading the model does not load the plotting libraries
+        from matplotlib import contour as cntr
+
         c = cntr.Cntr(self.xi, self.yi, self.regZ.T)
         contour = c.trace(self.sealvl)
 
@@ -0,0 +1,109 @@
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+##                                                                                   ##
+##  This file forms part of the Badlands surface processes modelling application.    ##
+##                                                                                   ##
+##  For full license and copyright information, please refer to the LICENSE.md file  ##
+##  located at the project root, or contact the authors.                             ##
+##                                                                                   ##
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+"""
+This module encapsulates the work buffers of Badlands simulations.
+
+The time stepping fills named work arrays (rain, erosion, deposition, sediment fluxes...)
+in place instead of allocating new ones at each step. A buffer is only allocated when it
+is first requested or when its shape or type changes (after a TIN rebuild), and each
+allocation is reported to the phase profiler so that steady-state steps can be checked
+to allocate nothing.
+"""
+
+import numpy
+from pyBadlands.simulation.phaseProfiler import profiler
+
+class workBuffers:
+    """
+    Class for handling the preallocated work arrays of a Badlands simulation.
+    """
+
+    def __init__(self):
+        '''Initialization.'''
+        self.arrays = {}
+        self.allocations = 0
+
+    def reset(self):
+        """
+        Release all the work arrays (e.g. when the TIN is rebuilt).
+        """
+
+        self.arrays = {}
+
+        return
+
+    def get(self, name, shape, dtype=float):
+        """
+        Get a work array. Its values are the ones left by the previous user.
+
+        Parameters
+        ----------
+        name
+            Name of the work array.
+
+        shape
+            Shape of the work array.
+
+        dtype
+            Numpy data type of the work array.
+
+        Returns
+        -------
+        array
+            Numpy array of the requested shape and type.
+        """
+
+        array = self.arrays.get(name)
+        if not isinstance(shape, tuple):
+            shape = (shape,)
+        dtype = numpy.dtype(dtype)
+        if array is None or array.shape != shape or array.dtype != dtype:
+            array = numpy.empty(shape, dtype=dtype)
+            self.arrays[name] = array
+            self.allocations += 1
+            profiler.allocation(name, array.nbytes)
+
+        return array
+
+    def zeros(self, name, shape, dtype=float):
+        """
+        Get a work array filled with zeros.
+        """
+
+        array = self.get(name, shape, dtype)
+        array.fill(0)
+
+        return array
+
+    def full(self, name, shape, value, dtype=float):
+        """
+        Get a work array filled with the given value.
+        """
+
+        array = self.get(name, shape, dtype)
+        array.fill(value)
+
+        return array
+
+    def copy(self, name, values):
+        """
+        Get a work array holding a copy of the given array.
+        """
+
+        array = self.get(name, values.shape, values.dtype)
+        numpy.copyto(array, values)
+
+        return array
+
+    def nbytes(self):
+        """
+        Get the memory used by the work arrays (in bytes).
+        """
+
+        return sum(array.nbytes for array in self.arrays.values())
@@ -46,12 +46,26 @@ class FVmethod:
         self.neighbours = None
         self.vor_edges = None
         self.edge_length = None
+        self.ngbOffsets = None
+        self.ngbIDs = None
+        self.ngbEdges = None
+        self.ngbDist = None
+        self.kernelArrays = {}
+        self.bndParents = None
         self.fillH = None
         self.partIDs = None
         self.maxNgbh = None
         self.localIDs = None
         self.outPts = None
         self.outCells = None
+        self.domain = None
+        self.insideIDs = None
+        self.outsideIDs = None
+        self.borders = None
+        self.domain2 = None
+        self.insideIDs2 = None
+        self.outsideIDs2 = None
+        self.borders2 = None
 
     def _FV_utils(self, lGIDs, verbose=False):
         """
@@ -354,3 +368,98 @@ class FVmethod:
             print " - perform MPI communication ", time.clock() - walltime
 
         return exportGIDs, exportNgbhIDs, exportEdges, exportVors, exportVols
+
+    def _inside_box(self, xyMin, xyMax):
+        """
+        Flag the nodes strictly inside a rectangular extent.
+        """
+
+        xy = self.node_coords
+        return (xy[:,0] > xyMin[0]) & (xy[:,0] < xyMax[0]) & (xy[:,1] > xyMin[1]) & (xy[:,1] < xyMax[1])
+
+    def build_domain(self, regX, regY):
+        """
+        Classify the nodes against the extent of the regular input grid. The simulation domain
+        (domain, insideIDs, outsideIDs and borders) holds the nodes with a positive voronoi area
+        inside the grid extent, and the diffusion domain (domain2, insideIDs2, outsideIDs2 and
+        borders2) the nodes inside the grid extent shrunk by 1 m.
+
+        The classification only depends on the TIN and is done once per Finite Volume mesh.
+
+        Parameters
+        ----------
+        regX
+            Numpy array containing the X-coordinates of the regular input grid.
+
+        regY
+            Numpy array containing the Y-coordinates of the regular input grid.
+        """
+
+        xyMin = [regX.min(), regY.min()]
+        xyMax = [regX.max(), regY.max()]
+
+        self.domain = self._inside_box([xyMin[0]-1., xyMin[1]-1.], [xyMax[0]+1., xyMax[1]+1.])
+        inside = self.domain & (numpy.asarray(self.control_volumes) > 0.)
+        self.insideIDs = numpy.where(inside)[0]
+        self.outsideIDs = numpy.where(~inside)[0]
+        self.borders = inside.astype(int)
+
+        self.domain2 = self._inside_box([xyMin[0]+1., xyMin[1]+1.], [xyMax[0]-1., xyMax[1]-1.])
+        self.insideIDs2 = numpy.where(self.domain2)[0]
+        self.outsideIDs2 = numpy.where(~self.domain2)[0]
+        self.borders2 = self.domain2.astype(int)
+
+        return
+
+    def build_csr(self):
+        """
+        Build the compressed sparse row (CSR) representation of the Finite Volume neighbourhood
+        from the padded arrays (neighbours, vor_edges and edge_length). The neighbours of node i are
+        ngbIDs[ngbOffsets[i]:ngbOffsets[i+1]] and the voronoi edges and distances to these
+        neighbours are stored in the same order in ngbEdges and ngbDist. These arrays are only passed
+        to the compiled kernels and are stored in double precision whatever the storage precision of
+        the padded arrays.
+
+        The padded arrays are kept as a compatibility view for the kernels which still use them.
+        """
+
+        # Neighbours are stored before the first negative entry of each row
+        padded = self.neighbours < 0
+        ngbNb = numpy.where(padded.any(axis=1), padded.argmax(axis=1), padded.shape[1])
+        valid = numpy.arange(padded.shape[1]) < ngbNb[:,numpy.newaxis]
+
+        self.ngbOffsets = numpy.zeros(len(ngbNb)+1, dtype=numpy.int32)
+        numpy.cumsum(ngbNb, out=self.ngbOffsets[1:])
+        self.ngbIDs = numpy.asarray(self.neighbours)[valid].astype(numpy.int32)
+        self.ngbEdges = numpy.asarray(self.vor_edges)[valid].astype(numpy.float64)
+        self.ngbDist = numpy.asarray(self.edge_length)[valid].astype(numpy.float64)
+        self.kernelArrays = {}
+
+        return
+
+    def kernel_array(self, name):
+        """
+        Get a stored Finite Volume array (control_volumes, vor_edges or edge_length) in the double
+        precision declared by the compiled kernels.
+
+        In single precision mode, the double precision copy is built once per mesh and kept, instead
+        of being made by f2py at each kernel call.
+
+        Parameters
+        ----------
+        name
+            Name of the FVmethod array.
+
+        Returns
+        -------
+        array
+            Double precision array, the stored array itself in double precision mode.
+        """
+
+        array = getattr(self, name)
+        if array.dtype == numpy.float64:
+            return array
+        if name not in self.kernelArrays:
+            self.kernelArrays[name] = numpy.array(array, dtype=numpy.float64, order='F')
+
+        return self.kernelArrays[name]
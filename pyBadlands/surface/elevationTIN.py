@@ -19,7 +19,156 @@ from scipy.interpolate import interpn
 from scipy.interpolate import LinearNDInterpolator
 from scipy.interpolate import NearestNDInterpolator
 
-def _boundary_elevation(elevation, neighbours, edge_length, boundPts, btype):
+def _closest(neighbours, edge_length, rows, mask):
+    """
+    Pick for each row the closest neighbour amongst the ones selected by mask.
+    Returns the neighbour IDs (-1 when none is selected) and the corresponding edge lengths.
+    """
+
+    dist = numpy.where(mask, edge_length[rows,:], numpy.inf)
+    picked = numpy.argmin(dist, axis=1)
+    found = mask.any(axis=1)
+    ids = numpy.where(found, neighbours[rows,picked], -1)
+    lengths = dist[numpy.arange(len(rows)),picked]
+
+    return ids, lengths
+
+def _missed_parents(neighbours, edge_length, boundPts, direct):
+    """
+    Find the parents of the edge nodes which have no interior neighbour (mainly the TIN corners).
+    Each of these nodes, taken in order, uses its closest neighbour amongst the interior nodes and
+    the edge nodes already defined. Parents which are themselves missed nodes are replaced by their
+    own parent, so that the missed nodes can be updated with a single gather after the other ones.
+    """
+
+    missedIDs = numpy.where(~direct)[0]
+    parents = numpy.zeros(len(missedIDs), dtype=int)
+    defined = direct.copy()
+    root = {}
+    for p in range(len(missedIDs)):
+        id = missedIDs[p]
+        ngbhs = neighbours[id,:]
+        valid = (ngbhs >= boundPts) | ((ngbhs >= 0) & defined[numpy.clip(ngbhs, 0, boundPts-1)])
+        ids = numpy.where(valid)[0]
+        if len(ids) == 0:
+            parents[p] = -1
+            continue
+        lselect = edge_length[id,ids]
+        picked = numpy.argmin(lselect)
+        parents[p] = root.get(ngbhs[ids[picked]], ngbhs[ids[picked]])
+        root[id] = parents[p]
+        defined[id] = True
+
+    return missedIDs, parents
+
+def boundary_parents(neighbours, edge_length, boundPts):
+    """
+    This function computes once per mesh the parent nodes used to define the values on the TIN edges,
+    so that updating the edges (see update_border_elevation and forceSim.disp_border) reduces to gathers.
+
+    Parameters
+    ----------
+    neighbours
+        Numpy integer-type array containing for each nodes its neigbhours IDs.
+
+    edge_length
+        Numpy float-type array containing the lengths to each neighbour.
+
+    boundPts
+        Number of nodes on the edges of the TIN surface.
+
+    Returns
+    -------
+    parents
+        Dictionary of parent arrays:
+            - id1, ln1: closest interior node to each edge node and its distance (id1 is -1 when
+              the edge node has no interior neighbour),
+            - id2, ln2: closest interior node to id1 and its distance,
+            - flat, slope: edge nodes updated from id1 (flat) or extrapolated from id1 and id2
+              (slope), and (IDs, parents) of the remaining edge nodes for each condition,
+            - parentID: TIN node associated to each edge node for erosion/deposition updates.
+    """
+
+    bIDs = numpy.arange(boundPts)
+    ngbhs = numpy.asarray(neighbours)
+    lengths = numpy.asarray(edge_length)
+
+    # Closest non-boundary vertice
+    id1, ln1 = _closest(ngbhs, lengths, bIDs, ngbhs[:boundPts,:] >= boundPts)
+    direct1 = id1 >= 0
+
+    # Closest non-boundary vertice to the first picked one
+    id2 = numpy.zeros(boundPts, dtype=int)
+    id2.fill(-1)
+    ln2 = numpy.ones(boundPts)
+    rows = id1[direct1]
+    id2[direct1], ln2[direct1] = _closest(ngbhs, lengths, rows, ngbhs[rows,:] >= boundPts)
+    direct2 = id2 >= 0
+
+    parents = {'boundPts': boundPts, 'id1': id1, 'ln1': ln1, 'id2': id2, 'ln2': ln2}
+    parents['flat'] = (numpy.where(direct1)[0],
+                       _missed_parents(ngbhs, lengths, boundPts, direct1))
+    parents['slope'] = (numpy.where(direct2)[0],
+                        _missed_parents(ngbhs, lengths, boundPts, direct2))
+
+    # Associate TIN edge point to the border for ero/dep updates, edges without interior
+    # neighbour take their closest neighbour
+    closest = _closest(ngbhs, lengths, bIDs, ngbhs[:boundPts,:] >= 0)[0]
+    parents['parentID'] = numpy.where(direct1, id1, closest)
+
+    return parents
+
+def gather_border(values, parents, btype=0, name='elevation'):
+    """
+    This function defines the values on the TIN edges from the precomputed boundary parents
+    for 2 different types of conditions:
+        1. Infinitely flat condition,
+        2. Continuous slope condition.
+
+    Parameters
+    ----------
+    values
+        Numpy arrays containing the internal nodes values, updated in place.
+
+    parents
+        Dictionary of boundary parents (see boundary_parents).
+
+    btype
+        Integer defining the type of boundary: 0 for flat and 1 for slope condition.
+
+    name
+        Name of the values used in error messages.
+
+    Returns
+    -------
+    values
+        Numpy array containing the updated values on the edges.
+    """
+
+    boundPts = parents['boundPts']
+    if btype == 0:
+        direct, (missedIDs, missed) = parents['flat']
+        values[direct] = values[parents['id1'][direct]]
+    else:
+        direct, (missedIDs, missed) = parents['slope']
+        z1 = values[parents['id1'][direct]]
+        z2 = values[parents['id2'][direct]]
+        ln1 = parents['ln1'][direct]
+        ln2 = parents['ln2'][direct]
+        values[direct] = (z1-z2)*(ln2+ln1)/ln2 + z2
+
+    if len(missedIDs) > 0:
+        failed = numpy.where(missed < 0)[0]
+        if len(failed) > 0:
+            raise ValueError('Error while getting boundary %s for point ''%d''.' % (name, missedIDs[failed[0]]))
+        values[missedIDs] = values[missed]
+
+    if btype == 1:
+        values[:boundPts] -= 0.5
+
+    return values
+
+def _boundary_elevation(elevation, neighbours, edge_length, boundPts, btype, parents=None):
     """
     This function defines the elevation of the TIN surface edges for 2 different types of conditions:
         1. Infinitely flat condition,
@@ -42,120 +191,26 @@ def _boundary_elevation(elevation, neighbours, edge_length, boundPts, btype):
     btype
         Integer defining the type of boundary: 0 for flat and 1 for slope condition.
 
+    parents
+        Dictionary of boundary parents of the mesh (see boundary_parents), computed when not given.
+
     Returns
     -------
     elevation
         Numpy array containing the updated elevations on the edges.
+
+    parentID
+        Numpy integer-type array containing the TIN node associated to each edge node.
     """
 
-    # Flat/fixed/wall
-    if btype == 0:
-        missedPts = []
-        for id in range(boundPts):
-            ngbhs = neighbours[id,:]
-            ids = numpy.where(ngbhs >= boundPts)[0]
-            if len(ids) == 1:
-                elevation[id] = elevation[ngbhs[ids]]
-            elif len(ids) > 1:
-                lselect = edge_length[id,ids]
-                picked = numpy.argmin(lselect)
-                elevation[id] = elevation[ngbhs[ids[picked]]]
-            else:
-                missedPts = numpy.append(missedPts,id)
-
-        if len(missedPts) > 0 :
-            for p in range(len(missedPts)):
-                id = int(missedPts[p])
-                ngbhs = neighbours[id,:]
-                ids = numpy.where((elevation[ngbhs] < 9.e6) & (ngbhs >= 0))[0]
-                if len(ids) == 0:
-                    raise ValueError('Error while getting boundary elevation for point ''%d''.' % id)
-                lselect = edge_length[id,ids]
-                picked = numpy.argmin(lselect)
-                elevation[id] = elevation[ngbhs[ids[picked]]]
-
-    # Slope
-    elif btype == 1:
-        missedPts = []
-        for id in range(boundPts):
-            ngbhs = neighbours[id,:]
-            ids = numpy.where(ngbhs >= boundPts)[0]
-            if len(ids) == 1:
-                # Pick closest non-boundary vertice
-                ln1 = edge_length[id,ids[0]]
-                id1 = ngbhs[ids[0]]
-                # Pick closest non-boundary vertice to first picked
-                ngbhs2 = neighbours[id1,:]
-                ids2 = numpy.where(ngbhs2 >= boundPts)[0]
-                lselect = edge_length[id1,ids2]
-                if len(lselect) > 0:
-                    picked = numpy.argmin(lselect)
-                    id2 = ngbhs2[ids2[picked]]
-                    ln2 = lselect[picked]
-                    elevation[id] = (elevation[id1]-elevation[id2])*(ln2+ln1)/ln2 + elevation[id2]
-                else:
-                    missedPts = numpy.append(missedPts,id)
-            elif len(ids) > 1:
-                # Pick closest non-boundary vertice
-                lselect = edge_length[id,ids]
-                picked = numpy.argmin(lselect)
-                id1 = ngbhs[ids[picked]]
-                ln1 = lselect[picked]
-                # Pick closest non-boundary vertice to first picked
-                ngbhs2 = neighbours[id1,:]
-                ids2 = numpy.where(ngbhs2 >= boundPts)[0]
-                lselect2 = edge_length[id1,ids2]
-                if len(lselect2) > 0:
-                    picked2 = numpy.argmin(lselect2)
-                    id2 = ngbhs2[ids2[picked2]]
-                    ln2 = lselect2[picked2]
-                    elevation[id] = (elevation[id1]-elevation[id2])*(ln2+ln1)/ln2 + elevation[id2]
-                else:
-                    missedPts = numpy.append(missedPts,id)
-            else:
-                missedPts = numpy.append(missedPts,id)
-
-        if len(missedPts) > 0 :
-            for p in range(0,len(missedPts)):
-                id = int(missedPts[p])
-                ngbhs = neighbours[id,:]
-                ids = numpy.where((elevation[ngbhs] < 9.e6) & (ngbhs >= 0))[0]
-                if len(ids) == 0:
-                    raise ValueError('Error while getting boundary elevation for point ''%d''.' % id)
-                lselect = edge_length[id,ids]
-                picked = numpy.argmin(lselect)
-                elevation[id] = elevation[ngbhs[ids[picked]]]
-        elevation[:boundPts] -= 0.5
-
-    # Associate TIN edge point to the border for ero/dep updates
-    parentID = numpy.zeros(boundPts,dtype=int)
-    missedPts = []
-    for id in range(boundPts):
-        ngbhs = neighbours[id,:]
-        ids = numpy.where(ngbhs >= boundPts)[0]
-        if len(ids) == 1:
-            parentID[id] = ngbhs[ids]
-        elif len(ids) > 1:
-            lselect = edge_length[id,ids]
-            picked = numpy.argmin(lselect)
-            parentID[id] = ngbhs[ids[picked]]
-        else:
-            missedPts = numpy.append(missedPts,id)
-
-    if len(missedPts) > 0 :
-        for p in range(len(missedPts)):
-            id = int(missedPts[p])
-            ngbhs = neighbours[id,:]
-            ids = numpy.where((elevation[ngbhs] < 9.e6) & (ngbhs >= 0))[0]
-            if len(ids) == 0:
-                raise ValueError('Error while getting boundary elevation for point ''%d''.' % id)
-            lselect = edge_length[id,ids]
-            picked = numpy.argmin(lselect)
-            parentID[id] = ngbhs[ids[picked]]
-
-    return elevation, parentID
-
-def update_border_elevation(elev, neighbours, edge_length, boundPts, btype='flat'):
+    if parents is None:
+        parents = boundary_parents(neighbours, edge_length, boundPts)
+
+    elevation = gather_border(elevation, parents, btype)
+
+    return elevation, parents['parentID'].copy()
+
+def update_border_elevation(elev, neighbours, edge_length, boundPts, btype='flat', parents=None):
     """
     This function computes the domain boundary elevation for 3 different types of conditions:
         1. Infinitely flat condition,
@@ -184,6 +239,9 @@ def update_border_elevation(elev, neighbours, edge_length, boundPts, btype='flat
         4. fixed
         5. outlet
 
+    parents
+        Dictionary of boundary parents of the mesh (see boundary_parents), computed when not given.
+
     Returns
     -------
     newelev
@@ -197,7 +255,7 @@ def update_border_elevation(elev, neighbours, edge_length, boundPts, btype='flat
         thetype = 0
         if btype == 'slope' or btype == 'outlet' or btype == 'wall1':
             thetype = 1
-        newelev, parentID = _boundary_elevation(elev, neighbours, edge_length, boundPts, thetype)
+        newelev, parentID = _boundary_elevation(elev, neighbours, edge_length, boundPts, thetype, parents)
         if btype == 'wall':
             newelev[:boundPts] = 1.e7
         if btype == 'outlet':
@@ -242,7 +300,7 @@ def getElevation(rX, rY, rZ, coords, interp='linear'):
 
     return elev
 
-def assign_parameter_pit(neighbours, area, diffnb, prop, boundPts, fillTH=1., epsilon=0.01):
+def assign_parameter_pit(neighbours, area, diffnb, prop, boundPts, fillTH=1., epsilon=0.01, offsets=None):
     """
     This function defines global variables used in the pit filling algorithm.
 
@@ -273,9 +331,16 @@ def assign_parameter_pit(neighbours, area, diffnb, prop, boundPts, fillTH=1., ep
     epsilon
         Force a minimal slope to form the depression instead of a flat area to build continuous flow
         pathways. Default is set to 0.01 metres.
+
+    offsets
+        Numpy integer-type array with the CSR neighbourhood offsets. When given, neighbours is the
+        flat CSR array of neighbours IDs.
     """
 
-    PDalgo.pdstack.pitparams(neighbours, area, diffnb, prop, fillTH, epsilon, boundPts)
+    if offsets is not None:
+        PDalgo.pdstack.pitparamscsr(offsets, neighbours, area, diffnb, prop, fillTH, epsilon, boundPts)
+    else:
+        PDalgo.pdstack.pitparams(neighbours, area, diffnb, prop, fillTH, epsilon, boundPts)
 
 
 def pit_stack_PD(elev, allFill, sealevel):
@@ -304,3 +369,32 @@ def pit_stack_PD(elev, allFill, sealevel):
     fillH = PDalgo.pdstack.pitfilling(elev, allFill, sealevel)
 
     return fillH
+
+def pit_stack_PF(elev, allFill, sealevel):
+    """
+    This function calls the priority-flood depression filling algorithm from Barnes et al. (2014)
+    which floods the TIN from its boundary using a priority queue. The filled elevations are the
+    ones obtained with pit_stack_PD, each node being visited a limited number of times instead of
+    sweeping the whole mesh until convergence.
+
+    Parameters
+    ----------
+    elev
+        Numpy arrays containing the nodes elevation.
+
+    allFill
+        Produce depression-less surface.
+
+    sealevel
+        Current elevation of sea level.
+
+    Returns
+    -------
+    fillH
+        Numpy array containing the filled elevations.
+    """
+
+    # Call heap based pit filling function from libUtils
+    fillH = PDalgo.pdstack.priorityfilling(elev, allFill, sealevel)
+
+    return fillH
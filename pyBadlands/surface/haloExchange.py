@@ -0,0 +1,114 @@
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+##                                                                                   ##
+##  This file forms part of the Badlands surface processes modelling application.    ##
+##                                                                                   ##
+##  For full license and copyright information, please refer to the LICENSE.md file  ##
+##  located at the project root, or contact the authors.                             ##
+##                                                                                   ##
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+"""
+This module encapsulates the communications of nodal values between partitions.
+
+Each processor owns the TIN nodes of its partition and computes the values of the nodes of its
+overlapping local grid (see partitionTIN.overlap). The nodes of the overlap owned by other
+partitions are the ghost nodes of the processor. Nodal arrays are then synchronised either by
+sending to the neighbouring partitions the values of the ghost nodes they own (halo exchange)
+or, when every processor needs the complete array, by gathering the values of the owned nodes.
+Both replace the reduction of complete arrays with Allreduce.
+"""
+
+import numpy
+import mpi4py.MPI as mpi
+
+class haloExchange:
+    """
+    Class for exchanging nodal values between partitions.
+
+    Parameters
+    ----------
+    partIDs
+        Numpy array containing the partition ID of each TIN node.
+
+    lGIDs
+        Numpy integer-type array filled with the global vertex IDs of the local overlapping grid.
+    """
+
+    def __init__(self, partIDs, lGIDs):
+
+        self._comm = mpi.COMM_WORLD
+        rank = self._comm.Get_rank()
+        size = self._comm.Get_size()
+
+        partIDs = numpy.asarray(partIDs).astype(numpy.int32)
+        self.ownIDs = numpy.where(partIDs == rank)[0].astype(numpy.int32)
+
+        # Ghost nodes of the local grid grouped by owner
+        lGIDs = numpy.asarray(lGIDs).astype(numpy.int32)
+        ghosts = lGIDs[partIDs[lGIDs] != rank]
+        owners = partIDs[ghosts]
+        self.recvIDs = {}
+        for p in numpy.unique(owners):
+            if p >= 0:
+                self.recvIDs[int(p)] = ghosts[owners == p]
+
+        # Tell each owner which of its nodes are ghosts of this partition
+        requests = [self.recvIDs.get(p, numpy.zeros(0, dtype=numpy.int32)) for p in range(size)]
+        received = self._comm.alltoall(requests)
+        self.sendIDs = {}
+        for p in range(size):
+            if len(received[p]) > 0:
+                self.sendIDs[p] = received[p]
+
+        # Global ordering of the owned nodes of each partition
+        self.counts = numpy.array(self._comm.allgather(len(self.ownIDs)), dtype=numpy.int32)
+        self.allIDs = numpy.zeros(self.counts.sum(), dtype=numpy.int32)
+        self._comm.Allgatherv(self.ownIDs, [self.allIDs, (self.counts, None)])
+
+    def update_ghosts(self, array):
+        """
+        Send the values of the owned nodes to the partitions where they are ghost nodes and
+        receive the values of the local ghost nodes. Only the halo values are communicated.
+
+        Parameters
+        ----------
+        array
+            Numpy array of nodal values (one row per TIN node) updated in place.
+        """
+
+        requests = []
+        sendbufs = []
+        recvbufs = {}
+        for p, ids in self.recvIDs.items():
+            recvbufs[p] = numpy.empty((len(ids),)+array.shape[1:], dtype=array.dtype)
+            requests.append(self._comm.Irecv(recvbufs[p], source=p, tag=7))
+        for p, ids in self.sendIDs.items():
+            sendbufs.append(numpy.ascontiguousarray(array[ids]))
+            requests.append(self._comm.Isend(sendbufs[-1], dest=p, tag=7))
+        mpi.Request.Waitall(requests)
+
+        for p, ids in self.recvIDs.items():
+            array[ids] = recvbufs[p]
+
+        return
+
+    def gather(self, array):
+        """
+        Gather the values of the owned nodes of every partition so that all processors hold the
+        complete array.
+
+        Parameters
+        ----------
+        array
+            Numpy array of nodal values (one row per TIN node) updated in place.
+        """
+
+        if len(self.counts) == 1:
+            return
+
+        rowSize = int(numpy.prod(array.shape[1:]))
+        sendbuf = numpy.ascontiguousarray(array[self.ownIDs])
+        recvbuf = numpy.empty((len(self.allIDs),)+array.shape[1:], dtype=array.dtype)
+        self._comm.Allgatherv(sendbuf, [recvbuf, (self.counts*rowSize, None)])
+        array[self.allIDs] = recvbuf
+
+        return
@@ -0,0 +1,204 @@
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+##                                                                                   ##
+##  This file forms part of the Badlands surface processes modelling application.    ##
+##                                                                                   ##
+##  For full license and copyright information, please refer to the LICENSE.md file  ##
+##  located at the project root, or contact the authors.                             ##
+##                                                                                   ##
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+"""
+This module encapsulates the on-disk cache of Badlands meshes.
+
+Building the TIN from the DEM, the Finite Volume discretisation and the partitioning is
+identical for every model load sharing the same DEM, resolution factor and number of
+processors. The cache stores the TIN, the Finite Volume arrays and the partitions in a
+single uncompressed numpy archive, which is read back by memory mapping its members.
+"""
+import os
+import uuid
+import numpy
+import struct
+import hashlib
+import zipfile
+import mpi4py.MPI as mpi
+
+# Increment when the content or the layout of the cached meshes changes
+CACHE_VERSION = 3
+
+def cache_file(cachedir, demfile, Afactor, size, partition='simple', precision='double'):
+    """
+    Get the cache file name for a given mesh definition.
+
+    Parameters
+    ----------
+    cachedir
+        Cache directory.
+
+    demfile
+        DEM file used to build the TIN.
+
+    Afactor
+        TIN cell area factor.
+
+    size
+        Number of partitions (processors).
+
+    partition
+        Partitioning method definition.
+
+    precision
+        Storage precision of the Finite Volume geometry (double or single).
+
+    Returns
+    -------
+    filename
+        Cache file name, the key being built from the DEM content hash, the area factor,
+        the number of partitions, the partitioning method, the precision and the cache version.
+    """
+
+    sha = hashlib.sha1()
+    with open(demfile, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    sha.update('Afactor=%s;size=%s;partition=%s;precision=%s;version=%s' % (Afactor, size, partition,
+                                                                           precision, CACHE_VERSION))
+
+    return os.path.join(cachedir, 'mesh_%s.npz' % sha.hexdigest())
+
+def _mmap_npz(filename):
+    """
+    Memory map the members of an uncompressed numpy archive.
+
+    Parameters
+    ----------
+    filename
+        Numpy archive (written with numpy.savez).
+
+    Returns
+    -------
+    data
+        Dictionary of copy-on-write memory mapped arrays.
+    """
+
+    data = {}
+    archive = zipfile.ZipFile(filename)
+    with open(filename, 'rb') as f:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError('Compressed numpy archive cannot be memory mapped.')
+            # Skip the local file header of the member
+            f.seek(info.header_offset)
+            header = f.read(30)
+            nameLen, extraLen = struct.unpack('<HH', header[26:30])
+            f.seek(info.header_offset + 30 + nameLen + extraLen)
+            # Read the npy header
+            version = numpy.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran, dtype = numpy.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran, dtype = numpy.lib.format.read_array_header_2_0(f)
+            name = info.filename[:-4]
+            if dtype.hasobject:
+                raise ValueError('Object arrays cannot be memory mapped.')
+            if numpy.prod(shape) == 0:
+                data[name] = numpy.zeros(shape, dtype=dtype)
+            else:
+                data[name] = numpy.memmap(filename, dtype=dtype, mode='c', offset=f.tell(),
+                                          shape=shape, order='F' if fortran else 'C')
+    archive.close()
+
+    return data
+
+def load_mesh(filename):
+    """
+    Load a cached mesh.
+
+    Parameters
+    ----------
+    filename
+        Cache file name.
+
+    Returns
+    -------
+    data
+        Dictionary of cached arrays or None if the cache file does not exist or cannot be read.
+    """
+
+    if not os.path.isfile(filename):
+        return None
+
+    try:
+        data = _mmap_npz(filename)
+    except (IOError, ValueError, zipfile.BadZipfile):
+        return None
+
+    if 'version' not in data or int(data['version']) != CACHE_VERSION:
+        return None
+
+    return data
+
+def save_mesh(filename, recGrid, FVmesh, tMesh, lGIDs):
+    """
+    Store a mesh in the cache. Local partitions are gathered on the master processor
+    which writes the cache file.
+
+    Parameters
+    ----------
+    filename
+        Cache file name.
+
+    recGrid
+        Regular grid and TIN (raster2TIN object).
+
+    FVmesh
+        Global Finite Volume mesh (FVmethod object).
+
+    tMesh
+        Local Finite Volume mesh of the partition (FVmethod object).
+
+    lGIDs
+        Global IDs of the local partition nodes.
+    """
+
+    comm = mpi.COMM_WORLD
+    rank = comm.Get_rank()
+
+    local = comm.gather([lGIDs, tMesh.node_coords, tMesh.cells, tMesh.edges], root=0)
+    if rank > 0:
+        return
+
+    data = {}
+    data['version'] = numpy.array(CACHE_VERSION)
+    for key, value in recGrid.get_tin_data().items():
+        data['grid_'+key] = value
+    data['partIDs'] = FVmesh.partIDs
+    data['neighbours'] = FVmesh.neighbours
+    data['edge_length'] = FVmesh.edge_length
+    data['vor_edges'] = FVmesh.vor_edges
+    data['control_volumes'] = FVmesh.control_volumes
+    data['ngbOffsets'] = FVmesh.ngbOffsets
+    data['ngbIDs'] = FVmesh.ngbIDs
+    data['ngbEdges'] = FVmesh.ngbEdges
+    data['ngbDist'] = FVmesh.ngbDist
+    data['maxNgbh'] = numpy.array(tMesh.maxNgbh)
+    for p in range(len(local)):
+        data['local%d_lGIDs' % p] = local[p][0]
+        data['local%d_vertices' % p] = local[p][1]
+        data['local%d_triangles' % p] = local[p][2]
+        data['local%d_edges' % p] = local[p][3]
+
+    # Write to a temporary file which is then renamed, so that concurrent models
+    # never read a partially written cache
+    cachedir = os.path.dirname(filename)
+    if cachedir != '' and not os.path.exists(cachedir):
+        try:
+            os.makedirs(cachedir)
+        except OSError:
+            if not os.path.isdir(cachedir):
+                raise
+    tmpfile = '%s.%s.tmp' % (filename, uuid.uuid4().hex)
+    with open(tmpfile, 'wb') as f:
+        numpy.savez(f, **data)
+    os.rename(tmpfile, filename)
+
+    return
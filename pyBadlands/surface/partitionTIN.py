@@ -7,7 +7,9 @@
 ##                                                                                   ##
 ##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
 """
-This module proposes 2 methods of triangular irregular network (TIN) partitioning.
+This module proposes several methods of triangular irregular network (TIN) partitioning: a simple
+row and column wise decomposition and space-filling curves (Hilbert or Morton) splits balancing
+node cost estimates.
 """
 
 import time
@@ -149,19 +151,11 @@ def simple(X, Y, Xdecomp=1, Ydecomp=1):
         Yend[p] = Ystart[p]+nbY
     Yend[nbprocY-1]=ymax
 
-    # Fill partition ID based on node coordinates
-    for id in range(len(X)):
-        ix = 0
-        pX = Xend[ix]
-        while X[id] > pX :
-            ix += 1
-            pX = Xend[ix]
-        iy = 0
-        pY = Yend[iy]
-        while Y[id] > pY :
-            iy += 1
-            pY = Yend[iy]
-        partID[id] = ix + iy * nbprocX
+    # Fill partition ID based on node coordinates: first partition whose end is not
+    # smaller than the node coordinate
+    ix = numpy.minimum(numpy.searchsorted(Xend, X, side='left'), nbprocX-1)
+    iy = numpy.minimum(numpy.searchsorted(Yend, Y, side='left'), nbprocY-1)
+    partID[:] = ix + iy * nbprocX
 
     return partID, nbprocX, nbprocY
 
@@ -279,6 +273,226 @@ def overlap(X, Y, nbprocX, nbprocY, overlapLen, verbose=False):
 
     return globIDs, localTIN
 
+def _hilbert_index(ix, iy, order):
+    """
+    Position of integer coordinates along the Hilbert curve of a given order.
+    """
+
+    n = 1 << order
+    x = ix.astype(numpy.int64)
+    y = iy.astype(numpy.int64)
+    d = numpy.zeros(len(x), dtype=numpy.int64)
+    s = n >> 1
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        d += s * s * ((3 * rx) ^ ry)
+        # Rotate the quadrant
+        flip = ~ry & rx
+        x[flip] = n-1 - x[flip]
+        y[flip] = n-1 - y[flip]
+        swap = ~ry
+        tmp = x[swap]
+        x[swap] = y[swap]
+        y[swap] = tmp
+        s >>= 1
+
+    return d
+
+def _morton_index(ix, iy, order):
+    """
+    Position of integer coordinates along the Morton (Z-order) curve of a given order.
+    """
+
+    x = ix.astype(numpy.int64)
+    y = iy.astype(numpy.int64)
+    d = numpy.zeros(len(x), dtype=numpy.int64)
+    for b in range(order):
+        d |= ((x >> b) & 1) << (2*b)
+        d |= ((y >> b) & 1) << (2*b+1)
+
+    return d
+
+def space_filling(X, Y, weights=None, curve='hilbert', order=16):
+    """
+    This function partitions the computational domain by splitting the nodes ordered along a
+    space-filling curve in contiguous segments of equal cost. Neighbouring nodes along the curve
+    are close in space, so partitions are compact while being balanced for any node cost.
+
+    Parameters
+    ----------
+    X
+        Numpy array containing the X coordinates of the TIN vertices.
+
+    Y
+        Numpy array containing the Y coordinates of the TIN vertices.
+
+    weights
+        Numpy float-type array containing the cost estimate of each node (default to 1).
+
+    curve
+        Space-filling curve used to order the nodes: hilbert or morton.
+
+    order
+        Number of levels of the curve (the domain is discretised in 2^order cells along each axis).
+
+    Returns
+    -------
+    partID
+        Numpy integer-type array filled with the ID of the partition each node belongs to.
+    """
+
+    size = mpi.COMM_WORLD.Get_size()
+
+    # Map coordinates on the curve grid
+    n = (1 << order) - 1
+    xmin = X.min()
+    ymin = Y.min()
+    extent = max(X.max()-xmin, Y.max()-ymin)
+    if extent <= 0.:
+        extent = 1.
+    ix = numpy.floor((X-xmin)/extent*n).astype(numpy.int64)
+    iy = numpy.floor((Y-ymin)/extent*n).astype(numpy.int64)
+
+    if curve == 'hilbert':
+        key = _hilbert_index(ix, iy, order)
+    elif curve == 'morton':
+        key = _morton_index(ix, iy, order)
+    else:
+        raise ValueError('Error in the partitioning: space-filling curve is either hilbert or morton')
+    sortIDs = numpy.argsort(key, kind='mergesort')
+
+    # Split the curve in segments of equal cost
+    if weights is None:
+        weights = numpy.ones(len(X))
+    sortW = weights[sortIDs]
+    cumW = numpy.cumsum(sortW)
+    total = cumW[-1]
+    if total <= 0.:
+        sortW = numpy.ones(len(X))
+        cumW = numpy.cumsum(sortW)
+        total = cumW[-1]
+    part = numpy.floor((cumW-0.5*sortW)*size/total).astype(numpy.int64)
+
+    partID = numpy.zeros(len(X), dtype=numpy.uint32)
+    partID[sortIDs] = numpy.clip(part, 0, size-1)
+
+    return partID
+
+def node_costs(elev, sealevel, landcost=1.):
+    """
+    This function estimates the computational cost of each TIN node. Nodes above sea level
+    run the flow routing and stream power computations and are given a higher cost.
+
+    Parameters
+    ----------
+    elev
+        Numpy float-type array containing the nodes elevation.
+
+    sealevel
+        Sea level elevation.
+
+    landcost
+        Cost of land nodes relative to marine nodes.
+
+    Returns
+    -------
+    weights
+        Numpy float-type array containing the cost estimate of each node.
+    """
+
+    weights = numpy.ones(len(elev))
+    weights[elev >= sealevel] = landcost
+
+    return weights
+
+def imbalance(partID, weights=None):
+    """
+    This function computes the load-imbalance statistics of a partitioning.
+
+    Parameters
+    ----------
+    partID
+        Numpy integer-type array filled with the ID of the partition each node belongs to.
+
+    weights
+        Numpy float-type array containing the cost estimate of each node (default to 1).
+
+    Returns
+    -------
+    stats
+        Dictionary with the number of nodes and the cost of each partition and the
+        imbalance (maximum over mean) of both.
+    """
+
+    size = mpi.COMM_WORLD.Get_size()
+
+    nodes = numpy.bincount(partID.astype(numpy.int64), minlength=size)
+    if weights is None:
+        cost = nodes.astype(float)
+    else:
+        cost = numpy.bincount(partID.astype(numpy.int64), weights=weights, minlength=size)
+
+    stats = {}
+    stats['nodes'] = nodes
+    stats['cost'] = cost
+    stats['node_imbalance'] = nodes.max()/max(nodes.mean(), 1.e-10)
+    stats['cost_imbalance'] = cost.max()/max(cost.mean(), 1.e-10)
+
+    return stats
+
+def overlap_bbox(X, Y, partID, overlapLen, verbose=False):
+    """
+    This function adds an overlap to any partitioning. The local domain of each processor is the
+    bounding box of its partition extended by the overlap length.
+
+    Parameters
+    ----------
+    X
+        Numpy arrays containing the X coordinates of the TIN vertices.
+
+    Y
+        Numpy arrays containing the Y coordinates of the TIN vertices.
+
+    partID
+        Numpy integer-type array filled with the ID of the partition each node belongs to.
+
+    overlapLen
+        Float defining the length of the overlapping region.
+
+    Returns
+    -------
+    globIDs
+        Numpy integer-type array containing for local nodes their global IDs.
+
+    localTIN
+        Triangle class representing local TIN coordinates and parameters.
+    """
+
+    # Initialise MPI communications
+    comm = mpi.COMM_WORLD
+    rank = comm.Get_rank()
+    walltime = time.clock()
+
+    inIDs = numpy.where(partID == rank)[0]
+    Xst = X[inIDs].min()-overlapLen
+    Xed = X[inIDs].max()+overlapLen
+    Yst = Y[inIDs].min()-overlapLen
+    Yed = Y[inIDs].max()+overlapLen
+
+    # Find the nodes in the local domain
+    inside = FASTloop.part.overlap(X,Y,Xst,Yst,Xed,Yed)
+    globIDs = numpy.where(inside > -1)[0]
+
+    # Build local TIN
+    data = numpy.column_stack((X,Y))
+    localTIN = triangle.triangulate(dict(vertices=data[globIDs,:2]),' ')
+
+    if rank == 0 and verbose:
+        print " - partition TIN including shadow zones ", time.clock() - walltime
+
+    return globIDs, localTIN
+
 def _robin_distribution(X,Y):
     """
     This function defines an initial distribution using round-robin algorithm.
@@ -64,9 +64,15 @@ class raster2TIN:
             >> TIN cells resolution = areaDelFactor x (TIN edges resolution)^2
 
         Default: 1
+
+    tinData
+        Optional dictionary of arrays (see get_tin_data) used to restore the grid and TIN
+        from the mesh cache instead of reading and triangulating the DEM.
+
+        Default: None
     """
 
-    def __init__(self, inputfile=None, rank=0, delimiter=r'\s+', resRecFactor=1, areaDelFactor=1):
+    def __init__(self, inputfile=None, rank=0, delimiter=r'\s+', resRecFactor=1, areaDelFactor=1, tinData=None):
         if inputfile==None:
             raise RuntimeError('DEM input file name must be defined to construct Badlands irregular grid.')
         if not os.path.isfile(inputfile):
@@ -105,7 +111,10 @@ class raster2TIN:
         self.resdx = None
 
         # TIN creation
-        self._triangulate_raster_from_file()
+        if tinData is None:
+            self._triangulate_raster_from_file()
+        else:
+            self._load_tin_data(tinData)
 
     def _raster_edges(self):
         """
@@ -242,6 +251,44 @@ class raster2TIN:
 
         return
 
+    def get_tin_data(self):
+        """
+        Export the regular grid and TIN parameters as a dictionary of numpy arrays.
+
+        Returns
+        -------
+        data
+            Dictionary of arrays which can be used to restore the object (tinData parameter).
+        """
+
+        data = {}
+        for key in ['nx', 'ny', 'areaDel', 'resEdges', 'edgesPt', 'boundsPt', 'rnx', 'rny', 'resdx']:
+            data[key] = numpy.array(getattr(self, key))
+        for key in ['rectX', 'rectY', 'rectZ', 'edges', 'bounds', 'regX', 'regY', 'regZ', 'bmask']:
+            data[key] = getattr(self, key)
+        for key in self.tinMesh.keys():
+            data['tin_'+key] = self.tinMesh[key]
+
+        return data
+
+    def _load_tin_data(self, data):
+        """
+        Restore the regular grid and TIN parameters from a dictionary of numpy arrays.
+        """
+
+        for key in ['nx', 'ny', 'edgesPt', 'boundsPt', 'rnx', 'rny']:
+            setattr(self, key, int(data[key]))
+        for key in ['areaDel', 'resEdges', 'resdx']:
+            setattr(self, key, float(data[key]))
+        for key in ['rectX', 'rectY', 'rectZ', 'edges', 'bounds', 'regX', 'regY', 'regZ', 'bmask']:
+            setattr(self, key, data[key])
+        self.tinMesh = {}
+        for key in data.keys():
+            if key.startswith('tin_'):
+                self.tinMesh[key[4:]] = data[key]
+
+        return
+
     def load_hdf5(self, restartFolder, timestep, tXY):
         """
         Read the HDF5 file for a given time step.
@@ -39,7 +39,7 @@ class carbMesh():
     """
 
     def __init__(self, layNb, elay, xyTIN, bPts, ePts, thickMap, folder, h5file, baseMap, nbSed,
-                 regX, regY, elev, rfolder=None, rstep=0):
+                 regX, regY, elev, rfolder=None, rstep=0, dtype=numpy.float):
         """
         Constructor.
 
@@ -83,6 +83,9 @@ class carbMesh():
 
         rstep
             Restart step.
+
+        dtype
+            Numpy data type of the stratigraphic layers (float32 in single precision mode).
         """
 
         # Initialise MPI communications
@@ -125,11 +128,11 @@ class carbMesh():
             self.step = paleoDepth.shape[1]
 
             # Elevation at time of deposition (paleo-depth)
-            self.paleoDepth = numpy.zeros((self.ptsNb,layNb+eroLay),order='F')
-            self.layerThick = numpy.zeros((self.ptsNb,layNb+eroLay),order='F')
+            self.paleoDepth = numpy.zeros((self.ptsNb,layNb+eroLay),dtype=dtype,order='F')
+            self.layerThick = numpy.zeros((self.ptsNb,layNb+eroLay),dtype=dtype,order='F')
             self.paleoDepth[:,:eroLay] = paleoDepth
             # Deposition thickness for each type of sediment
-            self.depoThick = numpy.zeros((self.ptsNb,layNb+eroLay,self.nbSed),order='F')
+            self.depoThick = numpy.zeros((self.ptsNb,layNb+eroLay,self.nbSed),dtype=dtype,order='F')
             for r in range(4):
                 self.depoThick[:,:eroLay,r] = numpy.array((df['/depoThickRock'+str(r)]))
             self.layerThick[:,:eroLay] = numpy.sum(self.depoThick[:,:eroLay,:],axis=-1)
@@ -139,10 +142,10 @@ class carbMesh():
 
             tmpTH = numpy.zeros(self.ptsNb)
             # Elevation at time of deposition (paleo-depth)
-            self.paleoDepth = numpy.zeros((self.ptsNb,layNb+eroLay),order='F')
+            self.paleoDepth = numpy.zeros((self.ptsNb,layNb+eroLay),dtype=dtype,order='F')
             # Deposition thickness for each type of sediment
-            self.depoThick = numpy.zeros((self.ptsNb,layNb+eroLay,self.nbSed),order='F')
-            self.layerThick = numpy.zeros((self.ptsNb,layNb+eroLay),order='F')
+            self.depoThick = numpy.zeros((self.ptsNb,layNb+eroLay,self.nbSed),dtype=dtype,order='F')
+            self.layerThick = numpy.zeros((self.ptsNb,layNb+eroLay),dtype=dtype,order='F')
             # Rock type array
             rockType = -numpy.ones(self.ptsNb,dtype=int)
 
@@ -40,7 +40,7 @@ class strataMesh():
     """
 
     def __init__(self, sdx, bbX, bbY, layNb, xyTIN, folder, h5file,
-                 cumdiff=0, rfolder=None, rstep=0):
+                 cumdiff=0, rfolder=None, rstep=0, dtype=numpy.float):
         """
         Constructor.
 
@@ -75,6 +75,9 @@ class strataMesh():
 
         rstep
             Restart step.
+
+        dtype
+            Numpy data type of the stratigraphic layers (float32 in single precision mode).
         """
 
         # Initialise MPI communications
@@ -130,9 +133,9 @@ class strataMesh():
 
         # Define global stratigraphic dataset
         self.stratIn = numpy.zeros([self.ptsNb],dtype=int)
-        self.stratElev = numpy.zeros([self.ptsNb,layNb])
-        self.stratThick = numpy.zeros([self.ptsNb,layNb])
-        self.stratDepth = numpy.zeros([self.ptsNb,layNb])
+        self.stratElev = numpy.zeros([self.ptsNb,layNb],dtype=dtype)
+        self.stratThick = numpy.zeros([self.ptsNb,layNb],dtype=dtype)
+        self.stratDepth = numpy.zeros([self.ptsNb,layNb],dtype=dtype)
 
         if rstep > 0:
             self.stratDepth[:,:rstlays] = layDepth
@@ -38,7 +38,7 @@ class stratiWedge():
     """
 
     def __init__(self, layNb, elay, xyTIN, bPts, ePts, thickMap, activeh, folder, h5file, rockNb,
-                 regX, regY, elev, rockCk, cumdiff=0, rfolder=None, rstep=0):
+                 regX, regY, elev, rockCk, cumdiff=0, rfolder=None, rstep=0, dtype=numpy.float):
         """
         Constructor.
 
@@ -91,6 +91,9 @@ class stratiWedge():
 
         rstep
             Restart step.
+
+        dtype
+            Numpy data type of the stratigraphic layers (float32 in single precision mode).
         """
 
         # Initialise MPI communications
@@ -130,11 +133,11 @@ class stratiWedge():
             self.step = paleoDepth.shape[1]
 
             # Elevation at time of deposition (paleo-depth)
-            self.paleoDepth = numpy.zeros((self.ptsNb,layNb+eroLay),order='F')
-            self.layerThick = numpy.zeros((self.ptsNb,layNb+eroLay),order='F')
+            self.paleoDepth = numpy.zeros((self.ptsNb,layNb+eroLay),dtype=dtype,order='F')
+            self.layerThick = numpy.zeros((self.ptsNb,layNb+eroLay),dtype=dtype,order='F')
             self.paleoDepth[:,:eroLay] = paleoDepth
             # Deposition thickness for each type of sediment
-            self.depoThick = numpy.zeros((self.ptsNb,layNb+eroLay,rockNb),order='F')
+            self.depoThick = numpy.zeros((self.ptsNb,layNb+eroLay,rockNb),dtype=dtype,order='F')
             for r in range(rockNb):
                 self.depoThick[:,:eroLay,r] = numpy.array((df['/depoThickRock'+str(r)]))
             self.layerThick[:,:eroLay] = numpy.sum(self.depoThick[:,:eroLay,:],axis=-1)
@@ -146,10 +149,10 @@ class stratiWedge():
 
             tmpTH = numpy.zeros(self.ptsNb)
             # Elevation at time of deposition (paleo-depth)
-            self.paleoDepth = numpy.zeros((self.ptsNb,layNb+eroLay),order='F')
+            self.paleoDepth = numpy.zeros((self.ptsNb,layNb+eroLay),dtype=dtype,order='F')
             # Deposition thickness for each type of sediment
-            self.depoThick = numpy.zeros((self.ptsNb,layNb+eroLay,rockNb),order='F')
-            self.layerThick = numpy.zeros((self.ptsNb,layNb+eroLay),order='F')
+            self.depoThick = numpy.zeros((self.ptsNb,layNb+eroLay,rockNb),dtype=dtype,order='F')
+            self.layerThick = numpy.zeros((self.ptsNb,layNb+eroLay),dtype=dtype,order='F')
             # Rock type array
             rockType = -numpy.ones(self.ptsNb,dtype=int)
 
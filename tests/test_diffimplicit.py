@@ -0,0 +1,113 @@
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+##                                                                                   ##
+##  This file forms part of the Badlands surface processes modelling application.    ##
+##                                                                                   ##
+##  For full license and copyright information, please refer to the LICENSE.md file  ##
+##  located at the project root, or contact the authors.                             ##
+##                                                                                   ##
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+"""
+Tests of the implicit marine diffusion of pyBadlands.hillslope.diffImplicit against the explicit
+scheme (FLOWalgo.diffmarinecsr).
+"""
+
+import unittest
+import numpy as np
+
+from pyBadlands.libUtils import FLOWalgo
+from pyBadlands.hillslope.diffImplicit import diffImplicit
+
+def grid_csr(nx=12, ny=12, dx=100.):
+    """
+    CSR neighbourhood of a regular grid with 4 neighbours per node, and its border flags.
+    """
+
+    ids = np.arange(nx*ny).reshape(ny, nx)
+    ngbs = []
+    for j in range(ny):
+        for i in range(nx):
+            ngbs.append([ids[jj, ii] for jj, ii in ((j, i+1), (j+1, i), (j, i-1), (j-1, i))
+                         if 0 <= ii < nx and 0 <= jj < ny])
+    offsets = np.zeros(nx*ny+1, dtype=np.int32)
+    offsets[1:] = np.cumsum([len(n) for n in ngbs])
+    neighbours = np.concatenate(ngbs).astype(np.int32)
+    edges = np.full(len(neighbours), dx)
+    borders = np.zeros((ny, nx), dtype=np.int32)
+    borders[1:-1, 1:-1] = 1
+
+    return offsets, neighbours, edges, edges.copy(), borders.ravel(), dx*dx
+
+class MarineDiffusionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.offsets, self.ngbs, self.edges, self.dist, self.borders, area = grid_csr()
+        nb = len(self.borders)
+        x = np.tile(np.arange(12)*100., 12)
+        y = np.repeat(np.arange(12)*100., 12)
+        # Marine slope with a deposited mound
+        self.elev = -20. - 0.01*x + 10.*np.exp(-((x - 550.)**2 + (y - 550.)**2)/300.**2)
+        self.depo = np.full(nb, 50.)
+        self.coeff = np.full(nb, 100./area)
+        self.gids = np.arange(nb, dtype=np.int32)
+
+    def explicit(self, tstep, steps):
+        elev = self.elev.copy()
+        depo = self.depo.copy()
+        dt = tstep/steps
+        for k in range(steps):
+            diff, mindt = FLOWalgo.flowcompute.diffmarinecsr(elev, self.borders, depo, self.offsets,
+                                self.ngbs, self.edges, self.dist, self.coeff, self.gids, 0., 0.1, dt)
+            self.assertGreaterEqual(mindt, dt)
+            elev += diff*dt
+            depo += diff*dt
+
+        return elev - self.elev
+
+    def implicit(self, tstep, steps):
+        solver = diffImplicit(self.offsets, self.ngbs, self.edges, self.dist)
+        elev = self.elev.copy()
+        depo = self.depo.copy()
+        for k in range(steps):
+            diff, step = solver.marine(elev, depo, self.coeff, self.borders, 0., 0.1, tstep/steps)
+            self.assertEqual(step, tstep/steps)
+            elev += diff
+            depo += diff
+
+        return elev - self.elev
+
+    def test_explicit(self):
+        tstep = 20.
+        ref = self.explicit(tstep, 1000)
+        scale = np.abs(ref).max()
+        self.assertGreater(scale, 0.)
+        # Backward Euler is first order accurate, the difference decreases with the step
+        errors = [np.abs(self.implicit(tstep, steps) - ref).max()/scale for steps in (1, 10, 100)]
+        self.assertLess(errors[0], 0.1)
+        self.assertLess(errors[1], 0.01)
+        self.assertLess(errors[2], 0.002)
+
+    def test_large_step(self):
+        # Steps far above the explicit stability limit are taken in a single solve
+        solver = diffImplicit(self.offsets, self.ngbs, self.edges, self.dist)
+        diff, step = solver.marine(self.elev, self.depo, self.coeff, self.borders, 0., 0.1, 1.e5)
+        self.assertEqual(step, 1.e5)
+        self.assertTrue(np.all(np.isfinite(diff)))
+        self.assertTrue(np.all(diff >= -self.depo))
+
+    def test_exhausted_deposits(self):
+        # The step is halved a bounded number of times, then the losses are limited to the deposits
+        solver = diffImplicit(self.offsets, self.ngbs, self.edges, self.dist)
+        depo = np.full(len(self.elev), 0.5)
+        diff, step = solver.marine(self.elev, depo, self.coeff, self.borders, 0., 0.1, 1.e5, halvings=3)
+        self.assertEqual(step, 1.e5/8)
+        self.assertTrue(np.all(diff >= -depo))
+
+    def test_factorisation_kept(self):
+        solver = diffImplicit(self.offsets, self.ngbs, self.edges, self.dist)
+        solver.marine(self.elev, self.depo, self.coeff, self.borders, 0., 0.1, 10.)
+        lu = solver._lu['marine']
+        solver.marine(self.elev, self.depo, self.coeff, self.borders, 0., 0.1, 10.)
+        self.assertIs(solver._lu['marine'], lu)
+
+if __name__ == '__main__':
+    unittest.main()
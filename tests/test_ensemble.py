@@ -0,0 +1,139 @@
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+##                                                                                   ##
+##  This file forms part of the Badlands surface processes modelling application.    ##
+##                                                                                   ##
+##  For full license and copyright information, please refer to the LICENSE.md file  ##
+##  located at the project root, or contact the authors.                             ##
+##                                                                                   ##
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+"""
+Tests of the parameters loaded by pyBadlands.ensemble.Ensemble.activate and of the
+ensemble predictions of bl_worker.blackBoxEnsemble.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+import bl_worker
+from pyBadlands import model as badlandsModel
+from pyBadlands.ensemble import Ensemble
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Input paths in the example XML files are relative to the project root
+XMLINPUT = 'Examples/crater_fast/crater.xml'
+
+class Namespace(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+class StubModel(object):
+    """
+    Model replacement whose snapshots only hold the model arrays, as the XML input
+    parameters are not part of the Model snapshots.
+    """
+
+    def __init__(self):
+        self.recGrid = None
+        self.tNow = 0.
+        self.elevation = np.zeros(4)
+        self.cumdiff = np.zeros(4)
+        self.rain = np.zeros(4)
+        self.input = Namespace(disp3d=False, SPLero=1.e-6, SPLm=0.5, SPLn=1., CDm=0.1, CDa=0.01)
+        self.flow = Namespace(erodibility=np.full(4, 1.e-6))
+        self.force = Namespace(rainVal=np.array([1., 2.]))
+        self.hillslope = Namespace(CDmarine=0.1, CDaerial=0.01, updatedt=1)
+
+    def snapshot(self):
+        return {'model': {}, 'components': {'flow': {}}}
+
+    def restore(self, snap):
+        return
+
+class TestEnsembleActivate(unittest.TestCase):
+
+    def test_members_with_different_parameters(self):
+        model = StubModel()
+        ensemble = Ensemble(model, 2)
+        ensemble.set_parameters(0, rain=3., erodibility=5.e-6, m=0.4, n=1.1, marinediff=0.5, aerialdiff=0.05)
+        ensemble.set_parameters(1, erodibility=2.e-6)
+
+        ensemble.activate(0)
+        self.assertEqual(model.input.SPLm, 0.4)
+        self.assertEqual(model.input.CDm, 0.5)
+        self.assertEqual(model.hillslope.CDaerial, 0.05)
+        self.assertEqual(model.hillslope.updatedt, 0)
+        self.assertTrue(np.all(model.force.rainVal == 3.))
+
+        model.hillslope.updatedt = 1
+        ensemble.activate(1)
+        self.assertEqual(model.input.SPLero, 2.e-6)
+        self.assertEqual(model.input.SPLm, 0.5)
+        self.assertEqual(model.input.SPLn, 1.)
+        self.assertEqual(model.input.CDm, 0.1)
+        self.assertEqual(model.input.CDa, 0.01)
+        self.assertEqual(model.hillslope.CDmarine, 0.1)
+        self.assertEqual(model.hillslope.CDaerial, 0.01)
+        self.assertEqual(model.hillslope.updatedt, 0)
+        self.assertTrue(np.array_equal(model.force.rainVal, [1., 2.]))
+
+class SeededModel(badlandsModel.Model):
+    """
+    Model whose random number generator, which shuffles the flow network base nodes, is
+    seeded in the same way for every run.
+    """
+
+    def load_xml(self, *args, **kwargs):
+        badlandsModel.Model.load_xml(self, *args, **kwargs)
+        np.random.seed(1)
+
+class TestEnsembleBlackBox(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.mkdtemp()
+        os.chdir(ROOT)
+        self.model = bl_worker.badlandsModel
+        bl_worker.badlandsModel = SeededModel
+
+    def tearDown(self):
+        bl_worker.badlandsModel = self.model
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmpdir)
+
+    def test_same_predictions(self):
+        sim_interval = np.arange(0, 15001, 3750.)
+        erdp_coords = np.array([[60, 60], [72, 66], [85, 73], [90, 75]])
+        params = [{'rain': 1., 'erodibility': 5.e-5, 'm': 0.5, 'n': 1.},
+                  {'rain': 1.5, 'erodibility': 8.e-5, 'm': 0.4, 'n': 1., 'aerialdiff': 0.05}]
+
+        predictions = bl_worker.blackBoxEnsemble(XMLINPUT, os.path.join(self.tmpdir, 'ensemble'),
+                                                 sim_interval, erdp_coords, params)
+        for k, param in enumerate(params):
+            refs = bl_worker.blackBox(XMLINPUT, os.path.join(self.tmpdir, 'run%d' % k), sim_interval,
+                                      erdp_coords, param['rain'], param['erodibility'], param['m'],
+                                      param['n'], aerialdiff=param.get('aerialdiff'))
+            for pred, ref in zip(predictions[k], refs):
+                self.assertEqual(list(pred), list(ref))
+                for simtime in sim_interval:
+                    np.testing.assert_array_equal(pred[simtime], ref[simtime])
+
+    def test_shared_arrays(self):
+        model = SeededModel()
+        model.load_xml(self.tmpdir, XMLINPUT, muted=True)
+        ensemble = Ensemble(model, 2)
+        ensemble.set_parameters(1, erodibility=8.e-5)
+        ensemble.run_to_time(3750.)
+
+        # The forcing periods are not modified and stay shared with the initial state
+        initial = ensemble._initial['components']['force']
+        for k in range(2):
+            state = ensemble._states[k]['components']['force']
+            self.assertIs(state['T_rain'], initial['T_rain'])
+            self.assertIsNot(ensemble._states[k]['model']['cumhill'], ensemble._initial['model']['cumhill'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+##                                                                                   ##
+##  This file forms part of the Badlands surface processes modelling application.    ##
+##                                                                                   ##
+##  For full license and copyright information, please refer to the LICENSE.md file  ##
+##  located at the project root, or contact the authors.                             ##
+##                                                                                   ##
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+"""
+Tests of the forcing maps cache and interpolation of pyBadlands.forcing.forceSim.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+from scipy import interpolate
+from pyBadlands.forcing import forceSim
+
+class ReadMapTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.nbytes = forceSim.MAPS_NBYTES
+        forceSim._maps.clear()
+
+    def tearDown(self):
+        forceSim.MAPS_NBYTES = self.nbytes
+        forceSim._maps.clear()
+        shutil.rmtree(self.tmpdir)
+
+    def write_map(self, name, values):
+        filename = os.path.join(self.tmpdir, name)
+        np.savetxt(filename, values)
+
+        return filename
+
+    def test_cached(self):
+        filename = self.write_map('rain.csv', np.arange(6.))
+        values = forceSim.read_map(filename)
+        self.assertIs(forceSim.read_map(filename), values)
+        self.assertFalse(values.flags.writeable)
+
+        # A modified file is read again and replaces the cached map
+        self.write_map('rain.csv', np.ones(6))
+        os.utime(filename, (0, os.path.getmtime(filename) + 10))
+        np.testing.assert_array_equal(forceSim.read_map(filename), np.ones((6, 1)))
+        self.assertEqual(len(forceSim._maps), 1)
+
+    def test_evicted(self):
+        forceSim.MAPS_NBYTES = 2*8*10
+        files = [self.write_map('map%d.csv' % k, np.full(10, k)) for k in range(3)]
+        forceSim.read_map(files[0])
+        forceSim.read_map(files[1])
+        # The least recently used map is evicted
+        forceSim.read_map(files[0])
+        forceSim.read_map(files[2])
+        cached = [os.path.basename(path) for path in forceSim._maps]
+        self.assertEqual(cached, ['map0.csv', 'map2.csv'])
+
+class InterpolationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.regX = np.linspace(0., 1000., 11)
+        self.regY = np.linspace(0., 500., 6)
+        self.force = forceSim.forceSim(regX=self.regX, regY=self.regY)
+
+    def test_interpn(self):
+        np.random.seed(1)
+        xy = np.random.rand(200, 2)*[1000., 500.]
+        xy[:4] = [[0., 0.], [1000., 500.], [1000., 0.], [0., 500.]]
+        grid = np.random.rand(len(self.regX), len(self.regY))
+        values = self.force._interpolation_operator(xy).dot(grid.ravel(order='F'))
+        expected = interpolate.interpn((self.regX, self.regY), grid, xy, method='linear')
+        np.testing.assert_allclose(values, expected, rtol=1.e-12, atol=1.e-12)
+
+    def test_out_of_bounds(self):
+        xy = np.array([[500., 250.], [1000.5, 250.]])
+        with self.assertRaises(ValueError):
+            self.force._interpolation_operator(xy)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+##                                                                                   ##
+##  This file forms part of the Badlands surface processes modelling application.    ##
+##                                                                                   ##
+##  For full license and copyright information, please refer to the LICENSE.md file  ##
+##  located at the project root, or contact the authors.                             ##
+##                                                                                   ##
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+"""
+Tests of the double precision kernel arrays of pyBadlands.surface.FVmethod.
+"""
+
+import unittest
+import numpy as np
+
+from pyBadlands.surface.FVmethod import FVmethod
+
+def padded_mesh(dtype):
+    """
+    Three nodes Finite Volume mesh stored with the given precision.
+    """
+
+    mesh = FVmethod(np.zeros((3, 2)), None, None)
+    mesh.neighbours = np.full((3, 20), -2, dtype=np.int32, order='F')
+    mesh.neighbours[:,:2] = [[1, 2], [0, 2], [0, 1]]
+    mesh.vor_edges = np.zeros((3, 20), dtype=dtype, order='F')
+    mesh.vor_edges[:,:2] = 0.1
+    mesh.edge_length = np.zeros((3, 20), dtype=dtype, order='F')
+    mesh.edge_length[:,:2] = 1.1
+    mesh.control_volumes = np.array([1.1, 2.2, 3.3], dtype=dtype)
+    mesh.build_csr()
+
+    return mesh
+
+class KernelArrayTest(unittest.TestCase):
+
+    def test_single_precision(self):
+        mesh = padded_mesh(np.float32)
+        self.assertEqual(mesh.ngbEdges.dtype, np.float64)
+        self.assertEqual(mesh.ngbDist.dtype, np.float64)
+        for name in ('control_volumes', 'vor_edges', 'edge_length'):
+            array = mesh.kernel_array(name)
+            self.assertEqual(array.dtype, np.float64)
+            np.testing.assert_array_equal(array, getattr(mesh, name))
+            # The copy is built once per mesh
+            self.assertIs(mesh.kernel_array(name), array)
+        self.assertTrue(mesh.kernel_array('vor_edges').flags.f_contiguous)
+
+        # A new neighbourhood discards the copies of the previous mesh
+        mesh.control_volumes = np.array([4.4, 5.5, 6.6], dtype=np.float32)
+        mesh.build_csr()
+        np.testing.assert_array_equal(mesh.kernel_array('control_volumes'), mesh.control_volumes)
+
+    def test_double_precision(self):
+        mesh = padded_mesh(np.float64)
+        for name in ('control_volumes', 'vor_edges', 'edge_length'):
+            self.assertIs(mesh.kernel_array(name), getattr(mesh, name))
+        self.assertEqual(mesh.kernelArrays, {})
+
+if __name__ == '__main__':
+    unittest.main()
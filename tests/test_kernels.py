@@ -0,0 +1,340 @@
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+##                                                                                   ##
+##  This file forms part of the Badlands surface processes modelling application.    ##
+##                                                                                   ##
+##  For full license and copyright information, please refer to the LICENSE.md file  ##
+##  located at the project root, or contact the authors.                             ##
+##                                                                                   ##
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+"""
+Tests of the Python kernels against the compiled libraries (PDalgo, sfd, FLOWalgo, ORmodel
+and WAVEsed). Each test is skipped when its compiled library is not available.
+"""
+
+import unittest
+import numpy as np
+
+from pyBadlands import libUtils
+from pyBadlands.libUtils.kernels import flowcompute, pdstack, sfd, fstack, orographicrain, wavesed
+
+# Maximum difference between the backends, relative to the largest output value
+TOLERANCE = 1.e-12
+
+# The orographic rain model uses a different Fourier transform in each backend and the
+# compiled library returns single precision rates
+RAIN_TOLERANCE = 1.e-6
+
+def compare(test, ref, out, tolerance=TOLERANCE):
+    """
+    Check that the outputs of a Python kernel match the ones of the compiled function.
+    """
+
+    if not isinstance(ref, tuple):
+        ref = (ref,)
+        out = (out,)
+    test.assertEqual(len(ref), len(out))
+    for a, b in zip(ref, out):
+        a = np.asarray(a, dtype=float)
+        b = np.asarray(b, dtype=float)
+        test.assertEqual(a.shape, b.shape)
+        np.testing.assert_array_equal(np.isnan(a), np.isnan(b))
+        a = a[~np.isnan(a)]
+        b = b[~np.isnan(b)]
+        if a.size > 0:
+            scale = max(np.abs(a).max(), 1.e-300)
+            test.assertLessEqual(np.abs(b - a).max()/scale, tolerance)
+
+def grid_mesh(nx=30, ny=30, dx=100.):
+    """
+    Neighbourhood of a regular grid with a noisy dome, boundary nodes first as in the
+    Badlands meshes.
+    """
+
+    x, y = np.meshgrid(np.arange(nx)*dx, np.arange(ny)*dx)
+    pts = np.column_stack((x.ravel(), y.ravel()))
+    nb = len(pts)
+    ids = np.arange(nb).reshape(ny, nx)
+    ngbs = np.full((nb, 20), -1, dtype=np.int32)
+    for k, (di, dj) in enumerate(((0, 1), (1, 0), (0, -1), (-1, 0))):
+        shifted = np.full((ny, nx), -1, dtype=np.int32)
+        shifted[max(di, 0):ny+min(di, 0), max(dj, 0):nx+min(dj, 0)] = ids[max(-di, 0):ny+min(-di, 0), max(-dj, 0):nx+min(-dj, 0)]
+        ngbs[:, k] = shifted.ravel()
+    ngbs.sort(axis=1)
+    ngbs = ngbs[:, ::-1].copy()
+    area = np.full(nb, dx*dx)
+
+    # Boundary nodes first, as in the Badlands meshes
+    border = ((x == 0) | (y == 0) | (x == x.max()) | (y == y.max())).ravel()
+    order = np.concatenate((np.where(border)[0], np.where(~border)[0]))
+    rank = np.argsort(order)
+    pts = pts[order]
+    ngbs = np.where(ngbs[order] >= 0, rank[ngbs[order]], -1).astype(np.int32)
+    edge = np.where(ngbs >= 0, dx, 0.)
+    bds = border.sum()
+
+    np.random.seed(1)
+    r2 = ((pts - pts.mean(axis=0))**2).sum(axis=1)
+    elev = 300.*np.exp(-r2/1.e6) + 20.*np.random.rand(nb) - 50.
+    elev[:bds] = -60.
+
+    return pts, ngbs, edge, area, bds, elev
+
+def grid_csr(ngbs, edge):
+    """
+    Compressed sparse row neighbourhood of a mesh.
+    """
+
+    valid = ngbs >= 0
+    offsets = np.zeros(len(ngbs)+1, dtype=np.int32)
+    np.cumsum(valid.sum(axis=1), out=offsets[1:])
+
+    return offsets, ngbs[valid].astype(np.int32), edge[valid]
+
+def grid_network(nx=30, ny=30, dx=100.):
+    """
+    Flow network of a regular grid with a noisy dome, built with the Python kernels.
+    """
+
+    pts, ngbs, edge, area, bds, elev = grid_mesh(nx, ny, dx)
+    nb = len(elev)
+    pdstack.pitparams(ngbs, area, 5, 0.9, 50., 1.e-3, bds)
+    fillH = pdstack.pitfilling(elev, 1, 0.)
+    gids = np.arange(nb, dtype=np.int32)
+    base, rcv, maxh, maxdep = sfd.directions(fillH, elev, ngbs, edge, edge, gids)
+    delta = np.zeros(nb+1, dtype=np.int32)
+    delta[1:] = np.cumsum(np.bincount(rcv, minlength=nb))
+    stack = fstack.build(np.where(base >= 0)[0].astype(np.int32), rcv, delta)[1]
+    stack = stack[stack >= 0].astype(np.int32)
+
+    return pts, area, elev, fillH, stack, rcv, maxh, maxdep
+
+@unittest.skipIf(libUtils.backends.get('FLOWalgo') != 'fortran', 'compiled FLOWalgo library not available')
+class StreamPowerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fortran = libUtils.FLOWalgo.flowcompute
+        pts, area, elev, fillH, stack, rcv, maxh, maxdep = grid_network()
+        self.network = pts, area, elev, fillH, stack, rcv, maxh, maxdep
+        dis = flowcompute.discharge(stack, rcv, elev, area*np.random.rand(len(area)))[0]
+        bid, vol = flowcompute.basinparameters(stack, rcv, elev, fillH, area)
+        pitIDs = np.where(vol > 0)[0].astype(np.int32)
+        order = np.argsort(fillH[pitIDs]).astype(np.int32)
+        drain = flowcompute.basindrainage(order, bid, rcv, pitIDs, fillH, 0.)
+        self.basins = bid, vol, drain, dis
+
+    def check(self, incisiontype, bedslptype, rocks):
+        pts, area, elev, fillH, stack, rcv, maxh, maxdep = self.network
+        bid, vol, drain, dis = self.basins
+        nb = len(elev)
+        for mod in (self.fortran, flowcompute):
+            mod.eroparams(incisiontype, 0.5, 1., 1., 1., 1.e-3, 1., 0.5, bedslptype)
+        np.random.seed(incisiontype*10 + bedslptype)
+        riv = np.random.rand(nb, rocks)*0.01
+        Cero = np.full((nb, rocks), 5.e-6)
+        actlay = np.random.rand(nb, rocks)
+        borders = np.ones(nb, dtype=np.int32)
+        imp = self.fortran.implicitspl(stack, rcv, pts, dis, fillH, elev, Cero[:,0], 0., 1000.)
+        for mode in (0, 1):
+            args = (stack, rcv, bid, vol, drain, pts, area, maxh, maxdep, dis, fillH, elev,
+                    riv, Cero, actlay, 0.5, 0.001, 0., 1000., borders, mode, imp)
+            for ref, out in zip(self.fortran.streampower(*args), flowcompute.streampower(*args)):
+                scale = max(np.abs(ref).max(), 1.e-300)
+                self.assertLessEqual(np.abs(out - ref).max()/scale, TOLERANCE)
+
+    def test_detachment_limited(self):
+        for bedslptype in range(4):
+            self.check(0, bedslptype, 1)
+
+    def test_transport_limited(self):
+        for bedslptype in range(4):
+            self.check(1, bedslptype, 1)
+            self.check(1, bedslptype, 3)
+
+    def test_sediment_dependent(self):
+        for incisiontype in (2, 3, 4):
+            for bedslptype in range(4):
+                self.check(incisiontype, bedslptype, 1)
+
+@unittest.skipIf(libUtils.backends.get('PDalgo') != 'fortran', 'compiled PDalgo library not available')
+class PitFillingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fortran = libUtils.PDalgo.pdstack
+        self.pts, self.ngbs, self.edge, self.area, self.bds, self.elev = grid_mesh()
+        for mod in (self.fortran, pdstack):
+            mod.pitparams(self.ngbs, self.area, 5, 0.9, 50., 1.e-3, self.bds)
+
+    def test_pitfilling(self):
+        for allfill in (0, 1):
+            for sea in (-100., 0.):
+                args = (self.elev, allfill, sea)
+                compare(self, self.fortran.pitfilling(*args), pdstack.pitfilling(*args))
+                compare(self, self.fortran.priorityfilling(*args), pdstack.priorityfilling(*args))
+
+    def test_pitfilling_csr(self):
+        offsets, ngbs, edge = grid_csr(self.ngbs, self.edge)
+        for mod in (self.fortran, pdstack):
+            mod.pitparamscsr(offsets, ngbs, self.area, 5, 0.9, 50., 1.e-3, self.bds)
+        args = (self.elev, 1, 0.)
+        compare(self, self.fortran.pitfilling(*args), pdstack.pitfilling(*args))
+
+    def test_stratigraphy(self):
+        np.random.seed(2)
+        nb = len(self.elev)
+        layS = np.random.rand(nb, 6, 2)*5.
+        layH = layS.sum(axis=2)
+        eros = -np.random.rand(nb, 2)*3.
+        depo = np.random.rand(nb, 2)*2.
+        compare(self, self.fortran.updatestrati(layS, layH, eros, depo),
+                pdstack.updatestrati(layS, layH, eros, depo))
+        compare(self, self.fortran.updatecstrati(layS, layH, eros[:,0], depo[:,0]),
+                pdstack.updatecstrati(layS, layH, eros[:,0], depo[:,0]))
+        clastic = np.random.rand(nb)
+        compare(self, self.fortran.stratcarb(layS, layH, clastic), pdstack.stratcarb(layS, layH, clastic))
+        alay = np.random.rand(nb)*10.
+        compare(self, self.fortran.getactlay(alay, layH, layS), pdstack.getactlay(alay, layH, layS))
+        compare(self, self.fortran.getactlay2(2.5, layH, layS), pdstack.getactlay2(2.5, layH, layS))
+
+@unittest.skipIf(libUtils.backends.get('sfd') != 'fortran', 'compiled sfd library not available')
+class DirectionsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fortran = libUtils.sfd
+        pts, ngbs, edge, area, bds, elev = grid_mesh()
+        pdstack.pitparams(ngbs, area, 5, 0.9, 50., 1.e-3, bds)
+        self.fillH = pdstack.pitfilling(elev, 1, 0.)
+        self.elev = elev
+        self.ngbs = ngbs
+        self.edge = edge
+        # Distinct Voronoi edges and distances to catch swapped arguments
+        self.dist = edge*1.5
+        self.gids = np.arange(len(elev), dtype=np.int32)
+        self.borders = np.ones(len(elev), dtype=np.int32)
+        self.borders[:bds] = 0
+        np.random.seed(3)
+        self.depo = np.random.rand(len(elev))*2.
+
+    def check(self, name, *args):
+        compare(self, getattr(self.fortran, name)(*args), getattr(sfd, name)(*args))
+
+    def test_directions(self):
+        self.check('directions', self.fillH, self.elev, self.ngbs, self.edge, self.dist, self.gids)
+        self.check('directions_base', self.elev, self.ngbs, self.edge, self.dist, self.gids)
+        self.check('dirview', self.fillH, self.elev, self.ngbs, self.edge, self.dist, self.gids, 0.)
+
+    def test_diffusion(self):
+        self.check('diffusion', self.elev, self.borders, self.ngbs, self.edge, self.dist, self.gids)
+        self.check('diffusionnl', 0.8, self.elev, self.borders, self.ngbs, self.edge, self.dist, self.gids)
+        self.check('diffusionero', self.elev, self.borders, self.ngbs, self.edge, self.dist, self.gids)
+        self.check('diffusionmarine', self.elev, self.borders, self.depo, self.ngbs, self.edge,
+                   self.dist, self.gids)
+        self.check('diffnlcfl', 0.8, 0.1, self.elev, self.borders, self.ngbs, self.dist, self.gids)
+
+    def test_csr(self):
+        offsets, ngbs, edge = grid_csr(self.ngbs, self.edge)
+        dist = edge*1.5
+        self.check('directions_csr', self.fillH, self.elev, offsets, ngbs, self.gids)
+        self.check('directions_base_csr', self.elev, offsets, ngbs, self.gids)
+        self.check('diffusion_csr', self.elev, self.borders, offsets, ngbs, edge, dist, self.gids)
+        self.check('diffusionnl_csr', 0.8, self.elev, self.borders, offsets, ngbs, edge, dist, self.gids)
+        self.check('diffusionero_csr', self.elev, self.borders, offsets, ngbs, edge, dist, self.gids)
+        self.check('diffnlcfl_csr', 0.8, 0.1, self.elev, self.borders, offsets, ngbs, dist, self.gids)
+
+@unittest.skipIf(libUtils.backends.get('FLOWalgo') != 'fortran', 'compiled FLOWalgo library not available')
+class FlowComputeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fortran = libUtils.FLOWalgo.flowcompute
+        self.pts, self.area, self.elev, self.fillH, self.stack, self.rcv, maxh, maxdep = grid_network()
+        self.ngbs, self.edge = grid_mesh()[1:3]
+        np.random.seed(4)
+        self.dis = flowcompute.discharge(self.stack, self.rcv, self.elev, self.area*np.random.rand(len(self.area)))[0]
+
+    def check(self, name, *args):
+        compare(self, getattr(self.fortran, name)(*args), getattr(flowcompute, name)(*args))
+
+    def test_network(self):
+        self.check('discharge', self.stack, self.rcv, self.elev, self.area)
+        self.check('parameters', self.stack, self.rcv, self.dis, self.pts, 0)
+        self.check('basinparameters', self.stack, self.rcv, self.elev, self.fillH, self.area)
+
+        bid, vol = flowcompute.basinparameters(self.stack, self.rcv, self.elev, self.fillH, self.area)
+        pitIDs = np.where(vol > 0)[0].astype(np.int32)
+        order = np.argsort(self.fillH[pitIDs]).astype(np.int32)
+        self.check('basindrainage', order, bid, self.rcv, pitIDs, self.fillH, 0.)
+        self.check('basindrainageall', order, bid, self.rcv, pitIDs)
+
+    def test_erosion(self):
+        nb = len(self.elev)
+        ids = np.arange(nb, dtype=np.int32)
+        Cero = np.full(nb, 5.e-6)
+        for mod in (self.fortran, flowcompute):
+            mod.eroparams(0, 0.5, 1., 1., 1., 1.e-3, 1., 0.5, 0)
+        self.check('flowcfl', ids, self.rcv, self.pts, self.elev, self.dis, Cero)
+        self.check('implicitspl', self.stack, self.rcv, self.pts, self.dis, self.fillH, self.elev,
+                   Cero, 0., 1000.)
+
+    def test_marine(self):
+        nb = len(self.elev)
+        gids = np.arange(nb, dtype=np.int32)
+        borders = np.ones(nb, dtype=np.int32)
+        borders[self.elev == -60.] = 0
+        np.random.seed(5)
+        depo = np.random.rand(nb, 2)
+        depoH = depo.sum(axis=1)
+        coeff = np.full(nb, 1.e-3)
+        dist = self.edge*1.5
+        self.check('diffmarine', self.elev, borders, depoH, self.ngbs, self.edge, dist, coeff, gids,
+                   0., 0.1, 100.)
+        offsets, ngbs, edge = grid_csr(self.ngbs, self.edge)
+        self.check('diffmarinecsr', self.elev, borders, depoH, offsets, ngbs, edge, edge*1.5, coeff,
+                   gids, 0., 0.1, 100.)
+        self.check('diffsedmarine', self.elev, borders, depo, depoH, 0., 0.1, coeff*100., self.ngbs,
+                   self.edge, dist, gids)
+        self.check('diffsedhillslope', self.elev, borders, depo, np.full(nb, 1.), coeff*100., self.ngbs,
+                   self.edge, dist, gids)
+
+@unittest.skipIf(libUtils.backends.get('ORmodel') != 'fortran', 'compiled ORmodel library not available')
+class OrographicRainTest(unittest.TestCase):
+
+    def test_compute(self):
+        fortran = libUtils.ORmodel.orographicrain
+        x, y = np.meshgrid(np.arange(60)*500., np.arange(50)*500.)
+        elev = 1500.*np.exp(-((x - 15000.)**2 + (y - 12000.)**2)/5000.**2)
+        for windx, windy in ((10., 0.), (-4., 7.)):
+            args = (elev, 500., windx, windy, 0., 5., 0.2, 0.005, 0.005, 3000., 1000., 1000.)
+            compare(self, fortran.compute(*args), orographicrain.compute(*args), RAIN_TOLERANCE)
+
+@unittest.skipIf(libUtils.backends.get('WAVEsed') != 'fortran', 'compiled WAVEsed library not available')
+class WaveSedTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fortran = libUtils.WAVEsed.wavesed
+        # Shoreface sloping towards the first row with an island
+        x, y = np.meshgrid(np.arange(40)*100., np.arange(50)*100.)
+        self.depth = 30. - 0.01*y - 40.*np.exp(-((x - 2000.)**2 + (y - 1500.)**2)/400.**2)
+        self.inland = (self.depth <= 0).astype(float)
+
+    def test_airymodel(self):
+        src = np.full(self.depth.shape, -2.)
+        src[0, :] = 0.
+        src[self.depth <= 0] = -2.
+        for shadow in (0, 1):
+            args = (100., 0.99, 2., self.depth, src, self.inland, shadow)
+            compare(self, self.fortran.airymodel(*args), wavesed.airymodel(*args))
+
+    def test_transport(self):
+        np.random.seed(6)
+        hent = np.where(self.depth > 0, np.random.rand(*self.depth.shape)*0.1, 0.)
+        angle = np.random.rand(*self.depth.shape)*np.pi
+        tX = np.cos(angle)/(np.abs(np.cos(angle)) + np.abs(np.sin(angle)))
+        tY = np.sin(angle)/(np.abs(np.cos(angle)) + np.abs(np.sin(angle)))
+        args = (100, self.depth, hent, tX, tY)
+        compare(self, self.fortran.transport(*args), wavesed.transport(*args))
+
+        dz = self.fortran.transport(*args)[0]
+        args = (-self.depth + dz - hent, dz, 1.e-3, 0.05, 2500., 20)
+        compare(self, self.fortran.diffusion(*args), wavesed.diffusion(*args))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+##                                                                                   ##
+##  This file forms part of the Badlands surface processes modelling application.    ##
+##                                                                                   ##
+##  For full license and copyright information, please refer to the LICENSE.md file  ##
+##  located at the project root, or contact the authors.                             ##
+##                                                                                   ##
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+"""
+Tests of the snapshot and restore functions of pyBadlands.model.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+from pyBadlands import model as badlandsModel
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Input paths in the example XML files are relative to the project root
+XMLINPUT = 'Examples/crater_fast/crater.xml'
+
+class SnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.mkdtemp()
+        os.chdir(ROOT)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmpdir)
+
+    def load(self):
+        model = badlandsModel.Model()
+        model.load_xml(self.tmpdir, XMLINPUT, muted=True)
+        # The flow network base nodes are shuffled with the random number generator
+        np.random.seed(1)
+
+        return model
+
+    def state(self, model):
+        return [np.copy(array) for array in (model.elevation, model.cumdiff, model.cumhill,
+                                             model.fillH, model.flow.discharge, model.flow.base)]
+
+    def check(self, state, ref):
+        for array, refarray in zip(state, ref):
+            np.testing.assert_array_equal(array, refarray)
+
+    def test_restore(self):
+        # The reference run stops at the snapshot time too, as run_to_time ends its last
+        # time step on the requested time
+        model = self.load()
+        model.run_to_time(1000., muted=True)
+        model.run_to_time(5000., muted=True)
+        ref = self.state(model)
+
+        model = self.load()
+        model.run_to_time(1000., muted=True)
+        snap = model.snapshot()
+        model.run_to_time(5000., muted=True)
+        self.check(self.state(model), ref)
+
+        # Each branch restored from the snapshot repeats the straight run
+        for branch in range(2):
+            model.restore(snap)
+            self.assertEqual(model.tNow, 1000.)
+            model.run_to_time(5000., muted=True)
+            self.check(self.state(model), ref)
+
+    def test_read_only(self):
+        model = self.load()
+        model.run_to_time(1000., muted=True)
+        snap = model.snapshot()
+        self.assertFalse(snap['model']['elevation'].flags.writeable)
+        self.assertIsNot(snap['model']['elevation'], model.elevation)
+
+        # Restored arrays are writable copies of the snapshot
+        model.restore(snap)
+        self.assertTrue(model.elevation.flags.writeable)
+        model.elevation += 1.
+        np.testing.assert_array_equal(snap['model']['elevation'] + 1., model.elevation)
+
+if __name__ == '__main__':
+    unittest.main()
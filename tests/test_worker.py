@@ -0,0 +1,118 @@
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+##                                                                                   ##
+##  This file forms part of the BayesLands surface processes modelling companion.    ##
+##                                                                                   ##
+##  For full license and copyright information, please refer to the LICENSE.md file  ##
+##  located at the project root, or contact the authors.                             ##
+##                                                                                   ##
+##~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~#~##
+
+"""
+Tests of the predictions recorded by bl_worker.blackBox.
+"""
+import os
+import time
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+import bl_worker
+
+class StubModel(object):
+	"""
+	Model replacement calling its observers like Model.run_to_time: only at the requested
+	times after the current time, with the elevation set to the simulation time.
+	"""
+	def __init__(self):
+		self.tNow = 0.
+		self.observers = []
+		x, y = np.meshgrid(np.arange(5.), np.arange(4.))
+		self.coords = np.c_[x.ravel(), y.ravel(), np.zeros(x.size)]
+
+	def load_xml(self, run_nb, filename, muted=False, meshcache=None):
+		self.input = type('input', (object,), {})()
+		self.flow = type('flow', (object,), {'erodibility': np.zeros(len(self.coords))})()
+		self.force = type('force', (object,), {'rainVal': np.zeros(2)})()
+
+	def add_observer(self, callback, times=None):
+		self.observers.append((callback, [float(t) for t in times if t > self.tNow]))
+
+	def state_views(self):
+		elev = np.full(len(self.coords), self.tNow)
+		return {'coords': self.coords, 'elevation': elev, 'cumdiff': elev}
+
+	def run_to_time(self, tEnd, muted=False):
+		times = sorted(set(t for callback, obs in self.observers for t in obs if t <= tEnd))
+		for t in times:
+			self.tNow = t
+			for callback, obs in self.observers:
+				if t in obs and callback(t, self.state_views()):
+					return
+
+class TestBlackBox(unittest.TestCase):
+
+	def setUp(self):
+		self.model = bl_worker.badlandsModel
+		bl_worker.badlandsModel = StubModel
+
+	def tearDown(self):
+		bl_worker.badlandsModel = self.model
+
+	def test_recorded_times(self):
+		sim_interval = np.arange(0, 15001, 3750)
+		erdp_coords = np.array([[1, 1], [2, 3]])
+		elev_vec, erdp_vec, erdp_pts_vec = bl_worker.blackBox('input.xml', 0, sim_interval, erdp_coords, 1., 5.e-6, 0.5, 1.)
+
+		for vec in [elev_vec, erdp_vec, erdp_pts_vec]:
+			self.assertEqual(list(vec.keys()), list(sim_interval))
+		for simtime in sim_interval:
+			self.assertTrue(np.allclose(elev_vec[simtime], simtime))
+			self.assertTrue(np.allclose(erdp_pts_vec[simtime], simtime))
+
+	def test_abort(self):
+		sim_interval = np.arange(0, 15001, 3750)
+		abort = lambda simtime, elev, erdp_pts: simtime >= 7500
+		elev_vec = bl_worker.blackBox('input.xml', 0, sim_interval, np.array([[1, 1]]), 1., 5.e-6, 0.5, 1., abort=abort)[0]
+
+		self.assertEqual(list(elev_vec.keys()), list(sim_interval[:3]))
+
+	def test_abort_likelihood(self):
+		sim_interval = np.arange(0, 15001, 3750)
+		erdp_coords = np.array([[1, 1]])
+		abort = lambda simtime, elev, erdp_pts: simtime >= sim_interval[1]
+		elev_vec, erdp_vec, erdp_pts_vec = bl_worker.blackBox('input.xml', 0, sim_interval, erdp_coords, 1., 5.e-6, 0.5, 1., abort=abort)
+		real_elev = elev_vec[sim_interval[0]]
+		real_erdp_pts = np.zeros((len(sim_interval), 1))
+
+		for likl_sed in [False, True]:
+			result = bl_worker.likelihood(elev_vec, erdp_pts_vec, real_elev, real_erdp_pts, sim_interval, likl_sed)
+			self.assertEqual(result, (-np.inf, np.inf, np.inf, np.inf))
+
+	def test_segments(self):
+		sim_interval = np.arange(0, 15001, 3750)
+		tmpdir = tempfile.mkdtemp()
+		interpolate = bl_worker.interpolateArray
+		def slow_interpolate(coords, z, dz):
+			time.sleep(0.02)
+			return interpolate(coords, z, dz)
+		bl_worker.interpolateArray = slow_interpolate
+		try:
+			timer = bl_worker.SampleTimer(os.path.join(tmpdir, 'timing.csv'))
+			bl_worker.blackBox('input.xml', 0, sim_interval, np.array([[1, 1]]), 1., 5.e-6, 0.5, 1., timer=timer)
+			timer.close()
+			rows = [line.strip().split(',') for line in open(os.path.join(tmpdir, 'timing.csv'))][1:]
+		finally:
+			bl_worker.interpolateArray = interpolate
+			shutil.rmtree(tmpdir)
+
+		# One run_to_time record per segment, labelled by its simulation time
+		segments = [row[2] for row in rows if row[1] == 'run_to_time']
+		self.assertEqual(segments, [str(t) for t in sim_interval[1:]])
+
+		# The interpolations done by the observer are not counted in the segments
+		self.assertEqual(timer.stats['interpolate'][0], len(sim_interval))
+		self.assertLess(timer.stats['run_to_time'][1], 0.02)
+
+if __name__ == '__main__':
+	unittest.main()